@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Microbenchmark comparing version ordering via ver_cmp and precomputed keys.
+
+Run from a source checkout via ``python benchmarks/bench_versions.py``.
+"""
+
+import argparse
+import random
+import timeit
+from functools import cmp_to_key
+
+from pkgcore.ebuild import cpv
+
+
+def generate_versions(count, seed=0):
+    """Generate a reproducible list of valid version strings with revisions."""
+    rnd = random.Random(seed)
+    versions = []
+    for _ in range(count):
+        ver = ".".join(
+            str(rnd.choice((0, 1, 2, 10, 2024))) if rnd.random() > 0.1 else "01"
+            for _ in range(rnd.randint(1, 4))
+        )
+        if rnd.random() < 0.1:
+            ver += rnd.choice("abc")
+        if rnd.random() < 0.3:
+            ver += "_" + rnd.choice(("alpha", "beta", "pre", "rc", "p"))
+            ver += str(rnd.randint(0, 5))
+        if rnd.random() < 0.3:
+            ver += f"-r{rnd.randint(1, 3)}"
+        versions.append(ver)
+    return versions
+
+
+def _ver_cmp(x, y):
+    return cpv.ver_cmp(x.version, x.revision, y.version, y.revision)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", type=int, default=5000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    versions = generate_versions(args.count)
+    cpvs = [cpv.VersionedCPV(f"cat/pkg-{v}") for v in versions]
+
+    benchmarks = {
+        "ver_cmp sort": lambda: sorted(cpvs, key=cmp_to_key(_ver_cmp)),
+        "CPV rich comparison sort": lambda: sorted(cpvs),
+        "sort_cpvs": lambda: cpv.sort_cpvs(cpvs),
+        "sort_versions (parsing included)": lambda: cpv.sort_versions(versions),
+    }
+    print(f"sorting {args.count} versions, best of {args.repeat}:")
+    for name, func in benchmarks.items():
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"  {name:<34} {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
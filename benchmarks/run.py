@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""Benchmark suite covering pkgcore hot paths.
+
+Benchmarks run offline against a generated synthetic repository, profile
+stack and vdb (see synthetic.py). Results can be written as JSON and compared
+against results from another commit:
+
+    python benchmarks/run.py -o base.json
+    git checkout feature && python benchmarks/run.py --compare base.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from functools import cmp_to_key
+from itertools import islice
+
+from synthetic import SyntheticTree
+
+from pkgcore import __version__
+from pkgcore.cache import flat_hash
+from pkgcore.config import load_config
+from pkgcore.ebuild import cpv, profiles, resolver
+from pkgcore.ebuild.atom import atom
+from pkgcore.restrictions import packages
+from pkgcore.util import parse_cache
+
+SIZES = {
+    "small": {"categories": 10, "packages": 300, "eclasses": 30, "installed": 60},
+    "medium": {"categories": 50, "packages": 3000, "eclasses": 200, "installed": 600},
+    "large": {
+        "categories": 150,
+        "packages": 15000,
+        "eclasses": 600,
+        "installed": 2000,
+    },
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register a benchmark.
+
+    Benchmarks take the benchmark context and return a callable that is timed
+    for each round, keeping setup costs out of the measurements.
+    """
+    BENCHMARKS[func.__name__.removeprefix("bench_")] = func
+    return func
+
+
+class Context:
+    """Lazily created objects shared between benchmarks."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._domain = None
+        self._repo = None
+
+    @property
+    def domain(self):
+        if self._domain is None:
+            config = load_config(location=self.tree.config, root=self.tree.root)
+            self._domain = config.get_default("domain")
+        return self._domain
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            self._repo = self.domain.ebuild_repos_raw[0]
+        return self._repo
+
+    def dep_atoms(self):
+        """Return all atom strings used in the tree's dependencies."""
+        atoms = []
+        for path, _, files in os.walk(os.path.join(self.tree.repo, "metadata")):
+            for name in files:
+                with open(os.path.join(path, name)) as f:
+                    for line in f:
+                        if line.startswith(("DEPEND=", "RDEPEND=", "BDEPEND=")):
+                            atoms.extend(
+                                x
+                                for x in line.split("=", 1)[1].split()
+                                if "/" in x and not x.endswith("?")
+                            )
+        return atoms
+
+    def versions(self):
+        return [v for vers in self.tree.packages.values() for v in vers]
+
+
+@benchmark
+def bench_atom_parse(ctx):
+    atoms = ctx.dep_atoms()
+
+    def run():
+        parse_cache.clear()
+        for s in atoms:
+            atom(s)
+
+    return run
+
+
+@benchmark
+def bench_atom_parse_cached(ctx):
+    atoms = ctx.dep_atoms()
+    # keep the instances alive so only cache lookups are measured
+    parsed = [atom(s) for s in atoms]
+
+    def run():
+        for s in atoms:
+            atom(s)
+
+    run.parsed = parsed
+    return run
+
+
+@benchmark
+def bench_ver_cmp(ctx):
+    cpvs = [cpv.VersionedCPV(f"cat/pkg-{v}") for v in ctx.versions()]
+
+    def f(x, y):
+        return cpv.ver_cmp(x.version, x.revision, y.version, y.revision)
+
+    key = cmp_to_key(f)
+    return lambda: sorted(cpvs, key=key)
+
+
+@benchmark
+def bench_version_sort(ctx):
+    versions = ctx.versions()
+    return lambda: cpv.sort_versions(versions)
+
+
+@benchmark
+def bench_restriction_match(ctx):
+    repo = ctx.repo
+    restricts = [atom(x) for x in islice(ctx.dep_atoms(), 500)]
+    # populate the package and version listings
+    for restrict in restricts:
+        repo.match(restrict)
+
+    def run():
+        for restrict in restricts:
+            repo.match(restrict)
+
+    return run
+
+
+@benchmark
+def bench_profile_collapse(ctx):
+    base = os.path.join(ctx.tree.repo, "profiles")
+    profile = os.path.relpath(ctx.tree.profile, base)
+    # profile nodes are interned while in use, keep them loaded so only
+    # collapsing the stack is measured regardless of benchmark order
+    nodes = profiles.OnDiskProfile(base, profile).stack
+
+    def run():
+        stack = profiles.OnDiskProfile(base, profile)
+        for attr in (
+            "masks",
+            "unmasks",
+            "keywords",
+            "accept_keywords",
+            "pkg_use",
+            "forced_use",
+            "masked_use",
+            "use",
+            "default_env",
+            "iuse_effective",
+        ):
+            getattr(stack, attr)
+
+    run.nodes = nodes
+    return run
+
+
+_profile_attrs = profiles.OnDiskProfile._snapshot_attrs + ("use", "arch")
+
+
+@benchmark
+def bench_profile_load(ctx):
+    base = os.path.join(ctx.tree.repo, "profiles")
+    profile = os.path.relpath(ctx.tree.profile, base)
+
+    def run():
+        # profile nodes are released after each round, so files are reparsed
+        stack = profiles.OnDiskProfile(base, profile)
+        for attr in _profile_attrs:
+            getattr(stack, attr)
+
+    return run
+
+
+@benchmark
+def bench_profile_snapshot(ctx):
+    base = os.path.join(ctx.tree.repo, "profiles")
+    profile = os.path.relpath(ctx.tree.profile, base)
+    snapshot = os.path.join(ctx.tree.path, "profile-snapshot.pickle")
+    # backdate the generated profile files so they aren't considered racy
+    stamp = time.time() - 3600
+    for path, _, files in os.walk(base):
+        for name in files:
+            os.utime(os.path.join(path, name), (stamp, stamp))
+        os.utime(path, (stamp, stamp))
+    os.utime(os.path.join(ctx.tree.repo, "metadata", "layout.conf"), (stamp, stamp))
+
+    def run():
+        stack = profiles.OnDiskProfile(base, profile, snapshot=snapshot)
+        for attr in _profile_attrs:
+            getattr(stack, attr)
+
+    return run
+
+
+@benchmark
+def bench_flat_hash_read(ctx):
+    cache = flat_hash.md5_cache(ctx.tree.repo, readonly=True)
+    keys = sorted(cache.keys())
+
+    def run():
+        for key in keys:
+            cache[key]
+
+    return run
+
+
+@benchmark
+def bench_filter_repo(ctx):
+    domain = ctx.domain
+    # configured repo wrapped by the domain's mask, keyword and license filters
+    repo = domain.source_repos[0].raw_repo
+    pkgs = list(repo.itermatch(packages.AlwaysTrue))
+    for pkg in pkgs:
+        pkg.keywords, pkg.license
+
+    def run():
+        restrict = domain.filter_repo(repo).restrict
+        for pkg in pkgs:
+            restrict.match(pkg)
+
+    return run
+
+
+@benchmark
+def bench_resolver(ctx):
+    domain = ctx.domain
+    targets = [atom(key) for key in sorted(ctx.tree.packages)[::10]]
+
+    def run():
+        resolver_inst = resolver.upgrade_resolver(
+            vdbs=domain.installed_repos,
+            dbs=domain.source_repos,
+            verify_vdb=False,
+            nodeps=False,
+            drop_cycles=True,
+        )
+        for target in targets:
+            resolver_inst.add_atoms([target])
+
+    return run
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(func, rounds, warmup=1):
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(rounds):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        "rounds": rounds,
+        "min": min(times),
+        "max": max(times),
+        "mean": statistics.fmean(times),
+        "median": statistics.median(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def compare(results, baseline, out=sys.stdout):
+    """Output the relative change of benchmark medians against a baseline."""
+    base = baseline["benchmarks"]
+    out.write(f"{'benchmark':<24} {'baseline':>12} {'current':>12} {'change':>9}\n")
+    for name, result in results["benchmarks"].items():
+        if name not in base:
+            out.write(f"{name:<24} {'-':>12} {result['median'] * 1000:10.2f}ms\n")
+            continue
+        old, new = base[name]["median"], result["median"]
+        change = (new - old) / old * 100 if old else 0.0
+        out.write(
+            f"{name:<24} {old * 1000:10.2f}ms {new * 1000:10.2f}ms {change:+8.1f}%\n"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("-s", "--size", choices=SIZES, default="medium")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-r", "--rounds", type=int, default=5)
+    parser.add_argument(
+        "-k",
+        "--select",
+        action="append",
+        default=[],
+        help="only run benchmarks containing the given string",
+    )
+    parser.add_argument("-o", "--output", help="write JSON results to a file")
+    parser.add_argument("--compare", help="JSON results file to compare against")
+    parser.add_argument(
+        "--tree", help="directory to generate the synthetic tree in (kept afterwards)"
+    )
+    parser.add_argument("--list", action="store_true", help="list benchmarks")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    names = [
+        name
+        for name in BENCHMARKS
+        if not args.select or any(x in name for x in args.select)
+    ]
+
+    with tempfile.TemporaryDirectory(prefix="pkgcore-bench-") as tmpdir:
+        path = args.tree if args.tree is not None else tmpdir
+        start = time.perf_counter()
+        tree = SyntheticTree(path, seed=args.seed, **SIZES[args.size])
+        sys.stderr.write(
+            f"generated {args.size} synthetic tree in "
+            f"{time.perf_counter() - start:.1f}s\n"
+        )
+        ctx = Context(tree)
+        results = {
+            "meta": {
+                "pkgcore": __version__,
+                "commit": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "size": args.size,
+                "seed": args.seed,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "benchmarks": {},
+        }
+        for name in names:
+            func = BENCHMARKS[name](ctx)
+            result = run_benchmark(func, args.rounds)
+            results["benchmarks"][name] = result
+            sys.stderr.write(f"{name:<24} {result['median'] * 1000:10.2f}ms\n")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    elif not args.output:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
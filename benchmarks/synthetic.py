@@ -0,0 +1,266 @@
+"""Generate a reproducible synthetic ebuild repository, profile stack and vdb.
+
+All generated data is deterministic for a given seed and size, so results
+from different commits can be compared. Metadata cache entries are written
+directly, avoiding any bash usage when loading packages.
+"""
+
+import hashlib
+import os
+import random
+import textwrap
+from os.path import join as pjoin
+
+ARCH = "amd64"
+USE_FLAGS = tuple(f"flag{i}" for i in range(40))
+LICENSES = ("GPL-2", "MIT", "BSD")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(data)
+
+
+def _md5(data):
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+class SyntheticTree:
+    """Synthetic repository, vdb and portage config rooted at a directory.
+
+    :param path: base directory to create everything in
+    :param categories: number of categories
+    :param packages: number of packages spread across the categories
+    :param eclasses: number of eclasses
+    :param installed: number of packages installed in the vdb
+    :param seed: random seed used for generation
+    """
+
+    def __init__(
+        self, path, categories=50, packages=3000, eclasses=200, installed=600, seed=0
+    ):
+        self.path = path
+        self.repo = pjoin(path, "repo")
+        self.root = pjoin(path, "root")
+        self.vdb = pjoin(self.root, "var", "db", "pkg")
+        self.config = pjoin(path, "etc", "portage")
+        self.profile = pjoin(self.repo, "profiles", "default", "linux", ARCH, "desktop")
+        self.rnd = random.Random(seed)
+        self.categories = [f"dev-synth{i}" for i in range(categories)]
+        self.eclasses = {}
+        self.packages = {}
+        self.installed = []
+        self._generate(packages, eclasses, installed)
+
+    def _generate(self, packages, eclasses, installed):
+        rnd = self.rnd
+        for i in range(eclasses):
+            name = f"synth{i}"
+            data = textwrap.dedent(
+                f"""\
+                # synthetic eclass {i}
+                {name}_src_compile() {{
+                \temake -j1 || die
+                }}
+                EXPORT_FUNCTIONS src_compile
+                """
+            )
+            _write(pjoin(self.repo, "eclass", f"{name}.eclass"), data)
+            self.eclasses[name] = _md5(data)
+
+        keys = []
+        for i in range(packages):
+            key = f"{rnd.choice(self.categories)}/pkg{i}"
+            versions = sorted(
+                {
+                    f"{rnd.randint(0, 5)}.{rnd.randint(0, 20)}"
+                    + rnd.choice(("", "", "", "_p1", "_rc2", "-r1", "a"))
+                    for _ in range(rnd.randint(1, 4))
+                }
+            )
+            self.packages[key] = versions
+            for ver in versions:
+                self._write_ebuild(key, ver, keys)
+            keys.append(key)
+
+        self._write_profiles(keys)
+        self._write_vdb(rnd.sample(keys, min(installed, len(keys))))
+        self._write_config(keys)
+
+    def _deps(self, keys, count):
+        rnd = self.rnd
+        deps = []
+        for key in rnd.sample(keys, min(count, len(keys))):
+            op, ver = rnd.choice((("", ""), ("", ""), (">=", "1.0"), ("<", "9")))
+            dep = f"{op}{key}"
+            if ver:
+                dep += f"-{ver}"
+            if rnd.random() < 0.2:
+                dep += ":="
+            if rnd.random() < 0.05:
+                dep += f"[{rnd.choice(USE_FLAGS)}(-)?]"
+            deps.append(dep)
+        if deps and self.rnd.random() < 0.3:
+            flag = rnd.choice(USE_FLAGS)
+            deps[-1] = f"{flag}? ( {deps[-1]} )"
+        return " ".join(deps)
+
+    def _write_ebuild(self, key, ver, keys):
+        rnd = self.rnd
+        cat, pn = key.split("/")
+        inherit = sorted(rnd.sample(list(self.eclasses), rnd.randint(0, 3)))
+        iuse = sorted(rnd.sample(USE_FLAGS, rnd.randint(0, 6)))
+        metadata = {
+            "EAPI": "8",
+            "DESCRIPTION": f"synthetic package {key}",
+            "HOMEPAGE": "https://example.com",
+            "SLOT": "0",
+            "LICENSE": rnd.choice(LICENSES),
+            "KEYWORDS": rnd.choice((ARCH, ARCH, ARCH, f"~{ARCH}", f"{ARCH} x86")),
+            "IUSE": " ".join(iuse),
+            "DEPEND": self._deps(keys, rnd.randint(0, 4)),
+            "RDEPEND": self._deps(keys, rnd.randint(0, 4)),
+            "BDEPEND": self._deps(keys, rnd.randint(0, 2)),
+            "DEFINED_PHASES": "compile install",
+        }
+        lines = [f"EAPI={metadata['EAPI']}"]
+        if inherit:
+            lines.append(f"inherit {' '.join(inherit)}")
+        lines.extend(
+            f'{k}="{v}"'
+            for k, v in metadata.items()
+            if k not in ("EAPI", "DEFINED_PHASES")
+        )
+        ebuild = "\n".join(lines) + "\n"
+        _write(pjoin(self.repo, cat, pn, f"{pn}-{ver}.ebuild"), ebuild)
+
+        if inherit:
+            metadata["INHERITED"] = " ".join(inherit)
+            metadata["_eclasses_"] = "\t".join(
+                f"{x}\t{self.eclasses[x]}" for x in inherit
+            )
+        metadata["_md5_"] = _md5(ebuild)
+        cache = "".join(f"{k}={v}\n" for k, v in sorted(metadata.items()) if v)
+        _write(pjoin(self.repo, "metadata", "md5-cache", cat, f"{pn}-{ver}"), cache)
+
+    def _write_profiles(self, keys):
+        rnd = self.rnd
+        profiles = pjoin(self.repo, "profiles")
+        _write(pjoin(profiles, "repo_name"), "synth\n")
+        _write(pjoin(profiles, "eapi"), "8\n")
+        _write(pjoin(profiles, "arch.list"), f"{ARCH}\nx86\n")
+        _write(pjoin(profiles, "categories"), "\n".join(self.categories) + "\n")
+        _write(pjoin(profiles, "use.desc"), "".join(f"{x} - {x}\n" for x in USE_FLAGS))
+        _write(
+            pjoin(profiles, "profiles.desc"),
+            f"{ARCH} default/linux/{ARCH}/desktop stable\n",
+        )
+        _write(
+            pjoin(self.repo, "metadata", "layout.conf"),
+            "masters =\ncache-formats = md5-dict\nthin-manifests = true\n",
+        )
+        for license in LICENSES:
+            _write(pjoin(self.repo, "licenses", license), f"{license}\n")
+        _write(pjoin(profiles, "license_groups"), "FREE GPL-2 MIT\n")
+
+        def sample_atoms(count, versioned=False):
+            atoms = []
+            for key in rnd.sample(keys, count):
+                if versioned:
+                    atoms.append(f">={key}-{rnd.choice(self.packages[key])}")
+                else:
+                    atoms.append(key)
+            return atoms
+
+        def pkg_use(count):
+            return "".join(
+                f"{key} {' '.join(rnd.sample(USE_FLAGS, 3))}\n"
+                for key in sample_atoms(count)
+            )
+
+        stack = (
+            ("base", None, 'USE="flag0 flag1 flag2"\nCHOST="x86_64-pc-linux-gnu"\n'),
+            ("default/linux", "../../base", 'USE="flag3 -flag1"\n'),
+            (
+                f"default/linux/{ARCH}",
+                "..",
+                f'ARCH="{ARCH}"\nACCEPT_KEYWORDS="{ARCH}"\nUSE="{ARCH} flag4"\n',
+            ),
+            (f"default/linux/{ARCH}/desktop", "..", 'USE="flag5 flag6 flag7"\n'),
+        )
+        for path, parent, make_defaults in stack:
+            base = pjoin(profiles, path)
+            _write(pjoin(base, "make.defaults"), make_defaults)
+            if parent is not None:
+                _write(pjoin(base, "parent"), f"{parent}\n")
+            _write(pjoin(base, "eapi"), "8\n")
+            _write(
+                pjoin(base, "package.mask"),
+                "\n".join(sample_atoms(20, versioned=True)) + "\n",
+            )
+            _write(pjoin(base, "package.use"), pkg_use(50))
+            _write(pjoin(base, "package.use.mask"), pkg_use(30))
+            _write(pjoin(base, "package.use.force"), pkg_use(10))
+            _write(pjoin(base, "use.mask"), "\n".join(rnd.sample(USE_FLAGS, 3)) + "\n")
+            _write(
+                pjoin(base, "package.accept_keywords"),
+                "".join(f"{x} ~{ARCH}\n" for x in sample_atoms(20)),
+            )
+
+    def _write_vdb(self, keys):
+        rnd = self.rnd
+        for key in sorted(keys):
+            ver = self.packages[key][-1]
+            cat, pn = key.split("/")
+            base = pjoin(self.vdb, cat, f"{pn}-{ver}")
+            contents = [f"dir /usr/share/{pn}"]
+            contents.extend(
+                f"obj /usr/share/{pn}/file{i} {_md5(str(i))} 1700000000"
+                for i in range(rnd.randint(1, 20))
+            )
+            entries = {
+                "EAPI": "8",
+                "SLOT": "0",
+                "KEYWORDS": ARCH,
+                "IUSE": "",
+                "USE": ARCH,
+                "LICENSE": "MIT",
+                "DESCRIPTION": f"synthetic package {key}",
+                "RDEPEND": "",
+                "repository": "synth",
+                "CONTENTS": "\n".join(contents),
+            }
+            for name, value in entries.items():
+                _write(pjoin(base, name), f"{value}\n")
+            self.installed.append(f"{key}-{ver}")
+
+    def _write_config(self, keys):
+        rnd = self.rnd
+        _write(
+            pjoin(self.config, "repos.conf"),
+            f"[DEFAULT]\nmain-repo = synth\n\n[synth]\nlocation = {self.repo}\n",
+        )
+        _write(
+            pjoin(self.config, "make.conf"),
+            f'USE="flag8"\nROOT="{self.root}"\nACCEPT_LICENSE="-* @FREE"\n',
+        )
+        sample = max(len(keys) // 15, 1)
+        _write(
+            pjoin(self.config, "package.license"),
+            "".join(f"{x} BSD\n" for x in rnd.sample(keys, sample)),
+        )
+        _write(
+            pjoin(self.config, "package.accept_keywords"),
+            "".join(f"{x} ~{ARCH}\n" for x in rnd.sample(keys, sample)),
+        )
+        # mix of atoms and the globs commonly used in user configs
+        masks = [f">={x}-{self.packages[x][-1]}" for x in rnd.sample(keys, sample)]
+        masks.extend(f"{x}/*:1" for x in rnd.sample(self.categories, 5))
+        masks.extend(f"*/{x.split('/')[1]}" for x in rnd.sample(keys, 5))
+        _write(pjoin(self.config, "package.mask"), "\n".join(masks) + "\n")
+        _write(
+            pjoin(self.config, "package.unmask"),
+            "".join(f"{x}\n" for x in rnd.sample(keys, sample // 4)),
+        )
+        os.symlink(self.profile, pjoin(self.config, "make.profile"))
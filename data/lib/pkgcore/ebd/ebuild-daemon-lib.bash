@@ -31,6 +31,43 @@ __ebd_read_size() {
 		die "coms error in ${PKGCORE_EBD_PID}, read_size $@ failed w/ ${ret}"
 }
 
+# Read a framed env of the given size in bytes and set its variables, see
+# EbuildProcessor._generate_env_frame() for the format.
+__ebd_read_env_frame() {
+	local - __data __var __i __ret=0
+	local -a __sections __vars
+	__ebd_read_size "$1" __data
+	set -f
+	__IFS_push $'\x1d'
+	__sections=( ${__data} )
+	unset -v __data
+	IFS=$'\x1e'
+	# strings are assigned in bulk
+	__vars=( ${__sections[0]} )
+	if [[ ${#__vars[@]} -gt 0 ]]; then
+		export -- "${__vars[@]}" || __ret=1
+	fi
+	__vars=( ${__sections[1]} )
+	if [[ ${#__vars[@]} -gt 0 ]]; then
+		declare -g -- "${__vars[@]}" || __ret=1
+	fi
+	for __i in 2 3; do
+		__vars=( ${__sections[__i]} )
+		for __var in "${__vars[@]}"; do
+			local -n __ref=${__var%%=*}
+			IFS=$'\x1f'
+			__ref=( ${__var#*=} ) || __ret=1
+			IFS=$'\x1e'
+			unset -n __ref
+			if [[ ${__i} -eq 2 ]]; then
+				export -- "${__var%%=*}" || __ret=1
+			fi
+		done
+	done
+	__IFS_pop
+	return ${__ret}
+}
+
 __ebd_read_cat_size() {
 	dd bs=$1 count=1 <&${PKGCORE_EBD_READ_FD}
 }
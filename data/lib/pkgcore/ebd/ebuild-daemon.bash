@@ -191,6 +191,10 @@ __ebd_process_ebuild_phases() {
 			start_receiving_env*)
 				line=${line#start_receiving_env }
 				case ${line} in
+					framed*)
+						__ebd_read_env_frame "${line#framed }"
+						cont=$?
+						;;
 					file*)
 						line=${line#file }
 						source "${line}"
@@ -293,16 +297,20 @@ __ebd_process_metadata() {
 		declare -r PKGCORE_QA_SUPPRESSED=false
 		# Wipe __mode; it bleeds from our parent.
 		unset -v __mode
-		local __data
-		local __ret
-		__ebd_read_size "$1" __data
-		local IFS=$'\0'
-		eval "$__data"
-		__ret=$?
-		unset -v __data
-		[[ ${__ret} -ne 0 ]] && exit 1
-		unset -v __ret
-		local IFS=$' \t\n'
+		if [[ $1 == framed\ * ]]; then
+			__ebd_read_env_frame "${1#framed }" || exit 1
+		else
+			local __data
+			local __ret
+			__ebd_read_size "$1" __data
+			local IFS=$'\0'
+			eval "$__data"
+			__ret=$?
+			unset -v __data
+			[[ ${__ret} -ne 0 ]] && exit 1
+			unset -v __ret
+			local IFS=$' \t\n'
+		fi
 
 		if [[ -n ${PKGCORE_METADATA_PATH} ]]; then
 			export PATH=${PKGCORE_METADATA_PATH}
@@ -392,6 +400,9 @@ __ebd_main_loop() {
 			alive)
 				__ebd_write_line "yep!"
 				;;
+			framed_protocol\?)
+				__ebd_write_line "framed_protocol!"
+				;;
 			*)
 				die "unknown ebd com: '${com}'"
 				;;
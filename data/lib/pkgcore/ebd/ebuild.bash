@@ -501,13 +501,24 @@ __dump_metadata_keys() {
 	# be invoked after ebuild code has done it's thing, as such we no longer care,
 	# and directly screw w/ it for speed reasons- about 5% speedup in metadata regen.
 	set -f
-	local key phases phase
+	local key phases phase __frame __words
 	for key in "${PKGCORE_METADATA_KEYS[@]}"; do
 		if [[ ${key} == DEFINED_PHASES ]]; then
 			for phase in "${PKGCORE_EBUILD_PHASES[@]}"; do
 				__is_function "${phase}" && phases+=( ${phase} )
 			done
-			__ebd_write_line "key DEFINED_PHASES=${phases[@]:--}"
+			if [[ -n ${PKGCORE_METADATA_FRAMED} ]]; then
+				__frame+="DEFINED_PHASES=${phases[*]:--}"$'\n'
+			else
+				__ebd_write_line "key DEFINED_PHASES=${phases[@]:--}"
+			fi
+		elif [[ -n ${PKGCORE_METADATA_FRAMED} ]]; then
+			# collect all keys into a single frame, word splitting normalizes
+			# whitespace the same way echo does below
+			if [[ ${!key:-unset} != "unset" ]]; then
+				__words=( ${!key} )
+				__frame+="${key}=${__words[*]}"$'\n'
+			fi
 		else
 			# deref the val, if it's not empty/unset, then spit a key command to EBD
 			# after using echo to normalize whitespace (specifically removal of newlines)
@@ -521,6 +532,11 @@ __dump_metadata_keys() {
 			fi
 		fi
 	done
+	if [[ -n ${PKGCORE_METADATA_FRAMED} ]]; then
+		# frame size is sent in bytes
+		local LC_ALL=C
+		printf 'keys %d\n%s' "${#__frame}" "${__frame}" >&${PKGCORE_EBD_WRITE_FD}
+	fi
 	set +f
 }
 
@@ -5,15 +5,18 @@ Currently this primarily just holds the Packages cache used for remote, and
 local binpkg repositories
 """
 
-__all__ = ("PackagesCacheV0", "PackagesCacheV1")
+__all__ = ("PackagesIndex", "PackagesCacheV0", "PackagesCacheV1")
 
+import io
+import mmap
 import os
+from collections.abc import MutableMapping
 from operator import itemgetter
 from time import time
 
 from snakeoil.chksum import get_chksums
 from snakeoil.containers import RefCountingSet
-from snakeoil.fileutils import AtomicWriteFile, readlines
+from snakeoil.fileutils import AtomicWriteFile
 from snakeoil.mappings import ImmutableDict, StackedDict
 
 from .. import cache
@@ -45,6 +48,179 @@ class CacheEntry(StackedDict):
             return default
 
 
+def _block_value(buf, key, start, end):
+    """Return the value of a key within an entry block of a Packages file."""
+    key += b":"
+    if buf[start : start + len(key)] == key:
+        pos = start
+    else:
+        pos = buf.find(b"\n" + key, start, end)
+        if pos == -1:
+            return None
+        pos += 1
+    line_end = buf.find(b"\n", pos, end)
+    if line_end == -1:
+        line_end = end
+    return buf[pos + len(key) : line_end].decode().strip()
+
+
+def _block_lines(buf, start, end):
+    return (x.strip() for x in buf[start:end].decode().splitlines())
+
+
+def _parse_block(data):
+    """Parse the key/value lines of a Packages file entry."""
+    d = {}
+    for line in data.splitlines():
+        k, sep, v = line.partition(":")
+        if sep:
+            d[k.strip()] = v.strip()
+    return d
+
+
+class PackagesIndex(MutableMapping):
+    """Lazily parsed entries of a binpkg Packages file.
+
+    On load, only the byte range of each entry is recorded. Each entry is
+    parsed the first time it's accessed, so large Packages files don't need
+    to be fully loaded before the first query. Entries that are set or
+    deleted are tracked so the cache can write updates without reserializing
+    unchanged entries.
+
+    :param cache: :obj:`PackagesCacheV0` instance entries are parsed for
+    :param location: path to the Packages file
+    :param use_mmap: map the file into memory instead of reading it
+    """
+
+    def __init__(self, cache, location, use_mmap=True):
+        self._cache = cache
+        self.location = location
+        self.use_mmap = use_mmap
+        self.reload()
+
+    def reload(self):
+        """Reindex the file, dropping any changes that weren't written."""
+        self._entries = {}
+        self._offsets = {}
+        self.modified = set()
+        self.preamble = ImmutableDict()
+        self.defaults = ImmutableDict()
+        self.header_size = 0
+        self.count = 0
+        buf = self._buf = self._read()
+        if buf is None:
+            return
+
+        # the header includes its trailing blank line
+        end = buf.find(b"\n\n")
+        end = len(buf) if end == -1 else end + 2
+        self.preamble = self._cache.read_preamble(_block_lines(buf, 0, end))
+        self.header_size = end
+        self.defaults = self._cache._entry_defaults(self.preamble)
+
+        pos = end
+        size = len(buf)
+        while pos < size:
+            # skip entry separators
+            if buf[pos] == 10:
+                pos += 1
+                continue
+            end = buf.find(b"\n\n", pos)
+            end = size if end == -1 else end + 1
+            cpv = _block_value(buf, b"CPV", pos, end)
+            if cpv is None:
+                category = _block_value(buf, b"CATEGORY", pos, end)
+                pf = _block_value(buf, b"PF", pos, end)
+                if category is not None and pf is not None:
+                    cpv = f"{category}/{pf}"
+            if cpv is not None:
+                self._offsets[cpv] = (pos, end)
+            self.count += 1
+            pos = end
+
+    def _read(self):
+        try:
+            with open(self.location, "rb") as f:
+                if self.use_mmap and os.fstat(f.fileno()).st_size:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @property
+    def exists(self):
+        """Whether the Packages file existed when it was indexed."""
+        return self._buf is not None
+
+    def raw_header(self):
+        """Return the unparsed preamble of the file."""
+        return self._buf[: self.header_size]
+
+    def raw_tail(self):
+        """Return the last bytes of the file."""
+        return self._buf[-2:]
+
+    def raw(self, cpv):
+        """Return the unparsed data of an entry as it exists on disk.
+
+        :raises KeyError: if the entry doesn't exist or has been modified
+        """
+        if cpv in self.modified:
+            raise KeyError(cpv)
+        start, end = self._offsets[cpv]
+        return self._buf[start:end]
+
+    def __getitem__(self, cpv):
+        try:
+            return self._entries[cpv]
+        except KeyError:
+            pass
+        start, end = self._offsets[cpv]
+        raw_d = _parse_block(self._buf[start:end].decode())
+        entry = self._entries[cpv] = CacheEntry(
+            self._cache._parse_entry(raw_d), self.defaults
+        )
+        return entry
+
+    def __setitem__(self, cpv, value):
+        self._entries[cpv] = value
+        self.modified.add(cpv)
+
+    def __delitem__(self, cpv):
+        if cpv not in self:
+            raise KeyError(cpv)
+        self._entries.pop(cpv, None)
+        self._offsets.pop(cpv, None)
+        self.modified.add(cpv)
+
+    def __contains__(self, cpv):
+        return cpv in self._entries or cpv in self._offsets
+
+    def __iter__(self):
+        yield from self._offsets
+        yield from (x for x in self._entries if x not in self._offsets)
+
+    def __len__(self):
+        return len(self._offsets) + sum(
+            1 for x in self._entries if x not in self._offsets
+        )
+
+    @property
+    def consistent(self):
+        """Whether the PACKAGES header matches the number of indexed entries."""
+        count = self.preamble.get("PACKAGES")
+        if count is None:
+            return True
+        try:
+            return int(count) == self.count
+        except ValueError:
+            return False
+
+    def appendable(self):
+        """Determine if the changes only consist of new entries."""
+        return all(x in self._entries and x not in self._offsets for x in self.modified)
+
+
 def find_best_savings(stream, line_prefix):
     rcs = RefCountingSet(stream)
     line_overhead = len(line_prefix)
@@ -118,53 +294,42 @@ class PackagesCacheV0(cache.bulk):
         kwds["auxdbkeys"] = vkeys
         super().__init__(*args, **kwds)
 
-    def _handle(self):
-        return readlines(self._location, True, False, False)
-
     def read_preamble(self, handle):
         return ImmutableDict(
             (self._header_mangling_map.get(k, k), v)
             for k, v in _iter_till_empty_newline(handle)
         )
 
-    def _read_data(self):
-        try:
-            handle = self._handle()
-        except FileNotFoundError:
-            return {}
-        self.preamble = self.read_preamble(handle)
-
+    def _entry_defaults(self, preamble):
+        """Return the default values of entries for a given preamble."""
         defaults = dict(self._deserialized_defaults.items())
         defaults.update(
-            (k, v)
-            for k, v in self.preamble.items()
-            if k in self.deserialized_inheritable
+            (k, v) for k, v in preamble.items() if k in self.deserialized_inheritable
         )
-        defaults = ImmutableDict(defaults)
+        return ImmutableDict(defaults)
 
-        pkgs = {}
-        count = 0
+    def _parse_entry(self, raw_d):
+        """Convert the raw key/value pairs of an entry to its cache data."""
         vkeys = self._known_keys
-        while True:
-            raw_d = dict(_iter_till_empty_newline(handle))
-
-            d = {k: v for k, v in raw_d.items() if k in vkeys}
-            if not d:
-                break
-            count += 1
-            cpv = d.pop("CPV", None)
-            if cpv is None:
-                cpv = f"{d.pop('CATEGORY')}/{d.pop('PF')}"
-
-            if "USE" in d:
-                d.setdefault("IUSE", d.get("USE", ""))
-            for src, dst in self._deserialize_map.items():
-                if src in d:
-                    d.setdefault(dst, d.pop(src))
+        d = {k: v for k, v in raw_d.items() if k in vkeys}
+        d.pop("CPV", None)
+        if "USE" in d:
+            d.setdefault("IUSE", d.get("USE", ""))
+        for src, dst in self._deserialize_map.items():
+            if src in d:
+                d.setdefault(dst, d.pop(src))
+        return d
 
-            pkgs[cpv] = CacheEntry(d, defaults)
-        assert count == int(self.preamble.get("PACKAGES", count))
-        return pkgs
+    def _read_data(self):
+        index = PackagesIndex(self, self._location)
+        self.preamble = index.preamble
+        if not index.consistent:
+            # likely an interrupted append; the next write rewrites the file
+            logger.warning(
+                f"{self._location!r}: PACKAGES header doesn't match the "
+                f"{index.count} entries found, reindexed"
+            )
+        return index
 
     @classmethod
     def _assemble_preamble_dict(cls, target_dicts):
@@ -206,17 +371,92 @@ class PackagesCacheV0(cache.bulk):
         return d
 
     def _write_data(self):
-        handler = None
+        index = self.data
         try:
-            try:
-                handler = AtomicWriteFile(self._location)
-                self._serialize_to_handle(list(self.data.items()), handler)
-                handler.close()
-            except PermissionError as e:
-                logger.error(f"failed writing binpkg cache to {self._location!r}: {e}")
+            if not index.exists or self.preamble.get("VERSION") != str(self.version):
+                self._write_full(index)
+            elif index.consistent and index.appendable():
+                self._write_appended(index)
+            else:
+                self._write_spliced(index)
+        except PermissionError as e:
+            logger.error(f"failed writing binpkg cache to {self._location!r}: {e}")
+            return
+        index.reload()
+        self.preamble = index.preamble
+
+    def _write_full(self, index):
+        handler = AtomicWriteFile(self._location)
+        try:
+            self._serialize_to_handle(list(index.items()), handler)
+            handler.close()
+        finally:
+            handler.discard()
+
+    def _inherited_preamble(self):
+        """Return the preamble values inherited by entries of the current file."""
+        return {
+            k: v for k, v in self.preamble.items() if k in self.deserialized_inheritable
+        }
+
+    def _patched_header(self, index, count):
+        """Return the current file header with updated package count and timestamp."""
+        lines = []
+        for line in index.raw_header().decode().splitlines():
+            key = line.split(":", 1)[0]
+            if key == "PACKAGES":
+                line = f"PACKAGES: {count}"
+            elif key == "TIMESTAMP":
+                line = f"TIMESTAMP: {int(time())}"
+            lines.append(line)
+        return "".join(f"{x}\n" for x in lines if x) + "\n"
+
+    def _write_appended(self, index):
+        """Append new entries to the file without rewriting existing ones.
+
+        The header is updated in place after the entries are written, so
+        unlike the other write methods the file is no longer kept sorted by
+        CPV and an interrupted write leaves a PACKAGES count that doesn't
+        match the entries; the latter is detected on load and repaired by
+        the next write.
+        """
+        preamble = self._inherited_preamble()
+        data = io.StringIO()
+        for cpv in sorted(index.modified):
+            self._serialize_entry(data, cpv, index[cpv], preamble)
+        header = self._patched_header(index, index.count + len(index.modified))
+        header = header.encode()
+        # the header can only be updated in place if its size is unchanged
+        if len(header) != index.header_size:
+            return self._write_spliced(index)
+        with open(self._location, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            if not index.raw_tail().endswith(b"\n\n"):
+                f.write(b"\n")
+            f.write(data.getvalue().encode())
+            f.flush()
+            f.seek(0)
+            f.write(header)
+
+    def _write_spliced(self, index):
+        """Rewrite the file, copying unchanged entries verbatim."""
+        preamble = self._inherited_preamble()
+        handler = AtomicWriteFile(self._location, binary=True)
+        try:
+            handler.write(self._patched_header(index, len(index)).encode())
+            for cpv in sorted(index):
+                try:
+                    raw = index.raw(cpv)
+                except KeyError:
+                    data = io.StringIO()
+                    self._serialize_entry(data, cpv, index[cpv], preamble)
+                    raw = data.getvalue().encode()
+                else:
+                    raw = bytes(raw).rstrip(b"\n") + b"\n\n"
+                handler.write(raw)
+            handler.close()
         finally:
-            if handler is not None:
-                handler.discard()
+            handler.discard()
 
     def _serialize_to_handle(self, data, handler):
         preamble = self._assemble_preamble_dict(data)
@@ -227,27 +467,31 @@ class PackagesCacheV0(cache.bulk):
             handler.write(f"{convert_key(key, key)}: {preamble[key]}\n")
         handler.write("\n")
 
+        for cpv, pkg_data in sorted(data, key=itemgetter(0)):
+            self._serialize_entry(handler, cpv, pkg_data, preamble)
+
+    def _serialize_entry(self, handler, cpv, pkg_data, preamble):
+        convert_key = self._serialize_map.get
         spacer = " "
         if self.version != 0:
             spacer = ""
 
         vkeys = self._known_keys
-        for cpv, pkg_data in sorted(data, key=itemgetter(0)):
-            handler.write(f"CPV:{spacer}{cpv}\n")
-            data = [(convert_key(key, key), value) for key, value in pkg_data.items()]
-            for write_key, value in sorted(data):
-                if write_key not in vkeys:
-                    continue
-                value = str(value).strip()
-                if write_key in preamble:
-                    if value != preamble[write_key]:
-                        if value:
-                            handler.write(f"{write_key}:{spacer}{value}\n")
-                        else:
-                            handler.write(f"{write_key}:\n")
-                elif value:
-                    handler.write(f"{write_key}:{spacer}{value}\n")
-            handler.write("\n")
+        handler.write(f"CPV:{spacer}{cpv}\n")
+        data = [(convert_key(key, key), value) for key, value in pkg_data.items()]
+        for write_key, value in sorted(data):
+            if write_key not in vkeys:
+                continue
+            value = str(value).strip()
+            if write_key in preamble:
+                if value != preamble[write_key]:
+                    if value:
+                        handler.write(f"{write_key}:{spacer}{value}\n")
+                    else:
+                        handler.write(f"{write_key}:\n")
+            elif value:
+                handler.write(f"{write_key}:{spacer}{value}\n")
+        handler.write("\n")
 
     def update_from_xpak(self, pkg, xpak):
         # invert the lookups here; if you do .items() on an xpak,
@@ -0,0 +1,285 @@
+"""
+single file SQLite based backend
+"""
+
+__all__ = ("database",)
+
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from urllib.parse import quote
+
+from snakeoil.chksum import get_handler
+from snakeoil.osutils import ensure_dirs
+
+from ..config.hint import ConfigHint
+from . import errors, fs_template
+
+# track open databases so forked children don't reuse the parent's connections
+_databases = weakref.WeakSet()
+
+
+def _reset_connections():
+    for db in _databases:
+        db._db = None
+        db._lock = threading.RLock()
+
+
+os.register_at_fork(after_in_child=_reset_connections)
+
+
+class database(fs_template.FsBased):
+    """Stores all cache entries in a single indexed SQLite database.
+
+    Entries are stored using the same serialized values as the md5-cache
+    format, allowing existing md5-cache trees to be imported directly via
+    :meth:`import_cache`.
+
+    Updates are queued in a transaction that's committed according to the
+    cache sync rate, so bulk updates such as cache regeneration only pay for
+    a single commit.
+    """
+
+    pkgcore_config_type = ConfigHint(
+        types={
+            "readonly": "bool",
+            "location": "str",
+            "label": "str",
+            "auxdbkeys": "list",
+        },
+        required=["location"],
+        positional=["location"],
+        typename="cache",
+    )
+
+    autocommits = False
+    chf_type = "md5"
+    eclass_chf_types = ("md5",)
+    schema_version = "1"
+
+    def __init__(self, *args, **config):
+        super().__init__(*args, **config)
+        self._lock = threading.RLock()
+        self._db = None
+        _databases.add(self)
+
+    @property
+    def connection(self):
+        """SQLite connection to the database, opened on first access."""
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._connect()
+        return self._db
+
+    def _connect(self):
+        if self.readonly:
+            if not os.path.exists(self.location):
+                # allow readonly access to missing databases, acting empty
+                uri = "file::memory:"
+            else:
+                uri = f"file:{quote(self.location)}?mode=ro"
+        else:
+            if not ensure_dirs(
+                os.path.dirname(os.path.abspath(self.location)),
+                mode=0o775,
+                minimal=False,
+            ):
+                raise errors.InitializationError(
+                    self.__class__.__name__,
+                    f"failed creating directory for {self.location!r}",
+                )
+            uri = f"file:{quote(self.location)}"
+        try:
+            db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            if self.readonly and uri.startswith("file::memory:"):
+                self._create_tables(db)
+            elif not self.readonly:
+                self._create_tables(db)
+                self._ensure_access(self.location)
+            else:
+                self._check_schema(db)
+        except sqlite3.Error as e:
+            raise errors.InitializationError(self.__class__.__name__, e) from e
+        return db
+
+    def _create_tables(self, db):
+        with db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS info "
+                "(key TEXT PRIMARY KEY NOT NULL, value TEXT NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata "
+                "(cpv TEXT PRIMARY KEY NOT NULL, data TEXT NOT NULL) WITHOUT ROWID"
+            )
+            db.execute(
+                "INSERT OR IGNORE INTO info VALUES (?, ?), (?, ?)",
+                ("version", self.schema_version, "chf", self.chf_type),
+            )
+        self._check_schema(db)
+
+    def _check_schema(self, db):
+        info = dict(db.execute("SELECT key, value FROM info"))
+        if info.get("version") != self.schema_version:
+            raise errors.GeneralCacheCorruption(
+                f"{self.location!r}: unsupported schema version: {info.get('version')!r}"
+            )
+        if info.get("chf") != self.chf_type:
+            raise errors.GeneralCacheCorruption(
+                f"{self.location!r}: checksum type mismatch: "
+                f"{info.get('chf')!r} != {self.chf_type!r}"
+            )
+
+    def _parse_data(self, cpv, data):
+        try:
+            values = json.loads(data)
+            d = self._cdict_kls(
+                (k, v) for k, v in values.items() if k in self._known_keys
+            )
+            d[self._chf_key] = self._chf_deserializer(d[self._chf_key])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise errors.CacheCorruption(cpv, e) from e
+        return d
+
+    def _getitem(self, cpv):
+        with self._lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT data FROM metadata WHERE cpv = ?", (cpv,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                raise errors.CacheCorruption(cpv, e) from e
+        if row is None:
+            raise KeyError(cpv)
+        return self._parse_data(cpv, row[0])
+
+    def _serialize(self, values):
+        return json.dumps(
+            {k: v for k, v in values.items() if k in self._known_keys},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+
+    def _setitem(self, cpv, values):
+        data = self._serialize(values)
+        with self._lock:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO metadata VALUES (?, ?)", (cpv, data)
+                )
+            except sqlite3.Error as e:
+                raise errors.CacheCorruption(cpv, e) from e
+
+    def _delitem(self, cpv):
+        with self._lock:
+            try:
+                cursor = self.connection.execute(
+                    "DELETE FROM metadata WHERE cpv = ?", (cpv,)
+                )
+            except sqlite3.Error as e:
+                raise errors.CacheCorruption(cpv, e) from e
+        if not cursor.rowcount:
+            raise KeyError(cpv)
+
+    def __contains__(self, cpv):
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM metadata WHERE cpv = ?", (cpv,)
+            ).fetchone()
+        return row is not None
+
+    def keys(self):
+        with self._lock:
+            cpvs = [
+                x[0]
+                for x in self.connection.execute(
+                    "SELECT cpv FROM metadata ORDER BY cpv"
+                )
+            ]
+        return iter(cpvs)
+
+    def __len__(self):
+        with self._lock:
+            row = self.connection.execute("SELECT COUNT(*) FROM metadata").fetchone()
+        return row[0]
+
+    def commit(self, force=False):
+        if self.readonly:
+            return
+        with self._lock:
+            if self._db is not None and (force or self._db.in_transaction):
+                try:
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    raise errors.GeneralCacheCorruption(e) from e
+
+    def close(self):
+        """Commit pending updates and close the database connection."""
+        with self._lock:
+            if self._db is not None:
+                self.commit()
+                self._db.close()
+                self._db = None
+
+    def _serialize_chf(self, value):
+        if self.chf_type == "mtime":
+            return str(value)
+        return get_handler(self.chf_type).long2str(value)
+
+    def import_cache(self, source, prune=True):
+        """Replace the database contents with all entries from another cache.
+
+        This is used to convert existing flat file caches (e.g. md5-cache
+        trees) in a single transaction without regenerating any metadata.
+
+        :param source: cache instance using the same checksum types
+        :param prune: remove entries that don't exist in the source cache
+        :return: number of imported entries
+        """
+        if self.readonly:
+            raise errors.ReadOnly()
+        if (source.chf_type, tuple(source.eclass_chf_types)) != (
+            self.chf_type,
+            tuple(self.eclass_chf_types),
+        ):
+            raise errors.CacheError(
+                f"can't import {source.__class__.__name__} cache: "
+                f"incompatible checksum types"
+            )
+
+        count = 0
+        with self._lock:
+            db = self.connection
+            try:
+                with db:
+                    if prune:
+                        db.execute("DELETE FROM metadata")
+                    for cpv in source.keys():
+                        try:
+                            values = dict(source._getitem(cpv))
+                        except (KeyError, errors.CacheError):
+                            continue
+                        chf = self._chf_key
+                        values[chf] = self._serialize_chf(values[chf])
+                        db.execute(
+                            "INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+                            (cpv, self._serialize(values)),
+                        )
+                        count += 1
+            except sqlite3.Error as e:
+                raise errors.GeneralCacheCorruption(e) from e
+        return count
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        d["_db"] = None
+        del d["_lock"]
+        return d
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        _databases.add(self)
@@ -16,6 +16,7 @@ from ..restrictions import boolean, packages, restriction, values
 from ..restrictions.packages import AndRestriction as PkgAndRestriction
 from ..restrictions.packages import Conditional
 from ..restrictions.values import ContainmentMatch
+from ..util.parse_cache import ParseCache
 from . import cpv, errors, restricts
 from . import eapi as eapi_mod
 
@@ -39,6 +40,9 @@ class atom(boolean.AndRestriction):
     """Currently implements gentoo ebuild atom parsing.
 
     Should be converted into an agnostic dependency base.
+
+    Instances are interned with recently used atoms kept alive via a bounded
+    cache, see :py:mod:`pkgcore.util.parse_cache`.
     """
 
     # note we don't need _hash
@@ -287,7 +291,7 @@ class atom(boolean.AndRestriction):
                     orig_atom, f"repo_id atoms aren't supported for EAPI {eapi}"
                 )
         try:
-            self._cpv = cpv.CPV(self.cpvstr, versioned=bool(self.op))
+            self._cpv = cpv.interned(self.cpvstr, bool(self.op))
         except errors.InvalidCPV as e:
             raise errors.MalformedAtom(orig_atom) from e
 
@@ -446,7 +450,7 @@ class atom(boolean.AndRestriction):
         if c:
             return c
 
-        c = cpv.ver_cmp(self.version, self.revision, other.version, other.revision)
+        c = cmp(self.version_key, other.version_key)
         if c:
             return c
 
@@ -862,3 +866,6 @@ class transitive_use_atom(atom):
 
     iter_dnf_solutions = boolean.AndRestriction.iter_dnf_solutions
     cnf_solutions = boolean.AndRestriction.cnf_solutions
+
+
+atom.__instance_cache__ = ParseCache("atom")
@@ -1,11 +1,13 @@
 """gentoo ebuild specific base package class"""
 
 from collections import UserString
+from operator import itemgetter
 
 from snakeoil.compatibility import cmp
 from snakeoil.delayed import regexp
 
 from ..package import base
+from ..util.parse_cache import ParseCache
 from . import atom
 from .errors import InvalidCPV
 
@@ -239,6 +241,83 @@ def ver_cmp(ver1: str, rev1: str, ver2: str, rev2: str) -> int:
     return cmp(rev1, rev2)
 
 
+# marks the end of a version's suffixes, ranking between the negative
+# (alpha, beta, pre, rc) and positive (p) suffix values
+_suffix_end = ((0,),)
+
+
+def version_key(ver: str, rev=None) -> tuple:
+    """Return a sort key for a version.
+
+    Keys are ordered the same as :func:`ver_cmp` orders versions, allowing
+    versions to be compared via plain tuple comparisons once their keys are
+    generated.
+
+    :param ver: version string without revision
+    :param rev: revision as a string, :obj:`Revision`, int, or None
+    """
+    parts = ver.split("_")
+    dotted = parts[0]
+    if dotted[-1].isalpha():
+        letter = ord(dotted[-1])
+        dotted = dotted[:-1]
+    else:
+        letter = -1
+    # components with leading zeroes are compared as strings sans trailing
+    # zeroes, always ranking lower than components compared as ints
+    components = tuple(
+        (0, x.rstrip("0")) if x[0] == "0" else (1, int(x)) for x in dotted.split(".")
+    )
+    if len(parts) > 1:
+        suffixes = []
+        for x in parts[1:]:
+            match = suffix_regexp.match(x)
+            suffixes.append((suffix_value[match.group(1)], int("0" + match.group(2))))
+        suffixes = tuple(suffixes) + _suffix_end
+    else:
+        suffixes = _suffix_end
+    return (components, letter, suffixes, int(rev) if rev else 0)
+
+
+def _split_fullver(fullver):
+    ver, _, rev = fullver.rpartition("-")
+    if ver and isvalid_rev(rev):
+        return ver, rev[1:]
+    return fullver, None
+
+
+def sort_versions(versions, reverse=False) -> list:
+    """Sort full version strings, e.g. as returned by a repo's versions mapping.
+
+    Each version is only parsed once, making this considerably faster than
+    sorting via pairwise :func:`ver_cmp` calls for large lists.
+
+    :param versions: iterable of version strings with optional revisions
+    :param reverse: sort from highest to lowest version
+    """
+    return [
+        fullver
+        for _key, fullver in sorted(
+            ((version_key(*_split_fullver(x)), x) for x in versions),
+            key=itemgetter(0),
+            reverse=reverse,
+        )
+    ]
+
+
+def sort_key(pkg) -> tuple:
+    """Return a sort key for a CPV or package ordered the same as CPV objects."""
+    return (pkg.category, pkg.package, pkg.version_key)
+
+
+def sort_cpvs(cpvs, reverse=False) -> list:
+    """Sort CPV objects or packages using precomputed version keys.
+
+    :param reverse: sort from highest to lowest
+    """
+    return sorted(cpvs, key=sort_key, reverse=reverse)
+
+
 class CPV(base.base):
     """base ebuild package class
 
@@ -247,6 +326,7 @@ class CPV(base.base):
     :ivar key: strkey (cat/pkg)
     :ivar version: str version
     :ivar revision: str revision
+    :ivar version_key: precomputed version sort key, see :func:`version_key`
     :ivar versioned_atom: atom matching this exact version
     :ivar unversioned_atom: atom matching all versions of this package
     """
@@ -259,6 +339,7 @@ class CPV(base.base):
         "version",
         "revision",
         "fullver",
+        "version_key",
     )
 
     def __init__(self, *args, versioned=None):
@@ -337,12 +418,14 @@ class CPV(base.base):
                 raise InvalidCPV(cpvstr, "invalid package name")
             sf(self, "package", "-".join(pkg_chunks))
             sf(self, "key", f"{category}/{self.package}")
+            sf(self, "version_key", version_key(self.version, self.revision))
         else:
             if not isvalid_pkg_name(pkg_chunks):
                 raise InvalidCPV(cpvstr, "invalid package name")
             sf(self, "revision", None)
             sf(self, "fullver", None)
             sf(self, "version", None)
+            sf(self, "version_key", ())
             sf(self, "key", cpvstr)
             sf(self, "package", "-".join(pkg_chunks))
 
@@ -360,10 +443,7 @@ class CPV(base.base):
             if self.cpvstr == other.cpvstr:
                 return True
             if self.category == other.category and self.package == other.package:
-                return (
-                    ver_cmp(self.version, self.revision, other.version, other.revision)
-                    == 0
-                )
+                return self.version_key == other.version_key
         except AttributeError:
             pass
         return False
@@ -375,12 +455,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        < 0
-                    )
+                    return self.version_key < other.version_key
                 return self.package < other.package
             return self.category < other.category
         except AttributeError:
@@ -393,12 +468,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        <= 0
-                    )
+                    return self.version_key <= other.version_key
                 return self.package < other.package
             return self.category < other.category
         except AttributeError:
@@ -411,12 +481,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        > 0
-                    )
+                    return self.version_key > other.version_key
                 return self.package > other.package
             return self.category > other.category
         except AttributeError:
@@ -429,12 +494,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        >= 0
-                    )
+                    return self.version_key >= other.version_key
                 return self.package > other.package
             return self.category > other.category
         except AttributeError:
@@ -474,3 +534,19 @@ class UnversionedCPV(CPV):
 
     def __init__(self, *args):
         super().__init__(*args, versioned=False)
+
+
+_cpv_cache = ParseCache("cpv")
+
+
+def interned(cpvstr: str, versioned: bool) -> CPV:
+    """Return a shared :obj:`CPV` instance for a CPV string.
+
+    CPV objects are immutable, so identical strings are only parsed once
+    while the resulting instance is in use or among the most recently used
+    ones, see :py:mod:`pkgcore.util.parse_cache`.
+    """
+    key = (cpvstr, versioned)
+    if (obj := _cpv_cache.get(key)) is None:
+        obj = _cpv_cache[key] = CPV(cpvstr, versioned=versioned)
+    return obj
@@ -8,12 +8,13 @@ import errno
 import operator
 import os
 
-from snakeoil.chksum import get_handler
+from snakeoil.chksum import get_handler, get_handlers
 from snakeoil.mappings import ImmutableDict
 
 from .. import gpg
 from ..fs.livefs import iter_scan
 from ..package import errors
+from ..util.chksum import chksum_files
 from . import cpv
 
 
@@ -131,9 +132,11 @@ class Manifest:
         aux, ebuild, misc = {}, {}, {}
         if not self.thin:
             filesdir = "/files/"
-            for obj in iter_scan(
-                "/", offset=os.path.dirname(self.path), chksum_types=chfs
-            ):
+            base = os.path.dirname(self.path)
+            chfs = tuple(get_handlers(chfs))
+            # (mapping, pathname, path) tuples of the files to checksum
+            files = []
+            for obj in iter_scan("/", offset=base):
                 if not obj.is_reg:
                     continue
                 pathname = obj.location
@@ -153,7 +156,10 @@ class Manifest:
                         "Unexpected directory found in %r; %r"
                         % (self.path, obj.dirname)
                     )
-                d[pathname] = dict(obj.chksums)
+                files.append((d, pathname, base + obj.location))
+            chksums = chksum_files((x[2] for x in files), chfs)
+            for (d, pathname, _path), values in zip(files, chksums):
+                d[pathname] = dict(zip(chfs, values))
 
         handle = open(self.path, "w")
 
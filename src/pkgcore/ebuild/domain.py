@@ -10,7 +10,7 @@ import copy
 import os
 import re
 import tempfile
-from collections import defaultdict
+from collections import Counter
 from functools import partial
 from itertools import chain
 from multiprocessing import cpu_count
@@ -27,6 +27,7 @@ from snakeoil.process.spawn import spawn_get_output
 from snakeoil.sequences import predicate_split, split_negations, stable_unique
 
 from ..binpkg import repository as binary_repo
+from ..cache import errors as cache_errors
 from ..cache.flat_hash import md5_cache
 from ..config import basics
 from ..config import errors as config_errors
@@ -40,12 +41,14 @@ from ..repository import filtered
 from ..repository.util import RepositoryGroup
 from ..restrictions import packages, values
 from ..restrictions.delegated import delegate
+from ..util.parse_cache import LRUCache
 from ..util.parserestrict import ParseError, parse_match
+from . import processor
 from . import repository as ebuild_repo
-from .atom import atom as _atom
 from .eapi import get_latest_PMS_eapi
 from .misc import (
     ChunkedDataDict,
+    RestrictDispatch,
     chunked_data,
     collapsed_restrict_to_data,
     incremental_expansion,
@@ -147,23 +150,14 @@ def package_env_splitter(basedir, iterable):
             logger.warning(f"{path!r}, line {lineno}: parsing error: {e}")
 
 
-def apply_mask_filter(globs, atoms, pkg, mode):
+def apply_mask_filter(dispatch, pkg, mode):
     # mode is ignored; non applicable.
-    for r in chain(globs, atoms.get(pkg.key, ())):
-        if r.match(pkg):
-            return True
-    return False
+    return dispatch.matches(pkg)
 
 
 def make_mask_filter(masks, negate=False):
-    atoms = defaultdict(list)
-    globs = []
-    for m in masks:
-        if isinstance(m, _atom):
-            atoms[m.key].append(m)
-        else:
-            globs.append(m)
-    return delegate(partial(apply_mask_filter, globs, atoms), negate=negate)
+    dispatch = RestrictDispatch((m, None) for m in masks)
+    return delegate(partial(apply_mask_filter, dispatch), negate=negate)
 
 
 def generate_filter(masks, unmasks, *extra):
@@ -239,6 +233,44 @@ def load_property(
 # should be redesigned to be a seperation of configuration
 # instantiation manglers, and then the ebuild specific chunk (which is
 # selected by config)
+def _pool_eclasses(main_repo, repos, setting):
+    """Return the eclasses of a repo to preload into pooled ebuild processors.
+
+    Eclasses overridden by other repos are skipped since preloaded eclasses
+    are used regardless of the repo of the package being processed.
+
+    :param setting: eclass names or the number of the most inherited eclasses
+    """
+    eclasses = main_repo.eclass_cache.eclasses
+    if setting.isdigit():
+        inherited = Counter()
+        cache = main_repo.cache[0]
+        for key in cache.keys():
+            try:
+                inherited.update(cache[key].get("_eclasses_", {}).keys())
+            except (KeyError, cache_errors.CacheError):
+                continue
+        names = [x for x, _ in inherited.most_common()]
+        limit = int(setting)
+    else:
+        names = setting.split()
+        limit = None
+
+    preload = []
+    for name in names:
+        if name not in eclasses:
+            continue
+        path = eclasses[name].path
+        if all(
+            (data := repo.eclass_cache.eclasses.get(name)) is None or data.path == path
+            for repo in repos
+        ):
+            preload.append(name)
+            if len(preload) == limit:
+                break
+    return preload
+
+
 class domain(config_domain):
     # XXX ouch, verify this crap and add defaults and stuff
     _types = dict.fromkeys(
@@ -271,6 +303,9 @@ class domain(config_domain):
 
     del _types
 
+    # maximum number of computed package USE states kept
+    use_cache_size = 10000
+
     def __init__(
         self,
         profile,
@@ -296,6 +331,45 @@ class domain(config_domain):
         # Protect original settings from being overridden so matching
         # package.env settings can be overlaid properly.
         self._settings = ProtectedDict(settings)
+        self._start_ebd_pool()
+
+    def _raw_setting(self, key):
+        """Return a make.conf setting, allowing overrides via the environment."""
+        return os.environ.get(key, self._settings.get(key))
+
+    def _start_ebd_pool(self):
+        """Start spawning ebuild processors in the background if enabled.
+
+        Controlled via EBD_POOL_SIZE, the number of idle processors to keep
+        available.
+        """
+        size = self._raw_setting("EBD_POOL_SIZE")
+        if not size:
+            return
+        try:
+            size = int(size)
+        except ValueError:
+            raise Failure(f"invalid EBD_POOL_SIZE value: {size!r}")
+        if size > 0:
+            processor.start_processor_pool(size)
+
+    def _preload_ebd_pool(self, repos):
+        """Configure eclasses preloaded into pooled ebuild processors.
+
+        Controlled via EBD_POOL_ECLASSES, either a list of eclass names or the
+        number of the most inherited eclasses of the main ebuild repo to
+        preload.
+        """
+        setting = self._raw_setting("EBD_POOL_ECLASSES")
+        if not setting or not self._raw_setting("EBD_POOL_SIZE"):
+            return
+        ebuild_repos = [x for x in repos if isinstance(x, ebuild_repo.UnconfiguredTree)]
+        main_repo = next((x for x in ebuild_repos if not x.masters), None)
+        if main_repo is not None:
+            processor.preload_pool_eclasses(
+                main_repo.eclass_cache,
+                partial(_pool_eclasses, main_repo, ebuild_repos, setting),
+            )
 
     @load_property("/etc/profile.env", read_func=read_bash_dict)
     def system_shell_profile(self, data):
@@ -386,6 +460,21 @@ class domain(config_domain):
         except KeyError:
             raise Failure("No DISTDIR setting detected from config")
 
+    @klass.jit_attr
+    def merge_jobs(self):
+        """Number of threads used to transfer files to the livefs during merging.
+
+        Controlled via MERGE_JOBS, defaulting to merging serially.
+        """
+        jobs = self._raw_setting("MERGE_JOBS")
+        if not jobs:
+            return 1
+        try:
+            jobs = int(jobs)
+        except ValueError:
+            raise Failure(f"invalid MERGE_JOBS value: {jobs!r}")
+        return max(jobs, 1)
+
     @property
     def stable_arch(self):
         return self.arch
@@ -528,7 +617,14 @@ class domain(config_domain):
         master_license.extend(self.settings.get("ACCEPT_LICENSE", ()))
         if master_license or self.pkg_licenses:
             # restrict that matches iff the licenses are allowed
-            restrict = delegate(partial(self._apply_license_filter, master_license))
+            restrict = delegate(
+                partial(
+                    self._apply_license_filter,
+                    master_license,
+                    RestrictDispatch(self.pkg_licenses),
+                    {},
+                )
+            )
             filters.append(restrict)
 
         return tuple(filters)
@@ -537,29 +633,34 @@ class domain(config_domain):
     def _default_licenses_manager(self):
         return Licenses(*self.source_repos_raw)
 
-    def _apply_license_filter(self, master_licenses, pkg, mode):
-        """Determine if a package's license is allowed."""
+    def _apply_license_filter(self, master_licenses, pkg_licenses, cache, pkg, mode):
+        """Determine if a package's license is allowed.
+
+        :param pkg_licenses: :obj:`RestrictDispatch` of package.license entries
+        :param cache: mapping used to cache results for license combinations
+        """
         # note we're not honoring mode; it's always match.
         # reason is that of not turning on use flags to get acceptable license
         # pairs, maybe change this down the line?
 
-        matched_pkg_licenses = []
-        for atom, licenses in self.pkg_licenses:
-            if atom.match(pkg):
-                matched_pkg_licenses += licenses
-
-        raw_accepted_licenses = master_licenses + matched_pkg_licenses
+        raw_accepted_licenses = tuple(
+            chain(master_licenses, *pkg_licenses.pull_data(pkg))
+        )
         license_manager = getattr(pkg.repo, "licenses", self._default_licenses_manager)
 
         for and_pair in pkg.license.dnf_solutions():
-            accepted = incremental_expansion_license(
-                pkg,
-                and_pair,
-                license_manager.groups,
-                raw_accepted_licenses,
-                msg_prefix="while checking ACCEPT_LICENSE ",
-            )
-            if accepted.issuperset(and_pair):
+            key = (license_manager, raw_accepted_licenses, tuple(and_pair))
+            allowed = cache.get(key)
+            if allowed is None:
+                accepted = incremental_expansion_license(
+                    pkg,
+                    and_pair,
+                    license_manager.groups,
+                    raw_accepted_licenses,
+                    msg_prefix="while checking ACCEPT_LICENSE ",
+                )
+                allowed = cache[key] = accepted.issuperset(and_pair)
+            if allowed:
                 return True
         return False
 
@@ -585,15 +686,20 @@ class domain(config_domain):
                 ((packages.AlwaysTrue, default_keys),), accept_keywords
             )
 
-        return delegate(partial(self._apply_keywords_filter, data))
+        return delegate(
+            partial(
+                self._apply_keywords_filter,
+                data,
+                RestrictDispatch(self.profile.keywords),
+            )
+        )
 
-    def _apply_keywords_filter(self, data, pkg, mode):
+    def _apply_keywords_filter(self, data, pkg_keywords_data, pkg, mode):
         # note we ignore mode; keywords aren't influenced by conditionals.
         # note also, we're not using a restriction here.  this is faster.
         pkg_keywords = pkg.keywords
-        for atom, keywords in self.profile.keywords:
-            if atom.match(pkg):
-                pkg_keywords += keywords
+        for keywords in pkg_keywords_data.pull_data(pkg):
+            pkg_keywords += keywords
         allowed = data.pull_data(pkg)
         if "**" in allowed:
             return True
@@ -619,6 +725,15 @@ class domain(config_domain):
             (x[0].groups(), x[1]) for x in ue_flags
         ]
 
+    @klass.jit_attr_named("_jit_reset_use_cache", uncached_val=None)
+    def _use_cache(self):
+        # tagged with the settings the entries are computed from
+        return self.settings, LRUCache(self.use_cache_size)
+
+    def use_cache_info(self):
+        """Return statistics of the package USE cache."""
+        return self._use_cache[1].info()
+
     def get_package_use_unconfigured(self, pkg, for_metadata=True):
         """Determine use flags for a given package.
 
@@ -638,6 +753,38 @@ class domain(config_domain):
             Three groups of use flags for the package in the following order:
             immutable flags, enabled flags, and disabled flags.
         """
+        settings, cache = self._use_cache
+        if settings is not self.settings:
+            # settings were regenerated, drop entries computed from the old ones
+            self._jit_reset_use_cache = None
+            settings, cache = self._use_cache
+
+        stable = (
+            self.stable_arch in pkg.keywords
+            and self.unstable_arch not in settings["ACCEPT_KEYWORDS"]
+        )
+        # all package attributes USE restrictions and defaults can depend on
+        key = (
+            for_metadata,
+            stable,
+            getattr(pkg.repo, "repo_id", None),
+            pkg.cpvstr,
+            pkg.slot,
+            pkg.subslot,
+            frozenset(pkg.iuse),
+        )
+        use = cache.get(key)
+        if use is None:
+            use = tuple(
+                map(
+                    frozenset,
+                    self._get_package_use_unconfigured(pkg, for_metadata, stable),
+                )
+            )
+            cache[key] = use
+        return tuple(map(set, use))
+
+    def _get_package_use_unconfigured(self, pkg, for_metadata, stable):
         pre_defaults = [x[1:] for x in pkg.iuse if x[0] == "+"]
         if pre_defaults:
             pre_defaults, ue_flags = self._split_use_expand_flags(pre_defaults)
@@ -645,12 +792,7 @@ class domain(config_domain):
                 x[1] for x in ue_flags if x[0][0].upper() not in self.settings
             )
 
-        attr = (
-            "stable_"
-            if self.stable_arch in pkg.keywords
-            and self.unstable_arch not in self.settings["ACCEPT_KEYWORDS"]
-            else ""
-        )
+        attr = "stable_" if stable else ""
         disabled = getattr(self.profile, attr + "masked_use").pull_data(pkg)
         immutable = getattr(self, attr + "forced_use").pull_data(pkg)
 
@@ -907,6 +1049,7 @@ class domain(config_domain):
                 if exc is None:
                     exc = e
                 logger.warning(f"skipping {r.name!r} repo: {exc}")
+        self._preload_ebd_pool(repos)
         return RepositoryGroup(repos)
 
     @klass.jit_attr_named("_jit_repo_installed_repos_raw", uncached_val=None)
@@ -175,7 +175,7 @@ class ebd:
         # variables (see PMS). Mark which env keys must not be exported; the
         # helper-needed path variables and the always-exported exceptions stay
         # exported. The actual export/no-export split happens in
-        # processor._generate_env_str().
+        # processor._env_vars().
         if not self.eapi.options.export_vars:
             nonexported = set(e_const.PMS_DEFINED_VARS | e_const.SPECIAL_PROFILE_VARS)
             # dynamic USE_EXPAND variables (e.g. PYTHON_TARGETS) and the
@@ -6,6 +6,7 @@ __all__ = (
     "ChunkedDataDict",
     "IncrementalsDict",
     "PayloadDict",
+    "RestrictDispatch",
     "chunked_data",
     "collapsed_restrict_to_data",
     "get_relative_dosym_target",
@@ -21,12 +22,14 @@ import os.path
 from collections import defaultdict, namedtuple
 from functools import partial
 from itertools import chain
+from operator import itemgetter
 
 from snakeoil import mappings
 from snakeoil.klass import GenericEquality, alias_method
 from snakeoil.sequences import iflatten_instance
 
 from ..restrictions import boolean, packages, restriction
+from ..restrictions import values as value_restrictions
 from . import atom
 
 restrict_payload = namedtuple("restrict_data", ["restrict", "data"])
@@ -276,6 +279,99 @@ class collapsed_restrict_to_data(GenericEquality):
                     yield item
 
 
+def _exact_attr(restrict, attr):
+    """Return the value a restriction requires a package attribute to equal."""
+    if isinstance(restrict, packages.PackageRestriction):
+        if restrict.attr == attr and not restrict.negate:
+            r = restrict.restriction
+            if isinstance(r, value_restrictions.StrExactMatch) and r.case_sensitive:
+                if not r.negate:
+                    return r.exact
+    elif isinstance(restrict, boolean.AndRestriction) and not restrict.negate:
+        for r in restrict.restrictions:
+            value = _exact_attr(r, attr)
+            if value is not None:
+                return value
+    return None
+
+
+class RestrictDispatch:
+    """Restriction to data mapping dispatched by package names.
+
+    Restrictions are indexed by the package key, category or package name
+    they require a package to have, leaving only restrictions that can match
+    any package to be checked for every package. Candidate restrictions for a
+    package are returned in their original order so incremental data can be
+    collapsed as if all restrictions were checked.
+
+    :param pairs: iterable of (restriction, data) pairs
+    """
+
+    __slots__ = ("_keys", "_categories", "_packages", "_generic", "_len")
+
+    def __init__(self, pairs):
+        keys = defaultdict(list)
+        categories = defaultdict(list)
+        pkgs = defaultdict(list)
+        generic = []
+        for index, (restrict, data) in enumerate(pairs):
+            item = (index, restrict, data)
+            if isinstance(restrict, atom.atom):
+                keys[restrict.key].append(item)
+                continue
+            category = _exact_attr(restrict, "category")
+            package = _exact_attr(restrict, "package")
+            if category is not None and package is not None:
+                keys[f"{category}/{package}"].append(item)
+            elif category is not None:
+                categories[category].append(item)
+            elif package is not None:
+                pkgs[package].append(item)
+            else:
+                generic.append(item)
+        self._keys = dict(keys)
+        self._categories = dict(categories)
+        self._packages = dict(pkgs)
+        self._generic = generic
+        self._len = len(generic) + sum(
+            len(l)
+            for d in (self._keys, self._categories, self._packages)
+            for l in d.values()
+        )
+
+    def __len__(self):
+        return self._len
+
+    def candidates(self, pkg):
+        """Return the (index, restriction, data) tuples that may match a package."""
+        lists = [
+            l
+            for l in (
+                self._generic,
+                self._categories.get(pkg.category),
+                self._packages.get(pkg.package),
+                self._keys.get(pkg.key),
+            )
+            if l
+        ]
+        if len(lists) > 1:
+            return sorted(chain.from_iterable(lists), key=itemgetter(0))
+        return lists[0] if lists else ()
+
+    def matches(self, pkg):
+        """Determine if any restriction matches a package."""
+        for _, restrict, _ in self.candidates(pkg):
+            if restrict.match(pkg):
+                return True
+        return False
+
+    def pull_data(self, pkg):
+        """Return the data of all restrictions matching a package in order."""
+        return [
+            data for _, restrict, data in self.candidates(pkg) if restrict.match(pkg)
+        ]
+
+
 class non_incremental_collapsed_restrict_to_data(collapsed_restrict_to_data):
     def pull_data(self, pkg, force_copy=False):
         l = []
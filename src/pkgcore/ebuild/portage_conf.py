@@ -28,6 +28,7 @@ from ..config.hint import configurable
 from ..fs.livefs import sorted_scan
 from ..log import logger
 from ..pkgsets.glsa import SecurityUpgrades
+from ..repository import index as repo_index
 from . import const as econst
 from . import profiles, repo_objs
 from .misc import optimize_incrementals
@@ -577,25 +578,31 @@ class PortageConfig(DictMixin):
 
         user_profile_path = pjoin(self.dir, "profile")
         if os.path.isdir(user_profile_path):
-            self["profile"] = basics.AutoConfigSection(
-                {
-                    "class": "pkgcore.ebuild.profiles.UserProfile",
-                    "parent_path": paths[0],
-                    "parent_profile": paths[1],
-                    "user_path": user_profile_path,
-                    "load_profile_base": not was_symlink,
-                }
-            )
+            conf = {
+                "class": "pkgcore.ebuild.profiles.UserProfile",
+                "parent_path": paths[0],
+                "parent_profile": paths[1],
+                "user_path": user_profile_path,
+                "load_profile_base": not was_symlink,
+            }
+            snapshot_key = user_profile_path
         else:
-            self["profile"] = basics.AutoConfigSection(
-                {
-                    "class": "pkgcore.ebuild.profiles.OnDiskProfile",
-                    "basepath": paths[0],
-                    "profile": paths[1],
-                    "load_profile_base": not was_symlink,
-                }
+            conf = {
+                "class": "pkgcore.ebuild.profiles.OnDiskProfile",
+                "basepath": paths[0],
+                "profile": paths[1],
+                "load_profile_base": not was_symlink,
+            }
+            snapshot_key = profile
+
+        # persistent snapshot of the collapsed profile stack
+        if "profile-cache" in self.features:
+            conf["snapshot"] = repo_index.default_location(
+                snapshot_key, subdir="profile-cache", ext="pickle"
             )
 
+        self["profile"] = basics.AutoConfigSection(conf)
+
     def _isolate_rsync_opts(self, options):
         """
         pop the misc RSYNC related options littered in make.conf, returning
@@ -633,11 +640,16 @@ class PortageConfig(DictMixin):
 
         return base
 
-    def _make_cache(self, cache_format, repo_path):
+    def _make_cache(self, cache_format, repo_path, cache_backend=None):
         """Configure repo cache."""
         # Use md5 cache if it exists or the option is selected, otherwise default
         # to the old flat hash format in /var/cache/edb/dep/*.
-        if (
+        if cache_backend == "sqlite":
+            # single database in /var/cache/edb/dep/* selected via repos.conf
+            kls = "pkgcore.cache.sqlite.database"
+            repo_path = pjoin("/var/cache/edb/dep", repo_path.lstrip("/") + ".sqlite")
+            cache_parent_dir = os.path.dirname(repo_path)
+        elif (
             os.path.exists(pjoin(repo_path, "metadata", "md5-cache"))
             or cache_format == "md5-dict"
         ):
@@ -700,9 +712,28 @@ class PortageConfig(DictMixin):
         # metadata cache
         if repo_obj.cache_format is not None:
             cache_name = "cache:" + repo_name
-            self[cache_name] = self._make_cache(repo_obj.cache_format, repo_path)
+            cache_backend = repo_opts.get("cache-backend")
+            if cache_backend not in (None, "sqlite"):
+                logger.warning(
+                    f"repos.conf: {repo_name!r} repo has unsupported "
+                    f"cache-backend {cache_backend!r}, ignoring"
+                )
+                cache_backend = None
+            self[cache_name] = self._make_cache(
+                repo_obj.cache_format, repo_path, cache_backend
+            )
             repo["cache"] = cache_name
 
+        # persistent package index
+        use_index = repo_opts.get("repo-index", "no").lower()
+        if use_index in ("yes", "true"):
+            repo["index"] = repo_index.default_location(repo_path)
+        elif use_index not in ("no", "false"):
+            logger.warning(
+                f"repos.conf: {repo_name!r} repo has invalid repo-index "
+                f"setting {use_index!r}, ignoring"
+            )
+
         if repo_name == defaults["main-repo"]:
             repo_conf["default"] = True
             repo["default"] = True
@@ -17,6 +17,9 @@ design) reduces regen time by over 40% compared to portage-2.1
 __all__ = (
     "request_ebuild_processor",
     "release_ebuild_processor",
+    "start_processor_pool",
+    "preload_pool_eclasses",
+    "processor_stats",
     "EbuildProcessor",
     "UnhandledCommand",
     "expected_ebuild_env",
@@ -27,7 +30,9 @@ import errno
 import os
 import signal
 import threading
+import time
 import traceback
+from collections import namedtuple
 from functools import partial, wraps
 from itertools import chain
 from os.path import join as pjoin
@@ -59,6 +64,7 @@ def _singled_threaded(functor):
 @_singled_threaded
 def shutdown_all_processors():
     """Kill all known processors."""
+    _pool.close()
     try:
         while active_ebp_list:
             try:
@@ -82,6 +88,237 @@ def shutdown_all_processors():
 spawn.atexit_register(shutdown_all_processors)
 
 
+def _forget_processors():
+    """Drop all processors inherited from the parent in forked children.
+
+    The inherited daemons are owned by the parent process and communicating
+    with them from a child would corrupt their state; children must spawn
+    their own.
+    """
+    global _global_ebp_lock, _pool
+    _global_ebp_lock = threading.Lock()
+    del active_ebp_list[:]
+    del inactive_ebp_list[:]
+    # the pool thread isn't running in the child
+    _pool = _ProcessorPool()
+
+
+os.register_at_fork(after_in_child=_forget_processors)
+
+
+ProcessorStats = namedtuple(
+    "ProcessorStats", ("hits", "misses", "spawned", "replaced", "spawn_time", "idle")
+)
+
+
+class _ProcessorPool:
+    """Pool of idle processors spawned in the background ahead of use.
+
+    Idle processors are regular members of :obj:`inactive_ebp_list` so
+    they're handed out by :func:`request_ebuild_processor` as usual; a daemon
+    thread keeps the configured number of them available, replacing ones
+    that were handed out or found dead, and preloads eclasses into them.
+    """
+
+    # seconds between health checks of idle processors
+    check_interval = 60
+
+    def __init__(self):
+        self.size = 0
+        self.userpriv = False
+        self.sandbox = False
+        self.hits = 0
+        self.misses = 0
+        self.spawned = 0
+        self.replaced = 0
+        self.spawn_time = 0.0
+        self._eclass_cache = None
+        self._eclasses = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def spawn(self, userpriv, sandbox, fd_pipes=None):
+        """Spawn a processor, tracking the time spent doing so."""
+        start = time.monotonic()
+        ebp = EbuildProcessor(userpriv, sandbox, fd_pipes=fd_pipes)
+        self.spawn_time += time.monotonic() - start
+        self.spawned += 1
+        return ebp
+
+    def _matches(self, ebp):
+        return (
+            ebp.userpriv == self.userpriv
+            and ebp.sandbox == self.sandbox
+            and not ebp.custom_fds
+        )
+
+    def idle(self):
+        """Return the number of idle processors usable by the pool."""
+        return sum(1 for ebp in inactive_ebp_list if self._matches(ebp))
+
+    def start(self, size, userpriv=False, sandbox=None):
+        if sandbox is None:
+            sandbox = spawn.is_sandbox_capable()
+        self.size = size
+        self.userpriv = userpriv
+        self.sandbox = sandbox
+        self._closed = False
+        if self._thread is None and size > 0:
+            self._thread = threading.Thread(
+                target=self._run, name="ebd-pool", daemon=True
+            )
+            self._thread.start()
+        self.wakeup()
+
+    def preload(self, eclass_cache, eclasses):
+        self._eclass_cache = eclass_cache
+        self._eclasses = eclasses
+        self.wakeup()
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    def close(self):
+        self._closed = True
+        self.wakeup()
+
+    def _eclass_names(self):
+        eclasses = self._eclasses
+        if callable(eclasses):
+            # resolved lazily since determining them can be costly
+            try:
+                eclasses = self._eclasses = tuple(eclasses())
+            except Exception as e:
+                logger.warning(f"ebd pool: failed determining eclasses to preload: {e}")
+                eclasses = self._eclasses = ()
+        return eclasses
+
+    def _preload(self, ebp):
+        eclass_cache = self._eclass_cache
+        if eclass_cache is None or not (eclasses := self._eclass_names()):
+            return True
+        eclasses = [x for x in eclasses if x in eclass_cache.eclasses]
+        if not eclasses:
+            return True
+        if ebp.preload_eclasses(eclass_cache, limited_to=eclasses):
+            return True
+        ebp.shutdown_processor(ignore_keyboard_interrupt=True)
+        return False
+
+    def _take_idle(self, predicate):
+        with _global_ebp_lock:
+            for ebp in inactive_ebp_list:
+                if self._matches(ebp) and predicate(ebp):
+                    inactive_ebp_list.remove(ebp)
+                    return ebp
+        return None
+
+    def _add(self, ebp):
+        with _global_ebp_lock:
+            if not self._closed:
+                inactive_ebp_list.append(ebp)
+                return
+        ebp.shutdown_processor(ignore_keyboard_interrupt=True)
+
+    def _update(self):
+        # preload eclasses into idle processors spawned before they were known
+        eclass_cache = self._eclass_cache
+        while not self._closed and eclass_cache is not None:
+            ebp = self._take_idle(lambda x: x._pool_eclasses is not eclass_cache)
+            if ebp is None:
+                break
+            ebp._pool_eclasses = eclass_cache
+            if self._preload(ebp):
+                self._add(ebp)
+
+        while not self._closed:
+            with _global_ebp_lock:
+                if self.idle() >= self.size:
+                    break
+            try:
+                ebp = self.spawn(self.userpriv, self.sandbox)
+            except Exception as e:
+                logger.warning(f"ebd pool: failed spawning processor: {e}")
+                return
+            ebp._pool_eclasses = eclass_cache
+            if self._preload(ebp):
+                self._add(ebp)
+
+    def _check(self):
+        """Replace dead idle processors."""
+        checked = []
+        while not self._closed:
+            ebp = self._take_idle(lambda x: x not in checked)
+            if ebp is None:
+                break
+            if ebp.is_responsive:
+                checked.append(ebp)
+                self._add(ebp)
+            else:
+                self.replaced += 1
+
+    def _run(self):
+        while not self._closed:
+            try:
+                self._wakeup.clear()
+                self._update()
+                if not self._wakeup.wait(self.check_interval):
+                    self._check()
+            except Exception as e:
+                logger.error(f"ebd pool: {e}")
+                return
+
+    def stats(self):
+        with _global_ebp_lock:
+            idle = self.idle() if self.size else 0
+        return ProcessorStats(
+            self.hits, self.misses, self.spawned, self.replaced, self.spawn_time, idle
+        )
+
+
+_pool = _ProcessorPool()
+
+
+def start_processor_pool(size, userpriv=False, sandbox=None):
+    """Keep a number of idle processors spawned in the background.
+
+    This moves the startup cost of processors out of the first metadata
+    regen or build requesting them.
+
+    :param size: number of idle processors to keep available, 0 stops
+        spawning new ones
+    :param userpriv: spawn userpriv'd processors, see
+        :func:`request_ebuild_processor`
+    :param sandbox: spawn sandboxed processors, defaults to sandboxing when
+        supported
+    """
+    _pool.start(size, userpriv=userpriv, sandbox=sandbox)
+
+
+def preload_pool_eclasses(eclass_cache, eclasses):
+    """Preload eclasses into processors spawned by the pool.
+
+    :param eclass_cache: :obj:`pkgcore.ebuild.eclass_cache` instance to use
+        for eclass access
+    :param eclasses: eclass names to preload or a callable returning them,
+        called from the pool thread
+    """
+    _pool.preload(eclass_cache, eclasses)
+
+
+def processor_stats():
+    """Return processor request and spawning statistics.
+
+    :return: :obj:`ProcessorStats` with the number of requests served by
+        idle processors (hits) and by newly spawned ones (misses), the number
+        of processors spawned and the total time in seconds spent spawning
+        them, the number of dead processors that were replaced, and the
+        number of idle processors in the pool
+    """
+    return _pool.stats()
+
+
 @_singled_threaded
 def request_ebuild_processor(userpriv=False, sandbox=None, fd_pipes=None):
     """Request a processor instance, creating a new one if needed.
@@ -95,18 +332,23 @@ def request_ebuild_processor(userpriv=False, sandbox=None, fd_pipes=None):
     if sandbox is None:
         sandbox = spawn.is_sandbox_capable()
 
-    for ebp in inactive_ebp_list:
+    for ebp in list(inactive_ebp_list):
         if ebp.userpriv == userpriv and (ebp.sandbox or not sandbox):
+            inactive_ebp_list.remove(ebp)
             if not ebp.is_responsive:
-                inactive_ebp_list.remove(ebp)
+                _pool.replaced += 1
                 continue
-            inactive_ebp_list.remove(ebp)
+            _pool.hits += 1
             active_ebp_list.append(ebp)
             break
     else:
-        ebp = EbuildProcessor(userpriv, sandbox, fd_pipes=fd_pipes)
+        _pool.misses += 1
+        ebp = _pool.spawn(userpriv, sandbox, fd_pipes=fd_pipes)
         active_ebp_list.append(ebp)
 
+    # replace the handed out processor
+    if _pool.size:
+        _pool.wakeup()
     return ebp
 
 
@@ -316,6 +558,8 @@ class EbuildProcessor:
     """
 
     pid = None
+    # eclass cache preloaded by the processor pool
+    _pool_eclasses = None
 
     def __init__(self, userpriv, sandbox, fd_pipes=None):
         """
@@ -423,7 +667,8 @@ class EbuildProcessor:
             if dwrite is not None:
                 os.close(dwrite)
         self.ebd_write = os.fdopen(cwrite, "w")
-        self.ebd_read = os.fdopen(dread, "r")
+        # frame sizes are sent in bytes, so newlines must not be translated
+        self.ebd_read = os.fdopen(dread, "r", newline="\n")
 
         # verify ebd is running
         self.write("ebd?")
@@ -438,6 +683,13 @@ class EbuildProcessor:
         else:
             self.write("no_sandbox")
         self._readonly_vars = frozenset(self.read().split())
+
+        # use the framed protocol for bulk transfers if supported
+        self._framed = False
+        if os.environ.get("PKGCORE_EBD_PROTOCOL", "framed") == "framed":
+            self.write("framed_protocol?")
+            self._framed = self.expect("framed_protocol!")
+
         # locking isn't used much, but w/ threading this will matter
         self.unlock()
 
@@ -559,6 +811,26 @@ class EbuildProcessor:
         """
         return "\n".join(self.readlines(lines))
 
+    def read_frame(self, size):
+        """Read a frame of a given size in bytes from the daemon.
+
+        :param size: frame size in bytes as sent by the daemon
+        :return: decoded frame data
+        """
+        encoding = self.ebd_read.encoding
+        chunks = []
+        while size > 0:
+            # never read past the frame; characters are encoded in at most
+            # 4 bytes by any encoding in use
+            chunk = self.ebd_read.read(max(1, size // 4))
+            if not chunk:
+                raise InternalError(None, "daemon closed the pipe mid frame")
+            chunks.append(chunk)
+            size -= len(chunk.encode(encoding))
+        if size < 0:
+            raise InternalError(None, "frame size doesn't match its data")
+        return "".join(chunks)
+
     def sandbox_summary(self, move_log=False):
         """If the instance is sandboxed, print the sandbox access summary.
 
@@ -736,14 +1008,14 @@ class EbuildProcessor:
         # which isn't always true.
         self.pid = None
 
-    def _generate_env_str(self, env_dict):
+    def _env_vars(self, env_dict):
+        """Yield validated (key, value, exported) tuples of an env to transfer."""
         env_dict = dict(env_dict)
         # EAPI 9+ marks variables that must be set but not exported (see PMS);
         # ebd.py stashes their names here. Absent the key, everything is exported
         # exactly as before.
         nonexported = frozenset(env_dict.pop("PKGCORE_NONEXPORTED_VARS", "").split())
 
-        exported, plain = [], []
         for key, val in sorted(env_dict.items()):
             if key in self._readonly_vars:
                 continue
@@ -755,7 +1027,11 @@ class EbuildProcessor:
                 raise ValueError(
                     f"_generate_env_str was fed a bad value; key={key}, val={val}"
                 )
+            yield key, val, key not in nonexported
 
+    def _generate_env_str(self, env_dict):
+        exported, plain = [], []
+        for key, val, export in self._env_vars(env_dict):
             if isinstance(val, (list, tuple)):
                 assign = f"{key}=({' '.join(f'[{i}]="{value}"' for i, value in enumerate(val))})"
             elif val.isalnum():
@@ -765,7 +1041,7 @@ class EbuildProcessor:
             else:
                 assign = f"{key}=$'{val.replace("'", "\\'")}'"
 
-            (plain if key in nonexported else exported).append(assign)
+            (exported if export else plain).append(assign)
 
         # Bare assignments create global, *unexported* shell variables when the
         # env is eval'd/sourced; exported ones get the `export` prefix.
@@ -779,20 +1055,62 @@ class EbuildProcessor:
             lines.append(f"export {' '.join(exported)}")
         return "\n".join(lines)
 
+    def _generate_env_frame(self, env_dict):
+        """Generate an env frame for the framed protocol.
+
+        Unlike :meth:`_generate_env_str` no quoting is required, values are
+        assigned verbatim by the daemon. The frame consists of four sections
+        each terminated by an ASCII group separator: exported strings,
+        unexported strings, exported arrays, and unexported arrays. Sections
+        contain "name=value" records each terminated by an ASCII record
+        separator, with array elements each terminated by an ASCII unit
+        separator.
+
+        :return: frame string or None if the env contains separator chars and
+            has to be sent via the text protocol
+        """
+        sections = ([], [], [], [])
+        for key, val, export in self._env_vars(env_dict):
+            if isinstance(val, str):
+                if "\x1d" in val or "\x1e" in val:
+                    return None
+                section = 0
+            else:
+                if any("\x1f" in x for x in val):
+                    return None
+                val = "".join(f"{x}\x1f" for x in val)
+                if "\x1d" in val or "\x1e" in val:
+                    return None
+                section = 2
+            sections[section if export else section + 1].append(f"{key}={val}\x1e")
+        return "".join("".join(x) + "\x1d" for x in sections)
+
+    def _framed_env(self, env_dict):
+        """Return an env frame prefixed by its size or None if unsupported."""
+        if not self._framed:
+            return None
+        frame = self._generate_env_frame(env_dict)
+        if frame is None:
+            return None
+        return f"{len(frame.encode(self.ebd_write.encoding))}\n{frame}"
+
     def send_env(self, env_dict, async_req=False, tmpdir=None):
         """Transfer the ebuild's desired env (env_dict) to the running daemon.
 
         :type env_dict: mapping with string keys and values.
         :param env_dict: the bash env.
         """
-        data = self._generate_env_str(env_dict)
         old_umask = os.umask(0o002)
-        if tmpdir:
+        if (frame := self._framed_env(env_dict)) is not None:
+            self.write(f"start_receiving_env framed {frame}", append_newline=False)
+        elif tmpdir:
+            data = self._generate_env_str(env_dict)
             path = pjoin(tmpdir, "ebd-env-transfer")
             with open(path, "w") as file:
                 file.write(data)
             self.write(f"start_receiving_env file {path}")
         else:
+            data = self._generate_env_str(env_dict)
             self.write(
                 f"start_receiving_env bytes {len(data)}\n{data}", append_newline=False
             )
@@ -839,8 +1157,11 @@ class EbuildProcessor:
         self._ensure_metadata_paths(("/dev/null",))
 
         env = expected_ebuild_env(package_inst, env, depends=True)
-        data = self._generate_env_str(env)
-        self.write(f"{command} {len(data)}\n{data}", append_newline=False)
+        if (frame := self._framed_env(env)) is not None:
+            self.write(f"{command} framed {frame}", append_newline=False)
+        else:
+            data = self._generate_env_str(env)
+            self.write(f"{command} {len(data)}\n{data}", append_newline=False)
 
         updates = None
         if self._eclass_caching:
@@ -891,6 +1212,23 @@ class EbuildProcessor:
         # Dump any leading/trailing spaces.
         return environ[0].strip()
 
+    @staticmethod
+    def _parse_keys_frame(frame):
+        """Parse a metadata frame into a dict of keys.
+
+        Each key is terminated by a newline, values can contain any other
+        line break characters.
+        """
+        keys = {}
+        for entry in frame.split("\n"):
+            if not entry:
+                continue
+            key, sep, val = entry.partition("=")
+            if not sep:
+                raise InternalError(entry, "invalid metadata frame entry")
+            keys[key] = val
+        return keys
+
     def get_keys(self, package_inst, eclass_cache):
         """Request the metadata be regenerated from an ebuild.
 
@@ -908,18 +1246,24 @@ class EbuildProcessor:
                 raise FinishedProcessing(True)
             metadata_keys[line[0]] = line[1]
 
+        def receive_keys(self, line):
+            # all keys in a single frame
+            metadata_keys.update(self._parse_keys_frame(self.read_frame(int(line))))
+
         # pass down phase and metadata key lists to avoid hardcoding them on the bash side
         env = {
             "PKGCORE_EBUILD_PHASES": tuple(package_inst.eapi.phases.values()),
             "PKGCORE_METADATA_KEYS": tuple(package_inst.eapi.metadata_keys),
         }
+        if self._framed:
+            env["PKGCORE_METADATA_FRAMED"] = "1"
 
         self._run_depend_like_phase(
             "gen_metadata",
             package_inst,
             eclass_cache,
             env=env,
-            extra_commands={"key": receive_key},
+            extra_commands={"key": receive_key, "keys": receive_keys},
         )
 
         return metadata_keys
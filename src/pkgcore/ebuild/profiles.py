@@ -4,9 +4,13 @@ __all__ = (
     "EmptyRootNode",
     "OnDiskProfile",
     "UserProfile",
+    "ProfileSnapshot",
 )
 
 import os
+import pickle
+import stat
+import time
 from collections import defaultdict, namedtuple
 from functools import partial
 from itertools import chain
@@ -16,11 +20,13 @@ from os.path import join as pjoin
 from snakeoil import klass
 from snakeoil.bash import read_bash, read_bash_dict
 from snakeoil.data_source import local_source
-from snakeoil.fileutils import readlines_utf8
+from snakeoil.fileutils import AtomicWriteFile, readlines_utf8
 from snakeoil.klass.memoize import WeaklyCached
 from snakeoil.mappings import ImmutableDict
+from snakeoil.osutils import ensure_dirs
 from snakeoil.sequences import split_negations, stable_unique
 
+from .. import __version__
 from ..config import errors
 from ..config.hint import ConfigHint
 from ..fs.livefs import sorted_scan
@@ -46,6 +52,9 @@ INCREMENTALS = (
     "ENV_UNSET",
 )
 
+# files parsed from profile directories, tracked to validate stack snapshots
+_node_files = {"profile.bashrc"}
+
 
 class ProfileError(errors.ParsingError):
     def __init__(self, path, filename, error):
@@ -105,6 +114,7 @@ def load_property(
         the fallback is returned and no ondisk activity occurs.
     :return: A :py:`klass.jit.attr_named` property instance.
     """
+    _node_files.add(filename)
 
     def f(func):
         f2 = klass.jit_attr_named(f"_{func.__name__}")
@@ -675,12 +685,220 @@ class EmptyRootNode(ProfileNode):
         return get_eapi("0")
 
 
+def _file_stamp(path):
+    """Return the stat signature of a profile file or directory tree."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_mtime_ns, st.st_size
+    try:
+        names = sorted(os.listdir(path))
+    except OSError:
+        return None
+    # skip hidden and backup files, matching profile directory parsing
+    return st.st_mtime_ns, tuple(
+        (x, _file_stamp(pjoin(path, x)))
+        for x in names
+        if not x.startswith(".") and not x.endswith("~")
+    )
+
+
+def _newest_mtime(stamp):
+    """Return the newest mtime of a stat signature."""
+    if stamp is None:
+        return 0
+    mtime, data = stamp
+    if isinstance(data, tuple):
+        return max((mtime, *(_newest_mtime(x[1]) for x in data)))
+    return mtime
+
+
+class ProfileSnapshot:
+    """On-disk snapshot of collapsed profile stack attributes.
+
+    Snapshots are validated against the chain of profile nodes in the stack
+    along with the mtime and size of every profile file in it and the repo
+    files affecting profile parsing, so a valid snapshot costs a stat call per
+    file instead of parsing and collapsing the stack.
+
+    :param location: path to the snapshot file
+    """
+
+    version = 1
+
+    # files relative to a repo's location affecting how its profiles are parsed
+    _repo_files = (
+        "metadata/layout.conf",
+        "profiles/arch.list",
+        "profiles/eapi",
+        "profiles/repo_name",
+    )
+
+    # files modified this recently aren't snapshotted, avoiding missed updates
+    # due to coarse mtime granularity
+    _racy_window = 2 * 10**9
+
+    def __init__(self, location):
+        self.location = location
+
+    @classmethod
+    def signature(cls, stack):
+        """Return the validation signature of a profile stack."""
+        files = sorted(_node_files)
+        sig = []
+        repos = {}
+        for node in stack.stack:
+            sig.append(
+                (
+                    node.__class__.__name__,
+                    node.path,
+                    node.pms_strict,
+                    tuple((x, _file_stamp(pjoin(node.path, x))) for x in files),
+                )
+            )
+            if (repo_config := node.repoconfig) is not None:
+                repos[repo_config.location] = None
+        for location in repos:
+            sig.append(
+                (
+                    location,
+                    tuple(
+                        (x, _file_stamp(pjoin(location, x))) for x in cls._repo_files
+                    ),
+                )
+            )
+        return tuple(sig)
+
+    def load(self, signature):
+        """Return the snapshotted attributes if the snapshot is valid.
+
+        :param signature: signature of the current profile stack
+        :return: dict of collapsed attributes or None
+        """
+        try:
+            with open(self.location, "rb") as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (
+            OSError,
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            ImportError,
+            TypeError,
+            ValueError,
+        ) as e:
+            logger.warning(f"ignoring invalid profile snapshot {self.location!r}: {e}")
+            return None
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != self.version
+            or data.get("pkgcore") != __version__
+            or data.get("signature") != signature
+        ):
+            return None
+        return data.get("attrs")
+
+    def save(self, signature, attrs):
+        """Write a snapshot of collapsed attributes to disk.
+
+        :param signature: signature of the profile stack the attributes were
+            collapsed from
+        :param attrs: dict of collapsed attributes
+        :return: True if the snapshot was written, otherwise False
+        """
+        newest = max(
+            (_newest_mtime(stamp) for entry in signature for _, stamp in entry[-1]),
+            default=0,
+        )
+        if time.time_ns() - newest < self._racy_window:
+            return False
+        data = {
+            "version": self.version,
+            "pkgcore": __version__,
+            "signature": signature,
+            "attrs": attrs,
+        }
+        try:
+            if not ensure_dirs(os.path.dirname(self.location), mode=0o755):
+                raise OSError(
+                    f"failed creating dir: {os.path.dirname(self.location)!r}"
+                )
+            f = AtomicWriteFile(self.location, binary=True)
+            try:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.close()
+            except BaseException:
+                f.discard()
+                raise
+        except (OSError, pickle.PicklingError) as e:
+            logger.debug(f"failed writing profile snapshot {self.location!r}: {e}")
+            return False
+        return True
+
+
+def _snapshot_attr(func):
+    """Decorator for stack jit attributes stored in profile snapshots."""
+    name = func.__name__
+
+    def _load(self):
+        data = self._load_snapshot()
+        if name in data:
+            return data[name]
+        return func(self)
+
+    return klass.jit_attr_named(f"_{name}")(_load)
+
+
 class ProfileStack:
     _node_kls = ProfileNode
 
-    def __init__(self, profile):
+    # collapsed attributes stored in snapshots
+    _snapshot_attrs = (
+        "forced_use",
+        "masked_use",
+        "stable_forced_use",
+        "stable_masked_use",
+        "pkg_use",
+        "stable_use",
+        "default_env",
+        "iuse_effective",
+        "masks",
+        "unmasks",
+        "pkg_deprecated",
+        "keywords",
+        "accept_keywords",
+        "system",
+        "profile_set",
+    )
+
+    def __init__(self, profile, snapshot=None):
+        """
+        :param profile: path to the profile
+        :param snapshot: optional path to a :obj:`ProfileSnapshot` file used to
+            load collapsed attributes instead of parsing the stack
+        """
         self.profile = profile
         self.node = self._node_kls._autodetect_and_create(profile)
+        self.snapshot = ProfileSnapshot(snapshot) if snapshot is not None else None
+        self._snapshot_data = None
+
+    def _load_snapshot(self):
+        """Return the collapsed attributes from the snapshot, creating it if needed."""
+        if self._snapshot_data is None:
+            # collapse attributes normally when missing or while snapshotting
+            self._snapshot_data = {}
+            if self.snapshot is not None:
+                signature = ProfileSnapshot.signature(self)
+                data = self.snapshot.load(signature)
+                if data is None:
+                    data = {x: getattr(self, x) for x in self._snapshot_attrs}
+                    self.snapshot.save(signature, data)
+                self._snapshot_data = data
+        return self._snapshot_data
 
     @property
     def arch(self):
@@ -728,27 +946,27 @@ class ProfileStack:
         d.freeze()
         return d
 
-    @klass.jit_attr
+    @_snapshot_attr
     def forced_use(self):
         return self._collapse_use_dict("forced_use")
 
-    @klass.jit_attr
+    @_snapshot_attr
     def masked_use(self):
         return self._collapse_use_dict("masked_use")
 
-    @klass.jit_attr
+    @_snapshot_attr
     def stable_forced_use(self):
         return self._collapse_use_dict("stable_forced_use")
 
-    @klass.jit_attr
+    @_snapshot_attr
     def stable_masked_use(self):
         return self._collapse_use_dict("stable_masked_use")
 
-    @klass.jit_attr
+    @_snapshot_attr
     def pkg_use(self):
         return self._collapse_use_dict("pkg_use")
 
-    @klass.jit_attr
+    @_snapshot_attr
     def stable_use(self):
         return self._collapse_use_dict("stable_use")
 
@@ -762,7 +980,7 @@ class ProfileStack:
             s.update(val[1])
         return s
 
-    @klass.jit_attr
+    @_snapshot_attr
     def default_env(self):
         d = dict(self.node.default_env.items())
         for incremental in INCREMENTALS:
@@ -834,7 +1052,7 @@ class ProfileStack:
             return frozenset(self.default_env.get("USE_EXPAND_UNPREFIXED", ()))
         return frozenset(self.default_env.get("USE_EXPAND_UNPREFIXED", "").split())
 
-    @klass.jit_attr
+    @_snapshot_attr
     def iuse_effective(self):
         iuse_effective = []
 
@@ -869,23 +1087,23 @@ class ProfileStack:
             arches = ()
         return ProvidesRepo(pkgs, arches)
 
-    @klass.jit_attr
+    @_snapshot_attr
     def masks(self):
         return frozenset(chain(self._collapse_generic("masks")))
 
-    @klass.jit_attr
+    @_snapshot_attr
     def unmasks(self):
         return frozenset(self._collapse_generic("unmasks"))
 
-    @klass.jit_attr
+    @_snapshot_attr
     def pkg_deprecated(self):
         return frozenset(chain(self._collapse_generic("pkg_deprecated")))
 
-    @klass.jit_attr
+    @_snapshot_attr
     def keywords(self):
         return tuple(chain.from_iterable(x.keywords for x in self.stack))
 
-    @klass.jit_attr
+    @_snapshot_attr
     def accept_keywords(self):
         return tuple(chain.from_iterable(x.accept_keywords for x in self.stack))
 
@@ -910,24 +1128,29 @@ class ProfileStack:
     bashrc = klass.alias_attr("bashrcs")
     path = klass.alias_attr("node.path")
 
-    @klass.jit_attr
+    @_snapshot_attr
     def system(self):
         return frozenset(self._collapse_generic("system", clear=True))
 
-    @klass.jit_attr
+    @_snapshot_attr
     def profile_set(self):
         return frozenset(self._collapse_generic("profile_set", clear=True))
 
 
 class OnDiskProfile(ProfileStack):
     pkgcore_config_type = ConfigHint(
-        types={"basepath": "str", "profile": "str"},
+        types={"basepath": "str", "profile": "str", "snapshot": "str"},
         required=("basepath", "profile"),
         typename="profile",
     )
 
-    def __init__(self, basepath, profile, load_profile_base=True):
-        super().__init__(pjoin(basepath, profile))
+    _snapshot_attrs = ProfileStack._snapshot_attrs + (
+        "_incremental_masks",
+        "_incremental_unmasks",
+    )
+
+    def __init__(self, basepath, profile, load_profile_base=True, snapshot=None):
+        super().__init__(pjoin(basepath, profile), snapshot=snapshot)
         self.basepath = basepath
         self.load_profile_base = load_profile_base
 
@@ -959,14 +1182,14 @@ class OnDiskProfile(ProfileStack):
             l = (EmptyRootNode._autodetect_and_create(self.basepath),) + l
         return l
 
-    @klass.jit_attr
+    @_snapshot_attr
     def _incremental_masks(self):
         stack = self.stack
         if self.load_profile_base:
             stack = stack[1:]
         return ProfileStack._incremental_masks(self, stack_override=stack)
 
-    @klass.jit_attr
+    @_snapshot_attr
     def _incremental_unmasks(self):
         stack = self.stack
         if self.load_profile_base:
@@ -992,11 +1215,23 @@ class UserProfileNode(ProfileNode, caching=False):
 
 class UserProfile(OnDiskProfile):
     pkgcore_config_type = ConfigHint(
-        types={"user_path": "str", "parent_path": "str", "parent_profile": "str"},
+        types={
+            "user_path": "str",
+            "parent_path": "str",
+            "parent_profile": "str",
+            "snapshot": "str",
+        },
         required=("user_path", "parent_path", "parent_profile"),
         typename="profile",
     )
 
-    def __init__(self, user_path, parent_path, parent_profile, load_profile_base=True):
-        super().__init__(parent_path, parent_profile, load_profile_base)
+    def __init__(
+        self,
+        user_path,
+        parent_path,
+        parent_profile,
+        load_profile_base=True,
+        snapshot=None,
+    ):
+        super().__init__(parent_path, parent_profile, load_profile_base, snapshot)
         self.node = UserProfileNode(user_path, pjoin(parent_path, parent_profile))
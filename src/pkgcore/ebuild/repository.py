@@ -31,8 +31,10 @@ from ..operations import OperationError
 from ..operations import repo as _repo_ops
 from ..package import errors as pkg_errors
 from ..repository import configured, errors, prototype, util
+from ..repository import index as repo_index
 from ..repository.virtual import RestrictionRepo
 from ..restrictions import packages
+from ..util import chksum as chksum_util
 from ..util import packages as pkgutils
 from . import cpv, digest, ebd, ebuild_src, processor, repo_objs, restricts
 from . import eclass_cache as eclass_cache_mod
@@ -143,11 +145,12 @@ class repo_operations(_repo_ops.operations):
 
             # calculate checksums for fetched distfiles
             try:
-                for fetchable in fetchables.values():
-                    chksums = chksum.get_chksums(
-                        pjoin(distdir, fetchable.filename), *write_chksums
-                    )
-                    fetchable.chksums = dict(zip(write_chksums, chksums))
+                chksums = chksum_util.chksum_files(
+                    (pjoin(distdir, x.filename) for x in fetchables.values()),
+                    write_chksums,
+                )
+                for fetchable, values in zip(fetchables.values(), chksums):
+                    fetchable.chksums = dict(zip(write_chksums, values))
             except chksum.MissingChksumHandler as exc:
                 observer.error(f"failed generating chksum: {exc}")
                 ret.add(key)
@@ -299,6 +302,7 @@ class UnconfiguredTree(prototype.tree):
             "default_mirrors": "list",
             "allow_missing_manifests": "bool",
             "repo_config": "ref:repo_config",
+            "index": "str",
         },
         typename="repo",
     )
@@ -313,6 +317,7 @@ class UnconfiguredTree(prototype.tree):
         allow_missing_manifests=False,
         package_cache=True,
         repo_config=None,
+        index=None,
     ):
         """
         :param location: on disk location of the tree
@@ -326,8 +331,13 @@ class UnconfiguredTree(prototype.tree):
             fetching from first, then falling back to other uri
         :param package_cache: boolean controlling package instance caching
         :param repo_config: :obj:`pkgcore.repo_objs.RepoConfig` instance for the related repo
+        :param index: If not None, path to a persistent package and version index
+            used to avoid rescanning the tree, see
+            :obj:`pkgcore.repository.index.TreeIndex`
         """
-        super().__init__()
+        if index is not None:
+            index = repo_index.TreeIndex(location, index)
+        super().__init__(index=index)
         self.base = self.location = location
         self.package_cache = package_cache
         if repo_config is None:
@@ -719,6 +729,7 @@ class UnconfiguredTree(prototype.tree):
         "eclass_cache": "ref:eclass_cache",
         "default_mirrors": "list",
         "allow_missing_manifests": "bool",
+        "index": "str",
     },
     requires_config="config",
 )
@@ -729,6 +740,7 @@ def tree(
     eclass_cache=None,
     default_mirrors=None,
     allow_missing_manifests=False,
+    index=None,
     tree_cls=UnconfiguredTree,
 ):
     """Initialize an unconfigured ebuild repository."""
@@ -783,6 +795,7 @@ def tree(
         default_mirrors=default_mirrors,
         allow_missing_manifests=allow_missing_manifests,
         repo_config=repo_config,
+        index=index,
     )
 
 
@@ -16,6 +16,7 @@ __all__ = (
     "VersionMatch",
 )
 
+from snakeoil.compatibility import cmp
 from snakeoil.klass import GenericEquality
 
 from ..restrictions import packages, restriction, values
@@ -32,7 +33,7 @@ class _VersionMatch(GenericEquality, restriction.base):
     self.vals, see intersect for reason why. vals also must be a tuple.
     """
 
-    __slots__ = ("ver", "rev", "vals", "droprev", "negate")
+    __slots__ = ("ver", "rev", "vals", "droprev", "negate", "_key")
 
     __attr_comparison__ = ("negate", "rev", "droprev", "vals")
 
@@ -82,16 +83,22 @@ class _VersionMatch(GenericEquality, restriction.base):
             self.droprev = False
             self.vals = self._convert_str2op[operator]
 
-    def match(self, pkg, *args, **kwargs):
-        if self.droprev:
-            r1, r2 = None, None
+        # precomputed version key, sans revision when it's ignored
+        if ver is None:
+            self._key = None
+        elif self.droprev:
+            self._key = cpv.version_key(ver)[:-1]
         else:
-            r1, r2 = self.rev, pkg.revision
+            self._key = cpv.version_key(ver, rev)
 
+    def match(self, pkg, *args, **kwargs):
         if pkg.version is None:
             return False
 
-        return (cpv.ver_cmp(pkg.version, r2, self.ver, r1) in self.vals) != self.negate
+        key = pkg.version_key
+        if self.droprev:
+            key = key[:-1]
+        return (cmp(key, self._key) in self.vals) != self.negate
 
     def __str__(self):
         s = self._convert_op2str[self.vals]
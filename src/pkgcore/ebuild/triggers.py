@@ -17,6 +17,7 @@ __all__ = (
 
 import fnmatch
 import os
+from itertools import chain
 from os.path import join as pjoin
 from os.path import normpath
 
@@ -186,12 +187,17 @@ class env_update(triggers.base):
 
 def simple_chksum_compare(x, y):
     found = False
-    for k, v in x.chksums.items():
+    keys = [k for k in x.chksums if k in y.chksums]
+    for chksums in (x.chksums, y.chksums):
+        # only generate lazy checksums being compared, in a single pass
+        if generate := getattr(chksums, "generate", None):
+            generate(keys)
+    for k in keys:
         if k == "size":
             continue
         o = y.chksums.get(k)
         if o is not None:
-            if o != v:
+            if o != x.chksums[k]:
                 return False
             found = True
     if "size" in x.chksums and "size" in y.chksums:
@@ -485,16 +491,38 @@ class ProtectOwned(FileCollision):
     def __init__(self, vdb, *args):
         super().__init__(*args)
         self.vdb = vdb
+        self.offset = "/"
+
+    def trigger(self, engine, *args, **kwargs):
+        self.offset = engine.offset
+        return super().trigger(engine, *args, **kwargs)
 
     def collision(self, colliding):
-        real_pkgs = (pkg for repo in self.vdb for pkg in repo if pkg.package_is_real)
         collisions = {}
-
-        # TODO: worth parallelizing this vdb scanning?
-        for pkg in real_pkgs:
-            pkg_file_collisions = pkg.contents.intersection(colliding)
-            if pkg_file_collisions:
-                collisions[pkg.cpvstr] = pkg_file_collisions
+        offset = self.offset.rstrip(os.path.sep)
+        paths = {}
+        for x in colliding:
+            path = x.location
+            if offset and path.startswith(offset + os.path.sep):
+                path = path[len(offset) :]
+            paths.setdefault(path, []).append(x)
+
+        for repo in self.vdb:
+            index = getattr(repo, "owners_index", None)
+            if index is not None:
+                # use the file ownership index instead of scanning all contents
+                for cpvstr, owned in index.collisions(paths).items():
+                    collisions.setdefault(cpvstr, []).extend(
+                        chain.from_iterable(paths[x] for x in owned)
+                    )
+                continue
+            # TODO: worth parallelizing this vdb scanning?
+            for pkg in repo:
+                if not pkg.package_is_real:
+                    continue
+                pkg_file_collisions = pkg.contents.intersection(colliding)
+                if pkg_file_collisions:
+                    collisions[pkg.cpvstr] = pkg_file_collisions
 
         if collisions:
             pkg_collisions = [
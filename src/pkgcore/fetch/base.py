@@ -6,8 +6,9 @@ __all__ = ("fetcher",)
 
 import os
 
-from snakeoil.chksum import MissingChksumHandler, get_chksums, get_handlers
+from snakeoil.chksum import MissingChksumHandler, get_handlers
 
+from ..util.chksum import get_chksums
 from . import errors
 
 
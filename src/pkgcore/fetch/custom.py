@@ -8,7 +8,10 @@ __all__ = (
 )
 
 import os
+import threading
+from contextlib import nullcontext
 from os.path import join as pjoin
+from urllib.parse import urlsplit
 
 from snakeoil.process.spawn import is_userpriv_capable, spawn_bash
 
@@ -31,6 +34,7 @@ class fetcher(base.fetcher):
             "distdir": "str",
             "command": "str",
             "resume_command": "str",
+            "host_limit": "int",
         },
         allow_unknowns=True,
     )
@@ -44,6 +48,7 @@ class fetcher(base.fetcher):
         userpriv: bool = True,
         attempts: int = 10,
         readonly: bool = False,
+        host_limit=None,
         **extra_env: str,
     ):
         """
@@ -57,6 +62,8 @@ class fetcher(base.fetcher):
         :param userpriv: depriv for fetching?
         :param attempts: max number of attempts before failing the fetch
         :param readonly: controls whether fetching is allowed
+        :param host_limit: if not None, max number of concurrent downloads
+            from a single host when fetching from multiple threads
         """
         super().__init__()
         self.distdir = distdir
@@ -95,6 +102,20 @@ class fetcher(base.fetcher):
         self.userpriv = userpriv
         self.readonly = readonly
         self.extra_env = extra_env
+        self.host_limit = host_limit
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host_slot(self, uri: str):
+        """Return a context manager holding a connection slot for a URI's host."""
+        if self.host_limit is None:
+            return nullcontext()
+        host = urlsplit(uri).netloc
+        with self._hosts_lock:
+            slots = self._hosts.get(host)
+            if slots is None:
+                slots = self._hosts[host] = threading.BoundedSemaphore(self.host_limit)
+        return slots
 
     def fetch(self, target: fetchable):
         """Fetch a file.
@@ -138,13 +159,16 @@ class fetcher(base.fetcher):
             # generation), _verify() cannot detect a partial download, so we
             # must rely on the fetcher's exit code and discard any incomplete file.
             try:
-                ret = spawn_bash(
-                    command % {"URI": next(uris), "FILE": target.filename}, **spawn_opts
-                )
+                uri = next(uris)
             except StopIteration:
                 raise errors.FetchFailed(
                     target.filename, "ran out of urls to fetch from"
                 )
+            # only the download holds a slot, verification happens without it
+            with self._host_slot(uri):
+                ret = spawn_bash(
+                    command % {"URI": uri, "FILE": target.filename}, **spawn_opts
+                )
             if ret != 0 and not target.chksums:
                 try:
                     os.unlink(path)
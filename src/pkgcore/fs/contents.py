@@ -4,12 +4,15 @@ contents set- container of fs objects
 
 import os
 import time
+from array import array
+from bisect import bisect_left
 from collections import OrderedDict, defaultdict
 from functools import partial
-from operator import attrgetter
+from operator import attrgetter, itemgetter
 from os.path import join as pjoin
 from os.path import normpath
 
+from snakeoil.data_source import local_source
 from snakeoil.klass import GenericEquality, alias_method
 
 from . import fs
@@ -43,6 +46,12 @@ class contentsSet(GenericEquality):
     __attr_comparison__ = ("_dict",)
     __dict_kls__ = dict
 
+    def __eq__(self, other):
+        if isinstance(other, CompactContentsSet):
+            # defer to the column based comparison
+            return NotImplemented
+        return super().__eq__(other)
+
     def __init__(self, initial=None, mutable=True):
         """
         :param initial: initial fs objs for this set
@@ -174,7 +183,7 @@ class contentsSet(GenericEquality):
     def issubset(self, other):
         if not hasattr(other, "__contains__"):
             other = set(self._convert_loc(other))
-        return all(x in other for x in self._dict)
+        return all(x in other for x in self._iter_locations())
 
     def issuperset(self, other):
         if not hasattr(other, "__contains__"):
@@ -184,7 +193,7 @@ class contentsSet(GenericEquality):
     def isdisjoint(self, other):
         if not hasattr(other, "__contains__"):
             other = set(self._convert_loc(other))
-        return not any(x in other for x in self._dict)
+        return not any(x in other for x in self._iter_locations())
 
     def union(self, other):
         c = contentsSet(other)
@@ -194,6 +203,9 @@ class contentsSet(GenericEquality):
     def __iter__(self):
         return iter(self._dict.values())
 
+    def _iter_locations(self):
+        return iter(self._dict)
+
     def __len__(self):
         return len(self._dict)
 
@@ -227,6 +239,11 @@ class contentsSet(GenericEquality):
         for x in iterable:
             d[x.location] = x
 
+    def _iter_kind(self, attr, invert):
+        if invert:
+            return (x for x in self if not getattr(x, attr))
+        return filter(attrgetter(attr), self)
+
     def iterfiles(self, invert=False):
         """A generator yielding just :obj:`pkgcore.fs.fs.fsFile` instances.
 
@@ -234,9 +251,7 @@ class contentsSet(GenericEquality):
             else yields just fsFile instances.
         """
 
-        if invert:
-            return (x for x in self if not x.is_reg)
-        return filter(attrgetter("is_reg"), self)
+        return self._iter_kind("is_reg", invert)
 
     def files(self, invert=False):
         """Returns a list of just :obj:`pkgcore.fs.fs.fsFile` instances.
@@ -247,17 +262,13 @@ class contentsSet(GenericEquality):
         return list(self.iterfiles(invert=invert))
 
     def iterdirs(self, invert=False):
-        if invert:
-            return (x for x in self if not x.is_dir)
-        return filter(attrgetter("is_dir"), self)
+        return self._iter_kind("is_dir", invert)
 
     def dirs(self, invert=False):
         return list(self.iterdirs(invert=invert))
 
     def itersymlinks(self, invert=False):
-        if invert:
-            return (x for x in self if not x.is_sym)
-        return filter(attrgetter("is_sym"), self)
+        return self._iter_kind("is_sym", invert)
 
     def symlinks(self, invert=False):
         return list(self.iterlinks(invert=invert))
@@ -266,17 +277,13 @@ class contentsSet(GenericEquality):
     links = alias_method("symlinks")
 
     def iterdevs(self, invert=False):
-        if invert:
-            return (x for x in self if not x.is_dev)
-        return filter(attrgetter("is_dev"), self)
+        return self._iter_kind("is_dev", invert)
 
     def devs(self, invert=False):
         return list(self.iterdevs(invert=invert))
 
     def iterfifos(self, invert=False):
-        if invert:
-            return (x for x in self if not x.is_fifo)
-        return filter(attrgetter("is_fifo"), self)
+        return self._iter_kind("is_fifo", invert)
 
     def fifos(self, invert=False):
         return list(self.iterfifos(invert=invert))
@@ -371,7 +378,7 @@ class contentsSet(GenericEquality):
 
     def add_missing_directories(self, mode=0o775, uid=0, gid=0, mtime=None):
         """Ensure that a directory node exists for each path; add if missing."""
-        missing = (x.dirname for x in self)
+        missing = map(os.path.dirname, self._iter_locations())
         missing = set(x for x in missing if x not in self)
         if mtime is None:
             mtime = time.time()
@@ -400,3 +407,443 @@ class OrderedContentsSet(contentsSet):
         if add_missing_directories:
             self.add_missing_directories()
         self.mutable = mutable
+
+
+# attributes stored in dedicated columns, everything else is stored per entry
+_int_attrs = ("mode", "uid", "gid", "dev", "inode")
+_column_attrs = frozenset(("location", "mtime", "chksums", "data") + _int_attrs)
+_unset = -1
+# range of the int columns, values outside of it (e.g. 64bit inodes) are stored
+# per entry instead
+_int_min, _int_max = -(2**63), 2**63 - 1
+
+
+class CompactContentsSet(contentsSet):
+    """contentsSet storing entries in columns instead of as fs objects
+
+    Meant for packages with huge numbers of entries; paths, types, modes,
+    ownership, mtimes and checksums are kept in parallel arrays sorted by path
+    and fs objects are only created on access.  As such iteration is in path
+    order and yields new objects on each pass.  Set operations and child node
+    lookups work directly on the sorted paths, with results created from the
+    columns without going through fs objects.
+
+    Lazily generated file checksums stay lazy, only the ones generated at the
+    time of addition are stored.
+    """
+
+    _column_names = (
+        "_paths",
+        "_kinds",
+        "_lazy",
+        "_mtimes",
+        "_ints",
+        "_chksums",
+        "_extra",
+    )
+
+    def __init__(self, initial=None, mutable=True):
+        """
+        :param initial: initial fs objs for this set
+        :type initial: sequence
+        :param mutable: controls if it modifiable after initialization
+        """
+        self._build(())
+        if initial is not None:
+            self.update(initial)
+        self.mutable = mutable
+
+    def _build(self, rows):
+        """Replace all entries with the given rows, sorted by location."""
+        rows = list(rows)
+        self._paths = [x[0] for x in rows]
+        self._kinds = [x[1] for x in rows]
+        self._lazy = bytearray(x[2] for x in rows)
+        self._mtimes = array("d", (x[3] for x in rows))
+        self._ints = tuple(
+            array("q", (x[4][i] for x in rows)) for i in range(len(_int_attrs))
+        )
+        self._chksums = {}
+        self._extra = {}
+        for i, (path, _kind, _lazy, _mtime, _ints, chksums, extra) in enumerate(rows):
+            if chksums:
+                for k, v in chksums.items():
+                    self._chksum_column(k)[i] = v
+            if extra:
+                self._extra[path] = extra
+
+    def __eq__(self, other):
+        """Compare entries by location and type with any contentsSet."""
+        if self is other:
+            return True
+        if isinstance(other, CompactContentsSet):
+            if self._paths != other._paths:
+                return False
+            pairs = zip(self._kinds, other._kinds)
+        elif isinstance(other, contentsSet):
+            if len(self._paths) != len(other._dict):
+                return False
+            pairs = []
+            for path, kind in zip(self._paths, self._kinds):
+                if (obj := other._dict.get(path)) is None:
+                    return False
+                pairs.append((kind, obj.__class__))
+        else:
+            return False
+        # fs objects compare equal to instances of their subclasses
+        return all(a is b or issubclass(a, b) or issubclass(b, a) for a, b in pairs)
+
+    def _chksum_column(self, chf):
+        col = self._chksums.get(chf)
+        if col is None:
+            col = self._chksums[chf] = [None] * len(self._paths)
+        return col
+
+    @staticmethod
+    def _encode(obj):
+        """Convert a fs object into a row of column values."""
+        location, obj = check_instance(obj)
+        mtime = obj.mtime
+        lazy = 0
+        chksums = None
+        extra = []
+        if obj.is_reg:
+            chksums = obj.chksums
+            if isinstance(chksums, fs._LazyChksums):
+                lazy = 1
+                chksums = chksums.generated()
+            data = obj.data
+            if not (
+                type(data) is local_source
+                and data.path == location
+                and not data.mutable
+                and data.encoding is None
+            ):
+                extra.append(("data", data))
+        extra.extend(
+            (k, getattr(obj, k)) for k in obj.__attrs__ if k not in _column_attrs
+        )
+        ints = []
+        for k in _int_attrs:
+            v = getattr(obj, k, None)
+            if v is None:
+                v = _unset
+            elif not _int_min <= v <= _int_max:
+                extra.append((k, v))
+                v = _unset
+            ints.append(v)
+        return (
+            location,
+            obj.__class__,
+            lazy,
+            float("nan") if mtime is None else mtime,
+            tuple(ints),
+            chksums,
+            tuple(extra),
+        )
+
+    def _row(self, i):
+        path = self._paths[i]
+        return (
+            path,
+            self._kinds[i],
+            self._lazy[i],
+            self._mtimes[i],
+            tuple(x[i] for x in self._ints),
+            {k: v for k, col in self._chksums.items() if (v := col[i]) is not None},
+            self._extra.get(path, ()),
+        )
+
+    def _rows(self, indices=None):
+        if indices is None:
+            indices = range(len(self._paths))
+        return map(self._row, indices)
+
+    def _get(self, i):
+        """Create the fs object for an entry."""
+        kind = self._kinds[i]
+        d = {}
+        mtime = self._mtimes[i]
+        if mtime == mtime:
+            d["mtime"] = int(mtime) if mtime.is_integer() else mtime
+        for k, col in zip(_int_attrs, self._ints):
+            if (v := col[i]) != _unset:
+                d[k] = v
+        chksums = None
+        if kind.is_reg:
+            chksums = {
+                k: v for k, col in self._chksums.items() if (v := col[i]) is not None
+            }
+            if not self._lazy[i]:
+                d["chksums"] = chksums
+        path = self._paths[i]
+        d.update(self._extra.get(path, ()))
+        obj = kind(path, strict=False, **d)
+        if chksums and self._lazy[i]:
+            obj.chksums.update_generated(chksums)
+        return obj
+
+    def _index(self, obj):
+        """Return the index of an entry or -1 if it doesn't exist."""
+        path = obj.location if fs.isfs_obj(obj) else normpath(obj)
+        i = bisect_left(self._paths, path)
+        if i < len(self._paths) and self._paths[i] == path:
+            return i
+        return -1
+
+    def _mask(self, other):
+        """Return a bytearray flagging the entries whose locations are in other."""
+        if isinstance(other, CompactContentsSet):
+            locations = other._paths
+        else:
+            locations = sorted(set(self._convert_loc(other)))
+        paths = self._paths
+        mask = bytearray(len(paths))
+        # walk both sorted sequences in step
+        i = j = 0
+        while i < len(paths) and j < len(locations):
+            if paths[i] == locations[j]:
+                mask[i] = 1
+                i += 1
+                j += 1
+            elif paths[i] < locations[j]:
+                i += 1
+            else:
+                j += 1
+        return mask
+
+    def _take(self, indices):
+        """Return the columns of the given entries."""
+        indices = list(indices)
+        paths = [self._paths[i] for i in indices]
+        return (
+            paths,
+            [self._kinds[i] for i in indices],
+            bytearray(self._lazy[i] for i in indices),
+            array("d", (self._mtimes[i] for i in indices)),
+            tuple(array("q", (col[i] for i in indices)) for col in self._ints),
+            {k: [col[i] for i in indices] for k, col in self._chksums.items()},
+            {x: v for x in paths if (v := self._extra.get(x))},
+        )
+
+    def _set_columns(self, columns):
+        for name, column in zip(self._column_names, columns):
+            setattr(self, name, column)
+
+    def _filtered(self, mask, value):
+        return self._take(i for i, x in enumerate(mask) if x == value)
+
+    def _from_columns(self, columns, mutable):
+        cset = self.clone(empty=True)
+        cset._set_columns(columns)
+        cset.mutable = mutable
+        return cset
+
+    def add(self, obj):
+        """
+        add a new fs obj to the set
+
+        :param obj: must be a derivative of :obj:`pkgcore.fs.fs.fsBase`
+        """
+        if not self.mutable:
+            # weird, but keeping with set.
+            raise AttributeError(f"{self.__class__} is frozen; no add functionality")
+        if not fs.isfs_obj(obj):
+            raise TypeError(f"'{obj}' is not a fs.fsBase class")
+        row = self._encode(obj)
+        path = row[0]
+        i = self._index(path)
+        if i == -1:
+            i = bisect_left(self._paths, path)
+            self._paths.insert(i, path)
+            self._kinds.insert(i, row[1])
+            self._lazy.insert(i, row[2])
+            self._mtimes.insert(i, row[3])
+            for col, v in zip(self._ints, row[4]):
+                col.insert(i, v)
+            for col in self._chksums.values():
+                col.insert(i, None)
+        else:
+            self._kinds[i] = row[1]
+            self._lazy[i] = row[2]
+            self._mtimes[i] = row[3]
+            for col, v in zip(self._ints, row[4]):
+                col[i] = v
+            for col in self._chksums.values():
+                col[i] = None
+        if row[5]:
+            for k, v in row[5].items():
+                self._chksum_column(k)[i] = v
+        if row[6]:
+            self._extra[path] = row[6]
+        else:
+            self._extra.pop(path, None)
+
+    def _remove_index(self, i):
+        path = self._paths.pop(i)
+        del self._kinds[i]
+        del self._lazy[i]
+        del self._mtimes[i]
+        for col in self._ints:
+            del col[i]
+        for col in self._chksums.values():
+            del col[i]
+        self._extra.pop(path, None)
+
+    def __delitem__(self, obj):
+        """
+        remove a fs obj to the set
+
+        :type obj: a derivative of :obj:`pkgcore.fs.fs.fsBase`
+            or a string location of an obj in the set.
+        :raise KeyError: if the obj isn't found
+        """
+        if not self.mutable:
+            # weird, but keeping with set.
+            raise AttributeError(f"{self.__class__} is frozen; no remove functionality")
+        i = self._index(obj)
+        if i == -1:
+            raise KeyError(obj)
+        self._remove_index(i)
+
+    def discard(self, obj):
+        i = self._index(obj)
+        if i != -1:
+            self._remove_index(i)
+
+    def __getitem__(self, obj):
+        i = self._index(obj)
+        if i == -1:
+            raise KeyError(obj)
+        return self._get(i)
+
+    def __contains__(self, key):
+        return self._index(key) != -1
+
+    def clear(self):
+        """
+        clear the set
+        :raise ttributeError: if the instance is frozen
+        """
+        if not self.mutable:
+            # weird, but keeping with set.
+            raise AttributeError(f"{self.__class__} is frozen; no clear functionality")
+        self._build(())
+
+    def difference(self, other):
+        return self._from_columns(self._filtered(self._mask(other), 0), self.mutable)
+
+    def difference_update(self, other):
+        if not self.mutable:
+            raise TypeError(f"immutable type {self!r}")
+        self._set_columns(self._filtered(self._mask(other), 0))
+
+    def intersection(self, other):
+        if isinstance(other, CompactContentsSet):
+            # entries are taken from other, matching contentsSet
+            return self._from_columns(
+                other._filtered(other._mask(self), 1), self.mutable
+            )
+        cset = self.clone(empty=True)
+        cset.update(x for x in other if x in self)
+        cset.mutable = self.mutable
+        return cset
+
+    def intersection_update(self, other):
+        if not self.mutable:
+            raise TypeError(f"immutable type {self!r}")
+        self._set_columns(self._filtered(self._mask(other), 1))
+
+    def union(self, other):
+        c = self.clone(empty=True)
+        c.update(other)
+        c.update(self)
+        return c
+
+    def symmetric_difference(self, other):
+        c = self.clone()
+        c.symmetric_difference_update(other)
+        c.mutable = self.mutable
+        return c
+
+    def __iter__(self):
+        return map(self._get, range(len(self._paths)))
+
+    def _iter_locations(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def update(self, iterable):
+        if isinstance(iterable, CompactContentsSet):
+            if not self._paths:
+                self._set_columns(iterable._take(range(len(iterable))))
+                return
+            new = iterable._rows()
+        else:
+            rows = {}
+            for x in iterable:
+                row = self._encode(x)
+                rows[row[0]] = row
+            new = sorted(rows.values(), key=itemgetter(0))
+        # merge the sorted rows, new entries replacing existing ones
+        rows = []
+        old = self._rows()
+        row = next(old, None)
+        for new_row in new:
+            while row is not None and row[0] < new_row[0]:
+                rows.append(row)
+                row = next(old, None)
+            if row is not None and row[0] == new_row[0]:
+                row = next(old, None)
+            rows.append(new_row)
+        if row is not None:
+            rows.append(row)
+            rows.extend(old)
+        self._build(rows)
+
+    def _iter_kind(self, attr, invert):
+        return (
+            self._get(i)
+            for i, kind in enumerate(self._kinds)
+            if getattr(kind, attr) != invert
+        )
+
+    def clone(self, empty=False):
+        cset = self.__class__(mutable=True)
+        if not empty:
+            cset.update(self)
+        return cset
+
+    @staticmethod
+    def _child_prefix(start_point):
+        """Return the path prefix of child nodes and the first path past them."""
+        if isinstance(start_point, fs.fsBase):
+            if start_point.is_sym:
+                start_point = start_point.target
+            else:
+                start_point = start_point.location
+        prefix = normpath(start_point).rstrip(os.path.sep) + os.path.sep
+        # all paths with the prefix sort before it with the separator bumped
+        return prefix, prefix[:-1] + chr(ord(os.path.sep) + 1)
+
+    def _child_range(self, start_point):
+        prefix, end = self._child_prefix(start_point)
+        return range(bisect_left(self._paths, prefix), bisect_left(self._paths, end))
+
+    def iter_child_nodes(self, start_point):
+        """Yield a stream of nodes that are fs entries contained within the
+        passed in start point.
+
+        :param start_point: fs filepath all yielded nodes must be within.
+        """
+        return map(self._get, self._child_range(start_point))
+
+    def child_nodes(self, start_point):
+        """Return a clone of this instance, w/ just the child nodes returned
+        from `iter_child_nodes`.
+
+        :param start_point: fs filepath all yielded nodes must be within.
+        """
+        return self._from_columns(self._take(self._child_range(start_point)), True)
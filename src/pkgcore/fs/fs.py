@@ -10,13 +10,15 @@ from os.path import join as pjoin
 from os.path import sep as path_seperator
 
 from snakeoil import klass
-from snakeoil.chksum import get_chksums, get_handlers
+from snakeoil.chksum import get_handlers
 from snakeoil.compatibility import cmp
 from snakeoil.currying import post_curry, pretty_docs
 from snakeoil.data_source import local_source
 from snakeoil.klass import immutable
 from snakeoil.mappings import LazyFullValLoadDict
 
+from ..util.chksum import get_chksums
+
 # goofy set of classes representating the fs objects pkgcore knows of.
 
 __all__ = ["fsFile", "fsDir", "fsSymlink", "fsDev", "fsFifo"]
@@ -138,8 +140,51 @@ class fsBase(immutable.Simple):
 
 
 class _LazyChksums(LazyFullValLoadDict):
+    """Checksums of a file generated on demand.
+
+    Looking up a single checksum only generates that checksum while
+    iterating over the values generates all missing ones in a single pass.
+    """
+
     __slots__ = ()
 
+    def generate(self, keys):
+        """Generate the given checksums in a single pass if not done already."""
+        if self._keys_func is not None:
+            self._keys = set(self._keys_func())
+            self._keys_func = None
+        missing = [x for x in keys if x not in self._vals and x in self._keys]
+        if missing:
+            self._vals.update(self._val_func(missing))
+
+    def __getitem__(self, key):
+        if key not in self._vals:
+            self.generate((key,))
+        try:
+            return self._vals[key]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def missing(self, keys):
+        """Return the given checksums that are known but not generated yet."""
+        return [x for x in keys if x not in self._vals and x in self]
+
+    def generated(self):
+        """Return a dict of the checksums generated so far."""
+        return dict(self._vals)
+
+    def update_generated(self, items):
+        """Inject already generated checksums."""
+        self._vals.update(items)
+
+    def values(self):
+        self.generate(self.keys())
+        return map(self._vals.__getitem__, self.keys())
+
+    def items(self):
+        self.generate(self.keys())
+        return ((k, self._vals[k]) for k in self.keys())
+
 
 class fsFile(fsBase):
     """file class"""
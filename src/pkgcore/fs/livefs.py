@@ -13,10 +13,20 @@ from snakeoil.chksum import get_handlers
 from snakeoil.data_source import local_source
 from snakeoil.mappings import LazyValDict
 
+from ..util.chksum import chksum_files
 from .contents import contentsSet
-from .fs import fsBase, fsDev, fsDir, fsFifo, fsFile, fsSymlink, get_major_minor
+from .fs import (
+    _LazyChksums,
+    fsBase,
+    fsDev,
+    fsDir,
+    fsFifo,
+    fsFile,
+    fsSymlink,
+    get_major_minor,
+)
 
-__all__ = ["gen_obj", "scan", "iter_scan", "sorted_scan"]
+__all__ = ["gen_obj", "scan", "iter_scan", "sorted_scan", "fill_chksums"]
 
 
 def gen_chksums(handlers, location):
@@ -87,14 +97,34 @@ def gen_obj(
         return fsDev(path, **d)
 
 
-# hmm. this code is roughly 25x slower then find.
-# make it less slow somehow. the obj instantiation is a bit of a
-# killer I'm afraid; without obj, looking at 2.3ms roughly best of 3
-# 100 iterations, obj instantiation, 58ms.
-# also, os.path.join is rather slow.
-# in this case, we know it's always pegging one more dir on, so it's
-# fine doing it this way (specially since we're relying on
-# os.path.sep, not '/' :P)
+def _scandir(path, follow_symlinks=False, hidden=True, backup=True):
+    """Return (name, stat) tuples for the entries of a directory.
+
+    Entries are filtered using their names and stat'ed relative to an open
+    descriptor for the directory, all before returning so the descriptor
+    isn't held open while the scan is suspended.
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        with os.scandir(fd) as it:
+            entries = [
+                x
+                for x in it
+                if (hidden or x.name[0] != ".") and (backup or x.name[-1] != "~")
+            ]
+        l = []
+        for entry in entries:
+            try:
+                st = entry.stat(follow_symlinks=follow_symlinks)
+            except FileNotFoundError:
+                if not follow_symlinks:
+                    raise
+                # dangling symlink
+                st = entry.stat(follow_symlinks=False)
+            l.append((entry.name, st))
+        return l
+    finally:
+        os.close(fd)
 
 
 def _internal_iter_scan(
@@ -105,22 +135,15 @@ def _internal_iter_scan(
     yield obj
     if not obj.is_dir:
         return
+    follow_symlinks = stat_func is not os.lstat
+    sep = os.path.sep
     while dirs:
         base = dirs.popleft()
-        for x in os.listdir(base):
-            if not hidden and x.startswith("."):
-                continue
-            if not backup and x.endswith("~"):
-                continue
-            path = pjoin(base, x)
-            obj = gen_obj(
-                path,
-                chksum_handlers=chksum_handlers,
-                real_location=path,
-                stat_func=stat_func,
-            )
-            yield obj
-            if obj.is_dir:
+        prefix = base.rstrip(sep) + sep
+        for x, st in _scandir(base, follow_symlinks, hidden=hidden, backup=backup):
+            path = prefix + x
+            yield gen_obj(path, stat=st, chksum_handlers=chksum_handlers)
+            if S_ISDIR(st.st_mode):
                 dirs.append(path)
 
 
@@ -138,20 +161,16 @@ def _internal_offset_iter_scan(
         base = dirs.popleft()
         real_base = pjoin(offset, base.lstrip(sep))
         base = base.rstrip(sep) + sep
-        for x in os.listdir(real_base):
-            if not hidden and x.startswith("."):
-                continue
-            if not backup and x.endswith("~"):
-                continue
-            path = pjoin(base, x)
-            obj = gen_obj(
+        real_prefix = real_base.rstrip(sep) + sep
+        for x, st in _scandir(real_base, hidden=hidden, backup=backup):
+            path = base + x
+            yield gen_obj(
                 path,
+                stat=st,
                 chksum_handlers=chksum_handlers,
-                real_location=pjoin(real_base, x),
-                stat_func=os.lstat,
+                real_location=real_prefix + x,
             )
-            yield obj
-            if obj.is_dir:
+            if S_ISDIR(st.st_mode):
                 dirs.append(path)
 
 
@@ -189,6 +208,36 @@ def iter_scan(
     )
 
 
+def fill_chksums(objs, chksum_types, jobs=None):
+    """Generate missing checksums for regular files in parallel.
+
+    Only lazily generated checksums backed by local files are handled, other
+    objects are left as is, as are all objects if any file can't be read.
+
+    :param objs: iterable of :obj:`pkgcore.fs.fs.fsBase` objects
+    :param chksum_types: names of the checksums to generate
+    :param jobs: max number of files to hash in parallel, defaults to the
+        number of CPUs
+    """
+    pending = {}
+    for obj in objs:
+        if not obj.is_reg or not isinstance(obj.chksums, _LazyChksums):
+            continue
+        if not isinstance(obj.data, local_source):
+            continue
+        if missing := tuple(obj.chksums.missing(chksum_types)):
+            pending.setdefault(missing, []).append((obj, obj.data.path))
+
+    for chfs, l in pending.items():
+        try:
+            results = chksum_files([path for _obj, path in l], chfs, jobs=jobs)
+        except OSError:
+            # leave it to lazy generation to report errors for specific files
+            continue
+        for (obj, _path), values in zip(l, results):
+            obj.chksums.update_generated(zip(chfs, values))
+
+
 def sorted_scan(path, nonexistent=False, *args, **kwargs):
     """
     Recursively scan a path for regular, nonhidden files.
@@ -6,10 +6,14 @@ Shouldn't be accessed directly for the most part, use
 """
 
 import errno
+import fcntl
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from os.path import join as pjoin
 
+from snakeoil.data_source import local_source
 from snakeoil.osutils import ensure_dirs, unlink_if_exists
 from snakeoil.process.spawn import spawn
 
@@ -104,6 +108,48 @@ class CannotOverwrite(FailedCopy):
         return f"cannot write {self.obj} due to {self.existing} existing"
 
 
+# errors signifying a kernel-side copy isn't supported for the given files
+_UNSUPPORTED_COPY_ERRNOS = frozenset(
+    (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY)
+)
+
+
+def _copy_data(obj, path):
+    """Copy the data of a regular file object to a path.
+
+    Local sources are reflinked when the filesystem supports it, falling back
+    to :py:func:`os.copy_file_range` so data is copied in the kernel, and
+    finally to copying via userspace. Other data sources are copied from
+    their byte streams.
+    """
+    if not isinstance(obj.data, local_source):
+        # transfer_to_path() copies the underlying file of any source with a
+        # path, e.g. the compressed data of bz2 sources
+        with obj.data.bytes_fileobj() as src, open(path, "wb") as dest:
+            shutil.copyfileobj(src, dest)
+        return
+
+    with open(obj.data.path, "rb") as src, open(path, "wb") as dest:
+        ficlone = getattr(fcntl, "FICLONE", None)
+        if ficlone is not None:
+            try:
+                fcntl.ioctl(dest.fileno(), ficlone, src.fileno())
+                return
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                    raise
+
+        copied = 0
+        try:
+            while n := os.copy_file_range(src.fileno(), dest.fileno(), 2**30):
+                copied += n
+            return
+        except OSError as e:
+            if copied or e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                raise
+        shutil.copyfileobj(src, dest)
+
+
 def copyfile(obj, mkdirs=False):
     """
     copy a :class:`pkgcore.fs.fs.fsBase` to its stated location.
@@ -142,7 +188,7 @@ def copyfile(obj, mkdirs=False):
         fp = existent_fp = obj.location + "#new"
 
     if fs.isreg(obj):
-        obj.data.transfer_to_path(fp)
+        _copy_data(obj, fp)
     elif fs.issym(obj):
         os.symlink(obj.target, fp)
     elif fs.isfifo(obj):
@@ -197,7 +243,45 @@ def do_link(src, trg):
     return True
 
 
-def merge_contents(cset, offset=None, callback=None):
+def _merge_entry(x, merged_inodes):
+    """Merge a non-directory fs object, hardlinking it if possible."""
+    try:
+        if x.is_reg:
+            key = (x.dev, x.inode)
+            # This logic could be made smarter- instead of
+            # blindly trying candidates, we could inspect the st_dev
+            # of the final location.  This however can be broken by
+            # overlayfs's potentially.  Brute force is in use either
+            # way.
+            candidates = merged_inodes.setdefault(key, [])
+            if any(
+                target._can_be_hardlinked(x) and do_link(target, x)
+                for target in candidates
+            ):
+                return
+            candidates.append(x)
+
+        copyfile(x, mkdirs=True)
+    except CannotOverwrite as cf:
+        if not fs.issym(x):
+            raise
+
+        # by this time, all directories should've been merged.
+        # thus we can check the target
+        try:
+            if not fs.isdir(gen_obj(pjoin(x.location, x.target))):
+                raise
+        except OSError:
+            raise cf
+
+
+def _merge_group(entries, merged_inodes, callback):
+    for x in entries:
+        callback(x)
+        _merge_entry(x, merged_inodes)
+
+
+def merge_contents(cset, offset=None, callback=None, jobs=1):
     """
     merge a :class:`pkgcore.fs.contents.contentsSet` instance to the livefs
 
@@ -205,7 +289,12 @@ def merge_contents(cset, offset=None, callback=None):
     :param offset: if not None, offset to prefix all locations with.
         Think of it as target dir.
     :param callback: callable to report each entry being merged; given a single arg,
-        the fs object being merged.
+        the fs object being merged. With multiple jobs it's called from the
+        worker threads as each entry is merged, so it must be thread safe.
+    :param jobs: number of workers merging files concurrently. Directories are
+        always created first, then the entries of each directory are merged
+        by a single worker in order, along with any other entries they may be
+        hardlinked to.
     :raise EnvironmentError: Thrown for permission failures.
     """
 
@@ -252,44 +341,38 @@ def merge_contents(cset, offset=None, callback=None):
             ensure_perms(x)
     del d
 
-    # might look odd, but what this does is minimize the try/except cost
-    # to one time, assuming everything behaves, rather then per item.
-    i = iterate(cset.iterdirs(invert=True))
     merged_inodes = {}
-    while True:
-        try:
-            for x in i:
-                callback(x)
-
-                if x.is_reg:
-                    key = (x.dev, x.inode)
-                    # This logic could be made smarter- instead of
-                    # blindly trying candidates, we could inspect the st_dev
-                    # of the final location.  This however can be broken by
-                    # overlayfs's potentially.  Brute force is in use either
-                    # way.
-                    candidates = merged_inodes.setdefault(key, [])
-                    if any(
-                        target._can_be_hardlinked(x) and do_link(target, x)
-                        for target in candidates
-                    ):
-                        continue
-                    candidates.append(x)
-
-                copyfile(x, mkdirs=True)
-
-            break
-        except CannotOverwrite as cf:
-            if not fs.issym(x):
-                raise
+    if jobs <= 1:
+        _merge_group(iterate(cset.iterdirs(invert=True)), merged_inodes, callback)
+        return True
 
-            # by this time, all directories should've been merged.
-            # thus we can check the target
-            try:
-                if not fs.isdir(gen_obj(pjoin(x.location, x.target))):
-                    raise
-            except OSError:
-                raise cf
+    # Group entries by parent directory; entries possibly hardlinked to each
+    # other are kept in the group of the first one so links are created in
+    # the same order as serial merging.
+    groups = {}
+    inode_groups = {}
+    for x in iterate(cset.iterdirs(invert=True)):
+        group = None
+        if x.is_reg and x.inode is not None:
+            group = inode_groups.get((x.dev, x.inode))
+        if group is None:
+            group = groups.setdefault(x.dirname, [])
+            if x.is_reg and x.inode is not None:
+                inode_groups[(x.dev, x.inode)] = group
+        group.append(x)
+
+    with ThreadPoolExecutor(jobs, thread_name_prefix="merge") as executor:
+        futures = [
+            executor.submit(_merge_group, group, merged_inodes, callback)
+            for group in groups.values()
+        ]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
     return True
 
 
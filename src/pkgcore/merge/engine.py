@@ -84,6 +84,8 @@ class MergeEngine:
     replace_csets_preserve = ["new_cset", "old_cset"]
 
     allow_reuse = True
+    # threads used by the merge trigger; see domain.merge_jobs
+    merge_jobs = 1
 
     def __init__(
         self,
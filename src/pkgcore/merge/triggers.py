@@ -429,7 +429,14 @@ class merge(base):
     suppress_exceptions = False
 
     def trigger(self, engine, merging_cset):
-        return merge_contents(merging_cset, callback=engine.observer.installing_fs_obj)
+        # parallel merging is opt-in via the MERGE_JOBS setting
+        jobs = engine.merge_jobs
+        observer = engine.observer
+        if jobs > 1:
+            observer = threadsafe_repo_observer(observer)
+        return merge_contents(
+            merging_cset, callback=observer.installing_fs_obj, jobs=jobs
+        )
 
 
 class unmerge(base):
@@ -65,7 +65,7 @@ class base(metaclass=ForcedDepends):
             trigger.register(engine)
 
     def customize_engine(self, engine):
-        pass
+        engine.merge_jobs = getattr(self.domain, "merge_jobs", 1)
 
     def start(self):
         """start the transaction"""
@@ -15,6 +15,7 @@ __all__ = (
 )
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join as pjoin
 
 from snakeoil import klass
@@ -27,13 +28,21 @@ from ..fetch import errors as fetch_errors
 
 
 class fetch_base:
-    def __init__(self, domain, pkg, fetchables, distdir=None):
+    """Fetch and verify a sequence of fetchables.
+
+    :param jobs: number of files to fetch concurrently
+    :param host_limit: if not None, max number of concurrent downloads from a
+        single host
+    """
+
+    def __init__(self, domain, pkg, fetchables, distdir=None, jobs=1, host_limit=None):
         self.verified_files = {}
         self._basenames = set()
         self.domain = domain
         self.pkg = pkg
         self.fetchables = fetchables
         self.distdir = distdir if distdir is not None else domain.distdir
+        self.jobs = jobs
 
         # create fetcher
         fetchcmd = domain.settings["FETCHCOMMAND"]
@@ -44,19 +53,45 @@ class fetch_base:
             fetchcmd,
             resumecmd,
             attempts=attempts,
+            host_limit=host_limit,
             PATH=os.environ["PATH"],
             http_proxy=domain.get_settings_envvar("http_proxy", ""),
             https_proxy=domain.get_settings_envvar("https_proxy", ""),
         )
 
     def fetch_all(self, observer):
-        # TODO: add parallel fetch support
+        if self.jobs > 1:
+            return self._fetch_parallel(observer)
         failures = []
         for fetchable in self.fetchables:
             if not self.fetch_one(fetchable, observer):
                 failures.append(fetchable)
         return self.verified_files, failures
 
+    def _fetch_parallel(self, observer):
+        # files sharing a name are written to the same path, so only the first
+        # fetchable for each name is fetched concurrently; the rest are handled
+        # afterwards and usually just hit the already verified file
+        unique = {}
+        for fetchable in self.fetchables:
+            unique.setdefault(fetchable.filename, fetchable)
+        pending = list(unique.values())
+        with ThreadPoolExecutor(self.jobs, thread_name_prefix="fetch") as executor:
+            results = dict(
+                zip(
+                    map(id, pending),
+                    executor.map(lambda x: self.fetch_one(x, observer), pending),
+                )
+            )
+        failures = []
+        for fetchable in self.fetchables:
+            result = results.get(id(fetchable))
+            if result is None:
+                result = self.fetch_one(fetchable, observer)
+            if not result:
+                failures.append(fetchable)
+        return self.verified_files, failures
+
     def fetch_one(self, fetchable, observer, retry=False):
         if fetchable.filename in self._basenames:
             return True
@@ -1,6 +1,19 @@
+import json
+import multiprocessing
+import os
+import queue
+import time
+from collections import defaultdict
+
 from snakeoil.compatibility import IGNORED_EXCEPTIONS
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.osutils import ensure_dirs
 
+from ..ebuild import processor
+from ..exceptions import PkgcoreException
+from ..log import logger
 from ..package.errors import MetadataException
+from ..repository.index import default_location
 from ..util.thread_pool import map_async
 
 
@@ -20,7 +33,15 @@ def regen_iter(iterable, regen_func, observer):
             yield pkg, e
 
 
-def regen_repository(repo, pkgs, observer, threads=1, pkg_attr="keywords", **kwargs):
+def regen_repository(
+    repo, pkgs, observer, threads=1, processes=1, pkg_attr="keywords", **kwargs
+):
+    if processes > 1 and hasattr(repo, "_regen_operation_helper"):
+        yield from regen_repository_processes(
+            repo, pkgs, observer, processes=processes, threads=threads, **kwargs
+        )
+        return
+
     helpers = []
 
     def _get_repo_helper():
@@ -38,3 +59,322 @@ def regen_repository(repo, pkgs, observer, threads=1, pkg_attr="keywords", **kwa
 
     # yield any errors that occurred during metadata generation
     yield from errors
+
+
+class RegenWorkerError(PkgcoreException):
+    """Error raised while regenerating a package in a worker process."""
+
+
+class _forwarding_cache:
+    """Cache proxy used by worker processes.
+
+    Lookups are served by the wrapped cache while modifications are sent to
+    the parent process, leaving it as the only cache writer.
+    """
+
+    def __init__(self, cache, index, results):
+        self._cache = cache
+        self._index = index
+        self._results = results
+
+    def __getattr__(self, attr):
+        return getattr(self._cache, attr)
+
+    def __getitem__(self, cpv):
+        return self._cache[cpv]
+
+    def __setitem__(self, cpv, values):
+        self._results.put(("set", self._index, cpv, dict(values)))
+
+    def __delitem__(self, cpv):
+        self._results.put(("del", self._index, cpv))
+
+
+def _regen_worker(repo, pkgs, results, threads, kwargs):
+    """Regenerate metadata for a shard of packages in a worker process."""
+    try:
+        factory = repo.package_class
+        factory._cache = tuple(
+            _forwarding_cache(cache, i, results) for i, cache in enumerate(repo.cache)
+        )
+        helpers = []
+
+        def get_args():
+            helper = repo._regen_operation_helper(**kwargs)
+            helpers.append(helper)
+            return (helper, None)
+
+        for pkg, e in map_async(
+            pkgs, regen_iter, threads=threads, per_thread_args=get_args
+        ):
+            results.put(("error", pkg.cpvstr, f"{e.__class__.__name__}: {e}"))
+        # release daemons before shutting them down
+        del helpers[:]
+    except KeyboardInterrupt:
+        pass
+    finally:
+        processor.shutdown_all_processors()
+        results.put(("done",))
+
+
+def _shard_pkgs(pkgs, count):
+    """Split packages into shards, keeping the versions of a package together."""
+    groups = defaultdict(list)
+    for pkg in pkgs:
+        groups[pkg.key].append(pkg)
+    shards = [[] for _ in range(count)]
+    # deal the largest groups first to roughly balance the shards
+    for i, group in enumerate(sorted(groups.values(), key=len, reverse=True)):
+        shards[i % count].extend(group)
+    return [x for x in shards if x]
+
+
+def regen_repository_processes(repo, pkgs, observer, processes, threads=1, **kwargs):
+    """Regenerate repository metadata using multiple worker processes.
+
+    Packages are sharded across forked worker processes, each running its own
+    set of threads and ebuild daemons. Cache updates from the workers are
+    streamed back and written by the calling process.
+
+    :param processes: number of worker processes to use
+    :param threads: total number of threads to spread across the workers
+    :return: iterable of (pkg, exception) tuples for failures
+    """
+    pkgs = list(pkgs)
+    shards = _shard_pkgs(pkgs, processes)
+    if not shards:
+        return
+    per_process_threads = max(1, threads // len(shards))
+    pkg_map = {pkg.cpvstr: pkg for pkg in pkgs}
+    caches = repo.cache
+
+    # make sure pending updates are visible to the workers
+    for cache in caches:
+        if not cache.readonly and not cache.autocommits:
+            cache.commit()
+
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(
+            target=_regen_worker,
+            args=(repo, shard, results, per_process_threads, kwargs),
+            daemon=True,
+        )
+        for shard in shards
+    ]
+    for worker in workers:
+        worker.start()
+
+    running = len(workers)
+    try:
+        while running:
+            try:
+                msg = results.get(timeout=1)
+            except queue.Empty:
+                # catch workers dying without signaling they're done
+                if all(w.exitcode is not None for w in workers) and results.empty():
+                    break
+                continue
+            op = msg[0]
+            if op == "set":
+                _, index, cpv, values = msg
+                cache = caches[index]
+                try:
+                    cache[cpv] = values
+                except Exception as e:
+                    yield pkg_map[cpv], e
+            elif op == "del":
+                _, index, cpv = msg
+                try:
+                    del caches[index][cpv]
+                except KeyError:
+                    pass
+            elif op == "error":
+                _, cpv, error = msg
+                yield pkg_map[cpv], RegenWorkerError(error)
+            elif op == "done":
+                running -= 1
+    finally:
+        for worker in workers:
+            if worker.is_alive() and running:
+                worker.terminate()
+            worker.join()
+        results.close()
+
+    for worker in workers:
+        if worker.exitcode:
+            if observer is not None:
+                observer.error(
+                    f"regen worker process failed with exit code {worker.exitcode}"
+                )
+
+
+class RegenState:
+    """Tree state recorded after a metadata regeneration run.
+
+    Tracks ebuild and eclass mtimes along with the eclasses inherited by each
+    package, allowing later runs to only regenerate packages with changed
+    ebuilds or inheriting changed eclasses.
+
+    :param location: path to the state file
+    :param caches: identifiers of the metadata caches the state relates to
+    """
+
+    version = 1
+
+    # files modified this recently aren't recorded, avoiding missed updates due
+    # to coarse mtime granularity
+    _racy_window = 2 * 10**9
+
+    def __init__(self, location, caches=()):
+        self.location = location
+        self.caches = list(caches)
+        self.ebuilds = {}
+        self.eclasses = {}
+        self.inherits = {}
+        self._ebuild_mtimes = {}
+        self._eclass_mtimes = {}
+
+    @classmethod
+    def for_repo(cls, repo, location=None, reset=False):
+        """Load the regen state for a repo.
+
+        A fresh state is returned if no state was previously recorded, it's
+        invalid, or it relates to different metadata caches.
+
+        :param location: path to the state file, defaults to a path in the
+            pkgcore cache dir
+        :param reset: ignore any previously recorded state
+        """
+        if location is None:
+            location = default_location(repo.location, subdir="regen-state")
+        caches = [getattr(x, "location", repr(x)) for x in repo.cache]
+        state = cls(location, caches)
+        if reset:
+            return state
+        try:
+            with open(location) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return state
+        except (OSError, ValueError) as e:
+            logger.warning(f"ignoring invalid regen state {location!r}: {e}")
+            return state
+        try:
+            if data["version"] != cls.version or data["caches"] != caches:
+                return state
+            state.ebuilds = dict(data["ebuilds"])
+            state.eclasses = dict(data["eclasses"])
+            state.inherits = {k: tuple(v) for k, v in data["inherits"].items()}
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"ignoring invalid regen state {location!r}: {e}")
+            return cls(location, caches)
+        return state
+
+    def eclass_index(self):
+        """Return the mapping of eclasses to the packages inheriting them."""
+        d = defaultdict(set)
+        for cpv, eclasses in self.inherits.items():
+            for eclass in eclasses:
+                d[eclass].add(cpv)
+        return d
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self, pkgs, eclass_cache):
+        """Determine the packages requiring regeneration.
+
+        :param pkgs: all packages in the repo
+        :param eclass_cache: eclass cache used by the repo
+        :return: list of packages with changed ebuilds, inheriting changed
+            eclasses, or without recorded state
+        """
+        self._eclass_mtimes = {
+            name: self._mtime(eclass.path)
+            for name, eclass in eclass_cache.eclasses.items()
+        }
+        changed_eclasses = {
+            name
+            for name in self.eclasses.keys() | self._eclass_mtimes.keys()
+            if self.eclasses.get(name) != self._eclass_mtimes.get(name)
+        }
+        eclass_index = self.eclass_index()
+        affected = set()
+        for eclass in changed_eclasses:
+            affected.update(eclass_index.get(eclass, ()))
+
+        self._ebuild_mtimes = {}
+        changed = []
+        for pkg in pkgs:
+            cpv = pkg.cpvstr
+            mtime = self._ebuild_mtimes[cpv] = self._mtime(pkg.path)
+            if cpv in affected or mtime is None or self.ebuilds.get(cpv) != mtime:
+                changed.append(pkg)
+        return changed
+
+    def update(self, pkgs, invalid=()):
+        """Record the current tree state after regenerating packages.
+
+        Must be called after :meth:`changed`.
+
+        :param pkgs: regenerated packages
+        :param invalid: package CPV strings that failed regeneration, these are
+            always regenerated on the next run
+        """
+        invalid = frozenset(invalid)
+        now = time.time_ns()
+
+        def stable(mtime):
+            return mtime is not None and now - mtime >= self._racy_window
+
+        for pkg in pkgs:
+            if pkg.cpvstr in invalid:
+                continue
+            try:
+                self.inherits[pkg.cpvstr] = tuple(pkg.inherited)
+            except MetadataException:
+                invalid |= {pkg.cpvstr}
+
+        self.ebuilds = {
+            cpv: mtime
+            for cpv, mtime in self._ebuild_mtimes.items()
+            if cpv not in invalid and cpv in self.inherits and stable(mtime)
+        }
+        self.inherits = {
+            cpv: eclasses
+            for cpv, eclasses in self.inherits.items()
+            if cpv in self.ebuilds
+        }
+        self.eclasses = {
+            name: mtime for name, mtime in self._eclass_mtimes.items() if stable(mtime)
+        }
+
+    def save(self):
+        """Write the state to disk."""
+        data = {
+            "version": self.version,
+            "caches": self.caches,
+            "ebuilds": self.ebuilds,
+            "eclasses": self.eclasses,
+            "inherits": self.inherits,
+        }
+        try:
+            if not ensure_dirs(os.path.dirname(self.location), mode=0o755):
+                raise OSError(
+                    f"failed creating dir: {os.path.dirname(self.location)!r}"
+                )
+            f = AtomicWriteFile(self.location)
+            try:
+                json.dump(data, f, separators=(",", ":"))
+                f.close()
+            except BaseException:
+                f.discard()
+                raise
+        except OSError as e:
+            logger.warning(f"failed writing regen state {self.location!r}: {e}")
@@ -227,14 +227,21 @@ class operations(sync_operations):
                 del cache[p]
 
     @operations_mod.is_standalone
-    def _cmd_api_regen_cache(self, observer=None, threads=1, **kwargs):
+    def _cmd_api_regen_cache(
+        self, observer=None, threads=1, incremental=False, **kwargs
+    ):
         cache = getattr(self.repo, "cache", None)
         if not cache and not kwargs.get("force", False):
             return
-        sync_rate = getattr(cache, "sync_rate", None)
+        # queue up cache updates for the entire run, allowing backends
+        # supporting it to write them in bulk
+        sync_rates = [
+            (x, x.sync_rate) for x in self._get_caches() if hasattr(x, "sync_rate")
+        ]
+        state = None
         try:
-            if sync_rate is not None:
-                cache.set_sync_rate(1000000)
+            for x, _sync_rate in sync_rates:
+                x.set_sync_rate(1000000)
             errors = 0
 
             # Force usage of unfiltered repo to include pkgs with metadata issues.
@@ -242,16 +249,37 @@ class operations(sync_operations):
             # as EBADF since the repo iterator isn't thread-safe.
             pkgs = list(self.repo.itermatch(packages.AlwaysTrue, pkg_filter=None))
 
+            # only regenerate pkgs that changed since the last recorded run
+            regen_pkgs = pkgs
+            if incremental:
+                state = regen.RegenState.for_repo(
+                    self.repo, reset=kwargs.get("force", False)
+                )
+                regen_pkgs = state.changed(pkgs, self.repo.eclass_cache)
+
             observer = self._get_observer(observer)
+            failed = set()
             for pkg, e in regen.regen_repository(
-                self.repo, pkgs, observer=observer, threads=threads, **kwargs
+                self.repo, regen_pkgs, observer=observer, threads=threads, **kwargs
             ):
                 observer.error(f"caught exception {e} while processing {pkg.cpvstr}")
                 errors += 1
+                failed.add(pkg.cpvstr)
 
             # report pkgs with bad metadata -- relies on iterating over the
             # unfiltered repo to populate the masked repo
-            pkgs = frozenset(pkg.cpvstr for pkg in self.repo)
+            if state is None:
+                pkgs = frozenset(pkg.cpvstr for pkg in self.repo)
+            else:
+                # unchanged pkgs were valid during the recorded run
+                keys = {pkg.unversioned_atom for pkg in regen_pkgs}
+                valid = frozenset(
+                    pkg.cpvstr for key in keys for pkg in self.repo.itermatch(key)
+                )
+                bad = frozenset(
+                    pkg.cpvstr for pkg in regen_pkgs if pkg.cpvstr not in valid
+                )
+                pkgs = frozenset(pkg.cpvstr for pkg in pkgs) - bad
             for pkg in sorted(self.repo._bad_masked):
                 observer.error(
                     f"{pkg.cpvstr}: {pkg.data.msg(verbosity=observer.verbosity)}"
@@ -261,12 +289,21 @@ class operations(sync_operations):
             # remove old/invalid cache entries
             self._cmd_implementation_clean_cache(pkgs)
 
-            return errors
+            if state is not None:
+                state.update(
+                    (pkg for pkg in regen_pkgs if pkg.cpvstr in valid),
+                    invalid=failed,
+                )
         finally:
-            if sync_rate is not None:
-                cache.set_sync_rate(sync_rate)
+            for x, sync_rate in sync_rates:
+                x.set_sync_rate(sync_rate)
             self.repo.operations.run_if_supported("flush_cache")
 
+        # only record the run once its cache updates were written
+        if state is not None:
+            state.save()
+        return errors
+
     def _get_caches(self):
         caches = getattr(self.repo, "cache", ())
         if not hasattr(caches, "commit"):
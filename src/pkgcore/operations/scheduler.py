@@ -0,0 +1,267 @@
+"""
+dependency aware scheduling of merge plan operations
+
+Builds of independent packages are run concurrently in worker threads while
+merging into the livefs is serialized onto the calling thread, ordered so
+that a package is only built once everything it depends on from the plan has
+been merged.
+"""
+
+__all__ = ("job", "plan_dependencies", "merge_scheduler")
+
+import os
+import queue
+import threading
+from collections import defaultdict
+
+from snakeoil.sequences import iflatten_instance
+
+from ..ebuild.atom import atom
+from .observer import null_output
+
+# dependency attributes pulled into the graph; pdepend is intentionally
+# excluded since it's only required after the package itself is merged.
+_dep_attrs = ("bdepend", "depend", "idepend", "rdepend")
+
+
+class job:
+    """Scheduling state for a single merge plan operation."""
+
+    __slots__ = ("op", "index", "waits_on", "state", "result", "exc")
+
+    def __init__(self, op, index, waits_on=()):
+        self.op = op
+        self.index = index
+        self.waits_on = frozenset(waits_on)
+        self.state = "pending"
+        self.result = None
+        self.exc = None
+
+    @property
+    def pkg(self):
+        return self.op.pkg
+
+    @property
+    def needs_build(self):
+        return self.op.desc != "remove"
+
+    def __str__(self):
+        return str(self.op.pkg.cpvstr)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.index}: {self.op} state={self.state}>"
+
+
+def _iter_dep_atoms(pkg):
+    for attr in _dep_attrs:
+        depset = getattr(pkg, attr, None)
+        if not depset:
+            continue
+        for a in iflatten_instance(depset, (atom,)):
+            if isinstance(a, atom) and not a.blocks:
+                yield a
+
+
+def plan_dependencies(ops):
+    """Determine the earlier plan operations each operation must wait on.
+
+    Dependencies are computed conservatively: every atom of every dependency
+    class (including all alternatives of any-of groups) that matches a package
+    earlier in the plan forms an edge, operations on the same package key are
+    kept in plan order, and removals act as barriers for everything around
+    them.
+
+    :param ops: sequence of resolver plan operations
+    :return: list of frozensets of indexes into ops, one per operation
+    """
+    by_key = defaultdict(list)
+    deps = []
+    barrier = None
+    for idx, op in enumerate(ops):
+        waits_on = set()
+        if barrier is not None:
+            waits_on.add(barrier)
+        if op.desc == "remove":
+            waits_on.update(range(barrier if barrier is not None else 0, idx))
+            barrier = idx
+        else:
+            # earlier ops touching the same key, e.g. slot replacements
+            waits_on.update(by_key.get(op.pkg.key, ()))
+            for a in _iter_dep_atoms(op.pkg):
+                for prev in by_key.get(a.key, ()):
+                    if a.match(ops[prev].pkg):
+                        waits_on.add(prev)
+        by_key[op.pkg.key].append(idx)
+        deps.append(frozenset(waits_on))
+    return deps
+
+
+class merge_scheduler:
+    """Run a merge plan with concurrent builds and serialized merges.
+
+    :param ops: sequence of resolver plan operations
+    :param jobs: maximum number of concurrently running builds
+    :param load_average: don't start new builds while the system load average
+        is at or above this value, unless nothing is currently building
+    :param observer: observer used for per-job progress reporting, must be
+        threadsafe if jobs is greater than one
+    :param keep_going: continue scheduling unrelated jobs after a failure
+    """
+
+    _load_poll_interval = 1.0
+
+    def __init__(self, ops, jobs=1, load_average=None, observer=None, keep_going=False):
+        if jobs < 1:
+            raise ValueError(f"jobs must be a positive integer: {jobs!r}")
+        ops = tuple(ops)
+        self.jobs = [
+            job(op, idx, waits_on)
+            for idx, (op, waits_on) in enumerate(zip(ops, plan_dependencies(ops)))
+        ]
+        self.max_jobs = jobs
+        self.load_average = load_average
+        self.observer = observer if observer is not None else null_output()
+        self.keep_going = keep_going
+        self._results = queue.Queue()
+        self._running = {}
+
+    def _load_exceeded(self):
+        if self.load_average is None:
+            return False
+        try:
+            return os.getloadavg()[0] >= self.load_average
+        except OSError:
+            return False
+
+    def _blocked(self, j, merged, failed):
+        """Check a job's dependencies, failing it if any of them failed."""
+        if not j.waits_on.issubset(merged):
+            if j.waits_on.intersection(failed):
+                j.state = "failed"
+                failed.add(j.index)
+                self.observer.error(f"skipping {j}: required dependency failed")
+            return True
+        return False
+
+    def _build(self, j, build_func):
+        # always queue a result, otherwise run() waits on the job forever
+        try:
+            result, exc = build_func(j.op), None
+        except BaseException as e:
+            result, exc = False, e
+        self._results.put((j, result, exc))
+
+    def _start_build(self, j, build_func):
+        j.state = "building"
+        self.observer.info(
+            f"starting build of {j} ({len(self._running) + 1} of {self.max_jobs} jobs)"
+        )
+        t = threading.Thread(target=self._build, args=(j, build_func), daemon=True)
+        self._running[j.index] = t
+        t.start()
+
+    def _reap(self, block, timeout=None):
+        """Collect finished builds, returning True if any were collected."""
+        reaped = False
+        while self._running:
+            try:
+                j, result, exc = self._results.get(block=block, timeout=timeout)
+            except queue.Empty:
+                break
+            self._running.pop(j.index).join()
+            j.result, j.exc = result, exc
+            if result is False or result is None:
+                j.state = "failed"
+                if isinstance(exc, (KeyboardInterrupt, SystemExit)):
+                    # propagate interrupts from builds to the calling thread
+                    raise exc
+                msg = f"failed building {j}"
+                if exc is not None:
+                    msg += f": {exc}"
+                self.observer.error(msg)
+            else:
+                j.state = "built"
+                self.observer.info(f"finished building {j}")
+            reaped = True
+            block = False
+        return reaped
+
+    def run(self, build_func, merge_func):
+        """Run all jobs, returning the list of failed jobs.
+
+        Jobs that never ran due to an earlier failure are left in the pending
+        state and aren't included in the returned list.
+
+        :param build_func: callable invoked in a worker thread with a plan
+            operation, returning the package to merge or False on failure
+        :param merge_func: callable invoked serially in the calling thread with
+            a plan operation and the result of its build (None for removals),
+            returning a boolean indicating success
+        """
+        pending = list(self.jobs)
+        merged = set()
+        failed = set()
+        try:
+            while pending or self._running:
+                progress = False
+                abort = failed and not self.keep_going
+
+                # merge everything built whose dependencies are merged
+                for j in list(pending):
+                    if j.state == "failed":
+                        failed.add(j.index)
+                        pending.remove(j)
+                        progress = True
+                        continue
+                    elif j.state != "built" and (j.needs_build or j.state != "pending"):
+                        continue
+                    if abort or self._blocked(j, merged, failed):
+                        if j.state == "failed":
+                            pending.remove(j)
+                            progress = True
+                        continue
+                    pending.remove(j)
+                    if merge_func(j.op, j.result):
+                        j.state = "merged"
+                        merged.add(j.index)
+                    else:
+                        j.state = "failed"
+                        failed.add(j.index)
+                    progress = True
+                    # merges may unblock builds, rescan from the start
+                    break
+
+                abort = failed and not self.keep_going
+                if abort and not self._running:
+                    break
+
+                # queue up new builds in plan order
+                load_blocked = False
+                for j in pending:
+                    if abort or len(self._running) >= self.max_jobs:
+                        break
+                    if j.state != "pending" or not j.needs_build:
+                        continue
+                    if self._blocked(j, merged, failed):
+                        continue
+                    if self._running and self._load_exceeded():
+                        load_blocked = True
+                        break
+                    self._start_build(j, build_func)
+                    progress = True
+
+                if self._running:
+                    timeout = self._load_poll_interval if load_blocked else None
+                    if self._reap(block=not progress, timeout=timeout):
+                        progress = True
+                elif not progress and pending:
+                    # everything left is waiting on failed or unmergeable deps
+                    for j in pending:
+                        if j.state != "failed":
+                            j.state = "failed"
+                            failed.add(j.index)
+                    break
+        finally:
+            while self._running:
+                self._reap(block=True)
+        return [j for j in self.jobs if j.state == "failed"]
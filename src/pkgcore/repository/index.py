@@ -0,0 +1,222 @@
+"""
+persistent on-disk package and version index for repositories
+"""
+
+__all__ = ("TreeIndex", "default_location")
+
+import atexit
+import hashlib
+import json
+import os
+import time
+from os.path import join as pjoin
+
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.osutils import ensure_dirs
+
+from .. import const
+from ..log import logger
+
+
+def default_location(repo_location, subdir="repo-index", ext="json"):
+    """Return the default index file path for a given repo location.
+
+    The system cache directory is used if it's writable, otherwise the index
+    is stored in the user cache directory.
+
+    :param subdir: cache subdirectory to use for the index type
+    :param ext: file extension of the index file
+    """
+    path = os.path.realpath(repo_location)
+    name = os.path.basename(path.rstrip(os.sep)) or "root"
+    digest = hashlib.md5(path.encode()).hexdigest()[:12]
+    cache_dir = const.SYSTEM_CACHE_PATH
+    if not os.access(cache_dir, os.W_OK):
+        cache_dir = const.USER_CACHE_PATH
+    return pjoin(cache_dir, subdir, f"{name}-{digest}.{ext}")
+
+
+class TreeIndex:
+    """Persistent category -> package -> version index of a repository tree.
+
+    Entries are validated against the mtime of their related directory, so a
+    lookup costs a single stat call instead of a directory listing, and only
+    changed directories are relisted. If the repo provides a sync timestamp
+    file that matches the one recorded in the index, entries are trusted
+    without any stat calls at all.
+
+    Updates are written back to disk on :meth:`save`, which is automatically
+    run at exit once the index has been modified.
+
+    :param base: base directory of the repository tree
+    :param location: path to the index file
+    :param timestamp: file relative to base whose content marks tree updates,
+        e.g. the timestamp file written on each sync
+    """
+
+    version = 1
+
+    # directories modified this recently aren't recorded as validated, avoiding
+    # missed updates due to coarse mtime granularity
+    _racy_window = 2 * 10**9
+
+    def __init__(self, base, location, timestamp="metadata/timestamp.chk"):
+        self.base = base
+        self.location = location
+        self._token = self._read_token(timestamp) if timestamp else None
+        self._data = {}
+        self._trusted = False
+        self._checked = set()
+        self._dirty = False
+        self._save_registered = False
+        self._load()
+
+    def _read_token(self, path):
+        try:
+            with open(pjoin(self.base, path)) as f:
+                return f.read().strip() or None
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _load(self):
+        try:
+            with open(self.location) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"ignoring invalid repo index {self.location!r}: {e}")
+            return
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != self.version
+            or data.get("base") != self.base
+        ):
+            return
+        try:
+            self._data = {
+                cat: [
+                    cat_mtime,
+                    {pkg: [mtime, tuple(vers)] for pkg, (mtime, vers) in pkgs.items()},
+                ]
+                for cat, (cat_mtime, pkgs) in data["categories"].items()
+            }
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            logger.warning(f"ignoring invalid repo index {self.location!r}: {e}")
+            return
+        self._trusted = self._token is not None and data.get("token") == self._token
+
+    def __len__(self):
+        return len(self._data)
+
+    def _mtime(self, *path):
+        """Return the mtime of a directory or None if it doesn't exist."""
+        try:
+            return os.stat(pjoin(self.base, *path)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _stamp(self, mtime):
+        """Return the mtime to record for a directory."""
+        if time.time_ns() - mtime < self._racy_window:
+            return None
+        return mtime
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if not self._save_registered:
+            self._save_registered = True
+            atexit.register(self.save)
+
+    def packages(self, category, pull):
+        """Return the packages of a category.
+
+        :param category: category name
+        :param pull: callable listing the packages of the category, used for
+            missing or outdated entries
+        """
+        entry = self._data.get(category)
+        validated = self._trusted or category in self._checked
+        if validated and entry is not None and entry[0] is not None:
+            return tuple(entry[1])
+        mtime = self._mtime(category)
+        if mtime is None:
+            # let the caller handle missing and inaccessible dirs
+            self._data.pop(category, None)
+            return pull(category)
+        self._checked.add(category)
+        if entry is not None and entry[0] == mtime:
+            return tuple(entry[1])
+        pkgs = tuple(pull(category))
+        old = entry[1] if entry is not None else {}
+        self._data[category] = [
+            self._stamp(mtime),
+            {pkg: old.get(pkg, [None, ()]) for pkg in pkgs},
+        ]
+        self._mark_dirty()
+        return pkgs
+
+    def versions(self, catpkg, pull):
+        """Return the versions of a package.
+
+        :param catpkg: (category, package) tuple
+        :param pull: callable listing the versions of the package, used for
+            missing or outdated entries
+        """
+        category, package = catpkg
+        cat_entry = self._data.get(category)
+        entry = cat_entry[1].get(package) if cat_entry is not None else None
+        validated = self._trusted or catpkg in self._checked
+        if validated and entry is not None and entry[0] is not None:
+            return entry[1]
+        mtime = self._mtime(category, package)
+        if mtime is None or cat_entry is None:
+            return pull(catpkg)
+        self._checked.add(catpkg)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+        versions = tuple(pull(catpkg))
+        cat_entry[1][package] = [self._stamp(mtime), versions]
+        self._mark_dirty()
+        return versions
+
+    def _fully_checked(self):
+        """Determine if all index entries were validated this session."""
+        checked = self._checked
+        for cat, (cat_mtime, pkgs) in self._data.items():
+            if cat_mtime is None or cat not in checked:
+                return False
+            for pkg, (mtime, _) in pkgs.items():
+                if mtime is None or (cat, pkg) not in checked:
+                    return False
+        return True
+
+    def save(self):
+        """Write the index to disk if it was modified."""
+        if not self._dirty:
+            return
+        # only trust the index on the next run if everything is known to match
+        # the current tree state
+        trusted = self._trusted or self._fully_checked()
+        data = {
+            "version": self.version,
+            "base": self.base,
+            "token": self._token if trusted else None,
+            "categories": self._data,
+        }
+        try:
+            if not ensure_dirs(os.path.dirname(self.location), mode=0o755):
+                raise OSError(
+                    f"failed creating dir: {os.path.dirname(self.location)!r}"
+                )
+            f = AtomicWriteFile(self.location)
+            try:
+                json.dump(data, f, separators=(",", ":"))
+                f.close()
+            except BaseException:
+                f.discard()
+                raise
+        except OSError as e:
+            logger.debug(f"failed writing repo index {self.location!r}: {e}")
+            return
+        self._dirty = False
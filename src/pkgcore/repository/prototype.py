@@ -5,6 +5,7 @@ base repository template
 __all__ = ("CategoryLazyFrozenSet", "PackageMapping", "VersionMapping", "tree")
 
 import typing
+from functools import partial
 from pathlib import Path
 
 from snakeoil.klass import jit_attr
@@ -103,6 +104,8 @@ class tree:
 
     Args:
         frozen (bool): controls whether the repository is mutable or immutable
+        index: :obj:`pkgcore.repository.index.TreeIndex` instance backing
+            package and version lookups
 
     Attributes:
         raw_repo: if wrapping a repo, set raw_repo per instance to it
@@ -130,10 +133,15 @@ class tree:
     operations_kls = repo.operations
     pkg_masks = frozenset()
 
-    def __init__(self, frozen=False):
+    def __init__(self, frozen=False, index=None):
+        self.index = index
+        get_packages, get_versions = self._get_packages, self._get_versions
+        if index is not None:
+            get_packages = partial(index.packages, pull=get_packages)
+            get_versions = partial(index.versions, pull=get_versions)
         self.categories = CategoryLazyFrozenSet(self._get_categories)
-        self.packages = PackageMapping(self.categories, self._get_packages)
-        self.versions = VersionMapping(self.packages, self._get_versions)
+        self.packages = PackageMapping(self.categories, get_packages)
+        self.versions = VersionMapping(self.packages, get_versions)
 
         if self.frozen_settable:
             self.frozen = frozen
@@ -15,11 +15,19 @@ class choice_point:
         "_deps",
         "_bdeps",
         "_ideps",
+        "_solutions",
     )
 
-    def __init__(self, a, matches):
+    def __init__(self, a, matches, solutions=None):
+        """
+        :param a: atom the choices are for
+        :param matches: iterable of packages to choose from
+        :param solutions: callable returning the dependency solutions of a
+            package, defaults to :meth:`dep_solutions`
+        """
         self.atom = a
         self.matches = iter(matches)
+        self._solutions = self.dep_solutions if solutions is None else solutions
         self.matches_cur = None
         self.solution_filters = set()
         # match solutions, remaining
@@ -104,17 +112,32 @@ class choice_point:
             else:
                 return round > 0
 
+    @staticmethod
+    def dep_solutions(pkg):
+        """Return the bdepend, depend, rdepend, pdepend and idepend solutions.
+
+        The returned lists must not be modified since they may be shared.
+        """
+        return (
+            pkg.bdepend.cnf_solutions(),
+            pkg.depend.cnf_solutions(),
+            pkg.rdepend.cnf_solutions(),
+            pkg.pdepend.cnf_solutions(),
+            pkg.pdepend.cnf_solutions(),
+        )
+
     def _reset_iters(self):
         """
         Reset bdepend, depend, rdepend, pdepend and idepend properties
         to current matches' related attributes.
         """
-        cur = self.matches_cur
-        self._bdeps = cur.bdepend.cnf_solutions()
-        self._deps = cur.depend.cnf_solutions()
-        self._rdeps = cur.rdepend.cnf_solutions()
-        self._prdeps = cur.pdepend.cnf_solutions()
-        self._ideps = cur.pdepend.cnf_solutions()
+        (
+            self._bdeps,
+            self._deps,
+            self._rdeps,
+            self._prdeps,
+            self._ideps,
+        ) = self._solutions(self.matches_cur)
 
     slot = klass.alias_attr("current_pkg.slot")
     key = klass.alias_attr("current_pkg.key")
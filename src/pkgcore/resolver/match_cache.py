@@ -0,0 +1,142 @@
+"""
+memoized atom matches and choice viability for the resolver
+"""
+
+__all__ = ("MatchCache",)
+
+from itertools import islice
+
+from snakeoil.iterables import caching_iter
+
+from ..util.parse_cache import CacheInfo
+from .choice_point import choice_point
+
+
+class _Stats:
+    __slots__ = ("hits", "misses")
+
+    def __init__(self):
+        self.hits = self.misses = 0
+
+
+class MatchCache:
+    """Resolver cache of atom matches and choice point viability.
+
+    Results are kept across backtracking since they don't depend on the
+    packages added to the plan. Sorted candidates for a repo are fixed
+    throughout resolution, except for repos filtered by the plan's vdb
+    filter which are invalidated whenever the filter changes, i.e. when
+    blockers force vdb packages to be removed or replaced. Viability
+    results, the first candidate left after pruning choices depending on
+    insoluble atoms, are additionally invalidated whenever an atom is
+    marked insoluble.
+
+    :param state: :obj:`pkgcore.resolver.state.plan_state` instance
+    :param insoluble: set of atoms known to be insoluble
+    """
+
+    def __init__(self, state, insoluble):
+        self.state = state
+        self.insoluble = insoluble
+        self._candidates = {}
+        self._viable = {}
+        self._solutions = {}
+        self._stats = {
+            "candidates": _Stats(),
+            "viable": _Stats(),
+            "solutions": _Stats(),
+        }
+
+    def _token(self, volatile):
+        if volatile:
+            return self.state.vdb_filter_generation
+        return None
+
+    def candidates(self, dbs, atom, volatile=False):
+        """Return the sorted packages matching an atom.
+
+        :param dbs: repo to match against
+        :param volatile: whether the repo is filtered by the plan state
+        :return: :obj:`snakeoil.iterables.caching_iter` of packages, matched
+            lazily so unneeded candidates are never loaded
+        """
+        key = (dbs, atom)
+        token = self._token(volatile)
+        stats = self._stats["candidates"]
+        entry = self._candidates.get(key)
+        if entry is not None and entry[0] == token:
+            stats.hits += 1
+            return entry[1]
+        stats.misses += 1
+        pkgs = caching_iter(dbs.itermatch(atom))
+        self._candidates[key] = (token, pkgs)
+        return pkgs
+
+    def choices(self, dbs, atom, volatile=False):
+        """Return a choice point for an atom pruned of insoluble choices.
+
+        :param dbs: repo to match against
+        :param volatile: whether the repo is filtered by the plan state
+        :return: :obj:`pkgcore.resolver.choice_point.choice_point` instance
+            and the sorted matching packages
+        """
+        pkgs = self.candidates(dbs, atom, volatile=volatile)
+        if not pkgs:
+            return choice_point(atom, pkgs, solutions=self.solutions), pkgs
+
+        key = (dbs, atom)
+        token = (self._token(volatile), len(self.insoluble))
+        stats = self._stats["viable"]
+        entry = self._viable.get(key)
+        if entry is not None and entry[0] == token:
+            stats.hits += 1
+            # skip candidates known to be pruned
+            choices = choice_point(
+                atom, islice(pkgs, entry[1], None), solutions=self.solutions
+            )
+            choices.reduce_atoms(self.insoluble)
+            return choices, pkgs
+
+        stats.misses += 1
+        choices = choice_point(atom, pkgs, solutions=self.solutions)
+        choices.reduce_atoms(self.insoluble)
+        if choices:
+            current = choices.current_pkg
+            index = next(i for i, pkg in enumerate(pkgs) if pkg is current)
+        else:
+            index = len(pkgs)
+        self._viable[key] = (token, index)
+        return choices, pkgs
+
+    def solutions(self, pkg):
+        """Return the dependency solutions of a package used by choice points."""
+        stats = self._stats["solutions"]
+        # keyed by identity since equal packages may come from different repos
+        entry = self._solutions.get(id(pkg))
+        if entry is not None:
+            stats.hits += 1
+            return entry[1]
+        stats.misses += 1
+        solutions = choice_point.dep_solutions(pkg)
+        self._solutions[id(pkg)] = (pkg, solutions)
+        return solutions
+
+    def info(self):
+        """Return cache statistics mapped by cache name."""
+        sizes = {
+            "candidates": len(self._candidates),
+            "viable": len(self._viable),
+            "solutions": len(self._solutions),
+        }
+        return {
+            name: CacheInfo(stats.hits, stats.misses, None, sizes[name])
+            for name, stats in self._stats.items()
+        }
+
+    def clear(self):
+        """Drop all cached results, resetting statistics."""
+        self._candidates.clear()
+        self._viable.clear()
+        self._solutions.clear()
+        for stats in self._stats.values():
+            stats.hits = stats.misses = 0
@@ -7,14 +7,15 @@ from functools import partial
 from itertools import chain, filterfalse, islice
 
 from snakeoil.compatibility import cmp, sort_cmp
-from snakeoil.iterables import caching_iter
 
 # XXX: hack; see insert_blockers
 from ..ebuild import atom as _atom
+from ..ebuild.cpv import sort_key
 from ..repository import filtered, misc, multiplex, util
 from ..restrictions import packages, restriction, values
 from . import state
 from .choice_point import choice_point
+from .match_cache import MatchCache
 
 limiters = set(["cycle"])
 
@@ -42,19 +43,11 @@ def highest_iter_sort(l, pkg_grabber=pkg_grabber):
     :return: sorted list of packages
     """
 
-    def f(x, y):
-        c = cmp(x, y)
-        if c:
-            return c
-        elif x.repo.livefs:
-            if y.repo.livefs:
-                return 0
-            return 1
-        elif y.repo.livefs:
-            return -1
-        return 0
+    def key(x):
+        pkg = pkg_grabber(x)
+        return (sort_key(pkg), getattr(pkg.repo, "livefs", False))
 
-    sort_cmp(l, f, key=pkg_grabber, reverse=True)
+    l.sort(key=key, reverse=True)
     return l
 
 
@@ -94,23 +87,15 @@ def lowest_iter_sort(l, pkg_grabber=pkg_grabber):
     :return: sorted list of packages
     """
 
-    def f(x, y):
-        c = cmp(x, y)
-        if c:
-            return c
-        elif x.repo.livefs:
-            if y.repo.livefs:
-                return 0
-            return -1
-        elif y.repo.livefs:
-            return 1
-        return 0
+    def key(x):
+        pkg = pkg_grabber(x)
+        return (sort_key(pkg), not getattr(pkg.repo, "livefs", False))
 
-    sort_cmp(l, f, key=pkg_grabber)
+    l.sort(key=key)
     return l
 
 
-class MutableContainmentRestriction(values.base):
+class MutableContainmentRestriction(values.base, caching=False):
     __slots__ = ("_blacklist", "match")
 
     def __init__(self, blacklist):
@@ -303,6 +288,7 @@ class merge_plan:
         debug=False,
         debug_handle=None,
         pdb_intercept=None,
+        trace=None,
     ):
         if debug:
             if debug_handle is None:
@@ -343,6 +329,7 @@ class merge_plan:
         )
 
         self.insoluble = set()
+        self.match_cache = MatchCache(self.state, self.insoluble)
         self.drop_cycles = drop_cycles
         self.process_built_depends = process_built_depends
         self._debugging = debug
@@ -352,6 +339,10 @@ class merge_plan:
             )
             self._debugging_depth = 0
             self._debugging_drop_cycles = False
+        # optional pkgcore.resolver.trace.ResolverTrace instance
+        self.trace = trace
+        if trace is not None:
+            self._rec_add_atom = partial(self._tracing_rec_add_atom, self._rec_add_atom)
 
     @property
     def forced_restrictions(self):
@@ -383,6 +374,8 @@ class merge_plan:
         stack[-1].events.append(
             ("choice", str(choices.current_pkg), False, msg % msg_args)
         )
+        if self.trace is not None:
+            self.trace.choice_failed(atom, choices.current_pkg, msg % msg_args)
         if msg:
             msg = ": %s" % (msg % msg_args)
         self._dprint(
@@ -465,6 +458,16 @@ class merge_plan:
             self._debugging_drop_cycles = False
         return ret
 
+    def _tracing_rec_add_atom(self, func, atom, stack, dbs, **kwds):
+        trace = self.trace
+        depth = len(stack)
+        start = trace.clock()
+        ret = func(atom, stack, dbs, **kwds)
+        trace.resolved(
+            atom, start, trace.clock(), kwds.get("mode", "none"), depth, bool(ret)
+        )
+        return ret
+
     def _rec_add_atom(self, atom, stack, dbs, mode="none", drop_cycles=False):
         """Add an atom.
 
@@ -582,6 +585,10 @@ class merge_plan:
                 self.notify_choice_failed(
                     stack, atom, choices, "failed inserting: %s", l
                 )
+                if self.trace is not None:
+                    self.trace.backtracked(
+                        atom, choices.current_pkg, f"failed inserting: {l}"
+                    )
                 self.state.backtrack(stack.current_frame.start_point)
                 choices.force_next_pkg()
                 continue
@@ -604,6 +611,8 @@ class merge_plan:
                 "ran out of choices",
             )
         )
+        if self.trace is not None:
+            self.trace.backtracked(atom, None, "ran out of choices")
         self.state.backtrack(stack.current_frame.start_point)
         # saving roll.  if we're allowed to drop cycles, try it again.
         # this needs to be *far* more fine grained also. it'll try
@@ -637,7 +646,7 @@ class merge_plan:
         :param drop_cycles: boolean controlling whether to drop dep cycles
         :param limit_to_vdb: boolean controlling considering pkgs only from the vdb
         :return: 3 possible; None (not viable), True (presolved),
-          :obj:`caching_iter` (not solved, but viable), :obj:`choice_point`
+          tuple of the :obj:`choice_point` and matches (not solved, but viable)
         """
         if self.pdb_intercept.match(atom):
             import pdb
@@ -653,11 +662,18 @@ class merge_plan:
                 ret = ((True,), {"pre_solved": True})
             else:
                 # not in the plan thus far.
-                matches = caching_iter(dbs.itermatch(atom))
+                # ignore what dropped out of the choices due to insoluble
+                # deps, at this juncture we don't care.
+                if self.trace is not None:
+                    start = self.trace.clock()
+                choices, matches = self.match_cache.choices(
+                    dbs, atom, volatile=limit_to_vdb
+                )
+                if self.trace is not None:
+                    self.trace.queried(
+                        atom, start, self.trace.clock(), vdb_limited=limit_to_vdb
+                    )
                 if matches:
-                    choices = choice_point(atom, matches)
-                    # ignore what dropped out, at this juncture we don't care.
-                    choices.reduce_atoms(self.insoluble)
                     if not choices:
                         # and was intractable because it has a hard dep on an
                         # unsolvable atom.
@@ -755,12 +771,18 @@ class merge_plan:
         if depth is None:
             depth = stack.depth
         depset = self.depset_reorder(getattr(choices, attr), attr)
+        # failures can exhaust the choices, so grab the pkg beforehand
+        pkg = choices.current_pkg if self.trace is not None else None
         l = self.process_dependencies(stack, choices, attr, depset, atom)
         if len(l) == 1:
             self._dprint(
                 "resetting for %s%s because of %s: %s",
                 (depth * 2 * " ", atom, attr, l[0]),
             )
+            if self.trace is not None:
+                self.trace.backtracked(
+                    atom, pkg, f"{attr}: {', '.join(map(str, l[0]))}"
+                )
             self.state.backtrack(stack.current_frame.start_point)
             return [], l[0]
 
@@ -983,8 +1005,27 @@ class merge_plan:
         return None
 
     def free_caches(self):
+        """Clear cached matches, returning the statistics of the resolver cache.
+
+        :return: mapping of cache names to
+            :obj:`pkgcore.util.parse_cache.CacheInfo` instances
+        """
         for repo in self.all_raw_dbs:
             repo.clear()
+        info = self.match_cache.info()
+        for name, stats in info.items():
+            total = stats.hits + stats.misses
+            self._dprint(
+                "%s cache: %i hits, %i misses, %.1f%% hit rate",
+                (
+                    name,
+                    stats.hits,
+                    stats.misses,
+                    stats.hits / total * 100 if total else 0,
+                ),
+            )
+        self.match_cache.clear()
+        return info
 
     # selection strategies for atom matches
 
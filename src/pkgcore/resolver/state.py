@@ -25,6 +25,8 @@ class plan_state:
         self.blockers_refcnt = RefCountingSet()
         self.match_atom = self.state.find_atom_matches
         self.vdb_filter = set()
+        # bumped on every vdb_filter change, see MatchCache
+        self.vdb_filter_generation = 0
         self.forced_restrictions = RefCountingSet()
 
     def add_blocker(self, choices, blocker, key=None):
@@ -193,11 +195,13 @@ class remove_op(base_op_state):
         del plan.pkg_choices[self.pkg]
         plan.plan.append(self)
         plan.vdb_filter.add(self.pkg)
+        plan.vdb_filter_generation += 1
 
     def revert(self, plan):
         plan.state.fill_slotting(self.pkg, force=True)
         plan.pkg_choices[self.pkg] = self.choices
         plan.vdb_filter.remove(self.pkg)
+        plan.vdb_filter_generation += 1
 
 
 class replace_op(base_op_state):
@@ -237,6 +241,7 @@ class replace_op(base_op_state):
         plan.pkg_choices[self.pkg] = self.choices
         plan.plan.append(self)
         plan.vdb_filter.add(old)
+        plan.vdb_filter_generation += 1
 
     def revert(self, plan):
         # far simpler, since the apply op generates multiple ops on its own.
@@ -251,6 +256,7 @@ class replace_op(base_op_state):
         del plan.pkg_choices[self.pkg]
         plan.pkg_choices[self.old_pkg] = self.old_choices
         plan.vdb_filter.remove(self.old_pkg)
+        plan.vdb_filter_generation += 1
 
     def __str__(self):
         s = ""
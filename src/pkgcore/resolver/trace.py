@@ -0,0 +1,193 @@
+"""
+structured resolver instrumentation for offline profiling
+"""
+
+__all__ = ("ResolverTrace", "formats")
+
+import json
+import os
+import time
+
+# trace output formats
+formats = ("json", "chrome")
+
+
+class _AtomStats:
+    __slots__ = (
+        "calls",
+        "failures",
+        "time",
+        "choice_failures",
+        "backtracks",
+        "queries",
+        "query_time",
+    )
+
+    def __init__(self):
+        self.calls = self.failures = self.choice_failures = 0
+        self.backtracks = self.queries = 0
+        self.time = self.query_time = 0.0
+
+    def todict(self):
+        return {x: getattr(self, x) for x in self.__slots__}
+
+
+class ResolverTrace:
+    """Recorder of resolver events.
+
+    Pass an instance to :obj:`pkgcore.resolver.plan.merge_plan` via its
+    ``trace`` argument to record the time spent resolving each atom
+    (inclusive of its dependencies), the package choices that failed, the
+    plan being backtracked to try another candidate, and the time spent
+    querying repositories for viable candidates. Results can be exported as JSON
+    including per-atom aggregates or in Chrome's trace event format, viewable
+    via chrome://tracing or https://ui.perfetto.dev.
+
+    :param clock: callable returning the current time in seconds
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.start = clock()
+        # (type, start, end, atom, args) tuples
+        self.events = []
+        self.atoms = {}
+
+    def _stats(self, atom):
+        key = str(atom)
+        stats = self.atoms.get(key)
+        if stats is None:
+            stats = self.atoms[key] = _AtomStats()
+        return stats
+
+    def resolved(self, atom, start, end, mode, depth, failed):
+        """Record the resolution of an atom.
+
+        :param start: time the resolution started
+        :param end: time the resolution ended
+        :param mode: dependency type the atom was pulled in by
+        :param depth: depth of the atom in the resolver stack
+        :param failed: whether the atom couldn't be resolved
+        """
+        stats = self._stats(atom)
+        stats.calls += 1
+        stats.time += end - start
+        if failed:
+            stats.failures += 1
+        self.events.append(
+            (
+                "resolve",
+                start,
+                end,
+                atom,
+                {"mode": mode, "depth": depth, "failed": failed},
+            )
+        )
+
+    def queried(self, atom, start, end, vdb_limited=False):
+        """Record a repository query for the candidates of an atom."""
+        stats = self._stats(atom)
+        stats.queries += 1
+        stats.query_time += end - start
+        self.events.append(("query", start, end, atom, {"vdb_limited": vdb_limited}))
+
+    def _instant(self, kind, atom, pkg, reason):
+        now = self.clock()
+        self.events.append((kind, now, now, atom, {"pkg": str(pkg), "reason": reason}))
+
+    def choice_failed(self, atom, pkg, reason):
+        """Record a package choice that failed.
+
+        :param pkg: package choice that failed
+        :param reason: failure message
+        """
+        self._stats(atom).choice_failures += 1
+        self._instant("choice_failed", atom, pkg, reason)
+
+    def backtracked(self, atom, pkg, reason):
+        """Record the plan being reset to before a package choice was made.
+
+        :param pkg: package choice being backed out
+        :param reason: failure message
+        """
+        self._stats(atom).backtracks += 1
+        self._instant("backtrack", atom, pkg, reason)
+
+    def summary(self):
+        """Return aggregate statistics of the recorded events."""
+        atoms = self.atoms.values()
+        return {
+            "duration": self.clock() - self.start,
+            "atoms": len(self.atoms),
+            "resolutions": sum(x.calls for x in atoms),
+            "failures": sum(x.failures for x in atoms),
+            "choice_failures": sum(x.choice_failures for x in atoms),
+            "backtracks": sum(x.backtracks for x in atoms),
+            "queries": sum(x.queries for x in atoms),
+            "query_time": sum(x.query_time for x in atoms),
+        }
+
+    def slowest(self, limit=None):
+        """Return per-atom statistics sorted by descending resolution time.
+
+        :param limit: maximum number of atoms to return
+        :return: list of (atom, stats dict) tuples
+        """
+        l = sorted(self.atoms.items(), key=lambda x: x[1].time, reverse=True)
+        return [(atom, stats.todict()) for atom, stats in l[:limit]]
+
+    def to_json(self):
+        """Return a JSON compatible dict of the summary, per-atom stats and events."""
+        return {
+            "summary": self.summary(),
+            "atoms": dict(self.slowest()),
+            "events": [
+                {
+                    "type": kind,
+                    "atom": str(atom),
+                    "start": start - self.start,
+                    "duration": end - start,
+                    **args,
+                }
+                for kind, start, end, atom, args in self.events
+            ],
+        }
+
+    def to_chrome(self):
+        """Return a dict in Chrome's trace event format.
+
+        Atom resolutions and repository queries are complete events nested
+        by time while failed choices and backtracks are instant events.
+        """
+        pid = os.getpid()
+        events = []
+        for kind, start, end, atom, args in self.events:
+            event = {
+                "name": str(atom),
+                "cat": kind,
+                "ts": (start - self.start) * 1e6,
+                "pid": pid,
+                "tid": 0,
+                "args": args,
+            }
+            if kind in ("choice_failed", "backtrack"):
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=(end - start) * 1e6)
+            events.append(event)
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": self.summary(),
+        }
+
+    def write(self, f, format="json"):
+        """Write the trace to a file object.
+
+        :param format: output format, either ``json`` or ``chrome``
+        """
+        if format not in formats:
+            raise ValueError(f"unknown trace format: {format!r}")
+        data = self.to_chrome() if format == "chrome" else self.to_json()
+        json.dump(data, f, indent=None if format == "chrome" else 2)
+        f.write("\n")
@@ -86,6 +86,15 @@ class AlwaysBool(base):
     def __setstate__(self, state):
         self.negate, self.type = state
 
+    def __reduce__(self):
+        # reuse cached instances such as packages.AlwaysTrue when unpickling
+        # since they're compared by identity
+        return _always_bool, (self.type, self.negate)
+
+
+def _always_bool(node_type, negate):
+    return AlwaysBool(node_type=node_type, negate=negate)
+
 
 # TODO: fix this so it's cachable.  It *is* cachable.
 class Negate(base, caching=False):
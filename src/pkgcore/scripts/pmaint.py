@@ -13,6 +13,7 @@ from snakeoil.cli import arghparse
 from snakeoil.fileutils import AtomicWriteFile
 from snakeoil.sequences import unique_stable
 
+from ..cache import errors as cache_errors
 from ..cache.flat_hash import md5_cache
 from ..ebuild import repository as ebuild_repo
 from ..ebuild import triggers
@@ -300,6 +301,27 @@ def update_pkg_desc_index(repo, observer):
     return ret
 
 
+def import_md5_cache(repo, out, observer):
+    """Seed a repo's writable database caches from its md5-cache tree"""
+    source = md5_cache(repo.location, readonly=True)
+    if not os.path.isdir(source.location):
+        observer.warn(f"repo {repo}: no md5-cache to import")
+        return 0
+
+    ret = 0
+    for cache in repo.cache:
+        if cache.readonly or not hasattr(cache, "import_cache"):
+            continue
+        try:
+            count = cache.import_cache(source)
+        except cache_errors.CacheError as e:
+            observer.error(f"repo {repo}: failed importing md5-cache: {e}")
+            ret = 1
+            continue
+        out.write(f"imported {count} md5-cache entries for repo {repo}")
+    return ret
+
+
 regen = subparsers.add_parser(
     "regen", parents=shared_options_domain, description="regenerate repository caches"
 )
@@ -336,18 +358,59 @@ regen_opts.add_argument(
         available processors.
     """,
 )
+regen_opts.add_argument(
+    "-j",
+    "--jobs",
+    type=arghparse.positive_int,
+    default=1,
+    help="number of processes to use",
+    docs="""
+        Number of worker processes to use for regeneration. Packages are
+        split between the processes, each running its own ebuild daemons,
+        while cache updates are written by the main process. The threads
+        specified via -t/--threads are divided between the processes.
+    """,
+)
 regen_opts.add_argument(
     "--force",
     action="store_true",
     default=False,
     help="force regeneration to occur regardless of staleness checks or repo settings",
 )
+regen_opts.add_argument(
+    "-i",
+    "--incremental",
+    action="store_true",
+    default=False,
+    help="only regenerate packages changed since the last incremental run",
+    docs="""
+        Record the tree state (ebuild and eclass mtimes along with the
+        eclasses each package inherits) after regeneration and use it on
+        later runs to only regenerate packages with changed ebuilds or that
+        inherit changed eclasses, skipping the cache validation of all other
+        packages. Packages with invalid metadata are always regenerated.
+
+        The first run, or a run with --force, regenerates everything.
+    """,
+)
 regen_opts.add_argument(
     "--dir",
     dest="cache_dir",
     type=arghparse.create_dir,
     help="use separate directory to store repository caches",
 )
+regen_opts.add_argument(
+    "--import-md5-cache",
+    action="store_true",
+    default=False,
+    help="seed database caches from the repo's md5-cache before regenerating",
+    docs="""
+        Convert the repo's existing metadata/md5-cache tree into any writable
+        cache backends supporting bulk imports (e.g. the sqlite backend
+        selected via ``cache-backend = sqlite`` in repos.conf) before running
+        regeneration, so only stale entries need to be regenerated.
+    """,
+)
 regen_opts.add_argument(
     "--rsync",
     action="store_true",
@@ -387,11 +450,15 @@ def regen_main(options, out, err):
             continue
 
         start_time = time.time()
+        if options.import_md5_cache:
+            ret.append(import_md5_cache(repo, out, observer))
         ret.append(
             repo.operations.regen_cache(
                 threads=options.threads,
+                processes=options.jobs,
                 observer=observer,
                 force=options.force,
+                incremental=options.incremental,
                 eclass_caching=(not options.disable_eclass_caching),
             )
         )
@@ -6,10 +6,12 @@ source or binary packages.
 """
 
 import sys
-from functools import partial
+import threading
+from functools import partial, partialmethod
 from textwrap import dedent
 from time import time
 
+from snakeoil.cli import arghparse
 from snakeoil.cli.exceptions import ExitException
 from snakeoil.sequences import iflatten_instance, stable_unique
 from snakeoil.strings import pluralism
@@ -20,8 +22,10 @@ from ..ebuild.atom import atom
 from ..ebuild.misc import run_sanity_checks
 from ..merge import errors as merge_errors
 from ..operations import format, observer
+from ..operations.scheduler import merge_scheduler
 from ..repository.util import get_raw_repos
 from ..repository.virtual import RestrictionRepo
+from ..resolver import trace
 from ..resolver.util import reduce_to_failures
 from ..restrictions import packages
 from ..restrictions.boolean import OrRestriction
@@ -328,6 +332,54 @@ resolution_options.add_argument(
         Force (un)merging on the livefs (vdb), regardless of if it's frozen.
     """,
 )
+resolution_options.add_argument(
+    "-j",
+    "--jobs",
+    type=arghparse.positive_int,
+    default=1,
+    help="number of packages to build concurrently",
+    docs="""
+        Number of packages to build in parallel. Packages are only built once
+        all their dependencies from the resolved plan have been merged and
+        merging into the livefs is always done one package at a time.
+    """,
+)
+resolution_options.add_argument(
+    "-l",
+    "--load-average",
+    type=float,
+    metavar="LOAD",
+    help="don't start new builds while the load average is above LOAD",
+    docs="""
+        When building packages in parallel via -j/--jobs, don't start any new
+        builds while the system load average is at or above the specified
+        value. At least one build is always allowed to run.
+    """,
+)
+resolution_options.add_argument(
+    "--fetch-jobs",
+    type=arghparse.positive_int,
+    default=1,
+    metavar="JOBS",
+    help="number of files to fetch concurrently",
+    docs="""
+        Number of distfiles to download in parallel. When greater than one,
+        the distfiles for the entire resolved plan are fetched up front,
+        before any package is built. Files are still verified by each
+        package's own fetch step, which also handles any failures.
+    """,
+)
+resolution_options.add_argument(
+    "--fetch-host-limit",
+    type=arghparse.positive_int,
+    default=2,
+    metavar="LIMIT",
+    help="max concurrent downloads from a single host",
+    docs="""
+        When fetching in parallel via --fetch-jobs, limit the number of
+        concurrent downloads from any single mirror or upstream host.
+    """,
+)
 
 output_options = argparser.add_argument_group("output options")
 output_options.add_argument(
@@ -394,6 +446,33 @@ debug_options.add_argument(
     """,
 )
 
+debug_options.add_argument(
+    "--resolver-trace",
+    metavar="PATH",
+    help="write resolver profiling data to a file",
+    docs="""
+        Record structured profiling data while resolving and write it to the
+        given path once resolution finishes, whether or not it succeeded.
+
+        The data includes the time spent resolving each atom including its
+        dependencies, choices that failed and forced the resolver to
+        backtrack, and the time spent querying repositories for candidates.
+        See --resolver-trace-format for the supported output formats.
+    """,
+)
+debug_options.add_argument(
+    "--resolver-trace-format",
+    choices=trace.formats,
+    default="json",
+    help="output format for --resolver-trace",
+    docs="""
+        Select the format used for --resolver-trace output. The json format
+        contains summary statistics, per-atom aggregates sorted by resolution
+        time and the raw events, while the chrome format uses Chrome's trace
+        event format viewable via chrome://tracing or https://ui.perfetto.dev.
+    """,
+)
+
 
 class AmbiguousQuery(parserestrict.ParseError):
     """Exception for multiple matches where a single match is required."""
@@ -603,6 +682,209 @@ def update_worldset(world_set, pkg, remove=False):
     world_set.flush()
 
 
+def build_pkg(out, domain, op, options, build_obs, cleanup):
+    """Fetch, build, and localize the package for a merge plan operation.
+
+    :param cleanup: list that functions to run once the op is finished are
+        appended to
+    :return: the package to merge or False if fetching failed; for fetch-only
+        runs True is returned on success
+    :raises ExitException: if building failed, chained to the build error
+    """
+    cleanup.append(op.pkg.release_cached_data)
+
+    if not options.fetchonly and options.debug:
+        out.write("Forcing a clean of workdir")
+
+    pkg_ops = domain.get_pkg_operations(op.pkg, observer=build_obs)
+    out.write(f"\n{len(op.pkg.distfiles)} file{pluralism(op.pkg.distfiles)} required-")
+    if not pkg_ops.run_if_supported("fetch", or_return=True):
+        out.error(f"fetching failed for {op.pkg.cpvstr}")
+        return False
+    if options.fetchonly:
+        return True
+
+    buildop = pkg_ops.run_if_supported("build", or_return=None)
+    pkg = op.pkg
+    if buildop is not None:
+        out.write(f"building {op.pkg.cpvstr}")
+        result = False
+        exc = None
+        try:
+            result = buildop.finalize()
+        except format.BuildError as e:
+            out.error(f"caught exception building {op.pkg.cpvstr}: {e}")
+            exc = e
+        else:
+            if result is False:
+                out.error(f"failed building {op.pkg.cpvstr}")
+        if result is False:
+            raise ExitException(1) from exc
+        pkg = result
+        cleanup.append(pkg.release_cached_data)
+        pkg_ops = domain.get_pkg_operations(pkg, observer=build_obs)
+        cleanup.append(buildop.cleanup)
+
+    cleanup.append(partial(pkg_ops.run_if_supported, "cleanup"))
+    # note the ops aren't reset after localizing, so they could be the wrong
+    # set of ops for the returned pkg.
+    return pkg_ops.run_if_supported("localize", or_return=pkg)
+
+
+def merge_pkg(out, domain, op, pkg, repo_obs, cleanup):
+    """Merge a built package or unmerge a package for a merge plan operation.
+
+    :param pkg: the package returned by :func:`build_pkg`, unused for removals
+    :return: boolean indicating success
+    """
+    if op.desc == "remove":
+        out.write(f">>> Removing {op.pkg.cpvstr}")
+        i = domain.uninstall_pkg(op.pkg, repo_obs)
+    else:
+        out.write()
+        if op.desc == "replace":
+            if op.old_pkg == pkg:
+                out.write(f">>> Reinstalling {pkg.cpvstr}")
+            else:
+                out.write(f">>> Replacing {op.old_pkg.cpvstr} with {pkg.cpvstr}")
+            i = domain.replace_pkg(op.old_pkg, pkg, repo_obs)
+            cleanup.append(op.old_pkg.release_cached_data)
+        else:
+            out.write(f">>> Installing {pkg.cpvstr}")
+            i = domain.install_pkg(pkg, repo_obs)
+
+    try:
+        i.finish()
+    except merge_errors.BlockModification as e:
+        out.error(f"Failed to merge {op.pkg}: {e}")
+        return False
+    return True
+
+
+def prefetch(options, out, domain, changes):
+    """Fetch the distfiles of an entire merge plan concurrently.
+
+    Failures are only reported, they're handled by the fetch step of the
+    related package when it's built.
+
+    :return: list of fetchables that failed
+    """
+    fetchables = []
+    for op in changes:
+        if op.desc == "remove" or getattr(op.pkg, "built", False):
+            continue
+        # fetch restricted packages are handled via pkg_nofetch
+        if "fetch" in op.pkg.restrict:
+            continue
+        fetchables.extend(op.pkg.fetchables)
+    if not fetchables:
+        return []
+
+    out.write(
+        f"\nFetching {len(fetchables)} file{pluralism(fetchables)} "
+        f"using {options.fetch_jobs} jobs"
+    )
+    fetch_obs = observer.phase_observer(
+        observer.formatter_output(_threadsafe_formatter(out)), debug=options.debug
+    )
+    fetcher = format.fetch_base(
+        domain,
+        None,
+        fetchables,
+        jobs=options.fetch_jobs,
+        host_limit=options.fetch_host_limit,
+    )
+    _verified, failures = fetcher.fetch_all(fetch_obs)
+    for fetchable in failures:
+        out.warn(f"failed fetching {fetchable.filename}")
+    return failures
+
+
+class _threadsafe_formatter:
+    """Formatter proxy serializing output from concurrently running jobs."""
+
+    def __init__(self, out):
+        self._out = out
+        self._lock = threading.RLock()
+
+    def __getattr__(self, attr):
+        return getattr(self._out, attr)
+
+    def _locked(self, attr, *args, **kwargs):
+        with self._lock:
+            return getattr(self._out, attr)(*args, **kwargs)
+
+    write = partialmethod(_locked, "write")
+    error = partialmethod(_locked, "error")
+    warn = partialmethod(_locked, "warn")
+    title = partialmethod(_locked, "title")
+    flush = partialmethod(_locked, "flush")
+
+
+def parallel_merge(options, out, domain, changes, merge_func):
+    """Build changes concurrently, merging them one at a time as they finish.
+
+    :param merge_func: callable taking an output formatter, repo observer, op,
+        built package, and cleanup list that merges the package, returning a
+        boolean indicating success
+    """
+    out = _threadsafe_formatter(out)
+    build_obs = observer.phase_observer(
+        observer.formatter_output(out), debug=options.debug
+    )
+    repo_obs = observer.repo_observer(
+        observer.formatter_output(out), debug=options.debug
+    )
+    job_cleanups = {}
+    merge_count = 0
+
+    def build(op):
+        cleanup = job_cleanups[id(op)] = []
+        try:
+            return build_pkg(out, domain, op, options, build_obs, cleanup)
+        except ExitException:
+            # the failure was already reported
+            return False
+
+    def merge(op, pkg):
+        nonlocal merge_count
+        merge_count += 1
+        out.write(
+            f"\nMerging {merge_count} of {len(changes)}: {op.pkg.cpvstr}::{op.pkg.repo}"
+        )
+        out.title(f"{merge_count}/{len(changes)}: {op.pkg.cpvstr}")
+        cleanup = job_cleanups.pop(id(op), [])
+        try:
+            return merge_func(out, repo_obs, op, pkg, cleanup)
+        finally:
+            for func in cleanup:
+                func()
+
+    scheduler = merge_scheduler(
+        changes,
+        jobs=options.jobs,
+        load_average=options.load_average,
+        observer=build_obs,
+        keep_going=options.ignore_failures,
+    )
+    try:
+        failures = scheduler.run(build, merge)
+    finally:
+        # release data held by jobs that were built but never merged
+        for cleanup in job_cleanups.values():
+            for func in cleanup:
+                func()
+
+    if failures:
+        out.write()
+        out.error(
+            "failed processing: %s" % ", ".join(str(j) for j in failures),
+        )
+        if not options.ignore_failures:
+            return 1
+    return 0
+
+
 @argparser.bind_final_check
 def _validate(parser, namespace):
     # nothing to validate if listing pkgsets
@@ -902,6 +1184,8 @@ def main(options, out, err):
     #    hp.setrelheap()
 
     extra_kwargs["pdb_intercept"] = tuple(x[1] for x in options.pdb_intercept)
+    if options.resolver_trace is not None:
+        extra_kwargs["trace"] = trace.ResolverTrace()
 
     resolver_inst = options.resolver_kls(
         vdbs=installed_repos,
@@ -939,6 +1223,23 @@ def main(options, out, err):
         ret = resolver_inst.add_atoms(atoms, finalize=True)
     resolve_time = time() - resolve_time
 
+    if options.resolver_trace is not None:
+        try:
+            with open(options.resolver_trace, "w") as f:
+                resolver_inst.trace.write(f, format=options.resolver_trace_format)
+        except OSError as e:
+            out.error(f"failed writing resolver trace: {e}")
+            return 1
+        summary = resolver_inst.trace.summary()
+        out.write(
+            out.bold,
+            " * ",
+            out.reset,
+            f"wrote resolver trace to {options.resolver_trace!r}: "
+            f"{summary['resolutions']} resolutions, "
+            f"{summary['backtracks']} backtracks",
+        )
+
     if failures:
         out.write()
         out.write("Failures encountered:")
@@ -1094,6 +1395,32 @@ def main(options, out, err):
 
     change_count = len(changes)
 
+    def merge(out, repo_obs, op, pkg, cleanup):
+        if not merge_pkg(out, domain, op, pkg, repo_obs, cleanup):
+            return False
+
+        if world_set is not None:
+            if op.desc == "remove":
+                out.write(f">>> Removing {op.pkg.cpvstr} from world file")
+                removal_pkg = slotatom_if_slotted(
+                    source_repos.combined, op.pkg.versioned_atom
+                )
+                update_worldset(world_set, removal_pkg, remove=True)
+            elif not options.oneshot and any(x.match(op.pkg) for x in atoms):
+                if not (options.upgrade or options.downgrade):
+                    out.write(f">>> Adding {op.pkg.cpvstr} to world file")
+                    add_pkg = slotatom_if_slotted(
+                        source_repos.combined, op.pkg.versioned_atom
+                    )
+                    update_worldset(world_set, add_pkg)
+        return True
+
+    if options.fetch_jobs > 1:
+        prefetch(options, out, domain, changes)
+
+    if options.jobs > 1 and not options.fetchonly:
+        return parallel_merge(options, out, domain, changes, merge)
+
     # left in place for ease of debugging.
     cleanup = []
     try:
@@ -1108,102 +1435,26 @@ def main(options, out, err):
                 f"{op.pkg.cpvstr}::{op.pkg.repo}"
             )
             out.title(f"{count + 1}/{change_count}: {op.pkg.cpvstr}")
+            pkg = None
             if op.desc != "remove":
-                cleanup.append(op.pkg.release_cached_data)
-
-                if not options.fetchonly and options.debug:
-                    out.write("Forcing a clean of workdir")
-
-                pkg_ops = domain.get_pkg_operations(op.pkg, observer=build_obs)
-                out.write(
-                    f"\n{len(op.pkg.distfiles)} file{pluralism(op.pkg.distfiles)} required-"
-                )
-                if not pkg_ops.run_if_supported("fetch", or_return=True):
-                    out.error(f"fetching failed for {op.pkg.cpvstr}")
+                try:
+                    pkg = build_pkg(out, domain, op, options, build_obs, cleanup)
+                except ExitException:
+                    if not options.ignore_failures:
+                        raise
+                    continue
+                if pkg is False:
                     if not options.ignore_failures:
                         return 1
                     continue
                 if options.fetchonly:
                     continue
 
-                buildop = pkg_ops.run_if_supported("build", or_return=None)
-                pkg = op.pkg
-                if buildop is not None:
-                    out.write(f"building {op.pkg.cpvstr}")
-                    result = False
-                    exc = None
-                    try:
-                        result = buildop.finalize()
-                    except format.BuildError as e:
-                        out.error(f"caught exception building {op.pkg.cpvstr}: {e}")
-                        exc = e
-                    else:
-                        if result is False:
-                            out.error(f"failed building {op.pkg.cpvstr}")
-                    if result is False:
-                        if not options.ignore_failures:
-                            raise ExitException(1) from exc
-                        continue
-                    pkg = result
-                    cleanup.append(pkg.release_cached_data)
-                    pkg_ops = domain.get_pkg_operations(pkg, observer=build_obs)
-                    cleanup.append(buildop.cleanup)
-
-                cleanup.append(partial(pkg_ops.run_if_supported, "cleanup"))
-                pkg = pkg_ops.run_if_supported("localize", or_return=pkg)
-                # wipe this to ensure we don't inadvertantly use it further down;
-                # we aren't resetting it after localizing, so could have the wrong
-                # set of ops.
-                del pkg_ops
-
-                out.write()
-                if op.desc == "replace":
-                    if op.old_pkg == pkg:
-                        out.write(f">>> Reinstalling {pkg.cpvstr}")
-                    else:
-                        out.write(
-                            f">>> Replacing {op.old_pkg.cpvstr} with {pkg.cpvstr}"
-                        )
-                    i = domain.replace_pkg(op.old_pkg, pkg, repo_obs)
-                    cleanup.append(op.old_pkg.release_cached_data)
-                else:
-                    out.write(f">>> Installing {pkg.cpvstr}")
-                    i = domain.install_pkg(pkg, repo_obs)
-
-                # force this explicitly- can hold onto a helluva lot more
-                # then we would like.
-            else:
-                out.write(f">>> Removing {op.pkg.cpvstr}")
-                i = domain.uninstall_pkg(op.pkg, repo_obs)
-            try:
-                ret = i.finish()
-            except merge_errors.BlockModification as e:
-                out.error(f"Failed to merge {op.pkg}: {e}")
+            if not merge(out, repo_obs, op, pkg, cleanup):
                 if not options.ignore_failures:
                     return 1
                 continue
 
-            # while this does get handled through each loop, wipe it now; we don't need
-            # that data, thus we punt it now to keep memory down.
-            # for safety sake, we let the next pass trigger a release also-
-            # mainly to protect against any code following triggering reloads
-            # basically, be protective
-
-            if world_set is not None:
-                if op.desc == "remove":
-                    out.write(f">>> Removing {op.pkg.cpvstr} from world file")
-                    removal_pkg = slotatom_if_slotted(
-                        source_repos.combined, op.pkg.versioned_atom
-                    )
-                    update_worldset(world_set, removal_pkg, remove=True)
-                elif not options.oneshot and any(x.match(op.pkg) for x in atoms):
-                    if not (options.upgrade or options.downgrade):
-                        out.write(f">>> Adding {op.pkg.cpvstr} to world file")
-                        add_pkg = slotatom_if_slotted(
-                            source_repos.combined, op.pkg.versioned_atom
-                        )
-                        update_worldset(world_set, add_pkg)
-
     #    again... left in place for ease of debugging.
     #    except KeyboardInterrupt:
     #        import pdb;pdb.set_trace()
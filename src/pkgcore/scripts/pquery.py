@@ -26,6 +26,7 @@ from snakeoil.osutils import sizeof_fmt
 from snakeoil.sequences import unique_stable
 
 from ..ebuild import atom, conditionals
+from ..ebuild.restricts import RepositoryDep
 from ..fs import fs as fs_module
 from ..repository import multiplex
 from ..repository.util import get_raw_repos, get_virtual_repos
@@ -903,29 +904,78 @@ def parse_eapi(value):
     return packages.PackageRestriction("eapi", values.StrExactMatch(value))
 
 
-@bind_add_query("--owns", action="append", help="exact match on an owned file/dir")
-def parse_owns(value):
-    return packages.PackageRestriction(
-        "contents",
-        values.AnyMatch(
-            values.GetAttrRestriction("location", values.StrExactMatch(value))
-        ),
-    )
+def _owners_restrict(repos, lookup, fallback):
+    """Create a package ownership restriction.
+
+    Repos providing a file ownership index are queried directly, avoiding
+    the need to load the contents of every package.
+    """
+    if not any(hasattr(repo, "owners_index") for repo in repos):
+        return fallback
+    restricts = []
+    for repo in repos:
+        if (index := getattr(repo, "owners_index", None)) is not None:
+            owners = frozenset(lookup(index))
+            restrict = packages.PackageRestriction(
+                "cpvstr", values.FunctionRestriction(owners.__contains__)
+            )
+        else:
+            restrict = fallback
+        restricts.append(packages.AndRestriction(RepositoryDep(repo.repo_id), restrict))
+    return packages.OrRestriction(*restricts)
 
 
 @bind_add_query(
-    "--owns-re", action="append", help='like "owns" but using a regexp for matching'
+    "--owns",
+    action="append",
+    bind="final_converter",
+    type=None,
+    help="exact match on an owned file/dir",
 )
-def parse_ownsre(value):
-    """Value is a regexp matched against the string form of an fs object.
+def owns_finalize(paths, namespace):
+    if not paths:
+        return []
+    repos = get_raw_repos(namespace.repos)
+    return [
+        _owners_restrict(
+            repos,
+            lambda index: index.owners(path),
+            packages.PackageRestriction(
+                "contents",
+                values.AnyMatch(
+                    values.GetAttrRestriction("location", values.StrExactMatch(path))
+                ),
+            ),
+        )
+        for path in paths
+    ]
 
-    This means the object kind is prepended to the path the regexp has
-    to match.
-    """
-    return packages.PackageRestriction(
-        "contents",
-        values.AnyMatch(values.GetAttrRestriction("location", values.StrRegex(value))),
-    )
+
+@bind_add_query(
+    "--owns-re",
+    action="append",
+    bind="final_converter",
+    type=None,
+    help='like "owns" but using a regexp for matching',
+)
+def owns_re_finalize(regexes, namespace):
+    """Values are regexps searched for in the paths of owned fs objects."""
+    if not regexes:
+        return []
+    repos = get_raw_repos(namespace.repos)
+    return [
+        _owners_restrict(
+            repos,
+            lambda index: index.owners_re(regex),
+            packages.PackageRestriction(
+                "contents",
+                values.AnyMatch(
+                    values.GetAttrRestriction("location", values.StrRegex(regex))
+                ),
+            ),
+        )
+        for regex in regexes
+    ]
 
 
 @bind_add_query("--maintainer", action="append", help="regex to search for maintainers")
@@ -0,0 +1,80 @@
+"""
+single pass checksumming of files, parallelized across files
+"""
+
+__all__ = ("get_chksums", "chksum_files")
+
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from snakeoil import chksum
+from snakeoil.data_source import local_source
+
+# size of the chunks fed to all hashes in turn while the chunk is still cached
+blocksize = 2**20
+# files at least this large are mapped instead of read
+mmap_threshold = 2**24
+
+
+def _update(updaters, data):
+    for updater in updaters:
+        updater.update(data)
+
+
+def get_chksums(location, *chfs):
+    """Generate multiple checksums for a file, reading it only once.
+
+    Large files are mmap'ed while smaller ones are read in blocks; either way
+    each block is fed to all hashes before moving on to the next. This is a
+    drop-in replacement for :py:func:`snakeoil.chksum.get_chksums`, data
+    sources not backed by a local file are passed through to it.
+
+    :param location: path to the file or data source
+    :param chfs: names of the checksums to generate
+    :return: list of checksums matching the order of the requested checksums
+    """
+    if isinstance(location, local_source):
+        location = location.path
+    elif not isinstance(location, str):
+        return chksum.get_chksums(location, *chfs)
+    if not chfs:
+        return []
+    handlers = chksum.get_handlers(chfs)
+    updaters = [handlers[chf].new()() for chf in chfs]
+    with open(location, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= mmap_threshold:
+            with (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m,
+                memoryview(m) as view,
+            ):
+                for offset in range(0, len(view), blocksize):
+                    with view[offset : offset + blocksize] as data:
+                        _update(updaters, data)
+        else:
+            while data := f.read(blocksize):
+                _update(updaters, data)
+    return [int(updater.hexdigest(), 16) for updater in updaters]
+
+
+def chksum_files(locations, chfs, jobs=None):
+    """Generate checksums for multiple files concurrently.
+
+    Hashing releases the GIL so threads are used, with each file handled by a
+    single worker via :py:func:`get_chksums`.
+
+    :param locations: file paths to checksum
+    :param chfs: names of the checksums to generate
+    :param jobs: max number of files to process in parallel, defaults to the
+        number of CPUs
+    :return: list of checksum lists matching the order of the locations
+    """
+    locations = list(locations)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(locations))
+    if jobs <= 1:
+        return [get_chksums(x, *chfs) for x in locations]
+    with ThreadPoolExecutor(jobs, thread_name_prefix="chksum") as executor:
+        return list(executor.map(lambda x: get_chksums(x, *chfs), locations))
@@ -0,0 +1,179 @@
+"""
+bounded instance caches for interning parsed objects
+"""
+
+__all__ = (
+    "ParseCache",
+    "LRUCache",
+    "CacheInfo",
+    "cache_info",
+    "clear",
+    "default_maxsize",
+    "resize",
+)
+
+import os
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple("CacheInfo", ("hits", "misses", "maxsize", "currsize"))
+
+# registered caches by name
+_caches = {}
+
+
+def default_maxsize(default=10000):
+    """Return the default cache size, overridable via PKGCORE_PARSE_CACHE_SIZE."""
+    try:
+        return max(0, int(os.environ.get("PKGCORE_PARSE_CACHE_SIZE", default)))
+    except ValueError:
+        return default
+
+
+class ParseCache:
+    """Instance cache interning objects created from the same arguments.
+
+    Usable as the ``__instance_cache__`` of weakly cached classes (see
+    :py:mod:`snakeoil.klass.memoize`) or directly via :meth:`get` and item
+    assignment. All live instances are tracked
+    via weak references so identical arguments always map to the same
+    instance while it exists, and the most recently used instances are
+    pinned in memory up to a size bound so commonly reused objects don't have
+    to be reparsed after being dropped by their users.
+
+    :param name: name the cache is registered under, see :func:`cache_info`
+    :param maxsize: maximum number of instances kept alive by the cache,
+        0 disables pinning leaving only weak interning
+    """
+
+    def __init__(self, name, maxsize=None):
+        self.name = name
+        self.maxsize = default_maxsize() if maxsize is None else maxsize
+        self.hits = 0
+        self.misses = 0
+        self._weak = weakref.WeakValueDictionary()
+        self._pinned = OrderedDict()
+        self._lock = threading.Lock()
+        _caches[name] = self
+
+    def get(self, key, default=None):
+        obj = self._weak.get(key)
+        if obj is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        if self.maxsize:
+            with self._lock:
+                self._pin(key, obj)
+        return obj
+
+    def __setitem__(self, key, obj):
+        self._weak[key] = obj
+        if self.maxsize:
+            with self._lock:
+                self._pin(key, obj)
+
+    def _pin(self, key, obj):
+        pinned = self._pinned
+        pinned[key] = obj
+        pinned.move_to_end(key)
+        while len(pinned) > self.maxsize:
+            pinned.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._weak
+
+    def __len__(self):
+        return len(self._weak)
+
+    def resize(self, maxsize):
+        """Change the number of instances kept alive by the cache."""
+        with self._lock:
+            self.maxsize = maxsize
+            pinned = self._pinned
+            while len(pinned) > maxsize:
+                pinned.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached instances and reset statistics."""
+        with self._lock:
+            self._pinned.clear()
+            self._weak.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        """Return cache statistics."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._pinned))
+
+
+class LRUCache:
+    """Bounded mapping of computed values evicting the least recently used.
+
+    Unlike :class:`ParseCache` values are held strongly and aren't
+    registered globally, making it suitable for per instance caches of
+    derived data.
+
+    :param maxsize: maximum number of entries, 0 disables caching
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = default_maxsize() if maxsize is None else maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            data = self._data
+            data[key] = value
+            data.move_to_end(key)
+            while len(data) > self.maxsize:
+                data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """Drop all entries and reset statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        """Return cache statistics."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
+def cache_info():
+    """Return the statistics of all registered caches mapped by name."""
+    return {name: cache.info() for name, cache in _caches.items()}
+
+
+def resize(maxsize):
+    """Change the size bound of all registered caches."""
+    for cache in _caches.values():
+        cache.resize(maxsize)
+
+
+def clear():
+    """Drop all instances and statistics from all registered caches."""
+    for cache in _caches.values():
+        cache.clear()
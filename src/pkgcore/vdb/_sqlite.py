@@ -0,0 +1,169 @@
+"""
+shared support for SQLite backed vdb indexes
+"""
+
+__all__ = ("SqliteIndex",)
+
+import os
+import sqlite3
+import threading
+from os.path import join as pjoin
+from urllib.parse import quote
+
+from snakeoil.osutils import ensure_dirs
+
+from ..log import logger
+
+
+class SqliteIndex:
+    """Base class for SQLite databases indexing per package vdb data.
+
+    Indexes are validated via the vdb directory's mtime, which is updated on
+    every merge and unmerge, while each package's entry records the mtime of
+    its vdb directory. If the database can't be written, e.g. when running
+    as a regular user, an in-memory copy of any existing one is used instead.
+
+    Subclasses implement :meth:`_refresh` to update an outdated index.
+
+    Subclasses define the schema via :attr:`tables`, which must include the
+    ``info`` table, and :attr:`filename`, the default database name.
+
+    :param repo: vdb repository to index
+    :param location: path to the index database
+    """
+
+    schema_version = "1"
+    filename = None
+    # description used in log messages
+    description = "index"
+    tables = ""
+
+    def __init__(self, repo, location=None):
+        self.repo = repo
+        if location is None:
+            location = pjoin(repo.location, ".pkgcore", self.filename)
+        self.location = location
+        self._lock = threading.RLock()
+        self._db = None
+
+    @property
+    def connection(self):
+        """SQLite connection to the index, opened on first access."""
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._connect()
+        return self._db
+
+    def _connect(self):
+        try:
+            ensure_dirs(os.path.dirname(self.location), mode=0o755)
+            db = sqlite3.connect(self.location, check_same_thread=False)
+            try:
+                self._create_tables(db)
+            except BaseException:
+                db.close()
+                raise
+            return db
+        except (OSError, sqlite3.Error) as e:
+            logger.debug(f"failed opening {self.description} {self.location!r}: {e}")
+        return self._memory_copy()
+
+    def _memory_copy(self):
+        """Return an in-memory copy of any existing database."""
+        db = sqlite3.connect(":memory:", check_same_thread=False)
+        if os.path.exists(self.location):
+            try:
+                src = sqlite3.connect(f"file:{quote(self.location)}?mode=ro", uri=True)
+                try:
+                    src.backup(db)
+                finally:
+                    src.close()
+                self._check_schema(db)
+            except sqlite3.Error as e:
+                logger.debug(
+                    f"failed reading {self.description} {self.location!r}: {e}"
+                )
+                db.close()
+                db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._create_tables(db)
+        return db
+
+    def _create_tables(self, db):
+        try:
+            self._check_schema(db)
+        except sqlite3.Error:
+            pass
+        else:
+            # Opening a database without write access succeeds, leaving it
+            # read-only; probe for that with a no-op write.
+            with db:
+                db.execute("DELETE FROM info WHERE key = 'probe'")
+            return
+        with db:
+            db.executescript(self.tables)
+            db.execute("INSERT INTO info VALUES ('version', ?)", (self.schema_version,))
+
+    def _check_schema(self, db):
+        row = db.execute("SELECT value FROM info WHERE key = 'version'").fetchone()
+        if row is None or row[0] != self.schema_version:
+            raise sqlite3.DatabaseError("unsupported schema version")
+
+    def _vdb_mtime(self):
+        try:
+            return os.stat(self.repo.location).st_mtime_ns
+        except OSError:
+            return None
+
+    def _pkg_mtime(self, cpv):
+        try:
+            return os.stat(pjoin(self.repo.location, cpv)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _set_mtime(self, db, mtime):
+        db.execute(
+            "INSERT OR REPLACE INTO info VALUES ('mtime', ?)",
+            (None if mtime is None else str(mtime),),
+        )
+
+    def is_current(self):
+        """Determine if the index matches the current vdb state."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value FROM info WHERE key = 'mtime'"
+            ).fetchone()
+        mtime = self._vdb_mtime()
+        return row is not None and mtime is not None and row[0] == str(mtime)
+
+    def _refresh(self, db):
+        """Update the outdated index to match the vdb in a single transaction."""
+        raise NotImplementedError(self, "_refresh")
+
+    def refresh(self):
+        """Update the index to match the vdb if it's outdated.
+
+        If the database can't be updated, e.g. due to it being locked, an
+        in-memory copy is updated and used instead.
+        """
+        with self._lock:
+            try:
+                if self.is_current():
+                    return
+                self._refresh(self.connection)
+            except sqlite3.Error as e:
+                logger.warning(
+                    f"failed updating {self.description} {self.location!r}, "
+                    f"using an in-memory copy: {e}"
+                )
+                self.close()
+                self._db = self._memory_copy()
+                if not self.is_current():
+                    self._refresh(self._db)
+
+    def close(self):
+        """Close the index database connection."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,7 +1,10 @@
-__all__ = ("LookupFsDev", "ContentsFile")
+__all__ = ("LookupFsDev", "ContentsFile", "ContentsIndex", "write_index")
 
 import os
 import stat
+import struct
+from contextlib import contextmanager
+from os.path import normpath
 
 from snakeoil import data_source
 from snakeoil.chksum import get_handler
@@ -9,7 +12,9 @@ from snakeoil.fileutils import AtomicWriteFile, readlines_utf8
 
 from .. import os_data
 from ..fs import fs
-from ..fs.contents import contentsSet
+from ..fs.contents import CompactContentsSet
+from ..fs.livefs import fill_chksums
+from ..log import logger
 
 
 class LookupFsDev(fs.fsDev):
@@ -33,20 +38,306 @@ class LookupFsDev(fs.fsDev):
         super().__init__(path, **kwds)
 
 
-class ContentsFile(contentsSet):
-    """class wrapping a contents file"""
+def _line_location(line):
+    """Return the location of a CONTENTS entry."""
+    s = line.split(" ")
+    if s[0] == "obj":
+        return normpath(" ".join(s[1:-2]))
+    elif s[0] == "sym":
+        return normpath(" ".join(s[1 : s.index("->")]))
+    return normpath(" ".join(s[1:]))
+
+
+class ContentsIndex:
+    """Binary index of a CONTENTS file.
+
+    The index holds the CONTENTS entries sorted by location with a table of
+    fixed size records pointing at them, allowing point lookups and prefix
+    scans via binary search without parsing all entries. It records the
+    size, mtime and inode of the CONTENTS file it was generated from and is
+    rejected if those don't match anymore.
+
+    Only the record table is kept in memory; entries are read from the index
+    file on demand so no file descriptors are held open between lookups.
+    Lookups raise :obj:`ValueError` if the index was replaced since it was
+    loaded and :obj:`OSError` if it was removed.
+
+    :param path: path to the CONTENTS file
+    :raise ValueError: if the index is outdated or invalid
+    :raise OSError: if the index or CONTENTS file can't be read
+    """
+
+    magic = b"PKGCIDX\0"
+    version = 1
+    suffix = ".index"
+    # magic, version, entry count, CONTENTS size, mtime and inode
+    _header = struct.Struct("<8sIIQQQ")
+    # offset, location length, line length
+    _record = struct.Struct("<QII")
+
+    def __init__(self, path):
+        st = os.stat(path)
+        self._path = path + self.suffix
+        with open(self._path, "rb") as f:
+            index_st = os.fstat(f.fileno())
+            header = f.read(self._header.size)
+            if len(header) < self._header.size:
+                raise ValueError("truncated header")
+            magic, version, self._count, *stamp = self._header.unpack(header)
+            if magic != self.magic or version != self.version:
+                raise ValueError("unsupported format")
+            if stamp != self._stamp(st):
+                raise ValueError("outdated")
+            self._records = f.read(self._count * self._record.size)
+        if len(self._records) < self._count * self._record.size:
+            raise ValueError("truncated record table")
+        if self._count and index_st.st_size < self._entry(self._count - 1)[2]:
+            raise ValueError("truncated entries")
+        self._index_stamp = self._stamp(index_st)
+
+    @classmethod
+    def load(cls, path):
+        """Return the index for a CONTENTS file or None if it isn't usable."""
+        try:
+            return cls(path)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.debug(f"ignoring CONTENTS index for {path!r}: {e}")
+        return None
+
+    @staticmethod
+    def _stamp(st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def _entry(self, i):
+        offset, location_len, line_len = self._record.unpack_from(
+            self._records, i * self._record.size
+        )
+        return offset, offset + location_len, offset + location_len + line_len
+
+    @contextmanager
+    def _open(self):
+        fd = os.open(self._path, os.O_RDONLY)
+        try:
+            if self._stamp(os.fstat(fd)) != self._index_stamp:
+                raise ValueError(f"CONTENTS index changed: {self._path!r}")
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _read_location(self, fd, i):
+        start, end, _ = self._entry(i)
+        return os.pread(fd, end - start, start)
+
+    def _read_entries(self, lo, hi):
+        """Return the (location, line) pairs of the entries in [lo, hi)."""
+        if lo >= hi:
+            return []
+        base = self._entry(lo)[0]
+        with self._open() as fd:
+            data = os.pread(fd, self._entry(hi - 1)[2] - base, base)
+        entries = []
+        for i in range(lo, hi):
+            start, end, line_end = (x - base for x in self._entry(i))
+            entries.append((data[start:end], data[end:line_end].decode()))
+        return entries
+
+    def _bisect(self, fd, location):
+        # utf8 encoded locations sort the same as their str counterparts
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._read_location(fd, mid) < location:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __len__(self):
+        return self._count
+
+    def lookup(self, location):
+        """Return the CONTENTS line of a location or None if it doesn't exist."""
+        location = location.encode()
+        with self._open() as fd:
+            i = self._bisect(fd, location)
+            if i < self._count and self._read_location(fd, i) == location:
+                _, start, end = self._entry(i)
+                return os.pread(fd, end - start, start).decode()
+        return None
+
+    def range(self, start, end):
+        """Iterate over the CONTENTS lines of the locations in [start, end)."""
+        with self._open() as fd:
+            lo = self._bisect(fd, start.encode())
+            hi = self._bisect(fd, end.encode())
+        return (line for _, line in self._read_entries(lo, hi))
+
+    def locations(self):
+        """Iterate over all locations in sorted order."""
+        return (x.decode() for x, _ in self._read_entries(0, self._count))
+
+    def lines(self):
+        """Iterate over all CONTENTS lines sorted by location."""
+        return (line for _, line in self._read_entries(0, self._count))
+
+
+def write_index(path):
+    """Write the binary index for a CONTENTS file.
+
+    :param path: path to the CONTENTS file
+    """
+    st = os.stat(path)
+    entries = sorted(
+        (_line_location(line).encode(), line.encode())
+        for line in readlines_utf8(path, True)
+        if line
+    )
+    header, record = ContentsIndex._header, ContentsIndex._record
+    offset = header.size + len(entries) * record.size
+    f = AtomicWriteFile(path + ContentsIndex.suffix, binary=True)
+    try:
+        f.write(
+            header.pack(
+                ContentsIndex.magic,
+                ContentsIndex.version,
+                len(entries),
+                *ContentsIndex._stamp(st),
+            )
+        )
+        for location, line in entries:
+            f.write(record.pack(offset, len(location), len(line)))
+            offset += len(location) + len(line)
+        for location, line in entries:
+            f.write(location)
+            f.write(line)
+        f.close()
+    except BaseException:
+        f.discard()
+        raise
+
+
+class ContentsFile(CompactContentsSet):
+    """class wrapping a contents file
+
+    If a file path is used and an up to date :obj:`ContentsIndex` exists for
+    it, the CONTENTS entries are only loaded on first use of anything besides
+    iteration, length, membership, item and child node lookups which are
+    handled by the index directly.
+    """
 
     def __init__(self, source, mutable=False, create=False):
         if not isinstance(source, (data_source.base, str)):
             raise TypeError("source must be either data_source, or a filepath")
-        super().__init__(mutable=True)
         self._source = source
+        self._contents_index = None
+        if not create and isinstance(source, str):
+            self._contents_index = ContentsIndex.load(source)
 
-        if not create:
-            self.update(self._iter_contents())
+        if self._contents_index is None:
+            super().__init__(mutable=True)
+            if not create:
+                self.update(self._iter_contents())
 
         self.mutable = mutable
 
+    def __getattr__(self, attr):
+        # entries are loaded from the index on first use
+        if (
+            attr in self._column_names
+            and self.__dict__.get("_contents_index") is not None
+        ):
+            self._load()
+            return getattr(self, attr)
+        raise AttributeError(attr)
+
+    def _load(self, index_error=None):
+        """Load all entries, parsing the CONTENTS file if the index failed.
+
+        :param index_error: exception raised by a failed index lookup
+        """
+        index = self._contents_index
+        self._contents_index = None
+        mutable = self.mutable
+        super().__init__(mutable=True)
+        if index_error is None:
+            try:
+                self.update(map(self._parse_line, index.lines()))
+            except (OSError, ValueError) as e:
+                index_error = e
+        if index_error is not None:
+            # the index was changed or removed since it was loaded
+            logger.debug(f"ignoring CONTENTS index for {self._source!r}: {index_error}")
+            self.update(self._iter_contents())
+        self.mutable = mutable
+
+    def _unloaded_index(self):
+        """Return the index if the entries haven't been loaded yet."""
+        if "_paths" in self.__dict__:
+            return None
+        return self._contents_index
+
+    def __contains__(self, key):
+        if (index := self._unloaded_index()) is not None:
+            location = key.location if fs.isfs_obj(key) else normpath(key)
+            try:
+                return index.lookup(location) is not None
+            except (OSError, ValueError) as e:
+                self._load(e)
+        return super().__contains__(key)
+
+    def __getitem__(self, obj):
+        if (index := self._unloaded_index()) is not None:
+            location = obj.location if fs.isfs_obj(obj) else normpath(obj)
+            try:
+                line = index.lookup(location)
+            except (OSError, ValueError) as e:
+                self._load(e)
+            else:
+                if line is None:
+                    raise KeyError(obj)
+                return self._parse_line(line)
+        return super().__getitem__(obj)
+
+    def __iter__(self):
+        if (index := self._unloaded_index()) is not None:
+            try:
+                return map(self._parse_line, index.lines())
+            except (OSError, ValueError) as e:
+                self._load(e)
+        return super().__iter__()
+
+    def _iter_locations(self):
+        if (index := self._unloaded_index()) is not None:
+            try:
+                return index.locations()
+            except (OSError, ValueError) as e:
+                self._load(e)
+        return super()._iter_locations()
+
+    def __len__(self):
+        if (index := self._unloaded_index()) is None:
+            return super().__len__()
+        return len(index)
+
+    def iter_child_nodes(self, start_point):
+        if (index := self._unloaded_index()) is not None:
+            try:
+                lines = index.range(*self._child_prefix(start_point))
+            except (OSError, ValueError) as e:
+                self._load(e)
+            else:
+                return map(self._parse_line, lines)
+        return super().iter_child_nodes(start_point)
+
+    def child_nodes(self, start_point):
+        if self._unloaded_index() is None:
+            return super().child_nodes(start_point)
+        cset = self.clone(empty=True)
+        cset.update(self.iter_child_nodes(start_point))
+        return cset
+
     def clone(self, empty=False):
         # create is used to block it from reading.
         cset = self.__class__(self._source, mutable=True, create=True)
@@ -60,7 +351,7 @@ class ContentsFile(contentsSet):
             if obj.chksums is None or "md5" not in obj.chksums:
                 raise TypeError("fsFile objects need to be strict")
 
-        contentsSet.add(self, obj)
+        super().add(obj)
 
     def _get_fd(self, write=False):
         if isinstance(self._source, str):
@@ -84,50 +375,54 @@ class ContentsFile(contentsSet):
     def _iter_contents(self):
         self.clear()
         for line in self._get_fd():
-            if not line:
-                continue
-            s = line.split(" ")
-            if s[0] in ("dir", "dev", "fif"):
-                path = " ".join(s[1:])
-                if s[0] == "dir":
-                    obj = fs.fsDir(path, strict=False)
-                elif s[0] == "dev":
-                    obj = LookupFsDev(path, strict=False)
-                else:
-                    obj = fs.fsFifo(path, strict=False)
-            elif s[0] == "obj":
-                path = " ".join(s[1:-2])
-                obj = fs.fsFile(
-                    path,
-                    chksums={"md5": int(s[-2], 16)},
+            if line:
+                yield self._parse_line(line)
+
+    @staticmethod
+    def _parse_line(line):
+        s = line.split(" ")
+        if s[0] in ("dir", "dev", "fif"):
+            path = " ".join(s[1:])
+            if s[0] == "dir":
+                obj = fs.fsDir(path, strict=False)
+            elif s[0] == "dev":
+                obj = LookupFsDev(path, strict=False)
+            else:
+                obj = fs.fsFifo(path, strict=False)
+        elif s[0] == "obj":
+            path = " ".join(s[1:-2])
+            obj = fs.fsFile(
+                path,
+                chksums={"md5": int(s[-2], 16)},
+                mtime=int(s[-1]),
+                strict=False,
+            )
+        elif s[0] == "sym":
+            try:
+                p = s.index("->")
+                obj = fs.fsLink(
+                    " ".join(s[1:p]),
+                    " ".join(s[p + 1 : -1]),
                     mtime=int(s[-1]),
                     strict=False,
                 )
-            elif s[0] == "sym":
-                try:
-                    p = s.index("->")
-                    obj = fs.fsLink(
-                        " ".join(s[1:p]),
-                        " ".join(s[p + 1 : -1]),
-                        mtime=int(s[-1]),
-                        strict=False,
-                    )
 
-                except ValueError:
-                    # XXX throw a corruption error
-                    raise
-            else:
-                raise Exception(f"unknown entry type {line!r}")
-
-            yield obj
+            except ValueError:
+                # XXX throw a corruption error
+                raise
+        else:
+            raise Exception(f"unknown entry type {line!r}")
+        return obj
 
     def _write(self):
         md5_handler = get_handler("md5")
+        objs = list(self)
+        fill_chksums(objs, ("md5",))
         outfile = None
         try:
             outfile = self._get_fd(True)
 
-            for obj in sorted(self):
+            for obj in objs:
                 if obj.is_reg:
                     s = " ".join(
                         (
@@ -156,6 +451,11 @@ class ContentsFile(contentsSet):
                     raise Exception(f"unknown type {type(obj)}: {obj}")
                 outfile.write(s + "\n")
             outfile.close()
+            if isinstance(self._source, str) and os.path.exists(
+                self._source + ContentsIndex.suffix
+            ):
+                # keep an existing index current
+                write_index(self._source)
 
         finally:
             # if atomic, it forces the update to be wiped.
@@ -0,0 +1,163 @@
+"""
+consolidated metadata cache for installed packages
+"""
+
+__all__ = ("MetadataCache",)
+
+import json
+import os
+import sqlite3
+from os.path import join as pjoin
+
+from ..log import logger
+from ._sqlite import SqliteIndex
+
+
+class MetadataCache(SqliteIndex):
+    """SQLite backed cache of the metadata files of installed packages.
+
+    All small metadata files of a package's vdb directory are stored in a
+    single row, avoiding reading separate files for each attribute access.
+    The cache is refreshed as a whole when the vdb directory's mtime changes,
+    only rereading packages whose vdb directory mtime changed, and updated in
+    a single transaction on every merge and unmerge.
+
+    Large files and ones handled separately, such as CONTENTS or the
+    environment, aren't cached and are marked to be read from the package's
+    directory instead.
+
+    :param repo: vdb repository to cache
+    :param location: path to the cache database
+    """
+
+    filename = "metadata.sqlite"
+    description = "metadata cache"
+    tables = """
+        DROP TABLE IF EXISTS info;
+        DROP TABLE IF EXISTS pkgs;
+        CREATE TABLE info (key TEXT PRIMARY KEY NOT NULL, value TEXT);
+        CREATE TABLE pkgs (
+            cpv TEXT PRIMARY KEY NOT NULL, mtime INTEGER, data TEXT NOT NULL
+        );
+    """
+
+    # files never cached
+    skip = frozenset(("CONTENTS", "CONTENTS.index", "environment", "environment.bz2"))
+    # files larger than this are read from disk on demand
+    max_size = 2**16
+
+    def __init__(self, repo, location=None):
+        super().__init__(repo, location=location)
+        self._entries = {}
+
+    def _read(self, cpv):
+        """Read the cacheable metadata files of a package.
+
+        :return: mapping of file names to their contents or None for
+            uncached files
+        """
+        path = pjoin(self.repo.location, cpv)
+        data = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                if not entry.is_file() or name.startswith("."):
+                    continue
+                if (
+                    name in self.skip
+                    or name.endswith(".ebuild")
+                    or entry.stat().st_size > self.max_size
+                ):
+                    data[name] = None
+                    continue
+                try:
+                    with open(entry.path, encoding="utf8") as f:
+                        data[name] = f.read()
+                except UnicodeDecodeError:
+                    data[name] = None
+        return data
+
+    def _add(self, db, cpv):
+        mtime = self._pkg_mtime(cpv)
+        try:
+            data = self._read(cpv)
+        except OSError as e:
+            logger.warning(f"{cpv}: failed reading vdb entry: {e}")
+            db.execute("DELETE FROM pkgs WHERE cpv = ?", (cpv,))
+            return
+        db.execute(
+            "INSERT OR REPLACE INTO pkgs VALUES (?, ?, ?)",
+            (cpv, mtime, json.dumps(data, separators=(",", ":"))),
+        )
+        self._entries[cpv] = data
+
+    def _remove(self, db, cpv):
+        db.execute("DELETE FROM pkgs WHERE cpv = ?", (cpv,))
+        self._entries.pop(cpv, None)
+
+    def _refresh(self, db):
+        mtime = self._vdb_mtime()
+        cached = dict(db.execute("SELECT cpv, mtime FROM pkgs"))
+        self._entries.clear()
+        with db:
+            for cat, pn in self.repo.versions:
+                for ver in self.repo.versions[(cat, pn)]:
+                    cpv = f"{cat}/{pn}-{ver}"
+                    old_mtime = cached.pop(cpv, None)
+                    if old_mtime is None or old_mtime != self._pkg_mtime(cpv):
+                        self._add(db, cpv)
+            for cpv in cached:
+                self._remove(db, cpv)
+            self._set_mtime(db, mtime)
+
+    def add(self, pkg, current=True):
+        """Add or update the entry for a newly merged package.
+
+        :param current: whether the cache matched the vdb before the related
+            vdb modification, if not the cache is left outdated and
+            refreshed on next use
+        """
+        with self._lock:
+            db = self.connection
+            with db:
+                self._add(db, pkg.cpvstr)
+                if current:
+                    self._set_mtime(db, self._vdb_mtime())
+
+    def remove(self, pkg, current=True):
+        """Remove the entry for an unmerged package.
+
+        :param current: see :meth:`add`
+        """
+        with self._lock:
+            db = self.connection
+            with db:
+                self._remove(db, pkg.cpvstr)
+                if current:
+                    self._set_mtime(db, self._vdb_mtime())
+
+    def __getitem__(self, cpv):
+        """Return the cached metadata files of a package.
+
+        :param cpv: CPV string of the package
+        :return: mapping of file names to their contents or None for files
+            that must be read from disk
+        :raise KeyError: if the package isn't installed or the cache can't be
+            read, in which case the package's files should be read directly
+        """
+        data = self._entries.get(cpv)
+        if data is not None:
+            return data
+        try:
+            self.refresh()
+            with self._lock:
+                row = self.connection.execute(
+                    "SELECT data FROM pkgs WHERE cpv = ?", (cpv,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"failed reading {self.description} {self.location!r}: {e}")
+            raise KeyError(cpv) from e
+        if row is None:
+            raise KeyError(cpv)
+        data = self._entries[cpv] = json.loads(row[0])
+        return data
@@ -6,13 +6,14 @@ import stat
 from functools import partial
 from os.path import join as pjoin
 
-from snakeoil import data_source
+from snakeoil import data_source, klass
 from snakeoil.fileutils import readfile
 from snakeoil.mappings import IndeterminantDict
 from snakeoil.osutils import listdir_dirs
 
 from ..config.hint import ConfigHint
 from ..ebuild import ebd, ebuild_built
+from ..ebuild.atom import atom
 from ..ebuild.cpv import VersionedCPV
 from ..ebuild.errors import InvalidCPV
 from ..log import logger
@@ -20,6 +21,9 @@ from ..package import base as pkg_base
 from ..repository import errors, prototype, wrapper
 from . import repo_ops
 from .contents import ContentsFile
+from .metadata import MetadataCache
+from .owners import OwnersIndex
+from .revdeps import RevdepIndex
 
 
 class tree(prototype.tree):
@@ -182,18 +186,76 @@ class tree(prototype.tree):
             data = data_source.local_source(fp)
         elif key == "repo":
             # try both, for portage/paludis compatibility.
-            data = readfile(pjoin(path, "repository"), True)
+            data = self._read_file(path, "repository")
             if data is None:
-                data = readfile(pjoin(path, "REPOSITORY"), True)
+                data = self._read_file(path, "REPOSITORY")
                 if data is None:
                     raise KeyError(key)
         else:
-            data = readfile(pjoin(path, key), True)
+            data = self._read_file(path, key)
             if data is None:
                 raise KeyError((path, key))
             data = data.rstrip("\n")
         return data
 
+    def _read_file(self, path, name):
+        """Read a package's vdb file via the metadata cache if enabled.
+
+        :return: file contents or None if it doesn't exist
+        """
+        if (cache := self.metadata_cache) is not None:
+            try:
+                data = cache[path[len(self.location) :].lstrip(os.path.sep)]
+            except KeyError:
+                pass
+            else:
+                if name not in data:
+                    return None
+                elif data[name] is not None:
+                    return data[name]
+        return readfile(pjoin(path, name), True)
+
+    @klass.jit_attr
+    def revdep_index(self):
+        """Reverse dependency index of installed packages."""
+        if self.raw_repo is not None:
+            return self.raw_repo.revdep_index
+        return RevdepIndex(self)
+
+    @klass.jit_attr
+    def metadata_cache(self):
+        """Consolidated metadata cache of installed packages, None if disabled."""
+        if self.raw_repo is not None:
+            return self.raw_repo.metadata_cache
+        if self.cache_location is None:
+            return None
+        return MetadataCache(self)
+
+    @klass.jit_attr
+    def owners_index(self):
+        """File ownership index of installed packages."""
+        if self.raw_repo is not None:
+            return self.raw_repo.owners_index
+        return OwnersIndex(self)
+
+    def reverse_dependencies(self, key):
+        """Return the installed packages with dependencies on a given package.
+
+        All dependency classes are checked, including every alternative of
+        any-of groups and USE conditionals enabled at build time, so the
+        results are a superset of the packages actually requiring it.
+
+        :param key: package key, e.g. ``dev-libs/foo``, or an object
+            with a key attribute such as an atom or package
+        :return: list of matching packages sorted by CPV
+        """
+        key = getattr(key, "key", key)
+        return [
+            pkg
+            for cpv in self.revdep_index[key]
+            for pkg in self.itermatch(atom(f"={cpv}"))
+        ]
+
     def notify_remove_package(self, pkg):
         remove_it = len(self.packages[pkg.category]) == 1
         prototype.tree.notify_remove_package(self, pkg)
@@ -0,0 +1,154 @@
+"""
+file ownership index for installed packages
+"""
+
+__all__ = ("OwnersIndex",)
+
+import re
+
+from ..log import logger
+from ._sqlite import SqliteIndex
+
+
+class OwnersIndex(SqliteIndex):
+    """SQLite backed mapping of installed paths to the packages owning them.
+
+    The index is stored alongside the vdb and validated via the vdb
+    directory's mtime, which is updated on every merge and unmerge. When it
+    doesn't match, only packages with new or changed vdb entries have their
+    CONTENTS reparsed. If the index can't be written, e.g. when running as a
+    regular user, an outdated index is updated in memory instead.
+
+    :param repo: vdb repository to index
+    :param location: path to the index database
+    """
+
+    filename = "owners.sqlite"
+    description = "owners index"
+    tables = """
+        DROP TABLE IF EXISTS info;
+        DROP TABLE IF EXISTS pkgs;
+        DROP TABLE IF EXISTS paths;
+        CREATE TABLE info (key TEXT PRIMARY KEY NOT NULL, value TEXT);
+        CREATE TABLE pkgs (cpv TEXT PRIMARY KEY NOT NULL, mtime INTEGER);
+        CREATE TABLE paths (path TEXT NOT NULL, cpv TEXT NOT NULL);
+        CREATE INDEX paths_path ON paths (path);
+        CREATE INDEX paths_cpv ON paths (cpv);
+    """
+
+    # maximum number of parameters used per query
+    _chunk_size = 500
+
+    def _add(self, db, cpv, contents):
+        db.execute("DELETE FROM paths WHERE cpv = ?", (cpv,))
+        db.executemany(
+            "INSERT INTO paths VALUES (?, ?)", ((x.location, cpv) for x in contents)
+        )
+        db.execute(
+            "INSERT OR REPLACE INTO pkgs VALUES (?, ?)", (cpv, self._pkg_mtime(cpv))
+        )
+
+    def _remove(self, db, cpv):
+        db.execute("DELETE FROM paths WHERE cpv = ?", (cpv,))
+        db.execute("DELETE FROM pkgs WHERE cpv = ?", (cpv,))
+
+    def _refresh(self, db):
+        mtime = self._vdb_mtime()
+        indexed = dict(db.execute("SELECT cpv, mtime FROM pkgs"))
+        with db:
+            for cat, pn in self.repo.versions:
+                for ver in self.repo.versions[(cat, pn)]:
+                    cpv = f"{cat}/{pn}-{ver}"
+                    old_mtime = indexed.pop(cpv, None)
+                    if old_mtime is None or old_mtime != self._pkg_mtime(cpv):
+                        pkg = self.repo.package_class(cat, pn, ver)
+                        try:
+                            contents = pkg.contents
+                        except (OSError, KeyError, ValueError) as e:
+                            logger.warning(f"{cpv}: failed reading CONTENTS: {e}")
+                            contents = ()
+                        self._add(db, cpv, contents)
+            for cpv in indexed:
+                self._remove(db, cpv)
+            self._set_mtime(db, mtime)
+
+    def add(self, pkg, current=True):
+        """Add or update the entry for a newly merged package.
+
+        :param current: whether the index matched the vdb before the related
+            vdb modification, if not the index is left outdated and
+            refreshed on next use
+        """
+        with self._lock:
+            db = self.connection
+            with db:
+                self._add(db, pkg.cpvstr, pkg.contents)
+                if current:
+                    self._set_mtime(db, self._vdb_mtime())
+
+    def remove(self, pkg, current=True):
+        """Remove the entry for an unmerged package.
+
+        :param current: see :meth:`add`
+        """
+        with self._lock:
+            db = self.connection
+            with db:
+                self._remove(db, pkg.cpvstr)
+                if current:
+                    self._set_mtime(db, self._vdb_mtime())
+
+    def owners(self, path):
+        """Return the sorted CPV strings of packages owning a given path."""
+        self.refresh()
+        with self._lock:
+            return tuple(
+                x[0]
+                for x in self.connection.execute(
+                    "SELECT DISTINCT cpv FROM paths WHERE path = ? ORDER BY cpv",
+                    (path,),
+                )
+            )
+
+    def owners_re(self, regex):
+        """Return the sorted CPV strings of packages owning paths matching a regex.
+
+        :param regex: pattern searched for in owned paths
+        """
+        self.refresh()
+        search = re.compile(regex).search
+        with self._lock:
+            db = self.connection
+            db.create_function(
+                "regexp",
+                2,
+                lambda _, path: search(path) is not None,
+                deterministic=True,
+            )
+            return tuple(
+                x[0]
+                for x in db.execute(
+                    "SELECT DISTINCT cpv FROM paths WHERE path REGEXP ? ORDER BY cpv",
+                    (regex,),
+                )
+            )
+
+    def collisions(self, paths):
+        """Return the owners of any of the given paths.
+
+        :return: mapping of CPV strings to the set of owned paths
+        """
+        self.refresh()
+        paths = list(set(paths))
+        owners = {}
+        with self._lock:
+            db = self.connection
+            for i in range(0, len(paths), self._chunk_size):
+                chunk = paths[i : i + self._chunk_size]
+                query = (
+                    "SELECT cpv, path FROM paths WHERE path IN "
+                    f"({', '.join('?' * len(chunk))})"
+                )
+                for cpv, path in db.execute(query, chunk):
+                    owners.setdefault(cpv, set()).add(path)
+        return owners
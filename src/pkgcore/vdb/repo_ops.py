@@ -2,6 +2,7 @@ __all__ = ("install", "uninstall", "replace", "operations")
 
 import os
 import shutil
+import sqlite3
 import time
 from itertools import chain
 from os.path import join as pjoin
@@ -15,7 +16,7 @@ from snakeoil.version import get_version
 from .. import __title__
 from ..log import logger
 from ..operations import repo as repo_ops
-from .contents import ContentsFile
+from .contents import ContentsFile, write_index
 
 
 def update_mtime(path, timestamp=None):
@@ -28,6 +29,34 @@ def update_mtime(path, timestamp=None):
         logger.error(f"failed updated vdb timestamp for {path!r}: {e}")
 
 
+def _index_current(index):
+    """Determine if an optional SQLite backed vdb index matches the vdb."""
+    if index is None:
+        return False
+    try:
+        return index.is_current()
+    except sqlite3.Error as e:
+        logger.warning(f"failed reading {index.description} {index.location!r}: {e}")
+        return False
+
+
+def _update_index(index, method, pkg, current):
+    """Update a SQLite backed vdb index for a merged or unmerged package.
+
+    The vdb was already modified at this point so failures are only logged,
+    the index is rebuilt on next use.
+    """
+    if index is None:
+        return
+    try:
+        getattr(index, method)(pkg, current=current)
+    except sqlite3.Error as e:
+        logger.warning(
+            f"failed updating {index.description} {index.location!r}, "
+            f"it will be rebuilt on next use: {e}"
+        )
+
+
 class install(repo_ops.install):
     def __init__(self, repo, newpkg, observer):
         base = pjoin(repo.location, newpkg.category)
@@ -35,6 +64,9 @@ class install(repo_ops.install):
         self.install_path = pjoin(base, dirname)
         self.tmp_write_path = pjoin(base, f".tmp.{dirname}")
         super().__init__(repo, newpkg, observer)
+        self._revdeps_current = repo.revdep_index.is_current()
+        self._owners_current = _index_current(repo.owners_index)
+        self._metadata_current = _index_current(repo.metadata_cache)
 
     def add_data(self, domain):
         # error checking?
@@ -47,6 +79,7 @@ class install(repo_ops.install):
                 v = ContentsFile(pjoin(dirpath, "CONTENTS"), mutable=True, create=True)
                 v.update(self.new_pkg.contents)
                 v.flush()
+                write_index(pjoin(dirpath, "CONTENTS"))
             elif k == "environment":
                 data = compression.compress_data(
                     "bzip2", self.new_pkg.environment.bytes_fileobj().read()
@@ -116,6 +149,11 @@ class install(repo_ops.install):
     def finalize_data(self):
         os.rename(self.tmp_write_path, self.install_path)
         update_mtime(self.repo.location)
+        self.repo.revdep_index.add(self.new_pkg, current=self._revdeps_current)
+        _update_index(self.repo.owners_index, "add", self.new_pkg, self._owners_current)
+        _update_index(
+            self.repo.metadata_cache, "add", self.new_pkg, self._metadata_current
+        )
         return True
 
 
@@ -125,6 +163,9 @@ class uninstall(repo_ops.uninstall):
             repo.location, pkg.category, pkg.package + "-" + pkg.fullver
         )
         super().__init__(repo, pkg, observer)
+        self._revdeps_current = repo.revdep_index.is_current()
+        self._owners_current = _index_current(repo.owners_index)
+        self._metadata_current = _index_current(repo.metadata_cache)
 
     def remove_data(self):
         return True
@@ -133,6 +174,13 @@ class uninstall(repo_ops.uninstall):
         update_mtime(self.repo.location)
         shutil.rmtree(self.remove_path)
         update_mtime(self.repo.location)
+        self.repo.revdep_index.remove(self.old_pkg, current=self._revdeps_current)
+        _update_index(
+            self.repo.owners_index, "remove", self.old_pkg, self._owners_current
+        )
+        _update_index(
+            self.repo.metadata_cache, "remove", self.old_pkg, self._metadata_current
+        )
         return True
 
 
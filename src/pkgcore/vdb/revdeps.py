@@ -0,0 +1,187 @@
+"""
+reverse dependency index for installed packages
+"""
+
+__all__ = ("RevdepIndex",)
+
+import json
+import os
+from collections import defaultdict
+from os.path import join as pjoin
+
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.osutils import ensure_dirs
+from snakeoil.sequences import iflatten_instance
+
+from ..ebuild.atom import atom
+from ..log import logger
+from ..package.errors import PackageError
+
+# dependency attributes that are indexed
+dep_attrs = ("bdepend", "depend", "rdepend", "pdepend", "idepend")
+
+
+def dep_keys(pkg):
+    """Return the sorted package keys referenced by a package's dependencies.
+
+    Blockers are skipped while all alternatives of any-of groups are included.
+    """
+    keys = set()
+    for attr in dep_attrs:
+        depset = getattr(pkg, attr, None)
+        if not depset:
+            continue
+        for a in iflatten_instance(depset, (atom,)):
+            if isinstance(a, atom) and not a.blocks:
+                keys.add(a.key)
+    return sorted(keys)
+
+
+class RevdepIndex:
+    """Mapping of package keys to the installed packages depending on them.
+
+    The index is stored alongside the vdb and validated via the vdb
+    directory's mtime which is updated on every merge and unmerge, including
+    by other package managers. When it doesn't match, only packages with
+    new or changed vdb entries are reparsed.
+
+    :param repo: vdb repository to index
+    :param location: path to the index file
+    """
+
+    version = 1
+
+    def __init__(self, repo, location=None):
+        self.repo = repo
+        if location is None:
+            location = pjoin(repo.location, ".pkgcore", "revdeps.json")
+        self.location = location
+        self._mtime = None
+        self._pkgs = {}
+        self._revdeps = None
+        self._loaded = False
+
+    def _vdb_mtime(self):
+        try:
+            return os.stat(self.repo.location).st_mtime_ns
+        except OSError:
+            return None
+
+    def _pkg_mtime(self, cpv):
+        try:
+            return os.stat(pjoin(self.repo.location, cpv)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.location) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"ignoring invalid revdep index {self.location!r}: {e}")
+            return
+        try:
+            if data["version"] != self.version:
+                return
+            pkgs = {
+                cpv: (mtime, tuple(keys)) for cpv, (mtime, keys) in data["pkgs"].items()
+            }
+            self._mtime = data["mtime"]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"ignoring invalid revdep index {self.location!r}: {e}")
+            return
+        self._pkgs = pkgs
+
+    def is_current(self):
+        """Determine if the index matches the current vdb state."""
+        if not self._loaded:
+            self._load()
+        return self._mtime is not None and self._mtime == self._vdb_mtime()
+
+    def _entry(self, pkg):
+        try:
+            keys = dep_keys(pkg)
+        except PackageError as e:
+            logger.warning(f"{pkg.cpvstr}: failed parsing deps: {e}")
+            keys = ()
+        return (self._pkg_mtime(pkg.cpvstr), tuple(keys))
+
+    def refresh(self):
+        """Update the index to match the vdb if it's outdated."""
+        if self.is_current():
+            return
+        # create the index dir first since it modifies the vdb mtime
+        ensure_dirs(os.path.dirname(self.location), mode=0o755)
+        mtime = self._vdb_mtime()
+        pkgs = {}
+        for cat, pn in self.repo.versions:
+            for ver in self.repo.versions[(cat, pn)]:
+                cpv = f"{cat}/{pn}-{ver}"
+                entry = self._pkgs.get(cpv)
+                if entry is None or entry[0] != self._pkg_mtime(cpv):
+                    entry = self._entry(self.repo.package_class(cat, pn, ver))
+                pkgs[cpv] = entry
+        self._pkgs = pkgs
+        self._mtime = mtime
+        self._revdeps = None
+        self.save()
+
+    def add(self, pkg, current=True):
+        """Add or update the entry for a newly merged package.
+
+        :param current: whether the index matched the vdb before the related
+            vdb modification, if not the index is left outdated and
+            refreshed on next use
+        """
+        self._update(pkg.cpvstr, self._entry(pkg), current)
+
+    def remove(self, pkg, current=True):
+        """Remove the entry for an unmerged package.
+
+        :param current: see :meth:`add`
+        """
+        self._update(pkg.cpvstr, None, current)
+
+    def _update(self, cpv, entry, current):
+        if not self._loaded:
+            self._load()
+        if entry is None:
+            self._pkgs.pop(cpv, None)
+        else:
+            self._pkgs[cpv] = entry
+        self._revdeps = None
+        if current:
+            self._mtime = self._vdb_mtime()
+            self.save()
+
+    def save(self):
+        """Write the index to disk, silently skipping unwritable locations."""
+        data = {"version": self.version, "mtime": self._mtime, "pkgs": self._pkgs}
+        try:
+            if not ensure_dirs(os.path.dirname(self.location), mode=0o755):
+                raise OSError(
+                    f"failed creating dir: {os.path.dirname(self.location)!r}"
+                )
+            f = AtomicWriteFile(self.location)
+            try:
+                json.dump(data, f, separators=(",", ":"))
+                f.close()
+            except BaseException:
+                f.discard()
+                raise
+        except OSError as e:
+            logger.debug(f"failed writing revdep index {self.location!r}: {e}")
+
+    def __getitem__(self, key):
+        """Return the sorted CPV strings of installed packages depending on a key."""
+        self.refresh()
+        if self._revdeps is None:
+            revdeps = defaultdict(list)
+            for cpv, (_mtime, keys) in self._pkgs.items():
+                for k in keys:
+                    revdeps[k].append(cpv)
+            self._revdeps = {k: tuple(sorted(v)) for k, v in revdeps.items()}
+        return self._revdeps.get(key, ())
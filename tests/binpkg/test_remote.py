@@ -0,0 +1,172 @@
+import textwrap
+from types import SimpleNamespace
+
+import pytest
+
+from pkgcore.binpkg import remote
+
+HEADER = textwrap.dedent(
+    """\
+    CHOST: x86_64-pc-linux-gnu
+    PACKAGES: 2
+    TIMESTAMP: 1700000000
+    VERSION: 0
+
+    """
+)
+
+ENTRIES = textwrap.dedent(
+    """\
+    BUILD_ID: 1
+    CPV: dev-util/bar-2
+    DESC: bar
+    MTIME: 1700000000
+    USE: x y
+
+    CPV: dev-util/foo-1
+    CHOST: i686-pc-linux-gnu
+    DESC: foo
+    MTIME: 1700000000
+    SLOT: 1
+
+    """
+)
+
+
+class TestPackagesCache:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.path = tmp_path / "Packages"
+        self.path.write_text(HEADER + ENTRIES)
+
+    def test_lazy_parsing(self):
+        cache = remote.PackagesCacheV0(str(self.path))
+        assert sorted(cache.data) == ["dev-util/bar-2", "dev-util/foo-1"]
+        assert not cache.data._entries
+        assert "dev-util/foo-1" in cache
+        assert "dev-util/foo-2" not in cache
+        assert not cache.data._entries
+
+        bar = cache["dev-util/bar-2"]
+        assert list(cache.data._entries) == ["dev-util/bar-2"]
+        assert bar["DESCRIPTION"] == "bar"
+        assert bar["mtime"] == "1700000000"
+        assert bar["IUSE"] == "x y"
+        assert bar["SLOT"] == "0"
+        # values inherited from the preamble
+        assert bar["CHOST"] == "x86_64-pc-linux-gnu"
+        assert cache["dev-util/foo-1"]["CHOST"] == "i686-pc-linux-gnu"
+        assert cache.preamble["PACKAGES"] == "2"
+        with pytest.raises(KeyError):
+            cache["dev-util/foo-2"]
+
+    def test_no_mmap(self):
+        cache = remote.PackagesCacheV0(str(self.path))
+        index = remote.PackagesIndex(cache, str(self.path), use_mmap=False)
+        assert {k: dict(v.items()) for k, v in index.items()} == {
+            k: dict(v.items()) for k, v in cache.data.items()
+        }
+
+    def test_missing_file(self, tmp_path):
+        cache = remote.PackagesCacheV0(str(tmp_path / "missing"))
+        assert not list(cache.data)
+        assert "dev-util/foo-1" not in cache
+        assert not cache.data.exists
+
+    def test_count_mismatch(self, caplog):
+        # an append interrupted before the header was updated
+        extra = "CPV: dev-util/abc-1\nDESC: abc\n\n"
+        self.path.write_text(HEADER + ENTRIES + extra)
+        cache = remote.PackagesCacheV0(str(self.path))
+        assert len(list(cache.data)) == 3
+        assert not cache.data.consistent
+        assert "PACKAGES header doesn't match" in caplog.text
+        assert cache["dev-util/abc-1"]["DESCRIPTION"] == "abc"
+
+        # the next write rewrites the whole file rather than appending
+        self.add(cache, "dev-util/baz-1")
+        cache.commit()
+        data = self.path.read_text()
+        assert "PACKAGES: 4" in data
+        assert data.index("dev-util/abc-1") < data.index("dev-util/bar-2")
+        cache = remote.PackagesCacheV0(str(self.path))
+        assert cache.data.consistent
+        assert len(list(cache.data)) == 4
+
+    @staticmethod
+    def add(cache, cpv, **kwargs):
+        cache[cpv] = dict(
+            DESCRIPTION=cpv, SLOT="0", _chf_=SimpleNamespace(mtime=1700000001), **kwargs
+        )
+
+    def test_append(self):
+        cache = remote.PackagesCacheV0(str(self.path))
+        self.add(cache, "dev-util/baz-1", CHOST="x86_64-pc-linux-gnu")
+        self.add(cache, "dev-util/abc-1")
+        cache.commit()
+
+        data = self.path.read_text()
+        header, entries = data.split("\n\n", 1)
+        assert "PACKAGES: 3" not in header
+        assert "PACKAGES: 4" in header
+        assert "TIMESTAMP: 1700000000" not in header
+        # new entries are appended without rewriting existing ones
+        assert entries.startswith(ENTRIES)
+        assert entries[len(ENTRIES) :] == textwrap.dedent(
+            """\
+            CPV: dev-util/abc-1
+            DESC: dev-util/abc-1
+            SLOT: 0
+            _mtime_: 1700000001
+
+            CPV: dev-util/baz-1
+            DESC: dev-util/baz-1
+            SLOT: 0
+            _mtime_: 1700000001
+
+            """
+        )
+        assert cache["dev-util/abc-1"]["DESCRIPTION"] == "dev-util/abc-1"
+
+        cache = remote.PackagesCacheV0(str(self.path))
+        assert len(list(cache.data)) == 4
+        assert cache["dev-util/baz-1"]["CHOST"] == "x86_64-pc-linux-gnu"
+        assert cache["dev-util/bar-2"]["DESCRIPTION"] == "bar"
+
+    def test_update(self):
+        cache = remote.PackagesCacheV0(str(self.path))
+        self.add(cache, "dev-util/foo-1")
+        del cache["dev-util/bar-2"]
+        self.add(cache, "dev-util/abc-1")
+        cache.commit()
+
+        data = self.path.read_text()
+        assert "PACKAGES: 2" in data
+        assert "dev-util/bar-2" not in data
+        cache = remote.PackagesCacheV0(str(self.path))
+        assert sorted(cache.data) == ["dev-util/abc-1", "dev-util/foo-1"]
+        assert cache["dev-util/foo-1"]["DESCRIPTION"] == "dev-util/foo-1"
+        assert cache["dev-util/foo-1"]["CHOST"] == "x86_64-pc-linux-gnu"
+
+    def test_spliced_entries(self):
+        # grow the package count to two digits, forcing the header to be rewritten
+        cache = remote.PackagesCacheV0(str(self.path))
+        for i in range(8):
+            self.add(cache, f"dev-util/new-{i}")
+        cache.commit()
+        data = self.path.read_text()
+        assert "PACKAGES: 10" in data
+        # unchanged entries are copied verbatim, including unknown keys
+        assert "BUILD_ID: 1\n" in data
+        assert len(list(remote.PackagesCacheV0(str(self.path)).data)) == 10
+
+    def test_version_upgrade(self):
+        cache = remote.PackagesCacheV1(str(self.path))
+        self.add(cache, "dev-util/abc-1")
+        cache.commit()
+        data = self.path.read_text()
+        assert "VERSION: 1\n" in data
+        assert "CPV:dev-util/abc-1\n" in data
+        assert "BUILD_ID" not in data
+        cache = remote.PackagesCacheV1(str(self.path))
+        assert len(list(cache.data)) == 3
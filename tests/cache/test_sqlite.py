@@ -0,0 +1,119 @@
+import os
+
+import pytest
+from snakeoil.chksum import LazilyHashedPath
+
+from pkgcore.cache import errors, flat_hash, sqlite
+
+_md5 = 0x2CD6E4E85C0C2D6D6E6B4C41D1FCB5E9
+
+
+def _chf_obj(md5=_md5):
+    return LazilyHashedPath("/nonexistent/path", md5=md5)
+
+
+def _data(**kwargs):
+    d = {
+        "DEPEND": "virtual/libc dev-lang/perl",
+        "DESCRIPTION": "provides a trash can by intercepting calls...",
+        "EAPI": "8",
+        "KEYWORDS": "~amd64 ~ppc ~x86",
+        "SLOT": "0",
+        "INHERIT": "toolchain-funcs",
+        "_eclasses_": {"toolchain-funcs": _chf_obj(0xABCDEF)},
+        "_chf_": _chf_obj(),
+    }
+    d.update(kwargs)
+    return d
+
+
+class TestSqlite:
+    @pytest.fixture
+    def location(self, tmp_path):
+        return str(tmp_path / "cache" / "repo.sqlite")
+
+    @pytest.fixture
+    def db(self, location):
+        return sqlite.database(location)
+
+    def test_roundtrip(self, db):
+        db["sys-libs/libtrash-2.4"] = _data()
+        assert "sys-libs/libtrash-2.4" in db
+        assert "sys-libs/libtrash-2.5" not in db
+        d = db["sys-libs/libtrash-2.4"]
+        assert d["DEPEND"] == "virtual/libc dev-lang/perl"
+        assert d["_md5_"] == _md5
+        assert d["_eclasses_"] == [("toolchain-funcs", (("md5", 0xABCDEF),))]
+        with pytest.raises(KeyError):
+            db["sys-libs/libtrash-2.5"]
+
+    def test_keys_and_delete(self, db):
+        for cpv in ("cat/pkg-2", "cat/pkg-1", "acat/pkg-1"):
+            db[cpv] = _data()
+        assert list(db.keys()) == ["acat/pkg-1", "cat/pkg-1", "cat/pkg-2"]
+        assert len(db) == 3
+        del db["cat/pkg-1"]
+        assert sorted(db) == ["acat/pkg-1", "cat/pkg-2"]
+        with pytest.raises(KeyError):
+            del db["cat/pkg-1"]
+
+    def test_persistence(self, db, location):
+        db["cat/pkg-1"] = _data(SLOT="1")
+        db.close()
+        assert os.path.exists(location)
+        db = sqlite.database(location, readonly=True)
+        assert db["cat/pkg-1"]["SLOT"] == "1"
+        with pytest.raises(errors.ReadOnly):
+            db["cat/pkg-2"] = _data()
+        with pytest.raises(errors.ReadOnly):
+            del db["cat/pkg-1"]
+
+    def test_readonly_missing(self, location):
+        db = sqlite.database(location, readonly=True)
+        assert list(db) == []
+        assert "cat/pkg-1" not in db
+        assert not os.path.exists(location)
+
+    def test_bulk_transaction(self, db, location):
+        db.set_sync_rate(1000000)
+        for x in range(10):
+            db[f"cat/pkg-{x}"] = _data()
+        # pending updates aren't visible to other connections until committed
+        other = sqlite.database(location, readonly=True)
+        assert len(other) == 0
+        db.commit(force=True)
+        assert len(other) == 10
+
+    def test_autocommit_default(self, db, location):
+        db["cat/pkg-1"] = _data()
+        other = sqlite.database(location, readonly=True)
+        assert "cat/pkg-1" in other
+
+    def test_schema_mismatch(self, db, location):
+        db["cat/pkg-1"] = _data()
+        db.connection.execute("UPDATE info SET value = '0' WHERE key = 'version'")
+        db.close()
+        with pytest.raises(errors.GeneralCacheCorruption):
+            sqlite.database(location)["cat/pkg-1"]
+
+    def test_corrupt_entry(self, db):
+        db["cat/pkg-1"] = _data()
+        db.connection.execute("UPDATE metadata SET data = 'garbage'")
+        with pytest.raises(errors.CacheCorruption):
+            db["cat/pkg-1"]
+
+    def test_import_cache(self, tmp_path, db):
+        md5 = flat_hash.md5_cache(str(tmp_path / "repo"))
+        md5["cat/pkg-1"] = _data()
+        md5["cat/pkg-2"] = _data(SLOT="2")
+        db["stale/pkg-1"] = _data()
+
+        assert db.import_cache(md5) == 2
+        assert sorted(db) == ["cat/pkg-1", "cat/pkg-2"]
+        for cpv in ("cat/pkg-1", "cat/pkg-2"):
+            assert db[cpv] == md5[cpv]
+
+    def test_import_cache_incompatible(self, tmp_path, db):
+        src = flat_hash.database(str(tmp_path / "flat"))
+        with pytest.raises(errors.CacheError):
+            db.import_cache(src)
@@ -391,3 +391,63 @@ class TestCPV:
             assert obj > 0
         with pytest.raises(TypeError):
             assert obj >= 0
+
+    def test_version_key(self):
+        versions = [
+            "0",
+            "00",
+            "01",
+            "1",
+            "1.0",
+            "1.01",
+            "1.010",
+            "1.1",
+            "1.1a",
+            "1.1b",
+            "1.1_alpha",
+            "1.1_beta2",
+            "1.1_pre",
+            "1.1_rc1",
+            "1.1_p",
+            "1.1_p1",
+            "1.1_p1_alpha",
+            "1.1_alpha_p",
+            "1.1.0",
+            "2",
+            "10",
+        ]
+        for v1 in versions:
+            for v2 in versions:
+                for r1, r2 in (("", ""), ("1", ""), ("", "2"), ("02", "2")):
+                    rev1, rev2 = cpv.Revision(r1), cpv.Revision(r2)
+                    k1, k2 = cpv.version_key(v1, rev1), cpv.version_key(v2, rev2)
+                    assert cpv.ver_cmp(v1, rev1, v2, rev2) == (k1 > k2) - (k1 < k2)
+
+        obj = cpv.VersionedCPV("da/ba-1.1_p1-r2")
+        assert obj.version_key == cpv.version_key("1.1_p1", "2")
+        assert cpv.UnversionedCPV("da/ba").version_key == ()
+
+    def test_sort_versions(self):
+        versions = ["1.0-r1", "1.0_rc1", "1.0", "0.9-r10", "1.0a", "1.0_p1", "1.0-r01"]
+        assert cpv.sort_versions(versions) == [
+            "0.9-r10",
+            "1.0_rc1",
+            "1.0",
+            "1.0-r1",
+            "1.0-r01",
+            "1.0_p1",
+            "1.0a",
+        ]
+        assert cpv.sort_versions(versions, reverse=True)[0] == "1.0a"
+
+    def test_sort_cpvs(self):
+        vkls = cpv.VersionedCPV
+        cpvs = [vkls(x) for x in ("b/a-1", "a/b-2", "a/b-1.0", "a/a-3", "a/b-1")]
+        assert cpv.sort_cpvs(cpvs) == sorted(cpvs)
+        assert [x.cpvstr for x in cpv.sort_cpvs(cpvs, reverse=True)] == [
+            "b/a-1",
+            "a/b-2",
+            "a/b-1.0",
+            "a/b-1",
+            "a/a-3",
+        ]
@@ -2,10 +2,12 @@ import os
 import tempfile
 
 import pytest
+from snakeoil.chksum import get_chksums
 from snakeoil.data_source import local_source
 
 from pkgcore import gpg
 from pkgcore.ebuild import digest
+from pkgcore.fetch import fetchable
 from pkgcore.package import errors
 
 # "Line too long" (and our custom more aggressive version of that)
@@ -100,3 +102,28 @@ class TestManifest:
 
 class TestManifestDataSource(TestManifest):
     convert_source = staticmethod(lambda x: local_source(x))
+
+
+class TestManifestUpdate:
+    def test_update(self, tmp_path):
+        pkgdir = tmp_path / "foo"
+        (pkgdir / "files").mkdir(parents=True)
+        (pkgdir / "foo-1.ebuild").write_text("EAPI=8\n")
+        (pkgdir / "metadata.xml").write_text("<pkgmetadata/>\n")
+        (pkgdir / "files" / "foo.patch").write_text("patch\n")
+        path = str(pkgdir / "Manifest")
+        chfs = ("size", "blake2b", "sha512")
+        dist = fetchable("foo-1.tar.gz", chksums={"size": 1, "blake2b": 2, "sha512": 3})
+        manifest = digest.Manifest(path)
+        manifest.update([dist], chfs=chfs)
+
+        dist_d, aux, ebuild, misc = digest.parse_manifest(path)
+        assert dist_d == {"foo-1.tar.gz": dist.chksums}
+        for d, name, location in (
+            (aux, "foo.patch", "files/foo.patch"),
+            (ebuild, "foo-1.ebuild", "foo-1.ebuild"),
+            (misc, "metadata.xml", "metadata.xml"),
+        ):
+            assert list(d) == [name]
+            expected = get_chksums(str(pkgdir / location), *chfs)
+            assert dict(d[name]) == dict(zip(chfs, expected))
@@ -26,13 +26,14 @@ class TestDomain:
         self.pkeywordsdir = self.confdir / "package.accept_keywords"
         self.pkeywordsdir.mkdir()
 
-    def mk_domain(self):
+    def mk_domain(self, **settings):
         return domain_mod.domain(
             profiles.OnDiskProfile(str(self.profile_base), "profile1"),
             [],
             [],
             ROOT=self.rootdir,
             config_dir=self.confdir,
+            **settings,
         )
 
     def test_sorting(self):
@@ -59,6 +60,19 @@ class TestDomain:
                 (packages.AlwaysTrue, (("X",), ("Y",))),
             ) == self.mk_domain().pkg_use
 
+    @pytest.mark.parametrize(
+        ("setting", "jobs"), ((None, 1), ("0", 1), ("4", 4)), ids=str
+    )
+    def test_merge_jobs(self, monkeypatch, setting, jobs):
+        monkeypatch.delenv("MERGE_JOBS", raising=False)
+        settings = {} if setting is None else {"MERGE_JOBS": setting}
+        assert self.mk_domain(**settings).merge_jobs == jobs
+
+    def test_invalid_merge_jobs(self, monkeypatch):
+        monkeypatch.setenv("MERGE_JOBS", "many")
+        with pytest.raises(domain_mod.Failure, match="MERGE_JOBS"):
+            self.mk_domain().merge_jobs
+
     def test_use_expand_syntax(self):
         (self.pusedir / "a").write_text(
             """
@@ -147,6 +161,47 @@ class TestDomain:
         assert "stableflag" not in enabled
         assert "globalflag" not in enabled
 
+    def test_use_cache(self):
+        (self.profile1 / "make.defaults").write_text(
+            'ARCH="amd64"\nACCEPT_KEYWORDS="amd64"\n'
+        )
+        (self.pusedir / "a").write_text("dev-util/foo x")
+        domain = self.mk_domain()
+        pkg = FakePkg("dev-util/foo-1", iuse=("x", "y"))
+        _, enabled, _ = domain.get_package_use_unconfigured(pkg)
+        assert enabled == {"amd64", "x"}
+        # returned sets are copies of the cached data
+        enabled.add("y")
+        with mock.patch.object(
+            domain, "_get_package_use_unconfigured"
+        ) as get_package_use:
+            _, enabled, _ = domain.get_package_use_unconfigured(
+                FakePkg("dev-util/foo-1", iuse=("y", "x"))
+            )
+            assert enabled == {"amd64", "x"}
+            assert not get_package_use.called
+        assert domain.use_cache_info()[:2] == (1, 1)
+
+        # differing inputs aren't shared
+        _, enabled, _ = domain.get_package_use_unconfigured(
+            FakePkg("dev-util/foo-1", iuse=("y",))
+        )
+        assert enabled == {"amd64"}
+        _, enabled, _ = domain.get_package_use_unconfigured(pkg, for_metadata=False)
+        assert "x" in enabled
+        assert domain.use_cache_info()[:2] == (1, 3)
+
+        # package.env domains with altered settings use their own cache
+        (self.confdir / "env").mkdir()
+        (self.confdir / "env" / "foo.conf").write_text('USE="y"\n')
+        (self.confdir / "package.env").write_text("dev-util/foo foo.conf")
+        pkg_domain = domain.get_package_domain(pkg)
+        assert pkg_domain is not domain
+        assert pkg_domain.use_cache_info()[:2] == (0, 0)
+        _, enabled, _ = pkg_domain.get_package_use_unconfigured(pkg)
+        assert enabled == {"amd64", "x", "y"}
+        assert pkg_domain.use_cache_info()[:2] == (0, 1)
+
     def test_use_flag_parsing_enforcement(self, caplog):
         (self.pusedir / "a").write_text("*/* X:")
         assert ((packages.AlwaysTrue, ((), ())),) == self.mk_domain().pkg_use
@@ -191,3 +246,26 @@ class TestDomain:
             # into the correct restriction (AlwaysTrue)
             (atom("dev-util/test-unstable"), ("**")),
         )
+
+
+def test_pool_eclasses():
+    def mk_repo(eclasses, cache=None):
+        eclasses = {k: mock.Mock(path=v) for k, v in eclasses.items()}
+        return mock.Mock(
+            eclass_cache=mock.Mock(eclasses=eclasses), cache=(cache or {},)
+        )
+
+    cache = {
+        "cat/a-1": {"_eclasses_": {"a": (), "b": ()}},
+        "cat/b-1": {"_eclasses_": {"b": (), "c": ()}},
+        "cat/c-1": {"_eclasses_": {"b": (), "c": ()}},
+        "cat/d-1": {},
+    }
+    main = mk_repo({"a": "/main/a", "b": "/main/b", "c": "/main/c"}, cache)
+    overlay = mk_repo({"a": "/main/a", "c": "/overlay/c"})
+    repos = [main, overlay]
+    # most inherited first, skipping overridden eclasses
+    assert domain_mod._pool_eclasses(main, repos, "2") == ["b", "a"]
+    assert domain_mod._pool_eclasses(main, repos, "1") == ["b"]
+    # explicit eclasses, ignoring unknown ones
+    assert domain_mod._pool_eclasses(main, repos, "c a missing") == ["a"]
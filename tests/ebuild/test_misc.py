@@ -1,7 +1,10 @@
 import pytest
 
 from pkgcore.ebuild import misc
-from pkgcore.restrictions import packages
+from pkgcore.ebuild.atom import atom
+from pkgcore.restrictions import packages, values
+from pkgcore.test.misc import FakePkg
+from pkgcore.util.parserestrict import parse_match
 
 AlwaysTrue = packages.AlwaysTrue
 AlwaysFalse = packages.AlwaysFalse
@@ -34,6 +37,48 @@ class Test_collapsed_restrict_to_data:
         )
 
 
+class TestRestrictDispatch:
+    def test_dispatch(self):
+        restricts = [
+            parse_match(x)
+            for x in (
+                "dev-util/*",
+                "=dev-util/foo-1",
+                "*/foo",
+                "dev-*/foo",
+                "dev-util/f*",
+                "*/*::gentoo",
+                "dev-libs/bar",
+            )
+        ]
+        d = misc.RestrictDispatch((r, i) for i, r in enumerate(restricts))
+        assert len(d) == 7
+        # ordered candidates, excluding non-matching categories and names
+        pkg = FakePkg("dev-util/foo-1")
+        assert [x[2] for x in d.candidates(pkg)] == [0, 1, 2, 3, 4, 5]
+        assert d.pull_data(pkg) == [0, 1, 2, 3, 4]
+        assert d.matches(pkg)
+        assert d.pull_data(FakePkg("dev-util/foo-2")) == [0, 2, 3, 4]
+        assert [x[2] for x in d.candidates(FakePkg("dev-libs/bar-1"))] == [5, 6]
+        assert [x[2] for x in d.candidates(FakePkg("sys-apps/baz-1"))] == [5]
+        assert not d.matches(FakePkg("sys-apps/baz-1"))
+
+    def test_empty(self):
+        d = misc.RestrictDispatch(())
+        assert not d
+        assert d.candidates(FakePkg("dev-util/foo-1")) == ()
+        assert not d.matches(FakePkg("dev-util/foo-1"))
+
+    def test_negated(self):
+        # negated restrictions can't be dispatched by the values they exclude
+        r = packages.PackageRestriction(
+            "category", values.StrExactMatch("dev-util"), negate=True
+        )
+        d = misc.RestrictDispatch([(r, 0), (atom("dev-util/foo"), 1)])
+        assert d.pull_data(FakePkg("sys-apps/baz-1")) == [0]
+        assert d.pull_data(FakePkg("dev-util/foo-1")) == [1]
+
+
 class TestIncrementalExpansion:
     f = staticmethod(misc.incremental_expansion)
 
@@ -202,3 +202,48 @@ class TestReposConf:
         assert repos == sym_repos
         assert defaults["main-repo"] == "gentoo"
         assert list(repos.keys()) == ["foo", "bar", "gentoo", "binpkgs"]
+
+
+class TestMakeCache:
+    def test_md5_cache(self, tmp_path):
+        (tmp_path / "metadata" / "md5-cache").mkdir(parents=True)
+        section = PortageConfig._make_cache(None, "md5-dict", str(tmp_path))
+        assert section.dict["class"] == "pkgcore.cache.flat_hash.md5_cache"
+        assert section.dict["location"] == str(tmp_path)
+
+    def test_sqlite(self, tmp_path):
+        (tmp_path / "metadata" / "md5-cache").mkdir(parents=True)
+        section = PortageConfig._make_cache(None, "md5-dict", str(tmp_path), "sqlite")
+        assert section.dict["class"] == "pkgcore.cache.sqlite.database"
+        assert section.dict["location"] == pjoin(
+            "/var/cache/edb/dep", str(tmp_path).lstrip("/") + ".sqlite"
+        )
+
+
+class TestAddProfile:
+    @staticmethod
+    def add_profile(tmp_path, features=()):
+        profile = tmp_path / "repo" / "profiles" / "default"
+        profile.mkdir(parents=True, exist_ok=True)
+        config = PortageConfig.__new__(PortageConfig)
+        config._config = {}
+        config.dir = str(tmp_path / "etc")
+        config.features = frozenset(features)
+        config._add_profile(str(profile))
+        return config["profile"].dict
+
+    def test_profile(self, tmp_path):
+        section = self.add_profile(tmp_path)
+        assert section["class"] == "pkgcore.ebuild.profiles.OnDiskProfile"
+        assert section["profile"] == "default"
+        assert "snapshot" not in section
+
+    def test_snapshot(self, tmp_path):
+        section = self.add_profile(tmp_path, features=["profile-cache"])
+        assert "/profile-cache/default-" in section["snapshot"]
+        assert section["snapshot"].endswith(".pickle")
+        # user profiles are snapshotted separately
+        (tmp_path / "etc" / "profile").mkdir(parents=True)
+        user_section = self.add_profile(tmp_path, features=["profile-cache"])
+        assert user_section["class"] == "pkgcore.ebuild.profiles.UserProfile"
+        assert user_section["snapshot"] != section["snapshot"]
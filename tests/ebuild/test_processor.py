@@ -1,4 +1,11 @@
-from pkgcore.ebuild.processor import EbuildProcessor
+import io
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pkgcore.ebuild import processor
+from pkgcore.ebuild.processor import EbuildProcessor, InternalError
 
 
 class TestGenerateEnvStr:
@@ -46,3 +53,160 @@ class TestGenerateEnvStr:
         # when nothing is exported there is no export line
         out = self._gen({"PKGCORE_NONEXPORTED_VARS": "P", "P": "foo-1"})
         assert out == "P='foo-1'"
+
+
+class TestFramedProtocol:
+    def _proc(self, data=b""):
+        proc = EbuildProcessor.__new__(EbuildProcessor)
+        proc._readonly_vars = frozenset(["RO"])
+        proc.ebd_read = io.TextIOWrapper(
+            io.BytesIO(data), encoding="utf-8", newline="\n"
+        )
+        proc.ebd_write = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        return proc
+
+    def test_env_frame(self):
+        frame = self._proc()._generate_env_frame(
+            {
+                "PKGCORE_NONEXPORTED_VARS": "P ARR",
+                "P": "foo-1",
+                "RO": "skipped",
+                "D": 'it\'s "quoted"\n$x',
+                "ARR": ["a b", ""],
+                "EMPTY": (),
+            }
+        )
+        # sections of sorted records with values passed verbatim
+        assert frame == (
+            'D=it\'s "quoted"\n$x\x1e\x1d'
+            "P=foo-1\x1e\x1d"
+            "EMPTY=\x1e\x1d"
+            "ARR=a b\x1f\x1f\x1e\x1d"
+        )
+
+    def test_env_frame_fallback(self):
+        proc = self._proc()
+        # separator chars can't be framed
+        assert proc._generate_env_frame({"A": "a\x1eb"}) is None
+        assert proc._generate_env_frame({"A": "a\x1db"}) is None
+        assert proc._generate_env_frame({"A": ["a\x1fb"]}) is None
+        proc._framed = True
+        assert proc._framed_env({"A": ["a\x1fb"]}) is None
+        assert proc._framed_env({"A": "ü"}) == "9\nA=ü\x1e\x1d\x1d\x1d\x1d"
+        proc._framed = False
+        assert proc._framed_env({"A": "a"}) is None
+
+    def test_read_frame(self):
+        data = "A=ü\nB=ƀ€\n"
+        proc = self._proc(f"{data}phases succeeded\n".encode())
+        assert proc.read_frame(len(data.encode())) == data
+        assert proc.ebd_read.readline() == "phases succeeded\n"
+
+    def test_read_frame_line_breaks(self):
+        # carriage returns are counted and passed through untranslated
+        data = "A=a\r\nb\rc\nB=\x0b\x1c\u2028\n"
+        proc = self._proc(f"{data}phases succeeded\n".encode())
+        assert proc.read_frame(len(data.encode())) == data
+        assert proc.ebd_read.readline() == "phases succeeded\n"
+
+    def test_parse_keys_frame(self):
+        keys = EbuildProcessor._parse_keys_frame(
+            "DESCRIPTION=a\rb\x0bc\x85d\u2028e\nSLOT=0\nEMPTY=\n"
+        )
+        assert keys == {
+            "DESCRIPTION": "a\rb\x0bc\x85d\u2028e",
+            "SLOT": "0",
+            "EMPTY": "",
+        }
+        with pytest.raises(InternalError):
+            EbuildProcessor._parse_keys_frame("SLOT\n")
+
+    def test_read_frame_truncated(self):
+        with pytest.raises(InternalError):
+            self._proc(b"A=b").read_frame(10)
+
+
+class FakeProcessor:
+    def __init__(self, userpriv, sandbox, fd_pipes=None):
+        self.userpriv = userpriv
+        self.sandbox = sandbox
+        self.custom_fds = fd_pipes
+        self.is_locked = False
+        self.is_responsive = True
+        self.preloaded = None
+        self.shutdown = False
+
+    def preload_eclasses(self, cache, async_req=False, limited_to=None):
+        self.preloaded = list(limited_to)
+        return True
+
+    def shutdown_processor(self, force=False, ignore_keyboard_interrupt=False):
+        self.shutdown = True
+
+
+class TestProcessorPool:
+    @pytest.fixture(autouse=True)
+    def _setup(self, monkeypatch):
+        monkeypatch.setattr(processor, "EbuildProcessor", FakeProcessor)
+        monkeypatch.setattr(processor, "_pool", processor._ProcessorPool())
+        monkeypatch.setattr(processor, "inactive_ebp_list", [])
+        monkeypatch.setattr(processor, "active_ebp_list", [])
+        yield
+        processor._pool.close()
+
+    def wait_idle(self, count):
+        for _ in range(500):
+            if processor.processor_stats().idle == count:
+                return
+            time.sleep(0.01)
+        pytest.fail(f"pool didn't reach {count} idle processors")
+
+    def test_stats(self):
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        stats = processor.processor_stats()
+        assert (stats.hits, stats.misses, stats.spawned) == (0, 1, 1)
+        assert stats.spawn_time >= 0
+        processor.release_ebuild_processor(ebp)
+        assert processor.request_ebuild_processor(sandbox=False) is ebp
+        stats = processor.processor_stats()
+        assert (stats.hits, stats.misses, stats.spawned) == (1, 1, 1)
+
+    def test_warm_pool(self):
+        processor.start_processor_pool(2, sandbox=False)
+        self.wait_idle(2)
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        assert processor.processor_stats().hits == 1
+        # the handed out processor is replaced
+        self.wait_idle(2)
+        assert processor.processor_stats().spawned == 3
+        assert ebp in processor.active_ebp_list
+
+    def test_preload(self):
+        eclass_cache = SimpleNamespace(eclasses={"a": None, "b": None})
+        processor.start_processor_pool(1, sandbox=False)
+        self.wait_idle(1)
+        # eclasses are lazily determined and preloaded into idle processors
+        processor.preload_pool_eclasses(eclass_cache, lambda: ["b", "missing"])
+        for _ in range(500):
+            if processor.inactive_ebp_list[0].preloaded is not None:
+                break
+            time.sleep(0.01)
+        assert processor.inactive_ebp_list[0].preloaded == ["b"]
+
+    def test_replace_dead(self):
+        processor.start_processor_pool(1, sandbox=False)
+        self.wait_idle(1)
+        dead = processor.inactive_ebp_list[0]
+        dead.is_responsive = False
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        assert ebp is not dead
+        stats = processor.processor_stats()
+        assert (stats.hits, stats.misses, stats.replaced) == (0, 1, 1)
+        self.wait_idle(1)
+
+    def test_close(self):
+        processor.start_processor_pool(1, sandbox=False)
+        self.wait_idle(1)
+        processor.shutdown_all_processors()
+        assert not processor.inactive_ebp_list
+        assert processor._pool._closed
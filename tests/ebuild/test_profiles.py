@@ -1883,3 +1883,94 @@ class TestProfileEapiDefault:
         profiles_base.mkdir(parents=True)
         (profiles_base / "repo_name").write_text("test\n")
         assert str(profiles.EmptyRootNode(str(profiles_base)).eapi) == "0"
+
+
+class TestProfileSnapshot(profile_mixin):
+    class kls(profiles.OnDiskProfile):
+        _node_kls = ProfileNode
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(profiles.ProfileSnapshot, "_racy_window", -(10**18))
+        self.base = tmp_path / "profiles"
+        self.base.mkdir()
+        self.location = str(tmp_path / "cache" / "snapshot.pickle")
+
+    def get_profile(self, profile="1"):
+        return self.kls(str(self.base), profile, snapshot=self.location)
+
+    def test_snapshot(self):
+        self.mk_profiles(
+            self.base,
+            {"package.mask": "dev-util/foo", "use.mask": "foo"},
+            {"package.use": "dev-util/bar bar\n", "make.defaults": 'USE="baz"\n'},
+        )
+        p = self.get_profile()
+        masks, pkg_use = p.masks, p.pkg_use
+        assert os.path.exists(self.location)
+
+        # attributes are loaded from the snapshot without parsing profile files
+        with mock.patch.object(
+            ProfileNode, "_parse_atom_negations", side_effect=AssertionError
+        ):
+            p = self.get_profile()
+            assert p.masks == masks
+            assert p._incremental_masks == (((), (atom("dev-util/foo"),)),)
+            assert p.default_env["USE"] == ("baz",)
+            assert p.use == ("baz",)
+        self.assertEqualChunks(
+            p.pkg_use,
+            {"dev-util/bar": (chunked_data(atom("dev-util/bar"), (), ("bar",)),)},
+        )
+        self.assertEqualChunks(
+            p.masked_use, {atrue: (chunked_data(atrue, (), ("foo",)),)}
+        )
+        assert p.pkg_use == pkg_use
+
+    def test_invalidation(self):
+        self.mk_profiles(self.base, {"package.mask": "dev-util/foo"}, {})
+        assert self.get_profile().masks == frozenset([atom("dev-util/foo")])
+
+        # modified files
+        path = self.base / "0" / "package.mask"
+        path.write_text("dev-util/bar\n")
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert self.get_profile().masks == frozenset([atom("dev-util/bar")])
+
+        # new files
+        (self.base / "1" / "package.mask").write_text("dev-util/foo\n")
+        assert self.get_profile().masks == frozenset(
+            atom(f"dev-util/{x}") for x in ("bar", "foo")
+        )
+
+        # changed stack
+        (self.base / "1" / "parent").unlink()
+        assert self.get_profile().masks == frozenset([atom("dev-util/foo")])
+
+    def test_racy_mtimes(self, monkeypatch):
+        monkeypatch.setattr(profiles.ProfileSnapshot, "_racy_window", 10**18)
+        self.mk_profiles(self.base, {"package.mask": "dev-util/foo"}, {})
+        assert self.get_profile().masks == frozenset([atom("dev-util/foo")])
+        assert not os.path.exists(self.location)
+
+    def test_invalid_snapshot(self, caplog):
+        self.mk_profiles(self.base, {"package.mask": "dev-util/foo"}, {})
+        os.makedirs(os.path.dirname(self.location))
+        with open(self.location, "w") as f:
+            f.write("garbage")
+        assert self.get_profile().masks == frozenset([atom("dev-util/foo")])
+        assert "invalid profile snapshot" in caplog.text
+        # the snapshot is rewritten
+        caplog.clear()
+        assert self.get_profile().masks == frozenset([atom("dev-util/foo")])
+        assert "invalid profile snapshot" not in caplog.text
+
+    def test_parse_errors(self):
+        self.mk_profiles(self.base, {"package.mask": "dev-util/foo"}, {})
+        (self.base / "1" / "package.use").mkdir()
+        p = self.get_profile()
+        with pytest.raises(profiles.ProfileError):
+            p.pkg_use
+        assert not os.path.exists(self.location)
+        assert p.masks == frozenset([atom("dev-util/foo")])
@@ -182,6 +182,23 @@ class TestUnconfiguredTree:
         assert {"cat": ("pkg",), "empty": ("empty",)} == dict(repo.packages)
         assert {("cat", "pkg"): ("3",), ("empty", "empty"): ()} == dict(repo.versions)
 
+    def test_index(self, tmp_path, pdir):
+        for pkg in ("cat/pkg-1", "cat/pkg-2", "cat/other-1"):
+            cat, pn = pkg.split("/")
+            pn = pn.rsplit("-", 1)[0]
+            (pkgdir := tmp_path / cat / pn).mkdir(parents=True, exist_ok=True)
+            (pkgdir / f"{pkg.split('/')[1]}.ebuild").touch()
+        (pdir / "categories").write_text("cat\n")
+        index = str(tmp_path / "index.json")
+        repo = self.mk_tree(tmp_path, index=index)
+        assert repo.index is not None
+        assert sorted(repo.packages["cat"]) == ["other", "pkg"]
+        assert sorted(repo.versions[("cat", "pkg")]) == ["1", "2"]
+        repo.index.save()
+        repo = self.mk_tree(tmp_path, index=index)
+        assert len(repo.index) == 1
+        assert sorted(repo.versions[("cat", "pkg")]) == ["1", "2"]
+
     def test_package_mask(self, tmp_path, pdir):
         (pdir / "package.mask").write_text(
             textwrap.dedent(
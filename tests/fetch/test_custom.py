@@ -1,4 +1,7 @@
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 import pytest
@@ -112,3 +115,37 @@ class TestFetch:
 
         # Partial file should still be present — our fix must not touch it
         assert os.path.exists(partial_path)
+
+
+class TestHostLimit:
+    def test_concurrent_downloads(self, distdir: str):
+        fetcher = custom.fetcher(
+            distdir=distdir,
+            command="fetch ${URI} -o ${FILE}",
+            userpriv=False,
+            host_limit=2,
+        )
+        lock = threading.Lock()
+        active = {}
+        peak = {}
+
+        def fake_spawn(cmd, **kwargs):
+            host = cmd.split()[1].split("/")[2]
+            with lock:
+                active[host] = active.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), active[host])
+            time.sleep(0.05)
+            with lock:
+                active[host] -= 1
+            partial_content(os.path.join(distdir, cmd.split()[-1]))
+            return 0
+
+        targets = [
+            fetchable(f"file{i}", uri=[f"http://host{i % 2}/file{i}"]) for i in range(8)
+        ]
+        with mock.patch("pkgcore.fetch.custom.spawn_bash", side_effect=fake_spawn):
+            with ThreadPoolExecutor(8) as executor:
+                paths = list(executor.map(fetcher.fetch, targets))
+
+        assert paths == [os.path.join(distdir, x.filename) for x in targets]
+        assert peak == {"host0": 2, "host1": 2}
@@ -2,6 +2,7 @@ import os
 from functools import partial
 
 import pytest
+from snakeoil.data_source import data_source
 
 from pkgcore.fs import contents, fs
 
@@ -13,6 +14,8 @@ mk_fifo = partial(fs.fsFifo, strict=False)
 
 
 class TestContentsSet:
+    kls = contents.contentsSet
+
     files = list(
         map(
             mk_file,
@@ -38,15 +41,15 @@ class TestContentsSet:
 
     def test_init(self):
         with pytest.raises(TypeError):
-            contents.contentsSet(self.all + [1])
-        contents.contentsSet(self.all)
-        contents.contentsSet(self.all, mutable=True)
+            self.kls(self.all + [1])
+        self.kls(self.all)
+        self.kls(self.all, mutable=True)
         # test to ensure no one screwed up the optional initials
         # making it mandatory
-        assert len(contents.contentsSet()) == 0
+        assert len(self.kls()) == 0
 
     def test_add(self):
-        cs = contents.contentsSet(self.files + self.dirs, mutable=True)
+        cs = self.kls(self.files + self.dirs, mutable=True)
         for x in self.links:
             cs.add(x)
             assert x in cs
@@ -54,7 +57,7 @@ class TestContentsSet:
             set(x.location for x in self.files + self.dirs + self.links)
         )
         with pytest.raises(AttributeError):
-            contents.contentsSet(mutable=False).add(self.devs[0])
+            self.kls(mutable=False).add(self.devs[0])
         with pytest.raises(TypeError):
             cs.add(1)
         with pytest.raises(TypeError):
@@ -62,13 +65,13 @@ class TestContentsSet:
 
     def test_remove(self):
         with pytest.raises(AttributeError):
-            contents.contentsSet(mutable=False).remove(self.devs[0])
+            self.kls(mutable=False).remove(self.devs[0])
         with pytest.raises(AttributeError):
-            contents.contentsSet(mutable=False).remove(1)
-        cs = contents.contentsSet(self.all, mutable=True)
+            self.kls(mutable=False).remove(1)
+        cs = self.kls(self.all, mutable=True)
         for x in self.all:
             cs.remove(x)
-        cs = contents.contentsSet(self.all, mutable=True)
+        cs = self.kls(self.all, mutable=True)
         for location in (x.location for x in self.all):
             cs.remove(location)
         assert len(cs) == 0
@@ -76,7 +79,7 @@ class TestContentsSet:
             cs.remove(self.all[0])
 
     def test_contains(self):
-        cs = contents.contentsSet(mutable=True)
+        cs = self.kls(mutable=True)
         for x in [
             y[0] for y in [self.files, self.dirs, self.links, self.devs, self.fifos]
         ]:
@@ -88,13 +91,13 @@ class TestContentsSet:
             cs.remove(x)
 
     def test_clear(self):
-        cs = contents.contentsSet(self.all, mutable=True)
+        cs = self.kls(self.all, mutable=True)
         assert len(cs) > 0
         cs.clear()
         assert len(cs) == 0
 
     def test_len(self):
-        assert len(contents.contentsSet(self.all)) == len(self.all)
+        assert len(self.kls(self.all)) == len(self.all)
 
     fs_types = (
         pytest.param("files", fs.fsFile, id="files"),
@@ -107,7 +110,7 @@ class TestContentsSet:
     @pytest.mark.parametrize(("name", "obj_class"), fs_types)
     def test_iterobj(self, name, obj_class):
         s = set(getattr(self, name))
-        cs = contents.contentsSet(s)
+        cs = self.kls(s)
         forced_name = "iter" + name
 
         s2 = set(getattr(cs, forced_name)())
@@ -128,7 +131,7 @@ class TestContentsSet:
     @pytest.mark.parametrize(("name", "obj_class"), fs_types)
     def test_listobj(self, name, obj_class):
         valid_list = getattr(self, name)
-        cs = contents.contentsSet(valid_list)
+        cs = self.kls(valid_list)
         test_list = getattr(cs, name)()
         if obj_class is not None:
             for x in test_list:
@@ -137,7 +140,7 @@ class TestContentsSet:
 
     def test_iterobj_all(self):
         s = set(self.all)
-        assert set(contents.contentsSet(s)) == s
+        assert set(self.kls(s)) == s
 
     def test_check_instance(self):
         for x in [
@@ -154,7 +157,7 @@ class TestContentsSet:
                 [fs.fsFile("/tmp", strict=False)],
             )
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(c2)
             c3 = c1
@@ -162,7 +165,7 @@ class TestContentsSet:
             c3 = getattr(c1, name)(c2)
         assert set(ret) == {x.location for x in c3}
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(iter(c2))
             c3 = c1
@@ -214,7 +217,7 @@ class TestContentsSet:
                 [fs.fsFile("/tmp", strict=False)],
             )
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(c2)
             c3 = c1
@@ -222,7 +225,7 @@ class TestContentsSet:
             c3 = getattr(c1, name)(c2)
         assert {x.location for x in c3} == ret
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(iter(c2))
             c3 = c1
@@ -233,8 +236,8 @@ class TestContentsSet:
     del f, fstrings
 
     def check_complex_set_op(self, name, required, data1, data2):
-        cset1 = contents.contentsSet(data1)
-        cset2 = contents.contentsSet(data2)
+        cset1 = self.kls(data1)
+        cset2 = self.kls(data2)
         f = getattr(cset1, name)
         got = f(cset2)
         assert got == required, (
@@ -298,14 +301,12 @@ class TestContentsSet:
     def test_child_nodes(self):
         assert {"/usr", "/usr/bin", "/usr/foo"} == {
             x.location
-            for x in contents.contentsSet(
-                [mk_dir("/usr"), mk_dir("/usr/bin"), mk_file("/usr/foo")]
-            )
+            for x in self.kls([mk_dir("/usr"), mk_dir("/usr/bin"), mk_file("/usr/foo")])
         }
 
     def test_map_directory_structure(self):
-        old = contents.contentsSet([mk_dir("/dir"), mk_link("/sym", "dir")])
-        new = contents.contentsSet([mk_file("/sym/a"), mk_dir("/sym")])
+        old = self.kls([mk_dir("/dir"), mk_link("/sym", "dir")])
+        new = self.kls([mk_file("/sym/a"), mk_dir("/sym")])
         # verify the machinery is working as expected.
         ret = new.map_directory_structure(old)
         assert set(ret) == {mk_dir("/dir"), mk_file("/dir/a")}
@@ -326,7 +327,7 @@ class TestContentsSet:
 
     def test_add_missing_directories(self):
         src = [mk_file("/dir1/a"), mk_file("/dir2/dir3/b"), mk_dir("/dir1/dir4")]
-        cs = contents.contentsSet(src)
+        cs = self.kls(src)
         cs.add_missing_directories()
         assert {x.location for x in cs} == {
             "/dir1",
@@ -345,7 +346,7 @@ class TestContentsSet:
             target = {k: set(v) for k, v in target.items()}
             assert d == target
 
-        cs = contents.contentsSet()
+        cs = self.kls()
         f1 = mk_file("/f", dev=1, inode=1)
         cs.add(f1)
         check_it({(1, 1): [f1]})
@@ -363,6 +364,122 @@ class TestContentsSet:
         check_it({(1, 1): [f1, f4], (1, 2): [f2], (2, 1): [f3]})
 
 
+class TestCompactContentsSet(TestContentsSet):
+    kls = contents.CompactContentsSet
+
+    def test_attrs(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("data")
+        objs = [
+            mk_file("/file", mtime=1, mode=0o644, uid=1, gid=2, chksums={"md5": 3}),
+            mk_file("/float", mtime=1.5, dev=4, inode=5, data=data_source("x")),
+            fs.fsFile(str(path), strict=False),
+            mk_dir("/dir", mode=0o755),
+            mk_link("/link", "dir", mtime=2),
+            mk_dev("/dev", major=1, minor=3),
+            mk_fifo("/fifo"),
+        ]
+        objs[2].chksums["md5"]
+        cs = self.kls(objs)
+        for obj in objs:
+            new = cs[obj.location]
+            assert new == obj
+            for attr in obj.__attrs__:
+                if attr not in ("chksums", "data"):
+                    assert getattr(new, attr) == getattr(obj, attr), attr
+        assert cs["/file"].chksums == {"md5": 3}
+        assert cs["/float"].data.text_fileobj().read() == "x"
+        assert cs[str(path)].data.path == str(path)
+        # lazily generated checksums stay lazy
+        chksums = cs[str(path)].chksums
+        assert chksums.missing(["md5", "sha512"]) == ["sha512"]
+        assert chksums["sha512"] == objs[2].chksums["sha512"]
+
+    def test_sorted(self):
+        cs = self.kls(self.all)
+        assert [x.location for x in cs] == sorted(x.location for x in self.all)
+        cs = self.kls(mutable=True)
+        for x in reversed(self.all):
+            cs.add(x)
+        assert list(cs) == sorted(self.all)
+
+    def test_replace(self):
+        cs = self.kls([mk_file("/foo", chksums={"md5": 1})], mutable=True)
+        cs.add(mk_dir("/foo"))
+        assert cs["/foo"].is_dir
+        cs.update([mk_file("/foo", chksums={"sha1": 2}), mk_dir("/bar")])
+        assert cs["/foo"].chksums == {"sha1": 2}
+        assert len(cs) == 2
+
+    def test_child_nodes_prefix(self):
+        cs = self.kls(
+            [
+                mk_dir("/usr"),
+                mk_file("/usr/a"),
+                mk_dir("/usr/bin"),
+                mk_file("/usr/bin/b"),
+                mk_file("/usr-2/c"),
+                mk_file("/usr0"),
+                mk_link("/lib", "/usr"),
+            ]
+        )
+        assert [x.location for x in cs.child_nodes("/usr/")] == [
+            "/usr/a",
+            "/usr/bin",
+            "/usr/bin/b",
+        ]
+        assert isinstance(cs.child_nodes("/usr"), self.kls)
+        assert [x.location for x in cs.iter_child_nodes(cs["/lib"])] == [
+            "/usr/a",
+            "/usr/bin",
+            "/usr/bin/b",
+        ]
+        assert not cs.child_nodes("/usr/a")
+
+    def test_mixed_set_ops(self):
+        compact = self.kls(self.files[:3] + self.dirs)
+        cs = contents.contentsSet(self.dirs + self.links)
+        assert set(compact.difference(cs)) == set(self.files[:3])
+        assert set(compact.intersection(cs)) == set(self.dirs)
+        assert set(compact.union(cs)) == set(self.files[:3] + self.dirs + self.links)
+        assert isinstance(compact.difference(cs), self.kls)
+        compact = compact.clone()
+        compact.difference_update(x.location for x in self.dirs)
+        assert set(compact) == set(self.files[:3])
+
+    def test_mixed_equality(self):
+        objs = self.files + self.dirs + self.links
+        compact = self.kls(objs)
+        for other in (
+            contents.contentsSet(objs),
+            contents.OrderedContentsSet(objs),
+            self.kls(contents.contentsSet(objs)),
+        ):
+            assert compact == other
+            assert other == compact
+            assert not compact != other
+            assert not other != compact
+        # entries are compared by location and type
+        cs = contents.contentsSet(objs[1:] + [mk_dir(objs[0].location)])
+        assert compact != cs
+        assert cs != compact
+        assert compact != contents.contentsSet(objs[1:])
+        assert compact != objs
+
+    def test_large_ints(self):
+        objs = [
+            mk_file("/a", dev=2**64 - 1, inode=2**63),
+            mk_file("/b", dev=1, inode=3),
+        ]
+        cs = self.kls(objs, mutable=True)
+        assert cs["/a"].dev == 2**64 - 1
+        assert cs["/a"].inode == 2**63
+        assert cs.clone()["/a"].inode == 2**63
+        cs.add(mk_file("/a", dev=1, inode=2))
+        assert (cs["/a"].dev, cs["/a"].inode) == (1, 2)
+        assert set(cs.inode_map()) == {(1, 2), (1, 3)}
+
+
 class Test_offset_rewriting:
     change_offset = staticmethod(contents.change_offset_rewriter)
     offset_insert = staticmethod(contents.offset_rewriter)
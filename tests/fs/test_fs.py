@@ -1,5 +1,6 @@
 from os.path import join as pjoin
 from os.path import normpath
+from unittest import mock
 
 import pytest
 from snakeoil.chksum import get_chksums
@@ -138,6 +139,29 @@ class Test_fsFile(base):
         obj2 = self.make_obj(__file__, chksums={1: 2})
         assert obj2.chksums is obj2.change_attributes(data=data_source).chksums
 
+    def test_lazy_chksums(self):
+        obj = self.make_obj(__file__)
+        with mock.patch.object(
+            obj.chksums, "_val_func", wraps=obj.chksums._val_func
+        ) as val_func:
+            # single lookups only generate what's requested
+            md5 = obj.chksums["md5"]
+            val_func.assert_called_once_with(["md5"])
+            assert obj.chksums["md5"] == md5
+            assert val_func.call_count == 1
+            obj.chksums.generate(("md5", "sha512", "size", "unknown"))
+            val_func.assert_called_with(["sha512", "size"])
+            # remaining checksums are generated in a single pass
+            assert dict(obj.chksums.items()) == dict(
+                zip(
+                    obj.chksums.keys(),
+                    get_chksums(__file__, *obj.chksums.keys()),
+                )
+            )
+            assert val_func.call_count == 3
+        with pytest.raises(KeyError):
+            obj.chksums["unknown"]
+
 
 class Test_fsLink(base):
     kls = fs.fsLink
@@ -1,7 +1,9 @@
 import os
 from pathlib import Path
+from unittest import mock
 
 import pytest
+from snakeoil.chksum import get_chksums
 
 from pkgcore.fs import fs, livefs
 from pkgcore.fs.contents import contentsSet
@@ -144,3 +146,45 @@ class TestFsObjs:
         assert not list(livefs.intersect(cset))
         cset = contentsSet([fs.fsDir("reg", strict=False)])
         assert not list(livefs.intersect(cset))
+
+    def test_iterscan_follow_symlinks(self, tmp_path):
+        (tmp_path / "dir").mkdir()
+        (tmp_path / "dir" / "file").touch()
+        (tmp_path / "link").symlink_to("dir")
+        (tmp_path / "dangling").symlink_to("nonexistent")
+        objs = {x.location: x for x in livefs.iter_scan(str(tmp_path))}
+        assert fs.issym(objs[str(tmp_path / "link")])
+        assert str(tmp_path / "link" / "file") not in objs
+
+        objs = {
+            x.location: x for x in livefs.iter_scan(str(tmp_path), follow_symlinks=True)
+        }
+        assert fs.isdir(objs[str(tmp_path / "link")])
+        assert fs.isreg(objs[str(tmp_path / "link" / "file")])
+        assert fs.issym(objs[str(tmp_path / "dangling")])
+
+    def test_fill_chksums(self, tmp_path):
+        for i in range(4):
+            (tmp_path / f"file{i}").write_text(f"data{i}")
+        (tmp_path / "dir").mkdir()
+        cset = livefs.scan(str(tmp_path))
+        files = sorted(cset.iterfiles())
+        files[0].chksums["sha512"]
+        with mock.patch(
+            "pkgcore.fs.livefs.chksum_files", wraps=livefs.chksum_files
+        ) as chksum_files:
+            livefs.fill_chksums(cset, ("md5", "sha512"))
+        # files are batched by the checksums they're missing
+        assert sorted(len(x.args[0]) for x in chksum_files.call_args_list) == [
+            1,
+            3,
+        ]
+        for obj in files:
+            assert obj.chksums.missing(("md5", "sha512")) == []
+            assert [obj.chksums["md5"], obj.chksums["sha512"]] == get_chksums(
+                obj.location, "md5", "sha512"
+            )
+        # non-lazy checksums are left alone
+        obj = fs.fsFile(str(tmp_path / "file0"), chksums={"md5": 1}, strict=False)
+        livefs.fill_chksums([obj], ("md5", "sha512"))
+        assert obj.chksums == {"md5": 1}
@@ -1,8 +1,12 @@
+import errno
 import os
+from contextlib import ExitStack
 from pathlib import Path
+from unittest import mock
 
 import pytest
-from snakeoil.data_source import local_source
+from snakeoil import compression
+from snakeoil.data_source import bz2_source, local_source
 
 from pkgcore.fs import contents, fs, livefs, ops
 
@@ -76,6 +80,68 @@ class TestCopyFile:
         assert dest.read_text() == content
         verify(o, kwds)
 
+    @pytest.mark.parametrize("reflink", (True, False))
+    @pytest.mark.parametrize("copy_range", (True, False))
+    def test_copy_fallbacks(self, tmp_path, reflink, copy_range):
+        data = os.urandom(100000)
+        (src := tmp_path / "src").write_bytes(data)
+        dest = tmp_path / "dest"
+        dest.write_text("old")
+        old_inode = dest.stat().st_ino
+        o = fs.fsFile(
+            str(dest),
+            mtime=10321,
+            uid=os.getuid(),
+            gid=os.getgid(),
+            mode=0o640,
+            data=local_source(str(src)),
+            dev=None,
+            inode=None,
+        )
+        with ExitStack() as stack:
+            if not reflink:
+                stack.enter_context(
+                    mock.patch(
+                        "pkgcore.fs.ops.fcntl.ioctl",
+                        side_effect=OSError(errno.EOPNOTSUPP, "unsupported"),
+                    )
+                )
+            if not copy_range:
+                stack.enter_context(
+                    mock.patch(
+                        "pkgcore.fs.ops.os.copy_file_range",
+                        side_effect=OSError(errno.EXDEV, "cross device"),
+                    )
+                )
+            assert ops.copyfile(o)
+        assert dest.read_bytes() == data
+        # existing files are replaced atomically via rename
+        assert dest.stat().st_ino != old_inode
+        assert not os.path.exists(f"{dest}#new")
+        verify(o, {"mtime": 10321, "mode": 0o640})
+
+    def test_compressed_source(self, tmp_path):
+        # sources with a path that aren't plain files are transferred as is
+        data = b"uncompressed data"
+        (src := tmp_path / "src.bz2").write_bytes(
+            compression.compress_data("bzip2", data)
+        )
+        dest = tmp_path / "dest"
+        o = fs.fsFile(str(dest), data=bz2_source(str(src)), strict=False)
+        assert ops.copyfile(o)
+        assert dest.read_bytes() == data
+
+    def test_copy_error(self, tmp_path):
+        (src := tmp_path / "src").write_text("data")
+        o = fs.fsFile(str(tmp_path / "dest"), data=local_source(str(src)), strict=False)
+        with (
+            mock.patch(
+                "pkgcore.fs.ops.fcntl.ioctl", side_effect=OSError(errno.EIO, "io")
+            ),
+            pytest.raises(OSError),
+        ):
+            ops.copyfile(o)
+
     def test_sym_perms(self, tmp_path):
         curgid = os.getgid()
         group = [x for x in os.getgroups() if x != curgid]
@@ -217,6 +283,58 @@ class TestMergeContents(ContentsMixin):
         assert ops.merge_contents(cset)
         assert fs.issym(livefs.gen_obj(str(path)))
 
+    @pytest.mark.parametrize("jobs", (1, 4))
+    def test_jobs(self, tmp_path, jobs):
+        src = tmp_path / "src"
+        files = {}
+        for i in range(5):
+            (src / f"dir{i}" / "sub").mkdir(parents=True)
+            for j in range(5):
+                for path in (f"dir{i}/file{j}", f"dir{i}/sub/file{j}"):
+                    files[path] = os.urandom(i * 1000 + j)
+                    (src / path).write_bytes(files[path])
+            (src / f"dir{i}" / "link").symlink_to("file0")
+        # hardlinks across directories
+        os.link(src / "dir0" / "file1", src / "dir4" / "sub" / "hardlink")
+        files["dir4/sub/hardlink"] = files["dir0/file1"]
+        cset = livefs.scan(str(src), offset=str(src))
+        (dest := tmp_path / "dest").mkdir()
+        merged = []
+
+        def callback(obj):
+            # entries are reported as they're merged, after the earlier
+            # entries of their directory
+            if not obj.is_dir:
+                for x in merged:
+                    if not x.is_dir and x.dirname == obj.dirname:
+                        assert os.path.lexists(x.location), x
+            merged.append(obj)
+
+        assert ops.merge_contents(cset, offset=str(dest), callback=callback, jobs=jobs)
+        assert len(merged) == len(cset)
+        assert livefs.scan(str(src), offset=str(src)) == livefs.scan(
+            str(dest), offset=str(dest)
+        )
+        for path, data in files.items():
+            assert (dest / path).read_bytes() == data
+        assert (dest / "dir0" / "file1").stat().st_ino == (
+            dest / "dir4" / "sub" / "hardlink"
+        ).stat().st_ino
+        # remerging over existing files
+        assert ops.merge_contents(cset, offset=str(dest), jobs=jobs)
+
+    def test_jobs_failure(self, tmp_path):
+        src = self.generate_tree(
+            tmp_path / "src", {"a": ["dir"], "a/file": ["reg"], "b": ["dir"]}
+        )
+        (src_path := tmp_path / "src" / "b" / "file").touch()
+        cset = livefs.scan(src, offset=src)
+        (dest := tmp_path / "dest").mkdir()
+        (dest / "b" / "file").mkdir(parents=True)
+        with pytest.raises(ops.CannotOverwrite):
+            ops.merge_contents(cset, offset=str(dest), jobs=2)
+        assert src_path.exists()
+
 
 class TestUnmergeContents(ContentsMixin):
     @pytest.fixture
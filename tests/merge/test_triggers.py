@@ -575,6 +575,24 @@ class Test_detect_world_writable(single_attr_change_base):
         assert "/far" not in " ".join(warnings)
 
 
+class TestMerge:
+    @pytest.mark.parametrize("jobs", (1, 4))
+    def test_jobs(self, monkeypatch, jobs):
+        calls = []
+        monkeypatch.setattr(
+            triggers, "merge_contents", lambda cset, **kw: calls.append(kw)
+        )
+        reported = []
+        observer = fake_reporter(installing_fs_obj=reported.append)
+        engine = fake_engine(observer=observer, merge_jobs=jobs)
+        triggers.merge().trigger(engine, contentsSet())
+        (kw,) = calls
+        assert kw["jobs"] == jobs
+        # parallel merging reports through a lock protected observer
+        kw["callback"]("/foo")
+        assert reported == ["/foo"]
+
+
 class TestPruneFiles:
     kls = triggers.PruneFiles
 
@@ -0,0 +1,132 @@
+import os
+import shlex
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from snakeoil.chksum import get_chksums
+
+from pkgcore.fetch import fetchable, mirror, uri_list
+from pkgcore.operations.format import fetch_base
+
+FETCHCOMMAND = (
+    f"{shlex.quote(sys.executable)} -c "
+    "'import sys, urllib.request; urllib.request.urlretrieve(*sys.argv[1:])' "
+    '"${URI}" "${DISTDIR}/${FILE}"'
+)
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.requests.append(self.path)
+        try:
+            time.sleep(0.05)
+            super().do_GET()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Local HTTP server standing in for a mirror."""
+    root = tmp_path / "mirror"
+    root.mkdir()
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(_Handler, directory=str(root))
+    )
+    httpd.lock = threading.Lock()
+    httpd.active = httpd.peak = 0
+    httpd.requests = []
+    httpd.root = root
+    httpd.url = "http://127.0.0.1:%i" % httpd.server_address[1]
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_fetchable(server, name, data, uris=None):
+    path = server.root / name
+    path.write_bytes(data)
+    chksums = dict(zip(("size", "sha512"), get_chksums(str(path), "size", "sha512")))
+    if uris is None:
+        uris = uri_list(name)
+        uris.add_uri(f"{server.url}/{name}")
+        uris.finalize()
+    return fetchable(name, uris, chksums)
+
+
+def make_fetcher(tmp_path, fetchables, **kwargs):
+    distdir = tmp_path / "distfiles"
+    distdir.mkdir(exist_ok=True)
+    domain = SimpleNamespace(
+        settings={"FETCHCOMMAND": FETCHCOMMAND, "FETCH_ATTEMPTS": "3"},
+        distdir=str(distdir),
+        get_settings_envvar=lambda key, default: default,
+    )
+    with mock.patch.dict(os.environ, {"no_proxy": "*"}):
+        fetcher = fetch_base(domain, None, fetchables, **kwargs)
+    fetcher.fetcher.userpriv = False
+    return fetcher
+
+
+class TestFetchBase:
+    def test_parallel(self, tmp_path, server):
+        fetchables = [
+            make_fetchable(server, f"file{i}", os.urandom(1024 + i)) for i in range(8)
+        ]
+        fetcher = make_fetcher(tmp_path, fetchables, jobs=8, host_limit=3)
+        verified, failures = fetcher.fetch_all(mock.Mock())
+        assert not failures
+        assert sorted(verified.values()) == sorted(fetchables)
+        assert len(server.requests) == 8
+        assert 1 < server.peak <= 3
+
+    def test_sequential(self, tmp_path, server):
+        fetchables = [
+            make_fetchable(server, f"file{i}", os.urandom(512)) for i in range(3)
+        ]
+        fetcher = make_fetcher(tmp_path, fetchables)
+        verified, failures = fetcher.fetch_all(mock.Mock())
+        assert not failures
+        assert len(verified) == 3
+        assert server.peak == 1
+
+    def test_mirror_fallback(self, tmp_path, server):
+        data = os.urandom(2048)
+        uris = uri_list("file")
+        # unreachable mirror followed by the working one
+        uris.add_mirror(mirror(["http://127.0.0.1:1", server.url], "test"), "file")
+        uris.finalize()
+        target = make_fetchable(server, "file", data, uris=uris)
+        other = make_fetchable(server, "other", os.urandom(64))
+        fetcher = make_fetcher(tmp_path, [target, other], jobs=2)
+        verified, failures = fetcher.fetch_all(mock.Mock())
+        assert not failures
+        assert verified[os.path.join(fetcher.distdir, "file")] == target
+
+    def test_failures(self, tmp_path, server):
+        good = make_fetchable(server, "good", os.urandom(64))
+        missing = make_fetchable(server, "missing", os.urandom(64))
+        os.unlink(server.root / "missing")
+        # duplicate filenames are only fetched once
+        fetchables = [good, missing, fetchable("good", good.uri, good.chksums)]
+        fetcher = make_fetcher(tmp_path, fetchables, jobs=4)
+        verified, failures = fetcher.fetch_all(mock.Mock())
+        assert failures == [missing]
+        assert list(verified.values()) == [good]
+        assert server.requests.count("/good") == 1
@@ -0,0 +1,242 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from pkgcore.ebuild import processor
+from pkgcore.operations import regen
+from pkgcore.operations import repo as repo_ops
+
+
+def fake_pkg(cpvstr):
+    return SimpleNamespace(cpvstr=cpvstr, key=cpvstr.rsplit("-", 1)[0])
+
+
+class fake_cache(dict):
+    readonly = False
+    autocommits = True
+
+
+class fake_repo:
+    def __init__(self, fail=()):
+        self.cache = (fake_cache(),)
+        self.package_class = SimpleNamespace(_cache=self.cache)
+        self.fail = frozenset(fail)
+
+    def _regen_operation_helper(self, **kwargs):
+        def helper(pkg):
+            if pkg.cpvstr in self.fail:
+                raise ValueError(f"broken: {pkg.cpvstr}")
+            for cache in self.package_class._cache:
+                cache[pkg.cpvstr] = {"pid": os.getpid(), **kwargs}
+                del cache["stale"]
+
+        return helper
+
+
+class TestShardPkgs:
+    def test_empty(self):
+        assert regen._shard_pkgs([], 4) == []
+
+    def test_versions_kept_together(self):
+        pkgs = [fake_pkg(x) for x in ("a/a-1", "b/b-1", "a/a-2", "c/c-1", "a/a-3")]
+        shards = regen._shard_pkgs(pkgs, 2)
+        assert len(shards) == 2
+        # largest group is dealt first
+        assert [x.cpvstr for x in shards[0]] == ["a/a-1", "a/a-2", "a/a-3", "c/c-1"]
+        assert [x.cpvstr for x in shards[1]] == ["b/b-1"]
+
+    def test_fewer_groups_than_shards(self):
+        pkgs = [fake_pkg("a/a-1"), fake_pkg("a/a-2")]
+        assert len(regen._shard_pkgs(pkgs, 8)) == 1
+
+
+class TestRegenRepositoryProcesses:
+    def test_cache_updates(self):
+        repo = fake_repo()
+        repo.cache[0]["stale"] = {}
+        pkgs = [fake_pkg(f"cat/pkg{i}-1") for i in range(10)]
+        errors = list(
+            regen.regen_repository(repo, pkgs, None, threads=4, processes=3, force=True)
+        )
+        assert errors == []
+        cache = repo.cache[0]
+        assert "stale" not in cache
+        assert sorted(cache) == sorted(x.cpvstr for x in pkgs)
+        # updates are written by the parent, but generated in the workers
+        assert all(v["force"] for v in cache.values())
+        pids = {v["pid"] for v in cache.values()}
+        assert os.getpid() not in pids
+        assert len(pids) == 3
+
+    def test_errors(self):
+        repo = fake_repo(fail=["cat/bad-1"])
+        pkgs = [fake_pkg(x) for x in ("cat/good-1", "cat/bad-1")]
+        errors = list(regen.regen_repository(repo, pkgs, None, processes=2))
+        assert len(errors) == 1
+        pkg, e = errors[0]
+        assert pkg is pkgs[1]
+        assert isinstance(e, regen.RegenWorkerError)
+        assert "broken: cat/bad-1" in str(e)
+        assert list(repo.cache[0]) == ["cat/good-1"]
+
+    def test_worker_crash(self):
+        repo = fake_repo()
+
+        def helper(**kwargs):
+            os._exit(3)
+
+        repo._regen_operation_helper = helper
+        messages = []
+        observer = SimpleNamespace(error=messages.append)
+        pkgs = [fake_pkg("cat/pkg-1")]
+        assert list(regen.regen_repository(repo, pkgs, observer, processes=2)) == []
+        assert messages == ["regen worker process failed with exit code 3"]
+
+
+def test_forked_children_drop_processors():
+    processor.inactive_ebp_list.append(object())
+    try:
+        pid = os.fork()
+        if pid == 0:
+            os._exit(len(processor.inactive_ebp_list))
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+    finally:
+        processor.inactive_ebp_list.pop()
+
+
+class TestRegenState:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(regen.RegenState, "_racy_window", -(10**18))
+        self.path = tmp_path
+        self.location = str(tmp_path / "state" / "repo.json")
+        (tmp_path / "eclass").mkdir()
+        self.eclasses = {}
+        self.pkgs = {}
+
+    def mk_eclass(self, name):
+        (path := self.path / "eclass" / f"{name}.eclass").touch()
+        self.eclasses[name] = SimpleNamespace(path=str(path))
+
+    def mk_pkg(self, cpvstr, *inherits):
+        (path := self.path / f"{cpvstr.replace('/', '_')}.ebuild").touch()
+        pkg = SimpleNamespace(cpvstr=cpvstr, path=str(path), inherited=inherits)
+        self.pkgs[cpvstr] = pkg
+        return pkg
+
+    def touch(self, path):
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**10))
+
+    def run(self, invalid=(), **kwargs):
+        repo = SimpleNamespace(location=str(self.path), cache=())
+        state = regen.RegenState.for_repo(repo, location=self.location, **kwargs)
+        eclass_cache = SimpleNamespace(eclasses=self.eclasses)
+        changed = state.changed(list(self.pkgs.values()), eclass_cache)
+        state.update(changed, invalid=invalid)
+        state.save()
+        return sorted(pkg.cpvstr for pkg in changed)
+
+    def test_changes(self):
+        self.mk_eclass("a")
+        self.mk_eclass("b")
+        self.mk_pkg("cat/pkg-1", "a")
+        self.mk_pkg("cat/pkg-2", "a", "b")
+        self.mk_pkg("cat/other-1")
+        # initial run regenerates everything
+        assert self.run() == ["cat/other-1", "cat/pkg-1", "cat/pkg-2"]
+        assert self.run() == []
+
+        # modified ebuild
+        self.touch(self.pkgs["cat/other-1"].path)
+        assert self.run() == ["cat/other-1"]
+
+        # modified eclass affects all inheriting packages
+        self.touch(self.eclasses["b"].path)
+        assert self.run() == ["cat/pkg-2"]
+
+        # new and removed packages
+        del self.pkgs["cat/pkg-1"]
+        self.mk_pkg("cat/new-1", "b")
+        assert self.run() == ["cat/new-1"]
+
+        # removed eclass
+        os.unlink(self.eclasses.pop("a").path)
+        assert self.run() == ["cat/pkg-2"]
+
+    def test_reset(self):
+        self.mk_pkg("cat/pkg-1")
+        assert self.run() == ["cat/pkg-1"]
+        assert self.run(reset=True) == ["cat/pkg-1"]
+
+    def test_invalid_pkgs_retried(self):
+        self.mk_pkg("cat/pkg-1")
+        self.mk_pkg("cat/bad-1")
+        assert self.run(invalid=["cat/bad-1"]) == ["cat/bad-1", "cat/pkg-1"]
+        assert self.run() == ["cat/bad-1"]
+        assert self.run() == []
+
+    def test_cache_change(self):
+        self.mk_pkg("cat/pkg-1")
+        self.run()
+        repo = SimpleNamespace(
+            location=str(self.path), cache=(SimpleNamespace(location="/new"),)
+        )
+        state = regen.RegenState.for_repo(repo, location=self.location)
+        assert not state.ebuilds
+
+    def test_invalid_state(self):
+        os.makedirs(os.path.dirname(self.location))
+        with open(self.location, "w") as f:
+            f.write('{"version": 1}')
+        self.mk_pkg("cat/pkg-1")
+        assert self.run() == ["cat/pkg-1"]
+
+
+class TestRegenCache:
+    @pytest.fixture(autouse=True)
+    def _setup(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.saved = []
+
+    def run(self, flush):
+        pkg = SimpleNamespace(cpvstr="cat/pkg-1", unversioned_atom="cat/pkg")
+        saved = self.saved
+        state = SimpleNamespace(
+            changed=lambda pkgs, eclass_cache: pkgs,
+            update=lambda pkgs, invalid: None,
+            save=lambda: saved.append(True),
+        )
+        self.monkeypatch.setattr(regen.RegenState, "for_repo", lambda *a, **kw: state)
+        self.monkeypatch.setattr(regen, "regen_repository", lambda *a, **kw: ())
+        repo = SimpleNamespace(
+            cache=(fake_cache(),),
+            eclass_cache=None,
+            _bad_masked=(),
+            itermatch=lambda *a, **kw: iter([pkg]),
+            operations=SimpleNamespace(run_if_supported=lambda name: flush()),
+        )
+        ops = SimpleNamespace(
+            repo=repo,
+            _get_caches=lambda: repo.cache,
+            _get_observer=lambda observer: observer,
+            _cmd_implementation_clean_cache=lambda pkgs: None,
+        )
+        return repo_ops.operations._cmd_api_regen_cache(
+            ops, observer=object(), incremental=True
+        )
+
+    def test_state_saved(self):
+        assert self.run(lambda: None) == 0
+        assert self.saved
+
+    def test_failed_flush(self):
+        def flush():
+            raise OSError("disk full")
+
+        # the state isn't saved if cache updates weren't written
+        with pytest.raises(OSError):
+            self.run(flush)
+        assert not self.saved
@@ -0,0 +1,192 @@
+import threading
+
+import pytest
+
+from pkgcore.operations import scheduler
+from pkgcore.test.misc import FakePkg
+
+
+class FakeOp:
+    def __init__(self, cpv, desc="add", **deps):
+        data = {k.upper(): v for k, v in deps.items()}
+        self.pkg = FakePkg(cpv, data=data)
+        self.desc = desc
+
+    def __str__(self):
+        return f"{self.desc}: {self.pkg}"
+
+
+class TestPlanDependencies:
+    def test_independent(self):
+        ops = [FakeOp("a/a-1"), FakeOp("a/b-1"), FakeOp("a/c-1")]
+        assert scheduler.plan_dependencies(ops) == [frozenset()] * 3
+
+    def test_deps(self):
+        ops = [
+            FakeOp("a/a-1"),
+            FakeOp("a/b-1", depend="a/a"),
+            FakeOp("a/c-1", rdepend="|| ( a/x a/b )"),
+            FakeOp("a/d-1", depend=">=a/a-2 !a/b", pdepend="a/c"),
+        ]
+        assert scheduler.plan_dependencies(ops) == [
+            frozenset(),
+            frozenset([0]),
+            frozenset([1]),
+            frozenset(),
+        ]
+
+    def test_same_key(self):
+        ops = [FakeOp("a/a-1"), FakeOp("a/a-2")]
+        assert scheduler.plan_dependencies(ops) == [frozenset(), frozenset([0])]
+
+    def test_remove_barrier(self):
+        ops = [
+            FakeOp("a/a-1"),
+            FakeOp("a/b-1"),
+            FakeOp("a/c-1", desc="remove"),
+            FakeOp("a/d-1"),
+        ]
+        deps = scheduler.plan_dependencies(ops)
+        assert deps[2] == frozenset([0, 1])
+        assert deps[3] == frozenset([2])
+
+
+class TestMergeScheduler:
+    def test_invalid_jobs(self):
+        with pytest.raises(ValueError):
+            scheduler.merge_scheduler([], jobs=0)
+
+    def test_merge_order(self):
+        ops = [
+            FakeOp("a/a-1"),
+            FakeOp("a/b-1", depend="a/a"),
+            FakeOp("a/c-1"),
+            FakeOp("a/d-1", depend="a/b a/c"),
+        ]
+        merged = []
+
+        def build(op):
+            # a build may only start once its deps are merged
+            if op.pkg.key == "a/b":
+                assert "a/a" in merged
+            elif op.pkg.key == "a/d":
+                assert {"a/b", "a/c"}.issubset(merged)
+            return op.pkg
+
+        def merge(op, pkg):
+            assert threading.current_thread() is threading.main_thread()
+            assert pkg is op.pkg
+            merged.append(op.pkg.key)
+            return True
+
+        sched = scheduler.merge_scheduler(ops, jobs=4)
+        assert sched.run(build, merge) == []
+        assert sorted(merged) == ["a/a", "a/b", "a/c", "a/d"]
+        assert merged.index("a/a") < merged.index("a/b") < merged.index("a/d")
+        assert merged.index("a/c") < merged.index("a/d")
+        assert all(j.state == "merged" for j in sched.jobs)
+
+    def test_concurrent_builds(self):
+        ops = [FakeOp(f"a/p{i}-1") for i in range(3)]
+        barrier = threading.Barrier(3, timeout=5)
+
+        def build(op):
+            # deadlocks (and times out) unless all three builds run concurrently
+            barrier.wait()
+            return op.pkg
+
+        sched = scheduler.merge_scheduler(ops, jobs=3)
+        assert sched.run(build, lambda op, pkg: True) == []
+
+    def test_removals(self):
+        ops = [FakeOp("a/a-1"), FakeOp("a/b-1", desc="remove")]
+        built = []
+        merged = []
+
+        def build(op):
+            built.append(op.pkg.key)
+            return op.pkg
+
+        def merge(op, pkg):
+            merged.append((op.desc, pkg))
+            return True
+
+        assert scheduler.merge_scheduler(ops, jobs=2).run(build, merge) == []
+        assert built == ["a/a"]
+        assert merged == [("add", ops[0].pkg), ("remove", None)]
+
+    @pytest.mark.parametrize("failure", ("return", Exception, RuntimeError))
+    def test_build_failure(self, failure):
+        ops = [
+            FakeOp("a/a-1"),
+            FakeOp("a/b-1", depend="a/a"),
+            FakeOp("a/c-1"),
+        ]
+
+        def build(op):
+            if op.pkg.key == "a/a":
+                if failure != "return":
+                    raise failure("build failed")
+                return False
+            return op.pkg
+
+        merged = []
+
+        def merge(op, pkg):
+            merged.append(op.pkg.key)
+            return True
+
+        sched = scheduler.merge_scheduler(ops, jobs=1, keep_going=True)
+        failures = sched.run(build, merge)
+        assert [j.pkg.key for j in failures] == ["a/a", "a/b"]
+        assert merged == ["a/c"]
+        if failure != "return":
+            assert str(sched.jobs[0].exc) == "build failed"
+
+    def test_build_interrupt(self):
+        ops = [FakeOp("a/a-1"), FakeOp("a/b-1")]
+
+        def build(op):
+            if op.pkg.key == "a/a":
+                raise KeyboardInterrupt
+            return op.pkg
+
+        sched = scheduler.merge_scheduler(ops, jobs=2)
+        with pytest.raises(KeyboardInterrupt):
+            sched.run(build, lambda op, pkg: True)
+        assert not sched._running
+
+    def test_abort_on_failure(self):
+        ops = [FakeOp("a/a-1"), FakeOp("a/b-1")]
+        merged = []
+
+        def merge(op, pkg):
+            merged.append(op.pkg.key)
+            return False
+
+        sched = scheduler.merge_scheduler(ops, jobs=1)
+        failures = sched.run(lambda op: op.pkg, merge)
+        assert [j.pkg.key for j in failures] == ["a/a"]
+        assert merged == ["a/a"]
+        assert sched.jobs[1].state in ("pending", "built")
+
+    def test_load_average(self, monkeypatch):
+        ops = [FakeOp(f"a/p{i}-1") for i in range(3)]
+        monkeypatch.setattr(scheduler.os, "getloadavg", lambda: (100.0, 0, 0))
+        lock = threading.Lock()
+        running = 0
+        max_running = 0
+
+        def build(op):
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            with lock:
+                running -= 1
+            return op.pkg
+
+        sched = scheduler.merge_scheduler(ops, jobs=3, load_average=2.0)
+        sched._load_poll_interval = 0.01
+        assert sched.run(build, lambda op, pkg: True) == []
+        assert max_running == 1
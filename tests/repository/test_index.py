@@ -0,0 +1,157 @@
+import json
+import os
+
+import pytest
+
+from pkgcore.repository.index import TreeIndex
+
+
+class TestTreeIndex:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path, monkeypatch):
+        # treat all directory mtimes as stable
+        monkeypatch.setattr(TreeIndex, "_racy_window", -(10**18))
+        self.base = tmp_path / "repo"
+        self.base.mkdir()
+        self.location = str(tmp_path / "index" / "repo.json")
+        self.pulls = []
+
+    def mk_pkg(self, cat, pkg, *versions):
+        (path := self.base / cat / pkg).mkdir(parents=True, exist_ok=True)
+        for ver in versions:
+            (path / f"{pkg}-{ver}.ebuild").touch()
+
+    def touch(self, *path, offset=10):
+        path = self.base.joinpath(*path)
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + offset * 10**9))
+
+    def pull_packages(self, cat):
+        self.pulls.append(cat)
+        return tuple(sorted(os.listdir(self.base / cat)))
+
+    def pull_versions(self, catpkg):
+        self.pulls.append(catpkg)
+        cat, pkg = catpkg
+        return tuple(
+            sorted(x[len(pkg) + 1 : -7] for x in os.listdir(self.base / cat / pkg))
+        )
+
+    def lookup(self, index, *catpkg):
+        if len(catpkg) == 1:
+            return index.packages(catpkg[0], self.pull_packages)
+        return index.versions(catpkg, self.pull_versions)
+
+    def mk_index(self, **kwargs):
+        return TreeIndex(str(self.base), self.location, **kwargs)
+
+    def test_persistence(self):
+        self.mk_pkg("cat", "a", "1", "2")
+        self.mk_pkg("cat", "b", "1")
+        index = self.mk_index()
+        assert self.lookup(index, "cat") == ("a", "b")
+        assert self.lookup(index, "cat", "a") == ("1", "2")
+        assert len(self.pulls) == 2
+        index.save()
+        assert os.path.exists(self.location)
+
+        self.pulls.clear()
+        index = self.mk_index()
+        assert len(index) == 1
+        assert self.lookup(index, "cat") == ("a", "b")
+        assert self.lookup(index, "cat", "a") == ("1", "2")
+        assert self.lookup(index, "cat", "b") == ("1",)
+        # only the unindexed package was listed
+        assert self.pulls == [("cat", "b")]
+
+    def test_incremental_update(self):
+        self.mk_pkg("cat", "a", "1")
+        self.mk_pkg("cat", "b", "1")
+        index = self.mk_index()
+        for key in (("cat",), ("cat", "a"), ("cat", "b")):
+            self.lookup(index, *key)
+        index.save()
+
+        self.mk_pkg("cat", "a", "2")
+        self.touch("cat", "a")
+        self.mk_pkg("cat", "c", "1")
+        self.touch("cat")
+        self.pulls.clear()
+        index = self.mk_index()
+        assert self.lookup(index, "cat") == ("a", "b", "c")
+        assert self.lookup(index, "cat", "a") == ("1", "2")
+        assert self.lookup(index, "cat", "b") == ("1",)
+        assert self.pulls == ["cat", ("cat", "a")]
+
+    def test_missing_dirs(self):
+        index = self.mk_index()
+        with pytest.raises(FileNotFoundError):
+            self.lookup(index, "missing")
+        assert len(index) == 0
+
+    def test_trusted_token(self):
+        (self.base / "metadata").mkdir()
+        (self.base / "metadata" / "timestamp.chk").write_text("sync 1\n")
+        self.mk_pkg("cat", "a", "1")
+        index = self.mk_index()
+        self.lookup(index, "cat")
+        self.lookup(index, "cat", "a")
+        index.save()
+        with open(self.location) as f:
+            assert json.load(f)["token"] == "sync 1"
+
+        # changes without a new sync aren't noticed
+        self.mk_pkg("cat", "a", "2")
+        self.touch("cat", "a")
+        self.pulls.clear()
+        index = self.mk_index()
+        assert self.lookup(index, "cat", "a") == ("1",)
+        assert not self.pulls
+
+        # a new sync triggers mtime validation
+        (self.base / "metadata" / "timestamp.chk").write_text("sync 2\n")
+        index = self.mk_index()
+        assert self.lookup(index, "cat", "a") == ("1", "2")
+
+    def test_partially_validated_index_is_untrusted(self):
+        (self.base / "metadata").mkdir()
+        (self.base / "metadata" / "timestamp.chk").write_text("sync 1\n")
+        self.mk_pkg("cat", "a", "1")
+        self.mk_pkg("cat", "b", "1")
+        index = self.mk_index(timestamp=None)
+        for key in (("cat",), ("cat", "a"), ("cat", "b")):
+            self.lookup(index, *key)
+        index.save()
+
+        self.touch("cat", "a")
+        index = self.mk_index()
+        self.lookup(index, "cat", "a")
+        index.save()
+        with open(self.location) as f:
+            assert json.load(f)["token"] is None
+
+    def test_racy_mtimes(self, monkeypatch):
+        monkeypatch.setattr(TreeIndex, "_racy_window", 10**18)
+        self.mk_pkg("cat", "a", "1")
+        index = self.mk_index()
+        self.lookup(index, "cat")
+        self.lookup(index, "cat", "a")
+        index.save()
+        self.pulls.clear()
+        index = self.mk_index()
+        self.lookup(index, "cat")
+        self.lookup(index, "cat", "a")
+        assert self.pulls == ["cat", ("cat", "a")]
+
+    @pytest.mark.parametrize(
+        "data",
+        ("", "{", '{"version": 1}', '{"version": 0, "categories": {}}', "[]"),
+    )
+    def test_invalid_index(self, data):
+        os.makedirs(os.path.dirname(self.location))
+        with open(self.location, "w") as f:
+            f.write(data)
+        self.mk_pkg("cat", "a", "1")
+        index = self.mk_index()
+        assert self.lookup(index, "cat") == ("a",)
+        assert self.pulls == ["cat"]
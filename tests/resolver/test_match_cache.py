@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+from pkgcore.resolver.match_cache import MatchCache
+from pkgcore.restrictions.boolean import AndRestriction
+
+from .test_choice_point import fake_package
+
+
+class fake_repo:
+    def __init__(self, pkgs):
+        self.pkgs = pkgs
+        self.calls = 0
+
+    def itermatch(self, atom):
+        self.calls += 1
+        return iter(self.pkgs)
+
+
+class TestMatchCache:
+    @staticmethod
+    def gen_cache():
+        state = SimpleNamespace(vdb_filter_generation=0)
+        return MatchCache(state, set())
+
+    def test_candidates(self):
+        cache = self.gen_cache()
+        pkgs = [fake_package(marker=1), fake_package(marker=2)]
+        repo = fake_repo(pkgs)
+        assert list(cache.candidates(repo, "dev-util/foo")) == pkgs
+        assert list(cache.candidates(repo, "dev-util/foo")) == pkgs
+        assert repo.calls == 1
+        cache.candidates(repo, "dev-util/bar")
+        assert repo.calls == 2
+        assert cache.info()["candidates"][:2] == (1, 2)
+
+    def test_candidates_lazy(self):
+        cache = self.gen_cache()
+        consumed = []
+
+        class repo:
+            @staticmethod
+            def itermatch(atom):
+                for i in range(3):
+                    consumed.append(i)
+                    yield fake_package(marker=i)
+
+        choices, _ = cache.choices(repo, "dev-util/foo")
+        assert choices.current_pkg.marker == 0
+        assert consumed == [0]
+
+    def test_volatile_candidates(self):
+        cache = self.gen_cache()
+        repo = fake_repo([fake_package()])
+        cache.candidates(repo, "dev-util/foo", volatile=True)
+        cache.candidates(repo, "dev-util/foo", volatile=True)
+        assert repo.calls == 1
+        # non-volatile entries are kept when the vdb filter changes
+        cache.candidates(repo, "dev-util/bar")
+        cache.state.vdb_filter_generation += 1
+        cache.candidates(repo, "dev-util/foo", volatile=True)
+        assert repo.calls == 3
+        cache.candidates(repo, "dev-util/bar")
+        assert repo.calls == 3
+
+    def test_choices(self):
+        cache = self.gen_cache()
+        pkgs = [
+            fake_package(marker=1, depend=AndRestriction("dep1")),
+            fake_package(marker=2, depend=AndRestriction("dep2")),
+        ]
+        repo = fake_repo(pkgs)
+        choices, matches = cache.choices(repo, "dev-util/foo")
+        assert choices.current_pkg.marker == 1
+        assert list(matches) == pkgs
+
+        cache.insoluble.add("dep1")
+        choices, _ = cache.choices(repo, "dev-util/foo")
+        assert choices.current_pkg.marker == 2
+        assert cache.info()["viable"][:2] == (0, 2)
+
+        # pruned candidates are skipped on reuse
+        choices, _ = cache.choices(repo, "dev-util/foo")
+        assert choices.current_pkg.marker == 2
+        assert cache.info()["viable"][:2] == (1, 2)
+
+        cache.insoluble.add("dep2")
+        choices, matches = cache.choices(repo, "dev-util/foo")
+        assert not choices
+        assert matches
+        choices, _ = cache.choices(repo, "dev-util/foo")
+        assert not choices
+
+    def test_no_matches(self):
+        cache = self.gen_cache()
+        choices, matches = cache.choices(fake_repo([]), "dev-util/foo")
+        assert not choices
+        assert not matches
+
+    def test_solutions(self):
+        cache = self.gen_cache()
+        pkg = fake_package(depend=AndRestriction("dep1"))
+        solutions = cache.solutions(pkg)
+        assert solutions[1] == [["dep1"]]
+        assert cache.solutions(pkg) is solutions
+        assert cache.info()["solutions"][:2] == (1, 1)
+
+        # solutions are shared between choice points
+        repo = fake_repo([pkg])
+        choices, _ = cache.choices(repo, "dev-util/foo")
+        assert choices.depend == [["dep1"]]
+        assert cache.info()["solutions"][:2] == (2, 1)
+
+    def test_clear(self):
+        cache = self.gen_cache()
+        repo = fake_repo([fake_package()])
+        cache.choices(repo, "dev-util/foo")
+        cache.clear()
+        assert all(x == (0, 0, None, 0) for x in cache.info().values())
+        cache.choices(repo, "dev-util/foo")
+        assert repo.calls == 2
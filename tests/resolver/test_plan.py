@@ -29,3 +29,15 @@ def test_pkg_sorting(sorter, vers, expected, iter_sort_target):
     if iter_sort_target:
         pkgs = [x[0] for x in pkgs]
     assert [int(x.fullver) for x in pkgs] == expected
+
+
+def test_mutable_containment_restriction():
+    blacklist = set()
+    restrict = plan.MutableContainmentRestriction(blacklist)
+    pkg = FakePkg("d-b/a-1")
+    assert not restrict.match(pkg)
+    # the restriction tracks changes to the wrapped set
+    blacklist.add(pkg)
+    assert restrict.match(pkg)
+    # instances aren't shared between sets
+    assert plan.MutableContainmentRestriction(set()) is not restrict
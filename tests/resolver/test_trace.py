@@ -0,0 +1,102 @@
+import io
+import json
+from itertools import count
+
+import pytest
+
+from pkgcore.ebuild import resolver
+from pkgcore.ebuild.atom import atom
+from pkgcore.resolver.trace import ResolverTrace
+from pkgcore.test.misc import FakePkg, FakeRepo
+
+
+class TestResolverTrace:
+    @staticmethod
+    def gen_trace():
+        # each clock call advances a second
+        return ResolverTrace(clock=count().__next__)
+
+    def test_stats(self):
+        trace = self.gen_trace()
+        trace.queried("dev-util/foo", 1, 2)
+        trace.choice_failed("dev-util/foo", "dev-util/foo-2", "blocked")
+        trace.backtracked("dev-util/foo", "dev-util/foo-2", "depend: dev-util/baz")
+        trace.backtracked("dev-util/foo", None, "ran out of choices")
+        trace.resolved("dev-util/foo", 1, 4, "none", 0, False)
+        trace.resolved("dev-util/bar", 5, 6, "rdepend", 1, True)
+        summary = trace.summary()
+        assert summary["atoms"] == 2
+        assert summary["resolutions"] == 2
+        assert summary["failures"] == 1
+        assert summary["choice_failures"] == 1
+        assert summary["backtracks"] == 2
+        assert summary["queries"] == 1
+        assert summary["query_time"] == 1
+
+        slowest = trace.slowest()
+        assert [x[0] for x in slowest] == ["dev-util/foo", "dev-util/bar"]
+        assert slowest[0][1]["time"] == 3
+        assert slowest[0][1]["backtracks"] == 2
+        assert trace.slowest(limit=1) == slowest[:1]
+
+    def test_json(self):
+        trace = self.gen_trace()
+        trace.resolved(atom("dev-util/foo"), 1, 4, "none", 0, False)
+        f = io.StringIO()
+        trace.write(f)
+        data = json.loads(f.getvalue())
+        assert data["atoms"]["dev-util/foo"]["calls"] == 1
+        assert data["events"] == [
+            {
+                "type": "resolve",
+                "atom": "dev-util/foo",
+                "start": 1,
+                "duration": 3,
+                "mode": "none",
+                "depth": 0,
+                "failed": False,
+            }
+        ]
+
+    def test_chrome(self):
+        trace = self.gen_trace()
+        trace.resolved("dev-util/foo", 1, 4, "none", 0, False)
+        trace.backtracked("dev-util/foo", "dev-util/foo-2", "blocked")
+        f = io.StringIO()
+        trace.write(f, format="chrome")
+        events = json.loads(f.getvalue())["traceEvents"]
+        assert events[0]["ph"] == "X"
+        assert events[0]["ts"] == 1e6
+        assert events[0]["dur"] == 3e6
+        assert events[1]["ph"] == "i"
+        assert events[1]["cat"] == "backtrack"
+        assert events[1]["args"] == {"pkg": "dev-util/foo-2", "reason": "blocked"}
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            self.gen_trace().write(io.StringIO(), format="xml")
+
+    def test_resolver(self):
+        repo = FakeRepo(livefs=False, repo_id="gentoo")
+        repo.pkgs = [
+            FakePkg("dev-util/foo-1", repo=repo),
+            FakePkg("dev-util/foo-2", repo=repo, data={"RDEPEND": "dev-util/bar"}),
+        ]
+        trace = ResolverTrace()
+        resolver_inst = resolver.upgrade_resolver(
+            [FakeRepo(livefs=True)], [repo], trace=trace
+        )
+        assert not resolver_inst.add_atoms([atom("dev-util/foo")])
+        assert trace.atoms["dev-util/foo"].calls == 1
+        assert trace.atoms["dev-util/foo"].backtracks == 1
+        assert trace.atoms["dev-util/foo"].queries == 1
+        assert trace.atoms["dev-util/bar"].failures == 1
+        assert trace.events[3][4]["reason"] == "rdepend: dev-util/bar"
+        events = [(x[0], str(x[3])) for x in trace.events]
+        assert events == [
+            ("query", "dev-util/foo"),
+            ("query", "dev-util/bar"),
+            ("resolve", "dev-util/bar"),
+            ("backtrack", "dev-util/foo"),
+            ("resolve", "dev-util/foo"),
+        ]
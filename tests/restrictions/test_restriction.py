@@ -1,3 +1,4 @@
+import pickle
 from functools import partial
 
 import pytest
@@ -69,6 +70,14 @@ class TestAlwaysBool(TestRestriction):
         assert false_r == self.bool_kls(False)
         assert true_r != false_r
 
+    def test_pickle(self):
+        true_r = restriction.AlwaysBool(node_type="foo", negate=True)
+        # unpickling reuses existing instances
+        assert pickle.loads(pickle.dumps(true_r)) is true_r
+        false_r = pickle.loads(pickle.dumps(self.bool_kls(False)))
+        assert not false_r.negate
+        assert false_r.type == "foo"
+
 
 class NoneMatch(restriction.base):
     """Only matches None."""
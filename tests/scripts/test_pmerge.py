@@ -1,6 +1,10 @@
+from types import SimpleNamespace
+from unittest import mock
+
 import pytest
 
 from pkgcore.ebuild.atom import atom
+from pkgcore.fetch import fetchable
 from pkgcore.repository.util import SimpleTree
 from pkgcore.scripts import pmerge
 from pkgcore.test.misc import FakePkg, FakeRepo
@@ -81,3 +85,85 @@ class TestTargetParsing:
         assert a[0].key == "foo/bar"
         assert a[0].match(atom("foo/bar:0"))
         assert not a[0].match(atom("foo/bar:2"))
+
+
+class TestPrefetch:
+    def test_plan_fetchables(self):
+        fetchables = {
+            "dev-util/foo-1": ["foo.tar.gz"],
+            "dev-util/bar-1": ["bar.tar.gz", "bar.patch"],
+            "dev-util/baz-1": ["baz.tar.gz"],
+            "dev-util/qux-1": ["qux.tar.gz"],
+        }
+
+        def op(desc, cpv, restrict=(), built=False):
+            pkg = SimpleNamespace(
+                fetchables=[fetchable(x) for x in fetchables[cpv]],
+                restrict=restrict,
+                built=built,
+            )
+            return SimpleNamespace(desc=desc, pkg=pkg)
+
+        changes = [
+            op("add", "dev-util/foo-1"),
+            op("replace", "dev-util/bar-1"),
+            op("remove", "dev-util/baz-1"),
+            op("add", "dev-util/qux-1", restrict=("fetch",)),
+            op("add", "dev-util/qux-1", built=True),
+        ]
+        options = SimpleNamespace(fetch_jobs=4, fetch_host_limit=2, debug=False)
+        out = mock.Mock()
+        with mock.patch("pkgcore.operations.format.fetch_base") as fetch_base:
+            fetch_base.return_value.fetch_all.return_value = (
+                {},
+                [fetchable("bar.patch")],
+            )
+            assert pmerge.prefetch(options, out, None, changes) == [
+                fetchable("bar.patch")
+            ]
+        args, kwargs = fetch_base.call_args
+        assert [x.filename for x in args[2]] == [
+            "foo.tar.gz",
+            "bar.tar.gz",
+            "bar.patch",
+        ]
+        assert kwargs == {"jobs": 4, "host_limit": 2}
+
+
+class TestBuildPkg:
+    @pytest.fixture
+    def build(self):
+        pkg = mock.Mock(distfiles=(), cpvstr="dev-util/foo-1")
+        buildop = mock.Mock()
+        pkg_ops = mock.Mock()
+        pkg_ops.run_if_supported.side_effect = lambda op, or_return: (
+            buildop if op == "build" else or_return
+        )
+        domain = mock.Mock()
+        domain.get_pkg_operations.return_value = pkg_ops
+        options = SimpleNamespace(fetchonly=False, debug=False)
+
+        def build():
+            op = SimpleNamespace(desc="add", pkg=pkg)
+            return pmerge.build_pkg(mock.Mock(), domain, op, options, None, [])
+
+        return build, buildop
+
+    def test_built(self, build):
+        build, buildop = build
+        assert build() is buildop.finalize.return_value
+
+    def test_failed(self, build):
+        build, buildop = build
+        buildop.finalize.return_value = False
+        with pytest.raises(pmerge.ExitException) as excinfo:
+            build()
+        assert excinfo.value.__cause__ is None
+
+    def test_build_error(self, build):
+        build, buildop = build
+        error = pmerge.format.BuildError("failed")
+        buildop.finalize.side_effect = error
+        with pytest.raises(pmerge.ExitException) as excinfo:
+            build()
+        assert excinfo.value.__cause__ is error
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from snakeoil import chksum
+from snakeoil.data_source import data_source
+
+from pkgcore.util import chksum as chksum_util
+
+CHFS = ("size", "blake2b", "sha512")
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i, size in enumerate((0, 100, 4096, 3 * 2**10 + 7)):
+        path = tmp_path / f"file{i}"
+        path.write_bytes(os.urandom(size))
+        paths.append(str(path))
+    return paths
+
+
+class TestGetChksums:
+    def test_matches_snakeoil(self, files):
+        for path in files:
+            assert chksum_util.get_chksums(path, *CHFS) == chksum.get_chksums(
+                path, *CHFS
+            )
+
+    def test_mmap(self, files, monkeypatch):
+        monkeypatch.setattr(chksum_util, "mmap_threshold", 1)
+        monkeypatch.setattr(chksum_util, "blocksize", 1000)
+        for path in files:
+            assert chksum_util.get_chksums(path, *CHFS) == chksum.get_chksums(
+                path, *CHFS
+            )
+
+    def test_order(self, files):
+        size, sha512 = chksum_util.get_chksums(files[1], "size", "sha512")
+        assert size == 100
+        assert [sha512, size] == chksum_util.get_chksums(files[1], "sha512", "size")
+
+    def test_data_source(self):
+        source = data_source("foo")
+        assert chksum_util.get_chksums(source, *CHFS) == chksum.get_chksums(
+            source, *CHFS
+        )
+
+    def test_missing(self, tmp_path):
+        assert chksum_util.get_chksums(str(tmp_path / "file")) == []
+        with pytest.raises(FileNotFoundError):
+            chksum_util.get_chksums(str(tmp_path / "file"), "size")
+        with pytest.raises(chksum.MissingChksumHandler):
+            chksum_util.get_chksums(str(tmp_path), "foo")
+
+
+class TestChksumFiles:
+    @pytest.mark.parametrize("jobs", (None, 1, 3))
+    def test_chksum_files(self, files, jobs):
+        expected = [chksum.get_chksums(x, *CHFS) for x in files]
+        assert chksum_util.chksum_files(iter(files), CHFS, jobs=jobs) == expected
+
+    def test_empty(self):
+        assert chksum_util.chksum_files([], CHFS) == []
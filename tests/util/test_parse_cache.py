@@ -0,0 +1,89 @@
+import gc
+
+from pkgcore.ebuild import cpv
+from pkgcore.ebuild.atom import atom
+from pkgcore.util import parse_cache
+
+
+class Obj:
+    def __init__(self, value):
+        self.value = value
+
+
+class TestParseCache:
+    def test_interning(self):
+        cache = parse_cache.ParseCache("test", maxsize=0)
+        assert cache.get("a") is None
+        obj = cache["a"] = Obj("a")
+        assert cache.get("a") is obj
+        assert "a" in cache
+        assert cache.info() == parse_cache.CacheInfo(1, 1, 0, 0)
+        # unpinned instances are dropped once unused
+        del obj
+        gc.collect()
+        assert cache.get("a") is None
+
+    def test_bounded(self):
+        cache = parse_cache.ParseCache("test", maxsize=2)
+        for x in "abc":
+            cache[x] = Obj(x)
+        gc.collect()
+        assert cache.get("a") is None
+        assert cache.get("b").value == "b"
+        # lookups refresh entries so the least recently used is dropped
+        cache["d"] = Obj("d")
+        gc.collect()
+        assert cache.get("c") is None
+        assert cache.get("b").value == "b"
+        assert cache.info().currsize == 2
+
+        cache.resize(1)
+        gc.collect()
+        assert cache.info().currsize == 1
+        assert cache.get("d") is None
+        cache.clear()
+        assert cache.info() == parse_cache.CacheInfo(0, 0, 1, 0)
+        assert not len(cache)
+
+    def test_default_maxsize(self, monkeypatch):
+        monkeypatch.setenv("PKGCORE_PARSE_CACHE_SIZE", "5")
+        assert parse_cache.default_maxsize() == 5
+        assert parse_cache.ParseCache("test").maxsize == 5
+        monkeypatch.setenv("PKGCORE_PARSE_CACHE_SIZE", "foo")
+        assert parse_cache.default_maxsize(10) == 10
+
+    def test_registered(self):
+        info = parse_cache.cache_info()
+        assert {"atom", "cpv"}.issubset(info)
+
+    def test_atoms(self):
+        a = atom(">=dev-libs/foo-1.2:0=[bar]")
+        hits = parse_cache.cache_info()["atom"].hits
+        b = atom(">=dev-libs/foo-1.2:0=[bar]")
+        assert a is b
+        assert parse_cache.cache_info()["atom"].hits == hits + 1
+        assert atom("=dev-libs/foo-1.2")._cpv is cpv.interned("dev-libs/foo-1.2", True)
+        assert atom("dev-libs/foo")._cpv is cpv.interned("dev-libs/foo", False)
+
+
+class TestLRUCache:
+    def test_bounded(self):
+        cache = parse_cache.LRUCache(maxsize=2)
+        assert cache.get("a") is None
+        cache["a"] = 1
+        cache["b"] = 2
+        assert cache.get("a") == 1
+        # lookups refresh entries so the least recently used is dropped
+        cache["c"] = 3
+        assert "b" not in cache
+        assert cache.get("a") == 1
+        assert cache.info() == parse_cache.CacheInfo(2, 1, 2, 2)
+        cache.clear()
+        assert cache.info() == parse_cache.CacheInfo(0, 0, 2, 0)
+        assert not len(cache)
+
+    def test_disabled(self):
+        cache = parse_cache.LRUCache(maxsize=0)
+        cache["a"] = 1
+        assert cache.get("a") is None
+        assert not len(cache)
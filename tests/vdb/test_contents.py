@@ -0,0 +1,168 @@
+import os
+
+import pytest
+
+from pkgcore.fs import fs
+from pkgcore.vdb.contents import ContentsFile, ContentsIndex, write_index
+
+
+class TestContentsFile:
+    def test_roundtrip(self, tmp_path):
+        path = tmp_path / "CONTENTS"
+        path.write_text(
+            "dir /usr\n"
+            "obj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1700000000\n"
+            "sym /usr/bin/bar -> foo 1700000001\n"
+            "fif /run/fifo\n"
+        )
+        cset = ContentsFile(str(path))
+        assert [x.location for x in cset] == [
+            "/run/fifo",
+            "/usr",
+            "/usr/bin/bar",
+            "/usr/bin/foo",
+        ]
+        assert cset["/usr/bin/foo"].chksums == {
+            "md5": 0xD41D8CD98F00B204E9800998ECF8427E
+        }
+        assert cset["/usr/bin/foo"].mtime == 1700000000
+        assert cset["/usr/bin/bar"].target == "foo"
+        assert [x.location for x in cset.child_nodes("/usr")] == [
+            "/usr/bin/bar",
+            "/usr/bin/foo",
+        ]
+
+        # new entries get their checksums generated on write
+        (tmp_path / "baz").write_text("")
+        new = cset.clone()
+        new.add(fs.fsFile(str(tmp_path / "baz"), mtime=1, strict=False))
+        new.flush()
+        assert ContentsFile(str(path)) == new
+        assert f"obj {tmp_path}/baz d41d8cd98f00b204e9800998ecf8427e 1\n" in (
+            path.read_text()
+        )
+
+
+class TestContentsIndex:
+    lines = (
+        "dir /usr",
+        "dir /usr/bin",
+        "obj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1700000000",
+        "sym /usr/bin/foo bar -> foo 1700000001",
+        "obj /usr/bin-extra 00000000000000000000000000000001 1",
+        "fif /run/fifo",
+    )
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        path = tmp_path / "CONTENTS"
+        path.write_text("\n".join(self.lines) + "\n")
+        write_index(str(path))
+        return str(path)
+
+    def test_lookups(self, path):
+        cset = ContentsFile(path)
+        assert "/usr/bin/foo" in cset
+        assert "/usr/bin//foo bar" in cset
+        assert fs.fsDir("/usr", strict=False) in cset
+        assert "/usr/bin/missing" not in cset
+        assert cset["/usr/bin/foo bar"].target == "foo"
+        assert cset["/usr/bin/foo"].chksums == {
+            "md5": 0xD41D8CD98F00B204E9800998ECF8427E
+        }
+        with pytest.raises(KeyError):
+            cset["/usr/bin/missing"]
+        assert len(cset) == 6
+        assert [x.location for x in cset.iter_child_nodes("/usr/bin")] == [
+            "/usr/bin/foo",
+            "/usr/bin/foo bar",
+        ]
+        assert [x.location for x in cset.child_nodes("/usr/")] == [
+            "/usr/bin",
+            "/usr/bin-extra",
+            "/usr/bin/foo",
+            "/usr/bin/foo bar",
+        ]
+        assert list(cset) == sorted(cset)
+        assert cset.issubset(["/run/fifo", "/usr", "/usr/bin", *cset._iter_locations()])
+        # none of the above required parsing all entries
+        assert "_paths" not in cset.__dict__
+
+        # anything else loads the entries
+        assert len(cset.files()) == 2
+        assert "_paths" in cset.__dict__
+        assert "/usr/bin/foo" in cset
+        assert cset == ContentsFile(path)
+
+    def test_no_open_fds(self, path):
+        fds = set(os.listdir("/proc/self/fd"))
+        csets = [ContentsFile(path) for _ in range(10)]
+        for cset in csets:
+            assert "/usr/bin/foo" in cset
+            assert len(list(cset.iter_child_nodes("/usr"))) == 4
+        assert "_paths" not in csets[0].__dict__
+        assert set(os.listdir("/proc/self/fd")) == fds
+
+    @pytest.mark.parametrize(
+        "change",
+        (
+            pytest.param(write_index, id="replaced"),
+            pytest.param(lambda p: os.unlink(p + ".index"), id="removed"),
+        ),
+    )
+    @pytest.mark.parametrize(
+        "lookup",
+        (
+            pytest.param(lambda cset: "/usr/bin/foo" in cset, id="contains"),
+            pytest.param(lambda cset: bool(cset["/usr/bin/foo"]), id="getitem"),
+            pytest.param(lambda cset: len(list(cset)) == 6, id="iter"),
+            pytest.param(
+                lambda cset: len(list(cset._iter_locations())) == 6, id="locations"
+            ),
+            pytest.param(
+                lambda cset: len(list(cset.iter_child_nodes("/usr/bin"))) == 2,
+                id="child_nodes",
+            ),
+            pytest.param(lambda cset: len(cset.files()) == 2, id="load"),
+        ),
+    )
+    def test_index_changed(self, path, change, lookup):
+        cset = ContentsFile(path)
+        change(path)
+        # entries are parsed from the CONTENTS file instead
+        assert lookup(cset)
+        assert "_paths" in cset.__dict__
+        assert cset._contents_index is None
+        assert len(cset) == 6
+
+    def test_modify(self, path):
+        cset = ContentsFile(path, mutable=True)
+        cset.remove("/usr/bin-extra")
+        assert "/usr/bin-extra" not in cset
+        assert len(cset) == 5
+        cset.flush()
+        # existing indexes are kept up to date
+        cset = ContentsFile(path)
+        assert "_paths" not in cset.__dict__
+        assert len(cset) == 5
+
+        cset = ContentsFile(path, mutable=True)
+        cset.clear()
+        assert "/usr" not in cset
+        assert not list(cset)
+
+    @pytest.mark.parametrize(
+        "corrupt",
+        (
+            pytest.param(lambda p: open(p, "a").write("dir /opt\n"), id="stale"),
+            pytest.param(lambda p: open(p + ".index", "r+b").write(b"X"), id="magic"),
+            pytest.param(lambda p: os.truncate(p + ".index", 30), id="truncated"),
+            pytest.param(lambda p: os.unlink(p + ".index"), id="missing"),
+        ),
+    )
+    def test_fallback(self, path, corrupt):
+        corrupt(path)
+        assert ContentsIndex.load(path) is None
+        cset = ContentsFile(path)
+        assert "_paths" in cset.__dict__
+        assert "/usr/bin/foo" in cset
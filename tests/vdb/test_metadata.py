@@ -0,0 +1,148 @@
+import os
+import sqlite3
+from unittest import mock
+
+import pytest
+
+from pkgcore.vdb import ondisk
+from pkgcore.vdb.metadata import MetadataCache
+
+
+class TestMetadataCache:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.path = tmp_path / "vdb"
+        self.path.mkdir()
+
+    def mk_pkg(self, cpv, **files):
+        (path := self.path / cpv).mkdir(parents=True)
+        files.setdefault("EAPI", "8")
+        files.setdefault("SLOT", "0")
+        for name, value in files.items():
+            (path / name).write_text(f"{value}\n")
+        self.bump()
+        return path
+
+    def bump(self, path=None):
+        path = self.path if path is None else path
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    def mk_repo(self, **kwargs):
+        return ondisk.tree(str(self.path), **kwargs)
+
+    def get_pkg(self, repo, cpv):
+        cat, pf = cpv.split("/")
+        pn, ver = pf.rsplit("-", 1)
+        return repo.package_class(cat, pn, ver)
+
+    def test_cached_reads(self):
+        self.mk_pkg("app-misc/foo-1", USE="a b", IUSE="a b c", repository="gentoo")
+        self.mk_pkg("app-misc/bar-2", SLOT="2/3")
+        repo = self.mk_repo()
+        assert self.get_pkg(repo, "app-misc/foo-1").use == frozenset(("a", "b"))
+        assert (self.path / ".pkgcore" / "metadata.sqlite").exists()
+        assert repo.metadata_cache["app-misc/bar-2"]["SLOT"] == "2/3\n"
+
+        # later runs don't read metadata files
+        repo = self.mk_repo()
+        with mock.patch("pkgcore.vdb.ondisk.readfile") as readfile:
+            pkg = self.get_pkg(repo, "app-misc/foo-1")
+            assert pkg.use == frozenset(("a", "b"))
+            assert pkg.source_repository == "gentoo"
+            assert self.get_pkg(repo, "app-misc/bar-2").subslot == "3"
+            assert not readfile.called
+            # missing files are known to be missing
+            assert self.get_pkg(repo, "app-misc/bar-2").source_repository is None
+            assert not readfile.called
+
+    def test_uncached_files(self):
+        self.mk_pkg("app-misc/foo-1", DESCRIPTION="x" * (2**16 + 1))
+        (self.path / "app-misc/foo-1/CONTENTS").write_text("dir /usr\n")
+        repo = self.mk_repo()
+        data = repo.metadata_cache["app-misc/foo-1"]
+        assert data["DESCRIPTION"] is None
+        assert data["CONTENTS"] is None
+        pkg = self.get_pkg(repo, "app-misc/foo-1")
+        assert pkg.description == "x" * (2**16 + 1)
+        assert "/usr" in pkg.contents
+
+    def test_refresh(self):
+        self.mk_pkg("app-misc/foo-1", USE="a")
+        self.mk_pkg("app-misc/bar-1")
+        repo = self.mk_repo()
+        cache = repo.metadata_cache
+        cache.refresh()
+        assert cache.is_current()
+        cache.close()
+
+        # only packages with changed vdb entries are reread
+        path = self.path / "app-misc/foo-1"
+        (path / "USE").write_text("b\n")
+        self.bump(path)
+        self.mk_pkg("app-misc/baz-1")
+        self.bump()
+        repo = self.mk_repo()
+        cache = repo.metadata_cache
+        assert not cache.is_current()
+        with mock.patch.object(cache, "_read", wraps=cache._read) as read:
+            assert cache["app-misc/foo-1"]["USE"] == "b\n"
+            assert sorted(x.args[0] for x in read.call_args_list) == [
+                "app-misc/baz-1",
+                "app-misc/foo-1",
+            ]
+        assert cache.is_current()
+
+    def test_add_remove(self):
+        self.mk_pkg("app-misc/foo-1")
+        repo = self.mk_repo()
+        cache = repo.metadata_cache
+        cache.refresh()
+
+        self.mk_pkg("app-misc/bar-1", USE="x")
+        pkg = self.get_pkg(repo, "app-misc/bar-1")
+        cache.add(pkg)
+        assert cache.is_current()
+        assert cache["app-misc/bar-1"]["USE"] == "x\n"
+        cache.remove(pkg)
+        with pytest.raises(KeyError):
+            cache["app-misc/bar-1"]
+
+    def readonly(self):
+        """Open the cache database as if it wasn't writable."""
+        location = str(self.path / ".pkgcore" / "metadata.sqlite")
+        connect = sqlite3.connect
+
+        def ro_connect(database, *args, **kwargs):
+            if database == location:
+                return connect(f"file:{database}?mode=ro", *args, uri=True, **kwargs)
+            return connect(database, *args, **kwargs)
+
+        return mock.patch("sqlite3.connect", ro_connect)
+
+    def test_readonly(self):
+        self.mk_pkg("app-misc/foo-1", USE="a")
+        self.mk_repo().metadata_cache.refresh()
+        self.mk_pkg("app-misc/bar-1", USE="b")
+        with self.readonly():
+            repo = self.mk_repo()
+            assert self.get_pkg(repo, "app-misc/bar-1").use == frozenset(("b",))
+            assert self.get_pkg(repo, "app-misc/foo-1").use == frozenset(("a",))
+            assert repo.metadata_cache.is_current()
+        # updates only happened in memory
+        assert not self.mk_repo().metadata_cache.is_current()
+
+    def test_failed_refresh(self):
+        self.mk_pkg("app-misc/foo-1", USE="a")
+        repo = self.mk_repo()
+        error = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(MetadataCache, "_refresh", side_effect=error):
+            # files are read directly instead
+            assert self.get_pkg(repo, "app-misc/foo-1").use == frozenset(("a",))
+
+    def test_disabled(self):
+        self.mk_pkg("app-misc/foo-1", USE="a")
+        repo = self.mk_repo(disable_cache=True)
+        assert repo.metadata_cache is None
+        assert self.get_pkg(repo, "app-misc/foo-1").use == frozenset(("a",))
+        assert not (self.path / ".pkgcore" / "metadata.sqlite").exists()
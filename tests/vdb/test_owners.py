@@ -0,0 +1,137 @@
+import os
+import sqlite3
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from pkgcore.ebuild import triggers
+from pkgcore.fs import fs
+from pkgcore.fs.contents import contentsSet
+from pkgcore.merge import errors
+from pkgcore.vdb import ondisk, repo_ops
+from pkgcore.vdb.owners import OwnersIndex
+
+
+class TestOwnersIndex:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.path = tmp_path / "vdb"
+        self.path.mkdir()
+
+    def mk_pkg(self, cpv, *paths):
+        (path := self.path / cpv).mkdir(parents=True)
+        (path / "EAPI").write_text("8\n")
+        (path / "SLOT").write_text("0\n")
+        lines = []
+        for p in paths:
+            if p.endswith("/"):
+                lines.append(f"dir {p.rstrip('/')}")
+            else:
+                lines.append(f"obj {p} d41d8cd98f00b204e9800998ecf8427e 1")
+        (path / "CONTENTS").write_text("\n".join(lines) + "\n")
+        self.bump()
+
+    def bump(self):
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    def mk_repo(self):
+        return ondisk.tree(str(self.path))
+
+    def test_lookups(self):
+        self.mk_pkg("app-misc/foo-1", "/usr/", "/usr/bin/", "/usr/bin/foo")
+        self.mk_pkg("app-misc/bar-1", "/usr/", "/usr/bin/", "/usr/bin/bar")
+        index = self.mk_repo().owners_index
+        assert index.owners("/usr/bin/foo") == ("app-misc/foo-1",)
+        assert index.owners("/usr/bin") == ("app-misc/bar-1", "app-misc/foo-1")
+        assert index.owners("/usr/bin/missing") == ()
+        assert index.owners_re(r"bin/b") == ("app-misc/bar-1",)
+        assert index.owners_re(r"^/usr/bin/") == ("app-misc/bar-1", "app-misc/foo-1")
+        assert index.collisions(["/usr/bin/foo", "/usr/bin/bar", "/etc/x"]) == {
+            "app-misc/foo-1": {"/usr/bin/foo"},
+            "app-misc/bar-1": {"/usr/bin/bar"},
+        }
+        assert (self.path / ".pkgcore" / "owners.sqlite").exists()
+
+    def test_incremental_refresh(self):
+        self.mk_pkg("app-misc/foo-1", "/usr/bin/foo")
+        repo = self.mk_repo()
+        assert repo.owners_index.owners("/usr/bin/foo") == ("app-misc/foo-1",)
+        repo.owners_index.close()
+
+        # external vdb changes are picked up on next use
+        self.mk_pkg("app-misc/bar-1", "/usr/bin/bar")
+        repo = self.mk_repo()
+        assert not repo.owners_index.is_current()
+        assert repo.owners_index.owners("/usr/bin/bar") == ("app-misc/bar-1",)
+        assert repo.owners_index.is_current()
+
+    def test_add_remove(self):
+        self.mk_pkg("app-misc/foo-1", "/usr/bin/foo")
+        repo = self.mk_repo()
+        index = repo.owners_index
+        index.refresh()
+
+        self.mk_pkg("app-misc/bar-1", "/usr/bin/bar")
+        pkg = repo.package_class("app-misc", "bar", "1")
+        index.add(pkg)
+        assert index.is_current()
+        assert index.owners("/usr/bin/bar") == ("app-misc/bar-1",)
+        index.remove(pkg)
+        assert index.owners("/usr/bin/bar") == ()
+
+    def test_unwritable_index(self, tmp_path):
+        self.mk_pkg("app-misc/foo-1", "/usr/bin/foo")
+        repo = self.mk_repo()
+        (tmp_path / "file").touch()
+        index = type(repo.owners_index)(repo, str(tmp_path / "file" / "owners.sqlite"))
+        assert index.owners("/usr/bin/foo") == ("app-misc/foo-1",)
+
+    def test_readonly_index(self):
+        self.mk_pkg("app-misc/foo-1", "/usr/bin/foo")
+        self.mk_repo().owners_index.refresh()
+        self.mk_pkg("app-misc/bar-1", "/usr/bin/bar")
+        location = str(self.path / ".pkgcore" / "owners.sqlite")
+        connect = sqlite3.connect
+
+        def ro_connect(database, *args, **kwargs):
+            if database == location:
+                return connect(f"file:{database}?mode=ro", *args, uri=True, **kwargs)
+            return connect(database, *args, **kwargs)
+
+        with mock.patch("sqlite3.connect", ro_connect):
+            index = self.mk_repo().owners_index
+            assert index.owners("/usr/bin/bar") == ("app-misc/bar-1",)
+            assert index.owners_re("^/usr/bin/f") == ("app-misc/foo-1",)
+        # the outdated index was only updated in memory
+        assert not self.mk_repo().owners_index.is_current()
+
+    def test_failed_update(self):
+        self.mk_pkg("app-misc/foo-1", "/usr/bin/foo")
+        repo = self.mk_repo()
+        repo.owners_index.refresh()
+        pkg = repo.package_class("app-misc", "foo", "1")
+        op = repo_ops.uninstall(repo, pkg, None)
+        error = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(OwnersIndex, "remove", side_effect=error):
+            # index failures don't fail operations that already modified the vdb
+            assert op.finalize_data()
+        assert not (self.path / "app-misc" / "foo-1").exists()
+        # and the index is rebuilt on next use
+        index = self.mk_repo().owners_index
+        assert not index.is_current()
+        assert index.owners("/usr/bin/foo") == ()
+
+    def test_protect_owned(self):
+        self.mk_pkg("app-misc/foo-1", "/usr/bin/foo")
+        repo = self.mk_repo()
+        trigger = triggers.ProtectOwned([repo])
+        engine = SimpleNamespace(offset="/root")
+        trigger.offset = engine.offset
+        colliding = contentsSet([fs.fsFile("/root/usr/bin/foo", strict=False)])
+        with pytest.raises(errors.BlockModification) as excinfo:
+            trigger.collision(colliding)
+        assert "app-misc/foo-1" in str(excinfo.value)
+        # unowned files are allowed
+        trigger.collision(contentsSet([fs.fsFile("/root/usr/bin/bar", strict=False)]))
@@ -0,0 +1,106 @@
+import os
+from unittest import mock
+
+import pytest
+
+from pkgcore.ebuild.atom import atom
+from pkgcore.vdb import ondisk
+
+
+class TestRevdepIndex:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path):
+        self.path = tmp_path / "vdb"
+        self.path.mkdir()
+
+    def mk_pkg(self, cpv, **deps):
+        (path := self.path / cpv).mkdir(parents=True)
+        (path / "EAPI").write_text("8\n")
+        (path / "SLOT").write_text("0\n")
+        (path / "USE").write_text("\n")
+        for attr, value in deps.items():
+            (path / attr.upper()).write_text(f"{value}\n")
+        self.bump()
+        return path
+
+    def bump(self):
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    def mk_repo(self):
+        return ondisk.tree(str(self.path))
+
+    def revdeps(self, repo, key):
+        return [pkg.cpvstr for pkg in repo.reverse_dependencies(key)]
+
+    def test_reverse_dependencies(self):
+        self.mk_pkg("dev-libs/foo-1")
+        self.mk_pkg("app-misc/bar-1", rdepend="dev-libs/foo || ( a/a b/b ) !x/x")
+        self.mk_pkg("app-misc/baz-2", depend=">=dev-libs/foo-1", bdepend="a/a")
+        repo = self.mk_repo()
+        assert self.revdeps(repo, "dev-libs/foo") == [
+            "app-misc/bar-1",
+            "app-misc/baz-2",
+        ]
+        assert self.revdeps(repo, atom("=dev-libs/foo-1")) == [
+            "app-misc/bar-1",
+            "app-misc/baz-2",
+        ]
+        assert self.revdeps(repo, "a/a") == ["app-misc/bar-1", "app-misc/baz-2"]
+        assert self.revdeps(repo, "b/b") == ["app-misc/bar-1"]
+        # blockers aren't dependencies
+        assert self.revdeps(repo, "x/x") == []
+        assert self.revdeps(repo, "dev-libs/missing") == []
+        assert (self.path / ".pkgcore" / "revdeps.json").exists()
+        # the index dir isn't treated as a category
+        assert ".pkgcore" not in repo.categories
+
+    def test_persistence(self):
+        self.mk_pkg("app-misc/bar-1", rdepend="dev-libs/foo")
+        repo = self.mk_repo()
+        assert self.revdeps(repo, "dev-libs/foo") == ["app-misc/bar-1"]
+
+        # unchanged vdb doesn't reparse packages
+        repo = self.mk_repo()
+        index = repo.revdep_index
+        with mock.patch.object(index, "_entry", wraps=index._entry) as entry:
+            assert self.revdeps(repo, "dev-libs/foo") == ["app-misc/bar-1"]
+        assert entry.call_count == 0
+
+        # external modifications are picked up, only reparsing new pkgs
+        self.mk_pkg("app-misc/baz-1", rdepend="dev-libs/foo")
+        repo = self.mk_repo()
+        index = repo.revdep_index
+        with mock.patch.object(index, "_entry", wraps=index._entry) as entry:
+            assert self.revdeps(repo, "dev-libs/foo") == [
+                "app-misc/bar-1",
+                "app-misc/baz-1",
+            ]
+        assert entry.call_count == 1
+
+    def test_add_remove(self):
+        self.mk_pkg("app-misc/bar-1", rdepend="dev-libs/foo")
+        repo = self.mk_repo()
+        index = repo.revdep_index
+        index.refresh()
+        assert index.is_current()
+
+        self.mk_pkg("app-misc/baz-1", rdepend="dev-libs/foo")
+        pkg = repo.package_class("app-misc", "baz", "1")
+        index.add(pkg)
+        assert index.is_current()
+        assert index["dev-libs/foo"] == ("app-misc/bar-1", "app-misc/baz-1")
+        index.remove(pkg)
+        assert index["dev-libs/foo"] == ("app-misc/bar-1",)
+
+        # updates to an outdated index are refreshed on next use
+        self.bump()
+        index.add(pkg, current=False)
+        assert not index.is_current()
+
+    def test_invalid_index(self):
+        self.mk_pkg("app-misc/bar-1", rdepend="dev-libs/foo")
+        (self.path / ".pkgcore").mkdir()
+        (self.path / ".pkgcore" / "revdeps.json").write_text("{")
+        repo = self.mk_repo()
+        assert self.revdeps(repo, "dev-libs/foo") == ["app-misc/bar-1"]